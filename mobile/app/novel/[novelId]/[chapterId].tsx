@@ -60,6 +60,8 @@ export default function ReaderScreen() {
       <StatusBar hidden />
       <MangaReader
         pages={chapter.pages}
+        pageInfo={chapter.pageInfo}
+        prefetch={chapter.prefetch}
         initialPage={initialPage}
         onPageChange={handlePageChange}
       />
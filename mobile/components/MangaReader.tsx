@@ -1,4 +1,4 @@
-import { useCallback, useRef, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import {
   Dimensions,
   StyleSheet,
@@ -7,17 +7,36 @@ import {
 import PagerView from "react-native-pager-view";
 import { Image } from "expo-image";
 import { IMAGE_SERVER_URL, COLORS } from "@/lib/constants";
+import type { PageInfo } from "@/lib/types";
 import { ReadingProgress } from "./ReadingProgress";
 
 const { width: SCREEN_W, height: SCREEN_H } = Dimensions.get("window");
 
+// マニフェストに先読みの順序がない場合は前後 1 ページ
+const DEFAULT_PREFETCH = [1, -1];
+
 interface Props {
   pages: string[];
+  pageInfo?: PageInfo[];
+  prefetch?: number[];
   initialPage?: number;
   onPageChange?: (index: number) => void;
 }
 
-export function MangaReader({ pages, initialPage = 0, onPageChange }: Props) {
+// ページを読み終わるまで表示するプレースホルダー
+function placeholderFor(info?: PageInfo) {
+  if (info?.blurhash) return { blurhash: info.blurhash };
+  if (info?.thumbnail) return { uri: info.thumbnail };
+  return undefined;
+}
+
+export function MangaReader({
+  pages,
+  pageInfo,
+  prefetch = DEFAULT_PREFETCH,
+  initialPage = 0,
+  onPageChange,
+}: Props) {
   const [currentPage, setCurrentPage] = useState(initialPage);
   const [showUI, setShowUI] = useState(true);
   const pagerRef = useRef<PagerView>(null);
@@ -35,19 +54,24 @@ export function MangaReader({ pages, initialPage = 0, onPageChange }: Props) {
     setShowUI((v) => !v);
   }, []);
 
-  // 隣接ページをプリフェッチ
+  // マニフェストの優先順（次のページから）でプリフェッチ
   const prefetchNeighbors = useCallback(
     (idx: number) => {
-      const neighbors = [idx - 1, idx + 1].filter(
-        (i) => i >= 0 && i < pages.length
-      );
+      const neighbors = prefetch
+        .map((offset) => idx + offset)
+        .filter((i) => i >= 0 && i < pages.length);
       for (const n of neighbors) {
         Image.prefetch(`${IMAGE_SERVER_URL}/${pages[n]}`);
       }
     },
-    [pages]
+    [pages, prefetch]
   );
 
+  // 開いた直後のページからも先読みする
+  useEffect(() => {
+    prefetchNeighbors(initialPage);
+  }, [initialPage, prefetchNeighbors]);
+
   return (
     <View style={styles.container}>
       <PagerView
@@ -65,6 +89,8 @@ export function MangaReader({ pages, initialPage = 0, onPageChange }: Props) {
           <View key={page} style={styles.page} collapsable={false}>
             <Image
               source={{ uri: `${IMAGE_SERVER_URL}/${page}` }}
+              placeholder={placeholderFor(pageInfo?.[idx])}
+              placeholderContentFit="contain"
               style={styles.image}
               contentFit="contain"
               transition={100}
@@ -29,6 +29,7 @@ export function NovelCard({ novel, onPress }: Props) {
         <Text style={styles.meta}>
           {novel.chapters.length}章 /{" "}
           {novel.chapters.reduce((sum, ch) => sum + ch.pages.length, 0)}P
+          {novel.status === "in_progress" ? "（生成中）" : ""}
         </Text>
       </View>
     </Pressable>
@@ -3,6 +3,8 @@ import AsyncStorage from "@react-native-async-storage/async-storage";
 import { IMAGE_SERVER_URL, STORAGE_KEYS } from "@/lib/constants";
 import type { MangaManifest } from "@/lib/types";
 
+const MANIFEST_POLL_INTERVAL_MS = 30_000;
+
 interface UseManifestResult {
   manifest: MangaManifest | null;
   loading: boolean;
@@ -15,12 +17,13 @@ export function useManifest(): UseManifestResult {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
-  const fetchManifest = useCallback(async () => {
-    setLoading(true);
+  const fetchManifest = useCallback(async (silent = false) => {
+    // 定期更新ではローディング表示を出さない
+    if (!silent) setLoading(true);
     setError(null);
     try {
       const url = `${IMAGE_SERVER_URL}/manga-manifest.json`;
-      const res = await fetch(url);
+      const res = await fetch(url, { cache: "no-store" });
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const data: MangaManifest = await res.json();
       setManifest(data);
@@ -49,5 +52,13 @@ export function useManifest(): UseManifestResult {
     fetchManifest();
   }, [fetchManifest]);
 
-  return { manifest, loading, error, refetch: fetchManifest };
+  // 生成中の作品があれば、ページが増えるのを定期的に取り込む
+  const inProgress = manifest?.novels.some((n) => n.status === "in_progress") ?? false;
+  useEffect(() => {
+    if (!inProgress) return;
+    const timer = setInterval(() => fetchManifest(true), MANIFEST_POLL_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [inProgress, fetchManifest]);
+
+  return { manifest, loading, error, refetch: () => fetchManifest() };
 }
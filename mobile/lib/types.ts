@@ -12,6 +12,17 @@ export interface Novel {
   author: string;
   coverImage: string; // 相対URL（例: "ningen_shikkaku/page_001.png"）
   chapters: Chapter[];
+  archives?: Archives; // 作品全体のアーカイブ
+  status?: NovelStatus; // 省略時は complete
+}
+
+/** 生成状況（in_progress: 生成中。先頭から連続したページだけが載っている） */
+export type NovelStatus = "in_progress" | "complete";
+
+/** アーカイブ（CBZ / EPUB）の相対URL */
+export interface Archives {
+  cbz?: string; // 例: "ningen_shikkaku/chapter_01.cbz"
+  epub?: string;
 }
 
 /** 章 */
@@ -19,6 +30,18 @@ export interface Chapter {
   id: string;
   title: string;
   pages: string[]; // ページ画像の相対URL配列
+  pageInfo?: PageInfo[]; // pages と同じ順のページ情報（古いマニフェストにはない）
+  prefetch?: number[]; // 先読みするページの現在位置からの相対位置（優先順、例: [1, 2, 3, -1]）
+  archives?: Archives; // 章ごとのアーカイブ（--archive-per-chapter 時）
+}
+
+/** ページの大きさとプレースホルダー（blurhash か thumbnail のどちらか） */
+export interface PageInfo {
+  width: number;
+  height: number;
+  bytes: number;
+  blurhash?: string; // BlurHash 文字列
+  thumbnail?: string; // 幅 16px のグレースケール PNG（data URI）
 }
 
 /** 読書位置 */
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""セリフの多いシーンでのページ合成速度（pages/sec）ベンチマーク。
+
+使い方:
+    python scripts/bench_compose.py
+    python scripts/bench_compose.py --pages 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from novelmanga.composer import PageComposer
+from novelmanga.models import Panel, PanelType, Scene
+
+_LINES = [
+    "えっ！", "……", "なんだって？", "ワッハッハ", "お父さん", "はい",
+    "恥の多い生涯を送って来ました。", "自分には、人間の生活というものが、見当つかないのです。",
+]
+_NARRATIONS = ["その夜のこと。", "翌朝。", "自分は、道化を演じていた。"]
+
+
+def make_scenes(n: int, seed: int = 0) -> list[Scene]:
+    rng = random.Random(seed)
+    scenes = []
+    for i in range(1, n + 1):
+        count = rng.choice([3, 4, 5, 6])
+        panels = [
+            Panel(
+                panel_number=j,
+                panel_type=PanelType.DIALOGUE,
+                visual_description="",
+                dialogue=rng.sample(_LINES, 3),
+                narration=rng.choice(_NARRATIONS),
+            )
+            for j in range(1, count + 1)
+        ]
+        scenes.append(Scene(scene_number=i, source_text="", panels=panels))
+    return scenes
+
+
+def bench(composer: PageComposer, scenes: list[Scene]) -> float:
+    t0 = time.perf_counter()
+    for scene in scenes:
+        composer.compose_page(scene, [None] * len(scene.panels))
+    return len(scenes) / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PageComposer ベンチマーク")
+    parser.add_argument("--pages", "-n", type=int, default=100, help="合成するページ数")
+    args = parser.parse_args()
+
+    scenes = make_scenes(args.pages)
+    direct = bench(PageComposer(use_sprites=False), scenes)
+    sprites = bench(PageComposer(use_sprites=True), scenes)
+    print(f"{args.pages} ページ（セリフ 3 行 + ナレーション / コマ）")
+    print(f"  直接描画     {direct:8.1f} pages/s")
+    print(f"  スプライト   {sprites:8.1f} pages/s  (x{sprites / direct:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""ページ割り（packing.py）によるページ数・出力バイト数の比較。
+
+fake_server の合成脚本（--transport replay で解析した場合と同じ内容）から
+シーン列を作り、1 シーン = 1 ページのまま合成した場合と pack_scenes で
+まとめた場合の両方について、全ページを合成して PNG にエンコードし、
+ページ数・合計バイト数・合成とエンコードの時間を比べる。
+パネル画像には fake_server の合成画像を使う。
+
+使い方:
+    python scripts/bench_packing.py
+    python scripts/bench_packing.py --chunks 20 --max-panels 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from novelmanga.analyzer import SceneAnalyzer
+from novelmanga.composer import PageComposer
+from novelmanga.fake_server import synthetic_image, synthetic_script
+from novelmanga.packing import ScenePacker
+from novelmanga.parser import AozoraBunkoParser
+from novelmanga.prompts import MODEL, USER_PROMPT
+from novelmanga.transport import request_key
+
+_SAMPLE = Path(__file__).resolve().parent.parent / "data" / "sample" / "ningen_shikkaku.txt"
+
+
+def scenes_for(chunks) -> list:
+    """チャンクごとの合成脚本をデコードしたシーン列。"""
+    analyzer = SceneAnalyzer(client=object())
+    scenes = []
+    for chunk in chunks:
+        contents = USER_PROMPT + chunk.text
+        key = request_key(MODEL, analyzer.system_instruction, contents)
+        seed = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")
+        decoded, _ = analyzer._decode(synthetic_script(contents, seed))
+        scenes.extend(decoded or [])
+    return scenes
+
+
+def panel_image(description: str) -> Image.Image:
+    seed = int.from_bytes(hashlib.sha256(description.encode()).digest()[:4], "little")
+    return Image.open(io.BytesIO(synthetic_image(seed)))
+
+
+def render(scenes, composer: PageComposer, compress_level: int) -> tuple[int, float]:
+    """全ページを合成・エンコードし、(合計バイト数, 秒) を返す。"""
+    total = 0
+    t0 = time.perf_counter()
+    for scene in scenes:
+        page = composer.compose_page(scene, [panel_image(p.visual_description) for p in scene.panels])
+        buf = io.BytesIO()
+        page.save(buf, format="PNG", compress_level=compress_level)
+        total += buf.tell()
+    return total, time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ページ割りのページ数・バイト数比較")
+    parser.add_argument("input_file", nargs="?", default=str(_SAMPLE), help="青空文庫テキスト")
+    parser.add_argument("--chunks", "-n", type=int, default=10, help="比較するチャンク数")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--max-panels", type=int, default=6, help="まとめたページの最大コマ数")
+    parser.add_argument("--png-compression", type=int, default=6)
+    args = parser.parse_args()
+
+    text_parser = AozoraBunkoParser()
+    chunks = text_parser.split_chunks(text_parser.parse_file(args.input_file), chunk_size=args.chunk_size)
+    scenes = scenes_for(chunks[: args.chunks])
+    packer = ScenePacker(args.max_panels)
+    packed = [page.as_scene() for page in packer.pack(scenes)]
+
+    composer = PageComposer()
+    rows = {}
+    for label, pages in (("unpacked", scenes), ("packed", packed)):
+        rows[label] = (len(pages), *render(pages, composer, args.png_compression))
+
+    st = packer.stats
+    print(f"{len(chunks[: args.chunks])} チャンク・{st.scenes} シーン・最大 {args.max_panels} コマ/ページ")
+    print(f"{'':<10}{'pages':>7}{'KiB':>10}{'ms':>9}")
+    for label, (pages, size, secs) in rows.items():
+        print(f"{label:<10}{pages:>7}{size / 1024:>10.0f}{secs * 1000:>9.0f}")
+    (up, ub, us), (pp, pb, ps) = rows["unpacked"], rows["packed"]
+    print(
+        f"{up - pp} ページ（{1 - pp / up:.0%}）・{(ub - pb) / 1024:.0f} KiB（{1 - pb / ub:.0%}）削減"
+        f"・合成時間 {1 - ps / us:.0%} 減・段の途中のシーン境目 {st.misaligned}"
+    )
+
+
+if __name__ == "__main__":
+    main()
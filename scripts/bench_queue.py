@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""ジョブキューのワーカー数によるスループット（jobs/sec）ベンチマーク。
+
+偽モデルサーバーに応答遅延を入れ、同じ投入内容をワーカープロセス 1, 2, 4, ...
+で処理して、経過時間と 1 プロセスに対する速度比を表示する。
+
+使い方:
+    python scripts/bench_queue.py
+    python scripts/bench_queue.py --chunks 8 --workers 1 2 4 8 --latency 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from novelmanga.fake_server import FakeModelServer
+from novelmanga.jobqueue import DONE, SQLiteJobQueue
+from novelmanga.models import Chunk
+from novelmanga.worker import submit_run
+
+_TEXT = "「おはよう」と彼は言った。自分は、道化を演じていた。" * 60
+
+
+def make_chunks(n: int) -> list[Chunk]:
+    return [Chunk(chunk_id=f"c{i}", text=f"{i}:{_TEXT}", start=i, end=i + 1) for i in range(n)]
+
+
+def bench(server_url: str, chunks: list[Chunk], workers: int) -> tuple[int, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        queue = SQLiteJobQueue(tmp_path / "jobs.db")
+        submit_run(queue, chunks, "bench", tmp_path / "out", tmp_path / "cache")
+        cmd = [
+            sys.executable, "-m", "novelmanga", "worker",
+            "--queue", str(queue.path),
+            "--transport", "replay", "--fake-server", server_url,
+            "--exit-when-idle", "--poll-interval", "0.05",
+        ]
+        t0 = time.perf_counter()
+        procs = [subprocess.Popen(cmd, stdout=subprocess.DEVNULL) for _ in range(workers)]
+        for p in procs:
+            p.wait()
+        elapsed = time.perf_counter() - t0
+        done = queue.counts()[DONE]
+        queue.close()
+    return done, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ジョブキュー ベンチマーク")
+    parser.add_argument("--chunks", "-n", type=int, default=4, help="投入するチャンク数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="ワーカープロセス数")
+    parser.add_argument("--latency", type=float, default=1.0, help="偽サーバーの応答遅延（秒）")
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+    with FakeModelServer(latency=args.latency) as server:
+        print(f"{args.chunks} チャンク・応答遅延 {args.latency:.2f}s")
+        base = None
+        for n in args.workers:
+            done, elapsed = bench(server.url, chunks, n)
+            rate = done / elapsed
+            base = base or rate
+            print(f"  {n:2d} workers  {done:4d} jobs  {elapsed:6.2f}s  {rate:6.1f} jobs/s  (x{rate / base:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""解析レスポンスの形式（verbose / compact）ごとの出力トークン数・レイテンシ比較。
+
+記録済みの解析レスポンス（--record-dir、なければ fake_server の合成脚本）を
+チャンクごとにコンパクト形式へ変換し、両方の形式を FakeModelServer から
+再生する。サーバーは出力トークン数に比例した生成時間（--token-latency 秒/トークン）
+をかけて応答するので、出力トークンが支配的な実 API のレイテンシを模擬できる。
+
+出力トークン数は既定では文字種から見積もる（英字 4 文字・数字 3 桁・日本語 1 文字・
+記号 1 文字をそれぞれ 1 トークン）。--count-tokens を指定すると実 API の
+count_tokens で数える（GOOGLE_API_KEY が必要）。
+
+使い方:
+    python scripts/bench_schema.py
+    python scripts/bench_schema.py --record-dir recordings --chunks 10 --token-latency 0.01
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from novelmanga.analyzer import SceneAnalyzer
+from novelmanga.fake_server import FakeModelServer, synthetic_script
+from novelmanga.parser import AozoraBunkoParser
+from novelmanga.planner import estimate_tokens
+from novelmanga.prompts import MODEL, USER_PROMPT
+from novelmanga.schema import compact_scenes
+from novelmanga.transport import RecordStore, create_client, request_key
+
+_SAMPLE = Path(__file__).resolve().parent.parent / "data" / "sample" / "ningen_shikkaku.txt"
+
+
+def _verbose_text(store: RecordStore | None, system: str, contents: str) -> str:
+    """記録済みのレスポンスを返す。なければ fake_server と同じ合成脚本を返す。"""
+    key = request_key(MODEL, system, contents)
+    record = store.load(key) if store is not None else None
+    if record is not None:
+        return "".join(p.get("text", "") for p in record.get("parts", []))
+    seed = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")
+    return synthetic_script(contents, seed)
+
+
+def build_records(chunks, record_dir: Path, source: RecordStore | None, count) -> list[tuple[int, int]]:
+    """両形式のレスポンスを record_dir に保存し、チャンクごとの (verbose, compact) 出力トークン数を返す。"""
+    verbose = SceneAnalyzer(client=object())
+    compact = SceneAnalyzer(client=object(), script_format="compact")
+    out = RecordStore(record_dir)
+    tokens = []
+    for chunk in chunks:
+        contents = USER_PROMPT + chunk.text
+        text = _verbose_text(source, verbose.system_instruction, contents)
+        scenes, _ = verbose._decode(text)
+        short = json.dumps(compact_scenes(scenes or []), ensure_ascii=False, separators=(",", ":"))
+        pair = (count(text), count(short))
+        tokens.append(pair)
+        for analyzer, body, n in ((verbose, text, pair[0]), (compact, short, pair[1])):
+            key = request_key(MODEL, analyzer.system_instruction, contents)
+            out.save(key, {"parts": [{"text": body}], "usage": {"candidates_token_count": n}}, model=MODEL)
+    return tokens
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="解析レスポンス形式の比較ベンチマーク")
+    parser.add_argument("input_file", nargs="?", default=str(_SAMPLE), help="青空文庫テキスト")
+    parser.add_argument("--record-dir", default=None, help="記録済みレスポンス（transport record）のディレクトリ")
+    parser.add_argument("--chunks", "-n", type=int, default=8, help="比較するチャンク数")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--token-latency", type=float, default=0.005, help="出力 1 トークンあたりの生成時間（秒）")
+    parser.add_argument("--count-tokens", action="store_true", help="実 API の count_tokens で数える")
+    args = parser.parse_args()
+
+    text_parser = AozoraBunkoParser()
+    chunks = text_parser.split_chunks(text_parser.parse_file(args.input_file), chunk_size=args.chunk_size)
+    chunks = chunks[: args.chunks]
+    source = RecordStore(args.record_dir) if args.record_dir else None
+
+    count = estimate_tokens
+    if args.count_tokens:
+        live = create_client("live")
+
+        def count(text: str) -> int:
+            return live.models.count_tokens(model=MODEL, contents=text).total_tokens
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tokens = build_records(chunks, Path(tmp), source, count)
+        timings: dict[str, list[float]] = {}
+        results = {}
+        with FakeModelServer(record_dir=tmp, output_token_latency=args.token_latency) as srv:
+            client = create_client("replay", base_url=srv.url, retry_attempts=1)
+            for fmt in ("verbose", "compact"):
+                analyzer = SceneAnalyzer(client=client, script_format=fmt)
+                timings[fmt] = []
+                results[fmt] = []
+                for chunk in chunks:
+                    t0 = time.perf_counter()
+                    results[fmt].append(analyzer.analyze_chunk(chunk.text))
+                    timings[fmt].append(time.perf_counter() - t0)
+            assert srv.stats.replayed == 2 * len(chunks), "recorded responses were not replayed"
+
+    same = results["verbose"] == results["compact"]
+    print(f"{len(chunks)} チャンク・{args.token_latency * 1000:.1f} ms/出力トークン"
+          f"・デコード結果は{'一致' if same else '不一致'}")
+    print(f"{'chunk':>5}  {'verbose tok':>11}  {'compact tok':>11}  {'verbose ms':>10}  {'compact ms':>10}")
+    for i, ((vt, ct), vs, cs) in enumerate(zip(tokens, timings["verbose"], timings["compact"]), 1):
+        print(f"{i:>5}  {vt:>11}  {ct:>11}  {vs * 1000:>10.0f}  {cs * 1000:>10.0f}")
+    vt_sum = sum(v for v, _ in tokens)
+    ct_sum = sum(c for _, c in tokens)
+    vs_sum, cs_sum = sum(timings["verbose"]), sum(timings["compact"])
+    print(f"{'total':>5}  {vt_sum:>11}  {ct_sum:>11}  {vs_sum * 1000:>10.0f}  {cs_sum * 1000:>10.0f}")
+    print(f"出力トークン {1 - ct_sum / vt_sum:.0%} 減・レイテンシ {1 - cs_sum / vs_sum:.0%} 減")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""脚本シリアライズ形式のラウンドトリップ・読み込み速度ベンチマーク。
+
+使い方:
+    python scripts/bench_script_io.py
+    python scripts/bench_script_io.py --scenes 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from novelmanga.models import Panel, PanelType, Scene
+from novelmanga.script_io import (
+    ScriptReader,
+    dump_scenes,
+    export_json,
+    import_json,
+    load_scenes,
+)
+
+
+def make_scenes(n: int, seed: int = 0) -> list[Scene]:
+    rng = random.Random(seed)
+    types = list(PanelType)
+    scenes = []
+    for i in range(1, n + 1):
+        panels = [
+            Panel(
+                panel_number=j,
+                panel_type=rng.choice(types),
+                visual_description=f"dim room, young man sitting alone, variation {rng.randint(0, 999)}",
+                dialogue=["恥の多い生涯を送って来ました。"] * rng.randint(0, 3),
+                narration="自分には、人間の生活というものが、見当つかないのです。" if rng.random() < 0.3 else None,
+            )
+            for j in range(1, rng.randint(1, 6) + 1)
+        ]
+        scenes.append(Scene(scene_number=i, source_text="", panels=panels))
+    return scenes
+
+
+def _timed(label: str, fn) -> object:
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"  {label:<28} {(time.perf_counter() - t0) * 1000:9.1f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="script_io ベンチマーク")
+    parser.add_argument("--scenes", "-n", type=int, default=20000, help="シーン数")
+    parser.add_argument("--lookups", type=int, default=1000, help="ランダムアクセス回数")
+    args = parser.parse_args()
+
+    scenes = make_scenes(args.scenes)
+    with tempfile.TemporaryDirectory() as tmp:
+        nms = Path(tmp) / "script.nms"
+        js = Path(tmp) / "script.json"
+
+        print(f"{args.scenes} シーン")
+        _timed("binary dump", lambda: dump_scenes(scenes, nms))
+        _timed("json export", lambda: export_json(scenes, js))
+        loaded = _timed("binary load (all)", lambda: load_scenes(nms))
+        _timed("json import (all)", lambda: import_json(js))
+        assert loaded == scenes, "round-trip mismatch"
+
+        rng = random.Random(1)
+        indices = [rng.randrange(args.scenes) for _ in range(args.lookups)]
+
+        def _lookups() -> None:
+            with ScriptReader(nms) as reader:
+                for i in indices:
+                    reader[i]
+
+        _timed(f"binary random x{args.lookups}", _lookups)
+        _timed("binary open + scene[-1]", lambda: ScriptReader(nms)[args.scenes - 1])
+
+        print(f"  size binary: {nms.stat().st_size / 1e6:.2f} MB, json: {js.stat().st_size / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
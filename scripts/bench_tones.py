@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""スクリーントーン後処理（tones.py）のコマあたりの処理時間ベンチマーク。
+
+ページ全面のコマ（1 コマのページ）と 6 コマのページの 1 コマの大きさで、
+プリセットごとに apply_tone の処理時間を測る。比較のため、画素ごとの
+Python ループで組織的ディザをかけた場合の時間も小さな画像から見積もる。
+
+使い方:
+    python scripts/bench_tones.py
+    python scripts/bench_tones.py --repeat 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+
+from PIL import Image
+
+from novelmanga.composer import PageComposer
+from novelmanga.fake_server import synthetic_image
+from novelmanga.models import Panel, PanelType, Scene
+from novelmanga.tones import PRESETS, _bayer, apply_tone
+
+
+def panel_image(width: int, height: int) -> Image.Image:
+    """合成画像をコマの大きさに拡大した、グラデーションのある "L" 画像。"""
+    img = Image.open(io.BytesIO(synthetic_image(1))).resize((width, height), Image.LANCZOS)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    return Image.blend(img, gradient, 0.4)
+
+
+def time_ms(fn, repeat: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def python_dither(img: Image.Image) -> Image.Image:
+    """画素ごとの Python ループによる組織的ディザ（比較用）。"""
+    matrix = [[(v + 0.5) * 4 for v in row] for row in _bayer(8).tolist()]
+    src = img.load()
+    out = Image.new("L", img.size)
+    dst = out.load()
+    for y in range(img.height):
+        row = matrix[y % 8]
+        for x in range(img.width):
+            dst[x, y] = 0 if src[x, y] < row[x % 8] else 255
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="スクリーントーン後処理のベンチマーク")
+    parser.add_argument("--repeat", "-n", type=int, default=20, help="1 条件あたりの繰り返し回数")
+    args = parser.parse_args()
+
+    composer = PageComposer(use_sprites=False)
+    sizes = {}
+    for n in (1, 6):
+        x1, y1, x2, y2 = composer.panel_rects(
+            Scene(1, "", [Panel(i + 1, PanelType.ACTION, "") for i in range(n)])
+        )[0]
+        # _draw_panel と同じく枠線の内側の大きさ
+        sizes[f"{n} コマ/ページ"] = (x2 - x1 - 6, y2 - y1 - 6)
+
+    print(f"{'preset':<12}" + "".join(f"{label} {w}x{h}".rjust(26) for label, (w, h) in sizes.items()))
+    images = {label: panel_image(w, h) for label, (w, h) in sizes.items()}
+    # しきい値マップの作成と初回の NumPy の初期化を計測から除く
+    for name in PRESETS:
+        for img in images.values():
+            apply_tone(img, name)
+    for name in PRESETS:
+        cells = [f"{time_ms(lambda: apply_tone(img, name), args.repeat):8.2f} ms/コマ" for img in images.values()]
+        print(f"{name:<12}" + "".join(c.rjust(26) for c in cells))
+
+    w, h = sizes["1 コマ/ページ"]
+    sample = panel_image(128, 128)
+    per_pixel = time_ms(lambda: python_dither(sample), 1) / (128 * 128)
+    print(f"\n参考: 画素ごとの Python ループのディザ ≈ {per_pixel * w * h:.0f} ms/コマ（{w}x{h} に換算）")
+
+
+if __name__ == "__main__":
+    main()
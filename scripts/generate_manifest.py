@@ -4,16 +4,30 @@
 使い方:
     python scripts/generate_manifest.py
     python scripts/generate_manifest.py --output-dir output --pages-per-chapter 10
+    python scripts/generate_manifest.py --placeholder thumbnail
+
+各章にはページの幅・高さ・バイト数とプレースホルダー（pageInfo）、
+先読みの順序（prefetch）を載せる（novelmanga.placeholders）。
+
+マニフェストの形式・章分割を python -m novelmanga と共有するため、
+novelmanga パッケージ（pip install -e .）がインストールされている必要がある。
 """
 
 from __future__ import annotations
 
 import argparse
-import json
 import re
+import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
+try:
+    from novelmanga.archive import ARCHIVE_FORMATS
+    from novelmanga.manifest import MANIFEST_NAME, novel_entry, write_manifest
+    from novelmanga.placeholders import PLACEHOLDER_KINDS, annotate_chapters
+except ImportError as e:
+    sys.exit(f"Error: {e}\nこのスクリプトには novelmanga パッケージが必要です: pip install -e .")
+
 
 def find_page_images(search_dir: Path) -> list[str]:
     """search_dir 内の page_*.png を番号順で返す。"""
@@ -24,6 +38,15 @@ def find_page_images(search_dir: Path) -> list[str]:
     return pages
 
 
+def find_archives(search_dir: Path, stem: str, url_stem: str) -> dict[str, str]:
+    """search_dir/{stem}.cbz などのアーカイブを {形式: 相対URL} で返す。"""
+    return {
+        fmt: f"{url_stem}.{fmt}"
+        for fmt in ARCHIVE_FORMATS
+        if (search_dir / f"{stem}.{fmt}").exists()
+    }
+
+
 def ensure_novel_subdir(output_dir: Path, novel_id: str) -> Path:
     """output_dir/{novel_id}/ サブディレクトリを作成し、
     ルートの page_*.png をそこに移動する。
@@ -54,6 +77,7 @@ def build_manifest(
     title: str = "人間失格",
     author: str = "太宰治",
     pages_per_chapter: int = 0,
+    placeholder: str = "auto",
 ) -> dict:
     """マニフェストJSONを構築する。
 
@@ -67,39 +91,23 @@ def build_manifest(
             f"No page_*.png found in {output_dir} or {novel_dir}"
         )
 
-    # 章に分割
-    if pages_per_chapter > 0:
-        chunks = [
-            pages[i : i + pages_per_chapter]
-            for i in range(0, len(pages), pages_per_chapter)
-        ]
-    else:
-        chunks = [pages]
-
-    chapters = []
-    for idx, chunk in enumerate(chunks, 1):
-        chapters.append(
-            {
-                "id": f"chapter_{idx:02d}",
-                "title": f"第{idx}章" if len(chunks) > 1 else "全編",
-                "pages": [f"{novel_id}/{p}" for p in chunk],
-            }
-        )
-
-    cover = f"{novel_id}/{pages[0]}" if pages else ""
+    # 章に分割（python -m novelmanga --archive の目次と同じ分割）
+    novel = novel_entry(
+        novel_id, title, author, [f"{novel_id}/{p}" for p in pages], pages_per_chapter
+    )
+    annotate_chapters(novel["chapters"], output_dir, placeholder)
+    for chapter in novel["chapters"]:
+        archives = find_archives(novel_dir, chapter["id"], f"{novel_id}/{chapter['id']}")
+        if archives:
+            chapter["archives"] = archives
+    archives = find_archives(output_dir, novel_id, novel_id)
+    if archives:
+        novel["archives"] = archives
 
     manifest = {
         "version": 1,
         "generatedAt": datetime.now(timezone.utc).isoformat(),
-        "novels": [
-            {
-                "id": novel_id,
-                "title": title,
-                "author": author,
-                "coverImage": cover,
-                "chapters": chapters,
-            }
-        ],
+        "novels": [novel],
     }
     return manifest
 
@@ -121,6 +129,12 @@ def main() -> None:
     )
     parser.add_argument("--title", default="人間失格", help="作品タイトル")
     parser.add_argument("--author", default="太宰治", help="著者名")
+    parser.add_argument(
+        "--placeholder",
+        choices=PLACEHOLDER_KINDS,
+        default="auto",
+        help="ページのプレースホルダー（auto: NumPy があれば blurhash、なければ thumbnail）",
+    )
     args = parser.parse_args()
 
     output_dir = Path(args.output_dir)
@@ -135,11 +149,12 @@ def main() -> None:
         title=args.title,
         author=args.author,
         pages_per_chapter=args.pages_per_chapter,
+        placeholder=args.placeholder,
     )
 
     # output/ 直下に配置（HTTPサーバーのルートからアクセス可能に）
-    manifest_path = output_dir / "manga-manifest.json"
-    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+    manifest_path = output_dir / MANIFEST_NAME
+    write_manifest(manifest_path, manifest)
 
     total_pages = sum(len(ch["pages"]) for ch in manifest["novels"][0]["chapters"])
     total_chapters = len(manifest["novels"][0]["chapters"])
@@ -4,17 +4,33 @@
     python -m novelmanga data/sample/ningen_shikkaku.txt
     python -m novelmanga data/sample/ningen_shikkaku.txt -o output/ -p 5
     python -m novelmanga data/sample/ningen_shikkaku.txt --no-images
+
+ジョブキューで複数プロセス・複数ホストに分担する場合:
+    python -m novelmanga submit data/sample/ningen_shikkaku.txt --queue jobs.db --cache-dir .cache
+    python -m novelmanga worker --queue jobs.db
+
+1 作品を複数ホストで分担し、結果を結合する場合:
+    python -m novelmanga data/sample/ningen_shikkaku.txt --shard 1/2 -o shared/
+    python -m novelmanga data/sample/ningen_shikkaku.txt --shard 2/2 -o shared/
+    python -m novelmanga merge shared/shards/ningen_shikkaku -o shared/
+
+常駐サービスとして起動し、HTTP でジョブを受け付ける場合:
+    python -m novelmanga daemon --port 8766 --cache-dir .cache
 """
 
 from __future__ import annotations
 
 import argparse
+import contextlib
 import os
 import sys
+import time
 from pathlib import Path
 
 
 def _build_parser() -> argparse.ArgumentParser:
+    from novelmanga.memory import size_arg
+
     p = argparse.ArgumentParser(
         prog="python -m novelmanga",
         description="NovelManga: Aozora Bunko 小説 → 漫画ページ 自動変換ツール",
@@ -39,16 +55,306 @@ def _build_parser() -> argparse.ArgumentParser:
         metavar="CHARS",
         help="Claude API に送るテキストチャンクの文字数（デフォルト: 2000）",
     )
+    p.add_argument(
+        "--content-defined-chunks",
+        action="store_true",
+        help="内容に基づくチャンク境界を使う（テキスト編集時に変更箇所のチャンクだけ再解析される）",
+    )
+    p.add_argument(
+        "--structured-output",
+        action="store_true",
+        help="シーン解析で API の JSON 出力モード（response_schema）を使う",
+    )
+    p.add_argument(
+        "--script-format",
+        choices=["verbose", "compact"],
+        default="verbose",
+        help="シーン解析の出力形式: compact=短いキーで出力トークンを減らす（デフォルト: verbose）",
+    )
     p.add_argument(
         "--no-images",
         action="store_true",
         help="画像生成をスキップしてレイアウトのみ出力",
     )
+    p.add_argument(
+        "--tone",
+        choices=["dither", "halftone", "ink", "screentone"],
+        default=None,
+        help="コマ画像を貼る前にスクリーントーン・網点に 2 値化する（NumPy が必要、省略時: グレースケールのまま）",
+    )
+    p.add_argument(
+        "--placeholder",
+        choices=["auto", "blurhash", "thumbnail", "none"],
+        default="auto",
+        help="マニフェストに載せるページのプレースホルダー（auto: NumPy があれば blurhash、なければ 16px の thumbnail）。"
+        "ページの大きさ・バイト数と先読みの順序も載せる",
+    )
+    p.add_argument(
+        "--cache-dir",
+        default=None,
+        metavar="DIR",
+        help="解析結果・生成画像のキャッシュディレクトリ（省略時: キャッシュしない）",
+    )
+    p.add_argument(
+        "--cache-shared",
+        default=None,
+        metavar="PATH|URL",
+        help="--cache-dir の下に置く共有キャッシュ（NFS などのディレクトリ、または S3 互換の http(s)://HOST/BUCKET/PREFIX）。"
+        "読み出しは --cache-dir → 共有の順、書き込みは共有へはバックグラウンドで行う",
+    )
+    p.add_argument(
+        "--cache-memory",
+        type=size_arg,
+        default=0,
+        metavar="SIZE",
+        help="--cache-dir の上に置くメモリキャッシュ（LRU）の上限（例: 256M、省略時: 使わない）",
+    )
+    p.add_argument(
+        "--similarity-threshold",
+        type=float,
+        default=None,
+        metavar="F",
+        help="visual_description の類似度がこの値以上なら既存画像を再利用（0〜1、省略時: 無効）",
+    )
+    p.add_argument(
+        "--panel-sheets",
+        action="store_true",
+        help="コマ数の多いシーンをコマ割りどおりの 1 枚のシートとして生成し、切り出して使う（API 呼び出しを減らす）",
+    )
+    p.add_argument(
+        "--sheet-min-panels",
+        type=int,
+        default=4,
+        metavar="N",
+        help="--panel-sheets でシートにまとめるシーンの最小コマ数（デフォルト: 4）",
+    )
+    p.add_argument(
+        "--pack-pages",
+        action="store_true",
+        help="連続する短いシーンを 1 ページにまとめてページ数を減らす（page_break のシーンと章の境目では改ページ）",
+    )
+    p.add_argument(
+        "--max-panels-per-page",
+        type=int,
+        choices=range(1, 7),
+        default=6,
+        metavar="1-6",
+        help="--pack-pages でまとめたページの最大コマ数（デフォルト: 6）",
+    )
+    p.add_argument(
+        "--plan",
+        action="store_true",
+        help="API を呼ばずに呼び出し数・トークン数・費用・所要時間を見積もって終了する（{output}/run_plan.json）",
+    )
+    p.add_argument(
+        "--plan-history",
+        action="append",
+        default=None,
+        metavar="PATH",
+        help="--plan の比率に使う過去の run_report.json かそのディレクトリ（複数指定可、省略時: 出力ディレクトリ）",
+    )
+    p.add_argument(
+        "--plan-rpm",
+        type=float,
+        default=None,
+        metavar="N",
+        help="--plan で想定する API のレート制限（解析・画像合わせて 1 分あたりの回数）",
+    )
+    p.add_argument(
+        "--plan-prices",
+        type=_prices,
+        default=None,
+        metavar="IN,OUT,IMAGE",
+        help="--plan の単価（USD: 入力・出力 100 万トークンあたり、画像 1 枚あたり）",
+    )
+    p.add_argument(
+        "--context-cache",
+        action="store_true",
+        help="シーン解析のシステムプロンプトをサーバー側のコンテキストキャッシュに置いて再利用する",
+    )
+    p.add_argument(
+        "--context-cache-ttl",
+        type=float,
+        default=3600.0,
+        metavar="SECONDS",
+        help="コンテキストキャッシュの TTL（秒、デフォルト: 3600）。期限が近づいたら作り直す",
+    )
+    p.add_argument(
+        "--novel-context",
+        default=None,
+        metavar="FILE",
+        help="登場人物一覧など作品全体の設定を書いたテキストファイル。すべてのチャンクの解析で参照する",
+    )
+    p.add_argument(
+        "--batch-submit",
+        action="store_true",
+        help="解析・画像生成をバッチジョブとしてまとめて投入し、結果を --cache-dir に取り込んでから処理する",
+    )
+    p.add_argument(
+        "--batch-state",
+        default=None,
+        metavar="PATH",
+        help="バッチジョブの状態ファイル（省略時: {cache-dir}/batches/{入力ファイル名}.json）。同じファイルで再実行すると再開する",
+    )
+    p.add_argument(
+        "--batch-poll",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="バッチジョブの状態を確認する間隔（秒、デフォルト: 30）",
+    )
+    p.add_argument(
+        "--batch-timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="バッチジョブの完了を待つ上限（秒、省略時: 無制限）。超えたら終了し、再実行で再開する",
+    )
+    p.add_argument(
+        "--transport",
+        choices=["live", "record", "replay"],
+        default="live",
+        help="API 接続方式: live=実 API / record=実 API + 記録 / replay=ローカルのスタンドイン（デフォルト: live）",
+    )
+    p.add_argument(
+        "--record-dir",
+        default=None,
+        metavar="DIR",
+        help="record で保存し replay で再生するレスポンスのディレクトリ",
+    )
+    p.add_argument(
+        "--fake-server",
+        default=None,
+        metavar="URL",
+        help="replay 時に接続する起動済み fake_server の URL（省略時: プロセス内で起動）",
+    )
+    p.add_argument(
+        "--write-threads",
+        type=int,
+        default=2,
+        metavar="N",
+        help="PNG エンコード・書き出しのバックグラウンドスレッド数（0 で同期書き出し、デフォルト: 2）",
+    )
+    p.add_argument(
+        "--png-compression",
+        type=int,
+        choices=range(10),
+        default=6,
+        metavar="0-9",
+        help="PNG の圧縮レベル（0=最速・最大サイズ 〜 9=最小サイズ・最遅、デフォルト: 6）",
+    )
+    p.add_argument(
+        "--archive",
+        action="append",
+        choices=["cbz", "epub"],
+        default=None,
+        help="合成したページを CBZ / EPUB に直接書き出す（複数指定可）",
+    )
+    p.add_argument(
+        "--archive-per-chapter",
+        action="store_true",
+        help="アーカイブを章ごとに {novel_id}/{chapter_id}.cbz として出力する",
+    )
+    p.add_argument(
+        "--pages-per-chapter",
+        type=int,
+        default=0,
+        metavar="N",
+        help="アーカイブ目次の 1 章あたりのページ数（0=全ページ1章、generate_manifest.py と同じ分割）",
+    )
+    p.add_argument(
+        "--no-page-files",
+        action="store_true",
+        help="page_*.png を個別に保存しない（--archive と併用）",
+    )
+    p.add_argument(
+        "--publish",
+        action="store_true",
+        help="読む順にページを生成し、{novel_id}/page_*.png と manga-manifest.json を逐次公開する",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        metavar="N",
+        help="--publish 時に解析・画像生成・合成を並行実行するスレッド数（デフォルト: 4）",
+    )
+    p.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="段階ごと・ページごとのメモリ使用量（tracemalloc・RSS）を run_report.json に記録する",
+    )
+    p.add_argument(
+        "--profile-cpu",
+        action="store_true",
+        help="段階ごとの CPU プロファイル（pstats と flamegraph 用の collapsed stack）を {output}/cpu_profile/ に書き出す",
+    )
+    p.add_argument(
+        "--profile-top",
+        type=int,
+        default=20,
+        metavar="N",
+        help="--profile-cpu の要約に載せる関数の数（デフォルト: 20）",
+    )
+    p.add_argument(
+        "--max-memory",
+        type=size_arg,
+        default=None,
+        metavar="SIZE",
+        help="メモリ使用量の上限（例: 2G）。超えたらパネル画像をディスクに退避し画像生成を遅らせる",
+    )
+    p.add_argument(
+        "--chapters",
+        default=None,
+        metavar="SPEC",
+        help="見出しの章番号で処理範囲を指定する（例: 3-5, 2, 1,4-）。章ごとに {novel_id}/chapter_NN/ へ出力する",
+    )
+    p.add_argument(
+        "--shard",
+        type=_shard,
+        default=None,
+        metavar="i/N",
+        help="チャンクを N 分割した i 番目だけを処理し、shards/{novel_id}/ に出力する（merge で結合）",
+    )
+    p.add_argument("--novel-id", default=None, help="アーカイブ・マニフェストの作品ID（省略時: 入力ファイル名）")
+    p.add_argument("--title", default=None, help="アーカイブの作品タイトル（省略時: 作品ID）")
+    p.add_argument("--author", default="", help="アーカイブの著者名")
     return p
 
 
+def _prices(text: str):
+    from novelmanga.planner import parse_prices
+
+    try:
+        return parse_prices(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def _shard(text: str) -> tuple[int, int]:
+    from novelmanga.shard import parse_shard
+
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+# 入力ファイル名より先に判定するサブコマンドと、その実装モジュール
+_SUBCOMMANDS = {"submit": "worker", "worker": "worker", "daemon": "daemon", "merge": "shard"}
+
+
 def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] in _SUBCOMMANDS:
+        import importlib
+
+        command, argv = sys.argv[1], sys.argv[2:]
+        module = importlib.import_module(f"novelmanga.{_SUBCOMMANDS[command]}")
+        getattr(module, f"{command}_main")(argv)
+        return
+
     args = _build_parser().parse_args()
+    started = time.perf_counter()
 
     input_path = Path(args.input_file)
     if not input_path.exists():
@@ -58,14 +364,80 @@ def main() -> None:
     output_dir = Path(args.output)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # API キー確認
-    if not os.environ.get("ANTHROPIC_API_KEY"):
+    if args.publish and (args.archive or args.no_page_files):
+        print("Error: --publish は --archive / --no-page-files と同時に指定できません", file=sys.stderr)
+        sys.exit(1)
+
+    if args.publish and args.chapters:
+        print("Error: --publish は --chapters と同時に指定できません", file=sys.stderr)
+        sys.exit(1)
+
+    if args.shard and (args.publish or args.chapters or args.archive or args.no_page_files):
+        print(
+            "Error: --shard は --publish / --chapters / --archive / --no-page-files と同時に指定できません",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    # ページ ID はシーンの位置から決まるため、ページをまとめるとシャード間で ID がずれる
+    if args.shard and args.pack_pages:
+        print("Error: --shard は --pack-pages と同時に指定できません", file=sys.stderr)
+        sys.exit(1)
+
+    if args.no_page_files and not args.archive:
+        print("Error: --no-page-files には --archive が必要です", file=sys.stderr)
+        sys.exit(1)
+
+    if args.tone:
+        from novelmanga.tones import require_numpy
+
+        try:
+            require_numpy()
+        except ImportError as e:
+            print(f"Error: --tone: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    from novelmanga.placeholders import resolve_kind
+
+    try:
+        resolve_kind(args.placeholder)
+    except ImportError as e:
+        print(f"Error: --placeholder: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    novel_context = None
+    if args.novel_context:
+        try:
+            novel_context = Path(args.novel_context).read_text(encoding="utf-8")
+        except OSError as e:
+            print(f"Error: --novel-context を読み込めません: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.batch_submit and not args.cache_dir:
+        print("Error: --batch-submit には --cache-dir が必要です", file=sys.stderr)
+        sys.exit(1)
+    if (args.cache_shared or args.cache_memory) and not args.cache_dir:
+        print("Error: --cache-shared / --cache-memory には --cache-dir が必要です", file=sys.stderr)
+        sys.exit(1)
+
+    if args.plan:
+        # パースとチャンク分割だけを行う（モデル SDK を読み込むモジュールは import しない）
+        _run_plan(args, input_path, output_dir, novel_context)
+        return
+
+    if args.transport == "record" and not args.record_dir:
+        print("Error: --transport record には --record-dir が必要です", file=sys.stderr)
+        sys.exit(1)
+
+    # API キー確認（replay はローカルのスタンドインに接続するため不要）
+    offline = args.transport == "replay"
+    if not offline and not os.environ.get("ANTHROPIC_API_KEY"):
         print(
             "Warning: ANTHROPIC_API_KEY が未設定です。シーン解析がスキップされる場合があります。",
             file=sys.stderr,
         )
-    skip_images = args.no_images or not os.environ.get("GOOGLE_API_KEY")
-    if not args.no_images and not os.environ.get("GOOGLE_API_KEY"):
+    skip_images = args.no_images or not (offline or os.environ.get("GOOGLE_API_KEY"))
+    if not args.no_images and not (offline or os.environ.get("GOOGLE_API_KEY")):
         print(
             "Warning: GOOGLE_API_KEY が未設定です。画像生成をスキップします。",
             file=sys.stderr,
@@ -76,60 +448,628 @@ def main() -> None:
 
     # --- モジュールをインポート ---
     from novelmanga.analyzer import SceneAnalyzer
-    from novelmanga.composer import PageComposer
+    from novelmanga.archive import ArchiveExporter
+    from novelmanga.composer import PAGE_HEIGHT, PAGE_WIDTH, PageComposer
     from novelmanga.generator import ImageGenerator
-    from novelmanga.parser import AozoraBunkoParser
+    from novelmanga.manifest import MANIFEST_NAME, plan_chapters, upsert_chapters
+    from novelmanga.memory import MemoryBudget, PanelImageStore
+    from novelmanga.pipeline import sheet_page_entry
+    from novelmanga.profiling import CpuProfiler, MemoryProfiler
+    from novelmanga.shard import page_id, shard_dir, write_shard_meta
+    from novelmanga.transport import create_client
+    from novelmanga.writer import PageWriter
+
+    client = create_client(
+        args.transport, record_dir=args.record_dir, base_url=args.fake_server
+    )
+
+    novel_id = args.novel_id or input_path.stem
+    # --shard: 実行レポート・CPU プロファイルはシャードのディレクトリに書き、同時に動く他のシャードと衝突させない
+    report_dir = shard_dir(output_dir, novel_id, *args.shard) if args.shard else output_dir
+
+    # メモリ計測・上限（--profile-memory / --max-memory）
+    profiler = MemoryProfiler().start() if args.profile_memory else None
+    cpu = CpuProfiler(report_dir / "cpu_profile", top=args.profile_top) if args.profile_cpu else None
+    stages = [p for p in (profiler, cpu) if p is not None]
+    budget = MemoryBudget(args.max_memory, PanelImageStore(spill_dir=args.cache_dir)) if args.max_memory else None
+    store = budget.store if budget is not None else PanelImageStore()
 
     # Step 1: パース
     print("\n[1/4] 青空文庫テキストを解析中...")
-    aozora_parser = AozoraBunkoParser()
-    text = aozora_parser.parse_file(input_path)
-    chunks = aozora_parser.chunk_for_analysis(text, chunk_size=args.chunk_size)
+    with _stage(stages, "parse"):
+        chunks, chunk_chapters, all_chunk_ids, chunk_indexes = _load_chunks(args, input_path)
 
-    if args.pages:
-        chunks = chunks[: args.pages]
-    print(f"  -> {len(chunks)} チャンク")
+    caches = {"scripts": _open_cache(args, "scripts")}
+    analyzer = SceneAnalyzer(
+        client=client,
+        structured=args.structured_output,
+        cache=caches["scripts"],
+        script_format=args.script_format,
+        context_cache=args.context_cache,
+        context_cache_ttl=args.context_cache_ttl,
+        context=novel_context,
+    )
+    # 実行計画（--plan）の比率の元にするため、API で解析するチャンクの量を記録する
+    analyzed = [c for c in chunks if not analyzer.is_cached(c)]
+    usage = {
+        "script_format": args.script_format,
+        "chunks": len(chunks),
+        "chars": sum(len(c.text) for c in chunks),
+        "analyzed_chunks": len(analyzed),
+        "analyzed_chars": sum(len(c.text) for c in analyzed),
+    }
+    image_gen = None
+    if not skip_images:
+        caches["images"] = _open_cache(args, "images")
+        image_gen = ImageGenerator(
+            cache_dir=Path(args.cache_dir) / "images" if args.cache_dir else None,
+            cache=caches["images"],
+            similarity_threshold=args.similarity_threshold,
+            client=client,
+            sheet_min_panels=args.sheet_min_panels if args.panel_sheets else 0,
+        )
+
+    packer = None
+    if args.pack_pages:
+        from novelmanga.packing import ScenePacker
+
+        packer = ScenePacker(args.max_panels_per_page)
+
+    if args.batch_submit:
+        with _stage(stages, "batch"):
+            _run_batches(args, chunks, analyzer, image_gen, client, input_path)
+
+    if args.publish:
+        with _stage(stages, "pipeline"):
+            scenes, sheet_pages = _run_progressive(
+                args, chunks, analyzer, image_gen, output_dir, input_path, profiler, budget, packer
+            )
+        usage.update(_usage(scenes, packer, analyzer, image_gen, started))
+        _write_run_report(
+            output_dir, input_path, profiler, budget, analyzer, image_gen, sheet_pages, packer, usage, caches, cpu
+        )
+        store.close()
+        return
 
     # Step 2: シーン解析
     print("\n[2/4] Claude API でシーン解析中...")
-    analyzer = SceneAnalyzer()
     all_scenes = []
-    for i, chunk in enumerate(chunks, 1):
-        print(f"  -> チャンク {i}/{len(chunks)}", end="", flush=True)
-        scenes = analyzer.analyze_chunk(chunk)
-        all_scenes.extend(scenes)
-        print(f" ({len(scenes)} シーン)")
+    scene_chapters = []
+    scene_ids = []  # --shard: (チャンク番号, chunk_id, ページ ID)
+    with _stage(stages, "analysis"):
+        for i, chunk in enumerate(chunks, 1):
+            print(f"  -> チャンク {i}/{len(chunks)}", end="", flush=True)
+            scenes = analyzer.analyze(chunk)
+            all_scenes.extend(scenes)
+            if chunk_chapters is not None:
+                scene_chapters.extend([chunk_chapters[i - 1]] * len(scenes))
+            if args.shard:
+                scene_ids.extend(
+                    (chunk_indexes[i - 1], chunk.chunk_id, page_id(chunk_indexes[i - 1], k))
+                    for k in range(1, len(scenes) + 1)
+                )
+            print(f" ({len(scenes)} シーン)")
     print(f"  -> 合計 {len(all_scenes)} シーン")
+    _print_analysis_stats(analyzer)
+    if packer is not None:
+        # 章の境目では必ず改ページする
+        breaks = [i for i in range(1, len(scene_chapters)) if scene_chapters[i].id != scene_chapters[i - 1].id]
+        pages = packer.pack(all_scenes, breaks)
+        all_scenes = [page.as_scene() for page in pages]
+        if chunk_chapters is not None:
+            scene_chapters = [scene_chapters[page.start] for page in pages]
+        st = packer.stats
+        print(f"  -> ページ割り: {st.scenes} シーンを {st.pages} ページに（{st.pages_saved} ページ削減）")
 
-    # Step 3: 画像生成
+    # Step 3: 画像生成（パネル画像は store に預け、上限を超えたらディスクに退避する）
     print("\n[3/4] Gemini API でパネル画像を生成中...")
-    all_panel_images: list[list] = []
-
-    if skip_images:
+    composer = PageComposer(tone=args.tone)
+    sheet_pages = []
+    if image_gen is None:
         print("  -> スキップ（--no-images または GOOGLE_API_KEY 未設定）")
-        all_panel_images = [[None] * len(s.panels) for s in all_scenes]
     else:
-        image_gen = ImageGenerator()
-        for si, scene in enumerate(all_scenes, 1):
-            scene_imgs = []
-            for pi, panel in enumerate(scene.panels, 1):
-                print(f"  -> シーン {si}/{len(all_scenes)}, コマ {pi}/{len(scene.panels)}", end="", flush=True)
-                img = image_gen.generate_panel_image(panel.visual_description)
-                scene_imgs.append(img)
-                print(" ✓" if img else " (スキップ)")
-            all_panel_images.append(scene_imgs)
+        with _stage(stages, "images"):
+            for si, scene in enumerate(all_scenes, 1):
+                if image_gen.uses_sheet(len(scene.panels)):
+                    # コマ割りどおりのシートを 1 回で生成して切り出す
+                    print(f"  -> シーン {si}/{len(all_scenes)}, {len(scene.panels)} コマをシートで生成", end="", flush=True)
+                    if budget is not None:
+                        budget.throttle()
+                    result = image_gen.generate_scene_images(
+                        [panel.visual_description for panel in scene.panels],
+                        composer.panel_rects(scene),
+                        (PAGE_WIDTH, PAGE_HEIGHT),
+                    )
+                    for pi, img in enumerate(result.images, 1):
+                        store.put((si, pi), img)
+                    sheet_pages.append(sheet_page_entry(si, result))
+                    note = "・切り出せずコマごとに生成" if result.fallback else ""
+                    print(f" API {result.calls} 回（{result.saved} 回節約{note}）")
+                    if profiler is not None:
+                        profiler.page(si, "images")
+                    continue
+                for pi, panel in enumerate(scene.panels, 1):
+                    print(f"  -> シーン {si}/{len(all_scenes)}, コマ {pi}/{len(scene.panels)}", end="", flush=True)
+                    if budget is not None:
+                        budget.throttle()
+                    img = image_gen.generate_panel_image(panel.visual_description)
+                    store.put((si, pi), img)
+                    print(" ✓" if img else " (スキップ)")
+                if profiler is not None:
+                    profiler.page(si, "images")
+        _print_generation_stats(image_gen)
 
     # Step 4: ページ合成
     print("\n[4/4] ページを合成中...")
-    composer = PageComposer()
-    for i, (scene, panel_imgs) in enumerate(zip(all_scenes, all_panel_images), 1):
-        page = composer.compose_page(scene, panel_imgs)
-        out_path = output_dir / f"page_{i:03d}.png"
-        composer.save_page(page, out_path)
-        print(f"  -> 保存: {out_path}")
+    if chunk_chapters is not None:
+        page_paths, chapter_specs = _source_chapter_layout(scene_chapters, output_dir / novel_id)
+    elif args.shard:
+        out_dir = shard_dir(output_dir, novel_id, *args.shard)
+        page_paths = [out_dir / f"page_{pid}.png" for _, _, pid in scene_ids]
+        chapter_specs = []
+    else:
+        page_paths = [output_dir / f"page_{i:03d}.png" for i in range(1, len(all_scenes) + 1)]
+        chapter_specs = plan_chapters(len(all_scenes), args.pages_per_chapter)
+    archiver = None
+    if args.archive:
+        archiver = ArchiveExporter(
+            output_dir,
+            novel_id,
+            args.title or novel_id,
+            chapter_specs,
+            author=args.author,
+            formats=tuple(dict.fromkeys(args.archive)),
+            per_chapter=args.archive_per_chapter,
+            compress_level=args.png_compression,
+        )
+    # PNG エンコードと書き込みはバックグラウンドで行い、次のページの合成と重ねる
+    with _stage(stages, "compose"), PageWriter(
+        threads=args.write_threads, compress_level=args.png_compression
+    ) as writer:
+        for i, scene in enumerate(all_scenes, 1):
+            panel_imgs = [store.pop((i, pi)) for pi in range(1, len(scene.panels) + 1)]
+            page = composer.compose_page(scene, panel_imgs)
+            if archiver is not None:
+                archiver.add(page)
+            if not args.no_page_files:
+                out_path = page_paths[i - 1]
+                writer.submit(page, out_path)
+                print(f"  -> 保存: {out_path}")
+            if profiler is not None:
+                profiler.page(i)
+    if not args.no_page_files:
+        print(f"  -> {writer.stats.pages} ページ・{writer.stats.bytes / 1024:.0f} KiB を書き出し")
+        if packer is not None:
+            packer.stats.bytes_written = writer.stats.bytes
+            _print_packing_stats(packer)
+    if archiver is not None:
+        for path in archiver.close():
+            print(f"  -> アーカイブ: {path}")
+    if args.shard:
+        meta_path = write_shard_meta(
+            out_dir,
+            novel_id,
+            *args.shard,
+            all_chunk_ids,
+            [
+                {"id": pid, "chunk": ci, "chunk_id": cid, "file": path.name}
+                for (ci, cid, pid), path in zip(scene_ids, page_paths)
+            ],
+        )
+        print(f"  -> シャード情報: {meta_path}")
+    if chunk_chapters is not None and not args.no_page_files:
+        from novelmanga.placeholders import annotate_chapters
+
+        chapters = [
+            {
+                "id": ch.id,
+                "title": ch.title,
+                "pages": [p.relative_to(output_dir).as_posix() for p in page_paths[ch.start : ch.end]],
+            }
+            for ch in chapter_specs
+        ]
+        with _stage(stages, "manifest"):
+            annotate_chapters(chapters, output_dir, args.placeholder)
+            # 生成した章だけを差し替える（他の章・他の作品はそのまま残す）
+            upsert_chapters(output_dir / MANIFEST_NAME, novel_id, args.title or novel_id, args.author, chapters)
+        print(f"  -> マニフェスト更新: {output_dir / MANIFEST_NAME}（{len(chapter_specs)} 章）")
+    usage.update(_usage(all_scenes, packer, analyzer, image_gen, started))
+    _write_run_report(
+        report_dir, input_path, profiler, budget, analyzer, image_gen, sheet_pages, packer, usage, caches, cpu
+    )
+    store.close()
 
     print(f"\n完了！{len(all_scenes)} ページを {output_dir}/ に保存しました。")
 
 
+def _run_batches(args, chunks, analyzer, image_gen, client, input_path: Path) -> None:
+    """解析・画像生成をバッチジョブで実行し、結果をキャッシュに取り込む。"""
+    from novelmanga.batch import BatchJobRunner, prefill_analysis, prefill_images
+
+    state_path = args.batch_state or Path(args.cache_dir) / "batches" / f"{input_path.stem}.json"
+    runner = BatchJobRunner(
+        client,
+        state_path,
+        poll_interval=args.batch_poll,
+        timeout=args.batch_timeout,
+        display_name=f"novelmanga-{input_path.stem}",
+    )
+    try:
+        print("\n[batch] シーン解析をバッチジョブで実行中...")
+        n = prefill_analysis(runner, analyzer, chunks)
+        print(f"  -> {n} チャンクの解析結果を取り込み")
+        if image_gen is not None:
+            # 解析結果はキャッシュから読む。バッチで失敗したチャンクは後の同期的な
+            # 解析で処理し、そのコマ画像も通常の API 呼び出しで生成する
+            descriptions = [
+                panel.visual_description
+                for chunk in chunks
+                for scene in analyzer.cached_scenes(chunk) or []
+                for panel in scene.panels
+            ]
+            print("\n[batch] パネル画像をバッチジョブで生成中...")
+            n = prefill_images(runner, image_gen, descriptions)
+            print(f"  -> {n} 枚の画像を取り込み")
+    except TimeoutError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except RuntimeError as e:
+        # ジョブが FAILED / CANCELLED / EXPIRED で終わった・結果ファイルがない。
+        # キャッシュにないチャンク・コマはこの後の通常の処理で同期的に呼び出す
+        print(f"Warning: {e}（残りは通常の API 呼び出しで処理します）", file=sys.stderr)
+    stats = runner.stats
+    print(
+        f"  -> バッチ {stats.submitted} 件投入・{stats.resumed} 件再開、"
+        f"成功 {stats.succeeded} 件・失敗 {stats.failed} 件（失敗分は通常の API 呼び出しで処理）"
+    )
+
+
+def _load_chunks(args, input_path: Path):
+    """入力をパースしてチャンクに分け、--chapters / --pages / --shard で処理範囲を絞る。
+
+    (チャンク, チャンクごとの章 or None, 全体のチャンク ID or None, 担当区間 or None) を返す。
+    後ろの 2 つは --shard のときだけ設定される。
+    """
+    from novelmanga.parser import AozoraBunkoParser
+    from novelmanga.shard import shard_range
+
+    aozora_parser = AozoraBunkoParser()
+    # --chapters: 見出しの索引から選んだ章のバイト範囲だけを読み、章をまたがないようにチャンク分割する
+    chunk_chapters = None
+    if args.chapters:
+        index = aozora_parser.load_index(input_path)
+        try:
+            selected = index.select(args.chapters)
+        except ValueError as e:
+            print(f"Error: --chapters: {e}", file=sys.stderr)
+            sys.exit(1)
+        chunks, chunk_chapters = [], []
+        for chapter in selected:
+            text = aozora_parser.read_chapter(input_path, chapter, index.encoding)
+            chapter_chunks = _split_chunks(aozora_parser, text, args)
+            chunks.extend(chapter_chunks)
+            chunk_chapters.extend([chapter] * len(chapter_chunks))
+            print(f"  -> {chapter.id}: {chapter.title}（{len(chapter_chunks)} チャンク）")
+    else:
+        text = aozora_parser.parse_file(input_path)
+        chunks = _split_chunks(aozora_parser, text, args)
+
+    if args.pages:
+        chunks = chunks[: args.pages]
+        if chunk_chapters is not None:
+            chunk_chapters = chunk_chapters[: args.pages]
+    all_chunk_ids = chunk_indexes = None
+    if args.shard:
+        # 全体のチャンク列を連続した区間に分け、担当区間だけを処理する（ページ ID は全体の位置で決まる）
+        all_chunk_ids = [c.chunk_id for c in chunks]
+        chunk_indexes = shard_range(len(chunks), *args.shard)
+        chunks = chunks[chunk_indexes.start : chunk_indexes.stop]
+        print(
+            f"  -> シャード {args.shard[0]}/{args.shard[1]}: "
+            f"チャンク {chunk_indexes.start + 1}-{chunk_indexes.stop}（全 {len(all_chunk_ids)}）"
+        )
+    print(f"  -> {len(chunks)} チャンク")
+    return chunks, chunk_chapters, all_chunk_ids, chunk_indexes
+
+
+def _run_plan(args, input_path: Path, output_dir: Path, novel_context) -> None:
+    """--plan: API を呼ばずに実行を見積もり、{output}/run_plan.json に書き出す。"""
+    from novelmanga.manifest import write_manifest
+    from novelmanga.planner import PLAN_NAME, Prices, format_plan, load_rates, plan_run
+
+    print(f"入力: {input_path}")
+    print("\n[plan] パースとチャンク分割のみを行い、実行を見積もります...")
+    chunks, _, _, _ = _load_chunks(args, input_path)
+    rates = load_rates(args.plan_history or [output_dir], args.script_format)
+    plan = plan_run(
+        chunks,
+        rates,
+        cache_dir=args.cache_dir,
+        script_format=args.script_format,
+        structured=args.structured_output,
+        context=novel_context,
+        images=not args.no_images,
+        workers=args.workers if args.publish else 1,
+        rpm=args.plan_rpm,
+        prices=args.plan_prices or Prices(),
+    )
+    print(format_plan(plan))
+    path = output_dir / PLAN_NAME
+    write_manifest(path, {"input": str(input_path), **plan.to_dict()})
+    print(f"  -> 実行計画: {path}")
+
+
+def _split_chunks(aozora_parser, text: str, args):
+    if args.content_defined_chunks:
+        return aozora_parser.chunk_content_defined(text, chunk_size=args.chunk_size)
+    return aozora_parser.split_chunks(text, chunk_size=args.chunk_size)
+
+
+def _source_chapter_layout(scene_chapters, novel_dir: Path):
+    """シーンごとの原文の章から、ページの出力パスと章の範囲（ChapterSpec）を決める。
+
+    ページは {novel_dir}/chapter_NN/page_MMM.png に章ごとの通し番号で置き、
+    章 ID とタイトルは原文の見出しに合わせる。
+    """
+    from novelmanga.manifest import ChapterSpec
+
+    paths: list[Path] = []
+    specs: list[ChapterSpec] = []
+    for i, chapter in enumerate(scene_chapters):
+        if not specs or specs[-1].id != chapter.id:
+            specs.append(ChapterSpec(chapter.id, chapter.title, i, i))
+        spec = specs[-1]
+        specs[-1] = ChapterSpec(spec.id, spec.title, spec.start, i + 1)
+        paths.append(novel_dir / chapter.id / f"page_{len(specs[-1]):03d}.png")
+    return paths, specs
+
+
+@contextlib.contextmanager
+def _stage(profilers, name: str):
+    """profilers（MemoryProfiler・CpuProfiler のリスト）のそれぞれで段階として計測する。"""
+    with contextlib.ExitStack() as stack:
+        for profiler in profilers:
+            stack.enter_context(profiler.stage(name))
+        yield
+
+
+def _usage(scenes, packer, analyzer, image_gen, started: float) -> dict:
+    """実行レポートの "usage"（--plan が過去の実行から比率を求めるのに使う）。"""
+    ast = analyzer.stats
+    usage = {
+        # まとめる前のシーン数（コマ数はまとめても変わらない）
+        "scenes": packer.stats.scenes if packer is not None else len(scenes),
+        "panels": sum(len(s.panels) for s in scenes),
+        "analysis": {
+            "calls": ast.calls,
+            "batch_results": ast.batch_results,
+            "cache_hits": ast.cache_hits,
+            "prompt_tokens": ast.prompt_tokens,
+            "output_tokens": ast.output_tokens,
+            "api_seconds": round(ast.api_seconds, 3),
+        },
+        "wall_seconds": round(time.perf_counter() - started, 3),
+    }
+    if image_gen is not None:
+        st = image_gen.stats
+        usage["images"] = {
+            "calls": st.api_calls,
+            "batch_results": st.batch_results,
+            "cache_hits": st.calls_saved,
+            "api_seconds": round(st.api_seconds, 3),
+        }
+    return usage
+
+
+def _write_run_report(
+    output_dir: Path,
+    input_path: Path,
+    profiler,
+    budget,
+    analyzer,
+    image_gen=None,
+    sheet_pages=None,
+    packer=None,
+    usage=None,
+    caches=None,
+    cpu=None,
+) -> None:
+    # 共有キャッシュへの書き込みを終えてから階層ごとのヒット率を集計する
+    tiered = _finish_caches(caches)
+    context_cache = analyzer.context_cache
+    sheets = image_gen is not None and image_gen.sheet_min_panels > 0
+    from dataclasses import asdict
+
+    from novelmanga.report import RunReport
+
+    report = RunReport(output_dir, input=str(input_path))
+    if usage:
+        report.section("usage", usage)
+    if profiler is not None or budget is not None:
+        memory = profiler.to_dict() if profiler is not None else {}
+        if budget is not None:
+            memory["budget"] = {
+                "max_bytes": budget.max_bytes,
+                "panel_bytes_peak": budget.store.peak_bytes,
+                **asdict(budget.stats),
+            }
+        report.section("memory", memory)
+    if context_cache is not None:
+        report.section(
+            "analysis",
+            {
+                **asdict(analyzer.stats),
+                "cached_tokens_per_call": analyzer.stats.cached_tokens_per_call,
+                "context_cache": {
+                    "available": context_cache.available,
+                    "creates": context_cache.creates,
+                    "ttl": context_cache.ttl,
+                    "error": context_cache.error,
+                },
+            },
+        )
+    if sheets:
+        report.section(
+            "images",
+            {
+                **asdict(image_gen.stats),
+                "sheet_calls_saved": image_gen.stats.sheet_calls_saved,
+                "sheet_pages": sorted(sheet_pages or [], key=lambda e: e["page"]),
+            },
+        )
+    if packer is not None:
+        report.section("packing", {"max_panels": packer.max_panels, **packer.stats.to_dict()})
+    if tiered:
+        report.section("cache", tiered)
+    if cpu is not None:
+        from novelmanga.profiling import format_cpu_summary
+
+        summary = cpu.write()
+        report.section("cpu", summary)
+        head, *rest = format_cpu_summary(summary).splitlines()
+        print(f"  -> {head}")
+        for line in rest:
+            print(f"   {line}")
+    path = report.write()
+    if profiler is not None:
+        profiler.stop()
+        print(f"  -> ピークメモリ {profiler.peak_rss / 2**20:.0f} MiB（RSS）")
+    if budget is not None and budget.stats.spilled:
+        print(f"  -> パネル画像 {budget.stats.spilled} 枚をディスクに退避")
+    print(f"  -> 実行レポート: {path}")
+
+
+def _open_cache(args, namespace: str):
+    from novelmanga.cache import open_cache
+
+    return open_cache(args.cache_dir, namespace, shared=args.cache_shared, memory_bytes=args.cache_memory)
+
+
+def _finish_caches(caches) -> dict:
+    """階層キャッシュの書き込みを待ち、階層ごとのヒット率を表示して統計を返す。"""
+    from novelmanga.cache import TieredCache
+
+    out = {}
+    for name, cache in (caches or {}).items():
+        if not isinstance(cache, TieredCache):
+            continue
+        cache.close()
+        out[name] = cache.to_dict()
+        rates = "・".join(
+            f"{tier} {st['hit_rate']:.0%}（{st['hits']}/{st['hits'] + st['misses']}）" for tier, st in out[name].items()
+        )
+        print(f"  -> キャッシュ {name}: {rates}")
+        errors = {tier: st["errors"] + st["corrupt"] for tier, st in out[name].items() if st["errors"] or st["corrupt"]}
+        if errors:
+            print("     エラー・破損: " + "・".join(f"{tier} {n} 件" for tier, n in errors.items()))
+    return out
+
+
+def _print_analysis_stats(analyzer) -> None:
+    ast = analyzer.stats
+    print(
+        f"  -> パース失敗率 {ast.parse_failure_rate:.1%}"
+        f"（{ast.calls} 回中 {ast.parse_failures} 回・修復 {ast.repaired} 件・再試行 {ast.retries} 回"
+        f"・キャッシュ {ast.cache_hits} 件）"
+    )
+    if ast.batch_results:
+        print(f"  -> バッチ結果 {ast.batch_results} 件を取り込み（使えなかったもの {ast.batch_failures} 件）")
+    if analyzer.context_cache is not None:
+        if ast.context_cache_calls:
+            print(
+                f"  -> コンテキストキャッシュ {ast.context_cache_calls} 回使用"
+                f"（入力 {ast.prompt_tokens} トークン中 {ast.cached_tokens} トークンをキャッシュから、"
+                f"1 回あたり {ast.cached_tokens_per_call:.0f} トークン節約）"
+            )
+        elif not analyzer.context_cache.available:
+            print("  -> コンテキストキャッシュは使えなかったため、システムプロンプトを毎回送信")
+
+
+def _print_generation_stats(image_gen) -> None:
+    st = image_gen.stats
+    print(
+        f"  -> API 呼び出し {st.api_calls} 回"
+        f"（キャッシュ {st.cache_hits} 件・類似プロンプト再利用 {st.similar_hits} 件で"
+        f" {st.calls_saved} 回節約）"
+    )
+    if st.batch_results:
+        print(f"  -> バッチ結果 {st.batch_results} 件を取り込み（使えなかったもの {st.batch_failures} 件）")
+    if st.sheets or st.sheet_fallbacks:
+        print(
+            f"  -> シート {st.sheets} 枚から {st.sheet_panels} コマを切り出し"
+            f"（切り出し失敗 {st.sheet_fallbacks} 件・{st.sheet_calls_saved} 回節約）"
+        )
+
+
+def _print_packing_stats(packer) -> None:
+    st = packer.stats
+    saved = st.bytes_saved_estimate
+    note = f"・約 {saved / 1024:.0f} KiB 削減" if saved is not None else ""
+    print(
+        f"  -> ページ割り: {st.scenes} シーン → {st.pages} ページ"
+        f"（{st.pages_saved} ページ削減{note}・複数シーンのページ {st.merged_pages}）"
+    )
+
+
+def _run_progressive(
+    args, chunks, analyzer, image_gen, output_dir: Path, input_path: Path, profiler=None, budget=None, packer=None
+) -> tuple[list, list[dict]]:
+    """読む順のパイプラインでページを生成し、マニフェストを逐次公開する。
+
+    読む順のシーンリストと、シートで生成したページの呼び出し数（実行レポート用）を返す。
+    """
+    from novelmanga.composer import PageComposer
+    from novelmanga.pipeline import ManifestPublisher, ReaderOrderPipeline
+    from novelmanga.writer import PageWriter
+
+    novel_id = args.novel_id or input_path.stem
+    publisher = ManifestPublisher(
+        output_dir,
+        novel_id,
+        args.title or novel_id,
+        author=args.author,
+        pages_per_chapter=args.pages_per_chapter,
+        placeholder=args.placeholder,
+    )
+    print(f"\n[2-4/4] 解析・画像生成・合成を読む順に実行中（{args.workers} スレッド）...")
+    print(f"  -> 公開先: {publisher.path}")
+    if image_gen is None:
+        print("  -> 画像生成はスキップ（--no-images または GOOGLE_API_KEY 未設定）")
+
+    def report(page_number: int, _page) -> None:
+        print(f"  -> ページ {page_number} を合成")
+        if profiler is not None:
+            profiler.page(page_number)
+
+    # PageWriter を閉じて最後のページが書き出されてから完了として公開する
+    with PageWriter(threads=args.write_threads, compress_level=args.png_compression) as writer:
+        pipeline = ReaderOrderPipeline(
+            analyzer,
+            PageComposer(tone=args.tone),
+            writer,
+            output_dir / novel_id,
+            generator=image_gen,
+            workers=args.workers,
+            publisher=publisher,
+            on_page=report,
+            budget=budget,
+            pack=packer,
+        )
+        scenes = pipeline.run(chunks)
+    publisher.finish()
+
+    _print_analysis_stats(analyzer)
+    if packer is not None:
+        packer.stats.bytes_written = writer.stats.bytes
+        _print_packing_stats(packer)
+    if image_gen is not None:
+        _print_generation_stats(image_gen)
+    print(
+        f"\n完了！{len(scenes)} ページを {output_dir / novel_id}/ に保存し、"
+        f"{publisher.path} を {publisher.publish_count} 回更新しました。"
+    )
+    return scenes, pipeline.sheet_pages
+
+
 if __name__ == "__main__":
     main()
@@ -2,115 +2,375 @@
 
 from __future__ import annotations
 
-import json
-import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
 
 from google import genai
-from google.genai import types
-
-from .models import Panel, PanelType, Scene
-
-_SYSTEM_PROMPT = """あなたは小説を漫画の脚本に変換する専門家です。
-与えられた小説テキストを漫画ページに変換するための脚本を生成してください。
-
-以下の JSON 形式のみで出力してください（前後に余計なテキストを入れないこと）：
-
-{
-  "scenes": [
-    {
-      "scene_number": 1,
-      "page_layout": "standard",
-      "panels": [
-        {
-          "panel_number": 1,
-          "panel_type": "establishing",
-          "visual_description": "Detailed English description for image generation AI",
-          "dialogue": ["セリフ1", "セリフ2"],
-          "narration": "ナレーションテキスト（なければ null）"
-        }
-      ]
-    }
-  ]
-}
+from google.genai import errors, types
+
+from .cache import DiskCache
+from .models import Chunk, Panel, PanelType, Scene
+from .prompts import MODEL, USER_PROMPT, analysis_cache_key, system_instruction
+from .schema import (
+    COMPACT_RESPONSE_SCHEMA,
+    RESPONSE_SCHEMA,
+    expand_compact,
+    repair_json,
+    salvage,
+)
+from .script_io import decode_scenes, encode_scenes
+
+
+@dataclass
+class AnalysisStats:
+    """シーン解析の呼び出し統計。"""
+
+    calls: int = 0
+    parse_failures: int = 0
+    repaired: int = 0
+    retries: int = 0
+    failed_chunks: int = 0
+    cache_hits: int = 0
+    # 入力・出力トークン（usage_metadata）とコンテキストキャッシュ
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    context_cache_calls: int = 0
+    context_cache_fallbacks: int = 0
+    # API 呼び出しにかかった時間の合計（秒、実行計画の見積もりに使う）
+    api_seconds: float = 0.0
+    # 取り込んだバッチジョブの結果（calls には数えない）と、そのうち使えなかったもの
+    batch_results: int = 0
+    batch_failures: int = 0
+
+    @property
+    def parse_failure_rate(self) -> float:
+        return self.parse_failures / self.calls if self.calls else 0.0
+
+    @property
+    def cached_tokens_per_call(self) -> float:
+        """コンテキストキャッシュを使った呼び出し 1 回あたりの、キャッシュから読んだ入力トークン数。"""
+        return self.cached_tokens / self.context_cache_calls if self.context_cache_calls else 0.0
+
+
+class ContextCache:
+    """システムプロンプト（と作品の設定）をサーバー側の cachedContent として保持する。
+
+    name() は有効なキャッシュの名前を返し、なければ作成する。TTL の残りが
+    refresh_margin 秒（省略時: TTL の 1 割、最大 60 秒）を切ったら作り直す。作成に失敗した場合（最小トークン数に
+    満たない・API が対応していないなど）は以後 None を返し、呼び出し側は
+    通常どおりシステムプロンプトを毎回送る。
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        system_instruction: str,
+        ttl: float = 3600.0,
+        refresh_margin: Optional[float] = None,
+    ) -> None:
+        self.client = client
+        self.model = model
+        self.system_instruction = system_instruction
+        self.ttl = ttl
+        # 期限切れ直前の呼び出しがサーバー側で失効しないよう、早めに作り直す
+        self.refresh_margin = refresh_margin if refresh_margin is not None else min(60.0, ttl * 0.1)
+        self.available = True
+        self.creates = 0
+        self.error: Optional[str] = None
+        self._name: Optional[str] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
 
-ガイドライン：
-- 各シーンは 1〜6 コマで構成（通常は 2〜4 コマ）
-- visual_description は画像生成 AI 向けの英語プロンプト（詳細に）
-- panel_type: "action" / "dialogue" / "narration" / "establishing"
-- page_layout: "standard" / "action" / "emotional"
-- 日本漫画スタイルを意識すること
-- テキストの分量に応じて適切な数のシーンを生成すること"""
+    def name(self) -> Optional[str]:
+        with self._lock:
+            if not self.available:
+                return None
+            if self._name is None or time.monotonic() >= self._expires - self.refresh_margin:
+                self._create()
+            return self._name
+
+    def invalidate(self) -> None:
+        """サーバー側でキャッシュが消えていた場合に、次回作り直す。"""
+        with self._lock:
+            self._name = None
+
+    def _create(self) -> None:
+        try:
+            cached = self.client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=self.system_instruction,
+                    ttl=f"{int(self.ttl)}s",
+                    display_name="novelmanga-analyzer",
+                ),
+            )
+        except Exception as e:
+            print(f"Warning: Context caching unavailable, sending the system prompt per call: {e}")
+            self.available = False
+            self.error = str(e)
+            self._name = None
+            return
+        self.creates += 1
+        self._name = cached.name
+        # サーバーの expire_time を優先し、なければ要求した TTL から見積もる
+        ttl = self.ttl
+        expire = getattr(cached, "expire_time", None)
+        if isinstance(expire, datetime):
+            ttl = min(ttl, (expire - datetime.now(timezone.utc)).total_seconds())
+        self._expires = time.monotonic() + ttl
 
 
 class SceneAnalyzer:
-    """Gemini API を用いてテキストチャンクをシーン脚本に変換する。"""
+    """Gemini API を用いてテキストチャンクをシーン脚本に変換する。
+
+    structured=True では API の JSON 出力モード（response_schema）を使う。
+    どちらのモードでも、壊れたレスポンスはまずローカルで修復を試み、
+    使えなかった場合だけ max_retries 回まで再リクエストする。
 
-    def __init__(self, api_key: str | None = None) -> None:
-        self.client = genai.Client(api_key=api_key)
+    cache_dir を指定すると、チャンク本文ごとに解析結果を保存する。cache には
+    DiskCache の代わりに cache.open_cache() の TieredCache などを渡せる。
+    編集されたテキストを再解析しても、変更のないチャンクは API を呼ばない。
+    batch_request() / ingest() はバッチジョブ（batch.py）でキャッシュを
+    先に埋めるために使う。
+
+    script_format="compact" では、短いキーの形式で出力させて出力トークンを減らし、
+    通常の形式に展開してから同じ Scene / Panel に変換する。
+
+    context_cache=True では、システムプロンプトをサーバー側のキャッシュ
+    （ContextCache）に置いて各呼び出しから参照し、毎回送る入力トークンを減らす。
+    context に登場人物一覧などの作品全体の設定を渡すと、システムプロンプトに
+    加えてすべてのチャンクの解析で参照させる。
+    """
+
+    model = MODEL
+    script_format = "verbose"
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        client: Any = None,
+        structured: bool = False,
+        max_retries: int = 1,
+        cache_dir: str | Path | None = None,
+        context_cache: bool = False,
+        context_cache_ttl: float = 3600.0,
+        context: Optional[str] = None,
+        script_format: str = "verbose",
+        cache: Any = None,
+    ) -> None:
+        # client を渡すと transport.create_client で生成した記録・再生用
+        # クライアントなどに差し替えられる
+        self.client = client if client is not None else genai.Client(api_key=api_key)
+        self.structured = structured
+        self.max_retries = max_retries
+        self._cache = cache if cache is not None else (DiskCache(cache_dir) if cache_dir else None)
+        self.system_instruction = system_instruction(script_format, context)
+        self.script_format = script_format
+        self.context_cache = (
+            ContextCache(self.client, MODEL, self.system_instruction, ttl=context_cache_ttl)
+            if context_cache
+            else None
+        )
+        self.stats = AnalysisStats()
+        self._lock = threading.Lock()
+
+    def _count(self, field: str, n: int = 1) -> None:
+        # 複数スレッドから analyze() を呼んでも統計が欠けないようにする
+        with self._lock:
+            setattr(self.stats, field, getattr(self.stats, field) + n)
+
+    def analyze(self, chunk: Chunk) -> list[Scene]:
+        """Chunk を解析し、各シーンに chunk_id と元テキストの位置を記録する。"""
+        scenes = self.cached_scenes(chunk)
+        if scenes is not None:
+            self._count("cache_hits")
+            return scenes
+        scenes = self.analyze_chunk(chunk.text)
+        # 失敗（空）の結果は次回再試行できるよう保存しない
+        if self._cache is not None and scenes:
+            self._cache.put(self.cache_key(chunk), encode_scenes(scenes))
+        return self._locate(scenes, chunk)
+
+    def cached_scenes(self, chunk: Chunk) -> Optional[list[Scene]]:
+        """キャッシュ済みの解析結果だけを返す（API は呼ばず、統計も数えない）。なければ None。"""
+        cached = self._cache.get(self.cache_key(chunk)) if self._cache else None
+        return self._locate(decode_scenes(cached), chunk) if cached is not None else None
+
+    @staticmethod
+    def _locate(scenes: list[Scene], chunk: Chunk) -> list[Scene]:
+        # 同じ本文でも編集で位置がずれるため、キャッシュ由来でも毎回付け直す
+        for scene in scenes:
+            scene.chunk_id = chunk.chunk_id
+            scene.source_span = (chunk.start, chunk.end)
+        return scenes
+
+    @property
+    def compact(self) -> bool:
+        return self.script_format == "compact"
+
+    def cache_key(self, chunk: Chunk) -> str:
+        return analysis_cache_key(self.structured, self.system_instruction, chunk.text)
+
+    def is_cached(self, chunk: Chunk) -> bool:
+        return self._cache is not None and self.cache_key(chunk) in self._cache
+
+    def batch_request(self, chunk: Chunk) -> dict:
+        """analyze_chunk と同じリクエストを、バッチ入力ファイル用の REST 形式で返す。"""
+        generation_config: dict[str, Any] = {"maxOutputTokens": 8192}
+        if self.structured:
+            generation_config["responseMimeType"] = "application/json"
+            generation_config["responseSchema"] = COMPACT_RESPONSE_SCHEMA if self.compact else RESPONSE_SCHEMA
+        return {
+            "systemInstruction": {"parts": [{"text": self.system_instruction}]},
+            "contents": [{"role": "user", "parts": [{"text": USER_PROMPT + chunk.text}]}],
+            "generationConfig": generation_config,
+        }
+
+    def ingest(self, chunk: Chunk, response_text: str) -> bool:
+        """バッチジョブのレスポンスを解析結果としてキャッシュに保存する。
+
+        使えないレスポンスは保存せず False を返す（analyze() 時に通常どおり再リクエストされる）。
+        """
+        self._count("batch_results")
+        scenes, repaired = self._decode(response_text)
+        if not scenes:
+            self._count("batch_failures")
+            return False
+        if repaired:
+            self._count("repaired")
+        if self._cache is not None:
+            self._cache.put(self.cache_key(chunk), encode_scenes(scenes))
+        return True
 
     def analyze_chunk(self, text_chunk: str) -> list[Scene]:
         """テキストチャンクを解析し、シーンリストを返す。"""
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash",
-            config=types.GenerateContentConfig(
-                system_instruction=_SYSTEM_PROMPT,
-                max_output_tokens=8192,
-            ),
-            contents="以下の小説テキストを漫画の脚本に変換してください：\n\n"
-            + text_chunk,
-        )
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+            response = self._generate(text_chunk)
+            self._count("calls")
+            scenes, repaired = self._decode(response.text or "")
+            if scenes is not None:
+                if repaired:
+                    self._count("repaired")
+                return scenes
+            self._count("parse_failures")
+
+        self._count("failed_chunks")
+        return []
+
+    def _generate(self, text_chunk: str) -> Any:
+        cached = self.context_cache.name() if self.context_cache is not None else None
+        if cached is not None:
+            try:
+                response = self._request(text_chunk, cached)
+            except errors.ClientError as e:
+                # TTL より先にサーバー側で消えた・参照できないキャッシュは作り直し、この呼び出しは通常どおり送る。
+                # レート制限（429）などはキャッシュの問題ではないので、作り直さずに呼び出し元の再試行に任せる
+                if e.code not in (403, 404):
+                    raise
+                print(f"Warning: Cached content {cached} rejected ({e.code}), resending the system prompt")
+                self.context_cache.invalidate()
+                self._count("context_cache_fallbacks")
+            else:
+                self._count("context_cache_calls")
+                self._record_usage(response)
+                return response
+        response = self._request(text_chunk, None)
+        self._record_usage(response)
+        return response
 
-        return self._parse_response(response.text)
+    def _request(self, text_chunk: str, cached_content: Optional[str]) -> Any:
+        config = types.GenerateContentConfig(max_output_tokens=8192)
+        if cached_content is not None:
+            config.cached_content = cached_content
+        else:
+            config.system_instruction = self.system_instruction
+        if self.structured:
+            config.response_mime_type = "application/json"
+            config.response_schema = COMPACT_RESPONSE_SCHEMA if self.compact else RESPONSE_SCHEMA
+        t0 = time.perf_counter()
+        try:
+            return self.client.models.generate_content(
+                model=MODEL,
+                config=config,
+                contents=USER_PROMPT + text_chunk,
+            )
+        finally:
+            self._count("api_seconds", time.perf_counter() - t0)
+
+    def _record_usage(self, response: Any) -> None:
+        meta = getattr(response, "usage_metadata", None)
+        prompt = getattr(meta, "prompt_token_count", None)
+        output = getattr(meta, "candidates_token_count", None)
+        cached = getattr(meta, "cached_content_token_count", None)
+        if isinstance(prompt, int):
+            self._count("prompt_tokens", prompt)
+        if isinstance(output, int):
+            self._count("output_tokens", output)
+        if isinstance(cached, int):
+            self._count("cached_tokens", cached)
 
     def _parse_response(self, response_text: str) -> list[Scene]:
         """レスポンステキストから JSON を抽出してシーンリストに変換する。"""
-        # コードブロックを除去
-        cleaned = re.sub(r"```(?:json)?\s*", "", response_text).strip()
+        scenes, _ = self._decode(response_text)
+        return scenes or []
 
-        # JSON オブジェクトを抽出
-        start = cleaned.find("{")
-        end = cleaned.rfind("}") + 1
-        if start == -1 or end <= start:
-            print(f"Warning: No JSON found in response")
-            return []
+    def _decode(self, response_text: str) -> tuple[Optional[list[Scene]], bool]:
+        """レスポンスを修復・検証してシーンリストに変換する。
 
-        try:
-            data = json.loads(cleaned[start:end])
-        except json.JSONDecodeError as e:
-            print(f"Warning: JSON parse error: {e}")
-            return []
+        戻り値は (シーンリスト, 修復したかどうか)。使えなければシーンリストは None。
+        """
+        data, repaired = repair_json(response_text)
+        if data is None:
+            print("Warning: No valid JSON found in response")
+            return None, False
+
+        # コンパクト形式を指定しても通常の形式で返ることがあるので、形で判定して展開する
+        data = expand_compact(data)
+        data, dropped = salvage(data)
+        if data is None:
+            print("Warning: Response does not match the script schema")
+            return None, False
 
-        return self._build_scenes(data)
+        return self._build_scenes(data), repaired or dropped
 
     def _build_scenes(self, data: dict) -> list[Scene]:
         """辞書データから Scene オブジェクトのリストを構築する。"""
         scenes: list[Scene] = []
         for scene_data in data.get("scenes", []):
             panels = [
-                self._build_panel(p) for p in scene_data.get("panels", [])
+                self._build_panel(p, i) for i, p in enumerate(scene_data.get("panels", []), 1)
             ]
             scenes.append(
                 Scene(
-                    scene_number=scene_data.get("scene_number", len(scenes) + 1),
+                    scene_number=scene_data.get("scene_number") or len(scenes) + 1,
                     source_text="",
                     panels=panels,
-                    page_layout=scene_data.get("page_layout", "standard"),
+                    page_layout=scene_data.get("page_layout") or "standard",
+                    page_break=scene_data.get("page_break") is True,
                 )
             )
         return scenes
 
-    def _build_panel(self, data: dict) -> Panel:
-        """辞書データから Panel オブジェクトを構築する。"""
-        type_str = data.get("panel_type", "action")
+    def _build_panel(self, data: dict, position: int = 1) -> Panel:
+        """辞書データから Panel オブジェクトを構築する。番号がなければ position（1 始まり）。"""
+        type_str = data.get("panel_type") or "action"
         try:
             panel_type = PanelType(type_str)
         except ValueError:
             panel_type = PanelType.ACTION
 
         return Panel(
-            panel_number=data.get("panel_number", 1),
+            panel_number=data.get("panel_number") or position,
             panel_type=panel_type,
-            visual_description=data.get("visual_description", ""),
+            visual_description=data.get("visual_description") or "",
             dialogue=data.get("dialogue") or [],
             narration=data.get("narration") or None,
         )
@@ -0,0 +1,354 @@
+"""合成済みページの CBZ / EPUB アーカイブ出力。
+
+ページは合成された順にアーカイブへ直接書き込み、ページ画像を個別ファイルとして
+経由しない。PNG は圧縮済みなので ZIP エントリは無圧縮（ZIP_STORED）で格納する。
+目次はマニフェストと同じ章分割（manifest.plan_chapters）から作る。
+
+- CBZ: ページ画像 + ComicInfo.xml（章の先頭ページに Bookmark）
+- EPUB: EPUB 3 固定レイアウト（1 ページ 1 XHTML、nav.xhtml に章の目次）
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import zipfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image
+
+from .manifest import ChapterSpec
+from .writer import DEFAULT_COMPRESS_LEVEL
+
+ARCHIVE_FORMATS = ("cbz", "epub")
+
+# ZIP のタイムスタンプを固定し、同じ入力から同じアーカイブを作る
+_ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def encode_png(page: Image.Image, compress_level: int = DEFAULT_COMPRESS_LEVEL) -> bytes:
+    """ページ画像を PNG にエンコードする。"""
+    buf = io.BytesIO()
+    page.save(buf, "PNG", compress_level=compress_level)
+    return buf.getvalue()
+
+
+@dataclass
+class _PageEntry:
+    name: str
+    width: int
+    height: int
+    bookmark: Optional[str] = None
+
+
+class _ZipArchive(ABC):
+    """一時ファイルに書き込み、close() で目的のパスへ rename する ZIP。
+
+    形式ごとのサブクラスはエントリ名・ページの書き込み・目次などの仕上げを実装する。
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_name(f".tmp-{self.path.name}")
+        self._zip = zipfile.ZipFile(self._tmp, "w")
+        self._pages: list[_PageEntry] = []
+        self._bookmark: Optional[str] = None
+        self._closed = False
+
+    def _write(self, name: str, data: bytes | str, compress: bool = False) -> None:
+        info = zipfile.ZipInfo(name, date_time=_ZIP_DATE)
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self._zip.writestr(info, data)
+
+    def start_chapter(self, title: str) -> None:
+        """次に追加するページを章の先頭として目次に載せる。"""
+        self._bookmark = title
+
+    def add_png(self, data: bytes, width: int, height: int) -> None:
+        """エンコード済みの PNG をページとして追加する。"""
+        index = len(self._pages)
+        entry = _PageEntry(self._page_name(index), width, height, self._bookmark)
+        self._bookmark = None
+        self._pages.append(entry)
+        self._write_page(index, entry, data)
+
+    def close(self) -> Path:
+        if not self._closed:
+            self._closed = True
+            try:
+                self._finish()
+                self._zip.close()
+                os.replace(self._tmp, self.path)
+            except BaseException:
+                self._zip.close()
+                self._tmp.unlink(missing_ok=True)
+                raise
+        return self.path
+
+    def abort(self) -> None:
+        """書き込みを中止し、一時ファイルを削除する。"""
+        if not self._closed:
+            self._closed = True
+            self._zip.close()
+            self._tmp.unlink(missing_ok=True)
+
+    @abstractmethod
+    def _page_name(self, index: int) -> str:
+        """index 番目（0 始まり）のページのエントリ名。"""
+
+    @abstractmethod
+    def _write_page(self, index: int, entry: _PageEntry, data: bytes) -> None:
+        """ページ画像（と形式に必要なページごとのエントリ）を書き込む。"""
+
+    @abstractmethod
+    def _finish(self) -> None:
+        """close() で ZIP を閉じる前に、目次などの残りのエントリを書き込む。"""
+
+
+class CbzWriter(_ZipArchive):
+    """ComicInfo.xml 付きの CBZ を書き出す。"""
+
+    def __init__(self, path: str | Path, title: str, author: str = "") -> None:
+        super().__init__(path)
+        self.title = title
+        self.author = author
+
+    def _page_name(self, index: int) -> str:
+        return f"page_{index + 1:04d}.png"
+
+    def _write_page(self, index: int, entry: _PageEntry, data: bytes) -> None:
+        self._write(entry.name, data)
+
+    def _finish(self) -> None:
+        pages = []
+        for i, p in enumerate(self._pages):
+            attrs = f'Image="{i}" ImageWidth="{p.width}" ImageHeight="{p.height}"'
+            if i == 0:
+                attrs += ' Type="FrontCover"'
+            if p.bookmark:
+                attrs += f" Bookmark={quoteattr(p.bookmark)}"
+            pages.append(f"    <Page {attrs} />")
+        xml = "\n".join(
+            [
+                '<?xml version="1.0" encoding="utf-8"?>',
+                '<ComicInfo xmlns:xsd="http://www.w3.org/2001/XMLSchema"'
+                ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">',
+                f"  <Title>{escape(self.title)}</Title>",
+                f"  <Writer>{escape(self.author)}</Writer>",
+                f"  <PageCount>{len(self._pages)}</PageCount>",
+                "  <LanguageISO>ja</LanguageISO>",
+                "  <Manga>YesAndRightToLeft</Manga>",
+                "  <Pages>",
+                *pages,
+                "  </Pages>",
+                "</ComicInfo>",
+                "",
+            ]
+        )
+        self._write("ComicInfo.xml", xml, compress=True)
+
+
+_CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+
+class EpubWriter(_ZipArchive):
+    """EPUB 3 固定レイアウト（右開き）の電子書籍を書き出す。"""
+
+    def __init__(self, path: str | Path, title: str, author: str = "", identifier: str = "") -> None:
+        super().__init__(path)
+        self.title = title
+        self.author = author
+        self.identifier = identifier or f"urn:novelmanga:{self.path.stem}"
+        # mimetype は先頭・無圧縮でなければならない
+        self._write("mimetype", "application/epub+zip")
+        self._write("META-INF/container.xml", _CONTAINER_XML, compress=True)
+
+    def _page_name(self, index: int) -> str:
+        return f"images/page_{index + 1:04d}.png"
+
+    def _write_page(self, index: int, entry: _PageEntry, data: bytes) -> None:
+        self._write(f"OEBPS/{entry.name}", data)
+        xhtml = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE html>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="ja">\n'
+            "<head>\n"
+            f"  <title>{escape(self.title)} {index + 1}</title>\n"
+            f'  <meta name="viewport" content="width={entry.width}, height={entry.height}"/>\n'
+            '  <style>html,body{margin:0;padding:0}img{display:block;width:100%;height:100%}</style>\n'
+            "</head>\n"
+            "<body>\n"
+            f'  <img src="{entry.name}" alt=""/>\n'
+            "</body>\n"
+            "</html>\n"
+        )
+        self._write(f"OEBPS/{_xhtml_name(index)}", xhtml, compress=True)
+
+    def _finish(self) -> None:
+        pages = self._pages
+        toc = [
+            f'      <li><a href="{_xhtml_name(i)}">{escape(p.bookmark)}</a></li>'
+            for i, p in enumerate(pages)
+            if p.bookmark
+        ]
+        if not toc and pages:
+            toc = [f'      <li><a href="{_xhtml_name(0)}">{escape(self.title)}</a></li>']
+        nav = "\n".join(
+            [
+                '<?xml version="1.0" encoding="UTF-8"?>',
+                "<!DOCTYPE html>",
+                '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="ja">',
+                f"<head><title>{escape(self.title)}</title></head>",
+                "<body>",
+                '  <nav epub:type="toc" id="toc">',
+                "    <ol>",
+                *toc,
+                "    </ol>",
+                "  </nav>",
+                "</body>",
+                "</html>",
+                "",
+            ]
+        )
+        self._write("OEBPS/nav.xhtml", nav, compress=True)
+
+        modified = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        items = ['    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>']
+        spine = []
+        for i, p in enumerate(pages):
+            cover = ' properties="cover-image"' if i == 0 else ""
+            items.append(f'    <item id="img{i + 1}" href="{p.name}" media-type="image/png"{cover}/>')
+            items.append(
+                f'    <item id="p{i + 1}" href="{_xhtml_name(i)}" media-type="application/xhtml+xml"/>'
+            )
+            spine.append(f'    <itemref idref="p{i + 1}"/>')
+        opf = "\n".join(
+            [
+                '<?xml version="1.0" encoding="UTF-8"?>',
+                '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="bookid" xml:lang="ja"'
+                ' prefix="rendition: http://www.idpf.org/vocab/rendition/#">',
+                '  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">',
+                f'    <dc:identifier id="bookid">{escape(self.identifier)}</dc:identifier>',
+                f"    <dc:title>{escape(self.title)}</dc:title>",
+                f"    <dc:creator>{escape(self.author)}</dc:creator>",
+                "    <dc:language>ja</dc:language>",
+                f'    <meta property="dcterms:modified">{modified}</meta>',
+                '    <meta property="rendition:layout">pre-paginated</meta>',
+                '    <meta property="rendition:spread">none</meta>',
+                "  </metadata>",
+                "  <manifest>",
+                *items,
+                "  </manifest>",
+                '  <spine page-progression-direction="rtl">',
+                *spine,
+                "  </spine>",
+                "</package>",
+                "",
+            ]
+        )
+        self._write("OEBPS/content.opf", opf, compress=True)
+
+
+def _xhtml_name(index: int) -> str:
+    return f"page_{index + 1:04d}.xhtml"
+
+
+_WRITERS = {"cbz": CbzWriter, "epub": EpubWriter}
+
+
+class ArchiveExporter:
+    """合成順に受け取ったページを、章構成に沿ってアーカイブへ書き込む。
+
+    per_chapter=False なら作品全体を ``output_dir/{novel_id}.{形式}`` に、
+    True なら章ごとに ``output_dir/{novel_id}/{chapter_id}.{形式}`` に出力する。
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        novel_id: str,
+        title: str,
+        chapters: list[ChapterSpec],
+        author: str = "",
+        formats: tuple[str, ...] = ("cbz",),
+        per_chapter: bool = False,
+        compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    ) -> None:
+        unknown = set(formats) - set(ARCHIVE_FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown archive format: {', '.join(sorted(unknown))}")
+        self.output_dir = Path(output_dir)
+        self.novel_id = novel_id
+        self.title = title
+        self.author = author
+        self.formats = tuple(formats)
+        self.per_chapter = per_chapter
+        self.compress_level = compress_level
+        self._chapters = {ch.start: ch for ch in chapters}
+        self._open: list[_ZipArchive] = []
+        self._written: list[Path] = []
+        self._count = 0
+
+    def add(self, page: Image.Image) -> None:
+        """次のページを追加する。"""
+        chapter = self._chapters.get(self._count)
+        if chapter is not None:
+            if self.per_chapter:
+                self._close_open()
+                self._open = [self._create(chapter, fmt) for fmt in self.formats]
+            elif not self._open:
+                self._open = [self._create(None, fmt) for fmt in self.formats]
+            for archive in self._open:
+                archive.start_chapter(chapter.title)
+        elif not self._open:
+            self._open = [self._create(None, fmt) for fmt in self.formats]
+
+        data = encode_png(page, self.compress_level)
+        for archive in self._open:
+            archive.add_png(data, page.width, page.height)
+        self._count += 1
+
+    def close(self) -> list[Path]:
+        """開いているアーカイブを閉じ、書き出したファイルのリストを返す。"""
+        self._close_open()
+        return list(self._written)
+
+    def abort(self) -> None:
+        for archive in self._open:
+            archive.abort()
+        self._open = []
+
+    def __enter__(self) -> ArchiveExporter:
+        return self
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _close_open(self) -> None:
+        for archive in self._open:
+            self._written.append(archive.close())
+        self._open = []
+
+    def _create(self, chapter: Optional[ChapterSpec], fmt: str) -> _ZipArchive:
+        if chapter is not None:
+            path = self.output_dir / self.novel_id / f"{chapter.id}.{fmt}"
+            title = f"{self.title} {chapter.title}"
+        else:
+            path = self.output_dir / f"{self.novel_id}.{fmt}"
+            title = self.title
+        return _WRITERS[fmt](path, title, self.author)
@@ -0,0 +1,238 @@
+"""オフラインのバッチジョブ（--batch-submit）。
+
+夜間にまとめて変換するときは対話的な応答速度が要らないので、シーン解析と
+画像生成のリクエストを 1 つの入力ファイル（JSONL）に書き出し、プロバイダの
+バッチジョブとして投入する。結果は SceneAnalyzer / ImageGenerator の
+キャッシュに書き込むので、その後の通常の処理はキャッシュから読むだけになる。
+バッチで失敗したリクエストはキャッシュされず、通常の処理で同期的に再リクエストされる。
+
+投入したジョブは状態ファイル（JSON）に記録する。ポーリング中に中断しても、
+同じ状態ファイルで再実行すれば新しく投入せずに同じジョブの完了を待つ。
+
+使い方:
+    python -m novelmanga data/sample/ningen_shikkaku.txt --cache-dir .cache --batch-submit
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from .manifest import write_manifest
+from .models import Chunk
+
+_STATE_VERSION = 1
+JOB_SUCCEEDED = "JOB_STATE_SUCCEEDED"
+# 結果が得られない終了状態（再実行時は新しく投入し直す）
+_JOB_FAILED = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+@dataclass
+class BatchStats:
+    """バッチジョブの統計。"""
+
+    submitted: int = 0
+    resumed: int = 0
+    requests: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    polls: int = 0
+
+
+def _state_name(state: Any) -> str:
+    return str(getattr(state, "value", state) or "")
+
+
+def response_text(response: Optional[dict]) -> str:
+    """generateContent の REST レスポンスからテキストを取り出す。"""
+    if not response:
+        return ""
+    candidates = response.get("candidates") or [{}]
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(p.get("text", "") for p in parts)
+
+
+def response_image(response: Optional[dict]) -> Optional[bytes]:
+    """generateContent の REST レスポンスから最初の画像を取り出す。"""
+    if not response:
+        return None
+    candidates = response.get("candidates") or [{}]
+    for part in (candidates[0].get("content") or {}).get("parts") or []:
+        inline = part.get("inlineData") or part.get("inline_data")
+        mime = (inline or {}).get("mimeType") or (inline or {}).get("mime_type") or ""
+        if inline and mime.startswith("image/"):
+            return base64.b64decode(inline["data"])
+    return None
+
+
+class BatchJobRunner:
+    """リクエストを JSONL の入力ファイルにしてバッチジョブを投入し、完了まで待つ。
+
+    フェーズ（"analysis" / "images"）ごとに、投入したジョブの名前・入力ファイル・
+    リクエストのキーを state_path に記録する。再実行時、未完了のリクエストが
+    記録済みのジョブに含まれていれば、投入し直さずにそのジョブを待つ。
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        state_path: str | Path,
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None,
+        display_name: str = "novelmanga",
+        log: Callable[[str], None] = print,
+    ) -> None:
+        self.client = client
+        self.state_path = Path(state_path)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.display_name = display_name
+        self.log = log
+        self.stats = BatchStats()
+
+    # ------------------------------------------------------------------
+    # 状態ファイル
+    # ------------------------------------------------------------------
+
+    def _load_state(self) -> dict:
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            if state.get("version") == _STATE_VERSION:
+                return state
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            pass
+        return {"version": _STATE_VERSION, "phases": {}}
+
+    def _save_phase(self, phase: str, entry: dict) -> None:
+        state = self._load_state()
+        state["phases"][phase] = entry
+        write_manifest(self.state_path, state)
+
+    # ------------------------------------------------------------------
+    # 投入・ポーリング
+    # ------------------------------------------------------------------
+
+    def run(self, phase: str, model: str, requests: dict[str, dict]) -> dict[str, Optional[dict]]:
+        """requests（キー → REST リクエスト）をバッチで実行し、キー → レスポンスを返す。
+
+        失敗したリクエストのレスポンスは None。
+        """
+        if not requests:
+            return {}
+        entry = self._load_state()["phases"].get(phase)
+        if (
+            entry
+            and entry.get("model") == model
+            and entry.get("state") not in _JOB_FAILED
+            and set(requests) <= set(entry.get("keys", []))
+        ):
+            self.stats.resumed += 1
+            self.log(f"  -> 投入済みのバッチジョブを再開: {entry['job']}")
+        else:
+            entry = self._submit(phase, model, requests)
+
+        job = self._wait(phase, entry)
+        results = self._download(job)
+        entry["state"] = "ingested"
+        self._save_phase(phase, entry)
+
+        out: dict[str, Optional[dict]] = {}
+        for key in requests:
+            response = results.get(key)
+            out[key] = response
+            if response is None:
+                self.stats.failed += 1
+            else:
+                self.stats.succeeded += 1
+        return out
+
+    def _submit(self, phase: str, model: str, requests: dict[str, dict]) -> dict:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        input_path = self.state_path.parent / f"{self.state_path.stem}-{phase}-{stamp}.jsonl"
+        input_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(input_path, "w", encoding="utf-8") as fh:
+            for key, request in requests.items():
+                fh.write(json.dumps({"key": key, "request": request}, ensure_ascii=False) + "\n")
+
+        name = f"{self.display_name}-{phase}"
+        uploaded = self.client.files.upload(file=str(input_path), config={"mime_type": "jsonl", "display_name": name})
+        job = self.client.batches.create(model=model, src=uploaded.name, config={"display_name": name})
+        self.stats.submitted += 1
+        self.stats.requests += len(requests)
+        entry = {
+            "job": job.name,
+            "model": model,
+            "input": str(input_path),
+            "file": uploaded.name,
+            "keys": sorted(requests),
+            "state": _state_name(job.state),
+            "submittedAt": datetime.now(timezone.utc).isoformat(),
+        }
+        self._save_phase(phase, entry)
+        self.log(f"  -> バッチジョブを投入: {job.name}（{len(requests)} リクエスト）")
+        return entry
+
+    def _wait(self, phase: str, entry: dict) -> Any:
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        while True:
+            job = self.client.batches.get(name=entry["job"])
+            self.stats.polls += 1
+            state = _state_name(job.state)
+            if state != entry.get("state"):
+                entry["state"] = state
+                self._save_phase(phase, entry)
+                self.log(f"  -> {entry['job']}: {state}")
+            if state == JOB_SUCCEEDED:
+                return job
+            if state in _JOB_FAILED:
+                raise RuntimeError(f"Batch job {entry['job']} ended with {state}")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Batch job {entry['job']} is still {state}; rerun with the same state file to resume"
+                )
+            time.sleep(self.poll_interval)
+
+    def _download(self, job: Any) -> dict[str, dict]:
+        """結果ファイル（{"key", "response"} または {"key", "error"} の行）を読む。"""
+        dest = getattr(job, "dest", None)
+        file_name = getattr(dest, "file_name", None)
+        if not file_name:
+            raise RuntimeError(f"Batch job {job.name} has no responses file")
+        raw = self.client.files.download(file=file_name)
+        results: dict[str, dict] = {}
+        for line in raw.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item.get("response") is not None:
+                results[item.get("key")] = item["response"]
+        return results
+
+
+def prefill_analysis(runner: BatchJobRunner, analyzer: Any, chunks: Iterable[Chunk]) -> int:
+    """キャッシュにないチャンクの解析をバッチで実行し、キャッシュに保存した件数を返す。"""
+    pending = {analyzer.cache_key(c): c for c in chunks if not analyzer.is_cached(c)}
+    results = runner.run("analysis", analyzer.model, {k: analyzer.batch_request(c) for k, c in pending.items()})
+    return sum(
+        analyzer.ingest(pending[key], response_text(response))
+        for key, response in results.items()
+        if response is not None
+    )
+
+
+def prefill_images(runner: BatchJobRunner, generator: Any, descriptions: Iterable[str]) -> int:
+    """キャッシュにないコマ画像をバッチで生成し、キャッシュに保存した件数を返す。"""
+    pending: dict[str, str] = {}
+    for description in descriptions:
+        key = generator.cache_key(description)
+        if key not in pending and not generator.is_cached(description):
+            pending[key] = description
+    results = runner.run(
+        "images", generator.model, {k: generator.batch_request(d) for k, d in pending.items()}
+    )
+    return sum(generator.ingest(pending[key], response_image(response)) for key, response in results.items())
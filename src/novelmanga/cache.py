@@ -0,0 +1,296 @@
+"""生成結果のキャッシュ。
+
+DiskCache はローカルディスクの単純なキャッシュ。TieredCache は
+メモリの LRU（MemoryCache）→ ローカルディスク → 共有バックエンド
+（ネットワークファイルシステム上の DiskCache、または objectstore.ObjectStoreCache）
+の順に引き、下の階層で見つかったエントリは上の階層にも置く（read-through）。
+書き込みはメモリとディスクには同期で、共有バックエンドにはバックグラウンドの
+スレッドから行う（write-back）。
+
+エントリは内容の SHA-256 を先頭に付けて保存し（seal）、読み出し時に照合する。
+壊れたエントリはどの階層でもミスとして扱い、ディスクからは削除する。
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+# seal したエントリの先頭（形式の識別子 + 内容の SHA-256）
+_MAGIC = b"NMC1"
+_DIGEST_SIZE = 32
+
+
+def content_key(*parts: str) -> str:
+    """キャッシュキー（SHA-256 の 16 進文字列）を生成する。"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def seal(data: bytes) -> bytes:
+    """保存する形式（識別子 + 内容の SHA-256 + 内容）にする。"""
+    return _MAGIC + hashlib.sha256(data).digest() + data
+
+
+def unseal(blob: bytes) -> Optional[bytes]:
+    """seal した形式から内容を取り出す。ハッシュが合わなければ None。
+
+    識別子のないエントリ（seal する前のキャッシュ）はそのまま返す。
+    """
+    if not blob.startswith(_MAGIC):
+        return blob
+    head = len(_MAGIC) + _DIGEST_SIZE
+    data = blob[head:]
+    if len(blob) < head or hashlib.sha256(data).digest() != blob[len(_MAGIC) : head]:
+        return None
+    return data
+
+
+class DiskCache:
+    """キー → バイト列 をファイルとして保存する単純なディスクキャッシュ。
+
+    書き込みは一時ファイル経由の rename で行うため、途中まで書かれた
+    エントリが読まれることはない。内容のハッシュが合わないエントリは
+    読み出し時に削除してミスとして扱い、corrupt に数える。
+    """
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.corrupt = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            blob = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        data = unseal(blob)
+        if data is None:
+            self.corrupt += 1
+            path.unlink(missing_ok=True)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(seal(data))
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+
+class MemoryCache:
+    """合計バイト数に上限のある LRU（スレッドセーフ）。上限を超える値は保持しない。"""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@dataclass
+class TierStats:
+    """階層ごとの統計。errors は例外（共有バックエンドの通信失敗など）の数。"""
+
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    errors: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class Tier:
+    """TieredCache の 1 階層。write_back=True の階層にはバックグラウンドで書き込む。"""
+
+    name: str
+    store: Any
+    write_back: bool = False
+    stats: TierStats = field(default_factory=TierStats)
+
+
+class TieredCache:
+    """複数のキャッシュを上から順に引く階層キャッシュ（get / put / in は DiskCache と同じ）。
+
+    どの階層の失敗（例外）も実行を止めず、その階層のミスとして数える。
+    write_back の階層への書き込みは flush() / close() で待てる
+    （プロセス終了時にも atexit で待つ）。
+    """
+
+    def __init__(self, tiers: list[Tier]) -> None:
+        self.tiers = tiers
+        self._lock = threading.Lock()
+        self._pending: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def _count(self, tier: Tier, field: str) -> None:
+        with self._lock:
+            setattr(tier.stats, field, getattr(tier.stats, field) + 1)
+
+    def get(self, key: str) -> bytes | None:
+        for i, tier in enumerate(self.tiers):
+            try:
+                data = tier.store.get(key)
+            except Exception:
+                self._count(tier, "errors")
+                data = None
+            if data is None:
+                self._count(tier, "misses")
+                continue
+            self._count(tier, "hits")
+            # 上の階層にも置き、次からはそこで見つかるようにする
+            for upper in self.tiers[:i]:
+                self._write(upper, key, data)
+            return data
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        for tier in self.tiers:
+            if tier.write_back:
+                self._enqueue(tier, key, data)
+            else:
+                self._write(tier, key, data)
+
+    def __contains__(self, key: str) -> bool:
+        for tier in self.tiers:
+            try:
+                if key in tier.store:
+                    return True
+            except Exception:
+                self._count(tier, "errors")
+        return False
+
+    def _write(self, tier: Tier, key: str, data: bytes) -> None:
+        try:
+            tier.store.put(key, data)
+        except Exception:
+            self._count(tier, "errors")
+        else:
+            self._count(tier, "writes")
+
+    def _enqueue(self, tier: Tier, key: str, data: bytes) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="cache-write-back", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+        self._pending.put((tier, key, data))
+
+    def _write_loop(self) -> None:
+        while True:
+            tier, key, data = self._pending.get()
+            try:
+                self._write(tier, key, data)
+            finally:
+                self._pending.task_done()
+
+    def flush(self) -> None:
+        """バックグラウンドの書き込みがすべて終わるまで待つ。"""
+        self._pending.join()
+
+    def close(self) -> None:
+        self.flush()
+
+    def to_dict(self) -> dict:
+        """階層ごとの統計（run_report.json の cache セクション）。"""
+        out = {}
+        for tier in self.tiers:
+            st = tier.stats
+            out[tier.name] = {
+                "hits": st.hits,
+                "misses": st.misses,
+                "hit_rate": round(st.hit_rate, 4),
+                "writes": st.writes,
+                "errors": st.errors,
+                "corrupt": getattr(tier.store, "corrupt", 0),
+            }
+        return out
+
+
+def open_cache(
+    root: str | Path | None,
+    namespace: str,
+    shared: Optional[str] = None,
+    memory_bytes: int = 0,
+    write_back: bool = True,
+) -> Any:
+    """root/namespace のキャッシュを開く。root がなければ None。
+
+    shared（ネットワークファイルシステム上のディレクトリ、または
+    http(s):// で始まる S3 互換のバケット URL）か memory_bytes を指定すると
+    TieredCache を、どちらもなければ DiskCache を返す。共有バックエンドには
+    namespace ごとのディレクトリ・接頭辞を使う。write_back=False では共有
+    バックエンドにも同期で書き込む（書き込んだ直後に別のホストが読むジョブキューのワーカー用）。
+    """
+    if root is None:
+        return None
+    disk = DiskCache(Path(root) / namespace)
+    if not shared and not memory_bytes:
+        return disk
+    tiers = []
+    if memory_bytes:
+        tiers.append(Tier("memory", MemoryCache(memory_bytes)))
+    tiers.append(Tier("disk", disk))
+    if shared:
+        if shared.startswith(("http://", "https://")):
+            from .objectstore import ObjectStoreCache
+
+            backend: Any = ObjectStoreCache(f"{shared.rstrip('/')}/{namespace}")
+        else:
+            backend = DiskCache(Path(shared) / namespace)
+        tiers.append(Tier("shared", backend, write_back=write_back))
+    return TieredCache(tiers)
@@ -2,53 +2,123 @@
 
 from __future__ import annotations
 
-import os
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 from PIL import Image, ImageDraw, ImageFont
 
+from .fonts import get_registry
 from .models import Panel, Scene
+from .sprites import SpriteCache
+from .writer import DEFAULT_COMPRESS_LEVEL, save_png_atomic
 
 PAGE_WIDTH = 1080
 PAGE_HEIGHT = 1528
 PANEL_MARGIN = 12
 BUBBLE_PAD = 10
 
-# 日本語フォントの候補（優先順）
-_FONT_CANDIDATES = [
-    # Windows
-    "C:/Windows/Fonts/YuGothM.ttc",
-    "C:/Windows/Fonts/meiryo.ttc",
-    "C:/Windows/Fonts/msgothic.ttc",
-    # macOS
-    "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc",
-    "/Library/Fonts/NotoSansCJK-Regular.ttc",
-    # Linux
-    "/usr/share/fonts/truetype/noto/NotoSansCJKjp-Regular.otf",
-    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-]
-
-
-def _load_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
-    """日本語対応フォントを読み込む。見つからない場合はデフォルトを返す。"""
-    for path in _FONT_CANDIDATES:
-        if os.path.exists(path):
-            try:
-                return ImageFont.truetype(path, size)
-            except Exception:
-                continue
-    return ImageFont.load_default()
+
+def _load_font(size: int, font_path: Optional[str] = None) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    """日本語対応フォントを共有レジストリから取得する。見つからない場合はデフォルトを返す。"""
+    return get_registry().get(size, font_path)
+
+
+def layout_rects(n: int, layout_type: str = "standard") -> list[tuple[int, int, int, int]]:
+    """n コマ・レイアウト layout_type のパネル矩形リスト（ページ座標）を返す。
+
+    7 コマ以上は 6 コマの配置になる（7 コマ目以降は描画されない）。
+    """
+    m = PANEL_MARGIN
+    W, H = PAGE_WIDTH, PAGE_HEIGHT
+
+    if n == 1:
+        return [(m, m, W - m, H - m)]
+
+    if n == 2:
+        mid = H // 2
+        return [
+            (m, m, W - m, mid - m),
+            (m, mid + m, W - m, H - m),
+        ]
+
+    if n == 3:
+        if layout_type == "action":
+            top = int(H * 0.58)
+            mid = W // 2
+            return [
+                (m, m, W - m, top),
+                (m, top + m, mid - m, H - m),
+                (mid + m, top + m, W - m, H - m),
+            ]
+        row = H // 3
+        return [
+            (m, m, W - m, row - m),
+            (m, row + m, W - m, row * 2 - m),
+            (m, row * 2 + m, W - m, H - m),
+        ]
+
+    if n == 4:
+        mw, mh = W // 2, H // 2
+        return [
+            (m, m, mw - m, mh - m),
+            (mw + m, m, W - m, mh - m),
+            (m, mh + m, mw - m, H - m),
+            (mw + m, mh + m, W - m, H - m),
+        ]
+
+    if n == 5:
+        row = H // 2
+        tw = W // 3
+        return [
+            (m, m, W // 2 - m, row - m),
+            (W // 2 + m, m, W - m, row - m),
+            (m, row + m, tw - m, H - m),
+            (tw + m, row + m, tw * 2 - m, H - m),
+            (tw * 2 + m, row + m, W - m, H - m),
+        ]
+
+    # 6 コマ（デフォルト）
+    mw, th = W // 2, H // 3
+    return [
+        (m, m, mw - m, th - m),
+        (mw + m, m, W - m, th - m),
+        (m, th + m, mw - m, th * 2 - m),
+        (mw + m, th + m, W - m, th * 2 - m),
+        (m, th * 2 + m, mw - m, H - m),
+        (mw + m, th * 2 + m, W - m, H - m),
+    ]
 
 
 class PageComposer:
-    """シーンデータとパネル画像からマンガページ画像を合成する。"""
+    """シーンデータとパネル画像からマンガページ画像を合成する。
+
+    吹き出し・ナレーション枠・セリフは SpriteCache に一度だけ描画し、
+    以降は貼り付けで合成する。use_sprites=False で従来の直接描画になる。
+    sprite_cache を渡すと複数の PageComposer でキャッシュを共有できる。
+    フォントはプロセス共通の FontRegistry から取得するため、
+    インスタンスを何度生成しても候補の探索と読み込みは繰り返さない。
+    tone にプリセット名（tones.PRESETS）を渡すと、コマ画像を貼る前に
+    スクリーントーン・網点に 2 値化する（NumPy が必要）。
+    """
+
+    def __init__(
+        self,
+        font_path: Optional[str] = None,
+        use_sprites: bool = True,
+        sprite_cache: Optional[SpriteCache] = None,
+        tone: Optional[str] = None,
+    ) -> None:
+        self._font_dialogue = _load_font(20, font_path)
+        self._font_narration = _load_font(17, font_path)
+        self._sprites: Optional[SpriteCache] = None
+        if use_sprites:
+            self._sprites = sprite_cache if sprite_cache is not None else SpriteCache()
+        self._tone: Optional[Callable[[Image.Image], Image.Image]] = None
+        if tone:
+            from .tones import apply_tone, get_preset
 
-    def __init__(self, font_path: Optional[str] = None) -> None:
-        if font_path:
-            _FONT_CANDIDATES.insert(0, font_path)
-        self._font_dialogue = _load_font(20)
-        self._font_narration = _load_font(17)
+            self._tone = partial(apply_tone, preset=get_preset(tone))
 
     # ------------------------------------------------------------------
     # Public API
@@ -67,7 +137,7 @@ class PageComposer:
         if not panels:
             return page
 
-        rects = self._calculate_layout(len(panels), scene.page_layout)
+        rects = self.panel_rects(scene)
 
         for i, (panel, rect) in enumerate(zip(panels, rects)):
             self._draw_panel(
@@ -80,11 +150,18 @@ class PageComposer:
 
         return page
 
-    def save_page(self, page: Image.Image, output_path: str | Path) -> None:
-        """ページ画像を PNG 形式で保存する。"""
-        out = Path(output_path)
-        out.parent.mkdir(parents=True, exist_ok=True)
-        page.save(str(out), "PNG")
+    def panel_rects(self, scene: Scene) -> list[tuple[int, int, int, int]]:
+        """シーンのコマ矩形（ページ座標）を返す。シート生成のレイアウトにも使う。"""
+        return self._calculate_layout(len(scene.panels), scene.page_layout)
+
+    def save_page(
+        self,
+        page: Image.Image,
+        output_path: str | Path,
+        compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    ) -> None:
+        """ページ画像を PNG 形式で保存する（一時ファイル経由で置き換える）。"""
+        save_png_atomic(page, output_path, compress_level)
 
     # ------------------------------------------------------------------
     # Panel rendering
@@ -107,15 +184,17 @@ class PageComposer:
         # 背景画像
         if img:
             bg = img.convert("L").resize((pw - 6, ph - 6), Image.LANCZOS)
+            if self._tone is not None:
+                bg = self._tone(bg)
             page.paste(bg, (x1 + 3, y1 + 3))
 
         # ナレーション
         if panel.narration:
-            self._draw_narration_box(draw, panel.narration, rect)
+            self._draw_narration_box(page, draw, panel.narration, rect)
 
         # 吹き出し
         for idx, line in enumerate(panel.dialogue[:3]):
-            self._draw_speech_bubble(draw, line, rect, idx)
+            self._draw_speech_bubble(page, draw, line, rect, idx)
 
     # ------------------------------------------------------------------
     # Speech bubble & narration
@@ -123,6 +202,7 @@ class PageComposer:
 
     def _draw_speech_bubble(
         self,
+        page: Image.Image,
         draw: ImageDraw.ImageDraw,
         text: str,
         panel_rect: tuple[int, int, int, int],
@@ -138,22 +218,31 @@ class PageComposer:
         if by < y1 + PANEL_MARGIN:
             return
         bubble = (bx, by, bx + bw, by + bh)
-        draw.ellipse(bubble, fill=255, outline=0, width=2)
-        self._draw_centered_text(draw, text, bubble, self._font_dialogue)
+        if self._sprites is not None:
+            img, mask = self._sprites.bubble(bw, bh, 2)
+            page.paste(img, (bx, by), mask)
+        else:
+            draw.ellipse(bubble, fill=255, outline=0, width=2)
+        self._draw_centered_text(page, draw, text, bubble, self._font_dialogue)
 
     def _draw_narration_box(
         self,
+        page: Image.Image,
         draw: ImageDraw.ImageDraw,
         text: str,
         panel_rect: tuple[int, int, int, int],
     ) -> None:
         x1, y1, x2, _ = panel_rect
         box = (x1 + PANEL_MARGIN, y1 + PANEL_MARGIN, x2 - PANEL_MARGIN, y1 + PANEL_MARGIN + 38)
-        draw.rectangle(box, fill=220, outline=0, width=1)
-        self._draw_centered_text(draw, text, box, self._font_narration)
+        if self._sprites is not None:
+            page.paste(self._sprites.box(box[2] - box[0], box[3] - box[1], 220, 1), box[:2])
+        else:
+            draw.rectangle(box, fill=220, outline=0, width=1)
+        self._draw_centered_text(page, draw, text, box, self._font_narration)
 
     def _draw_centered_text(
         self,
+        page: Image.Image,
         draw: ImageDraw.ImageDraw,
         text: str,
         rect: tuple[int, int, int, int],
@@ -162,6 +251,14 @@ class PageComposer:
         x1, y1, x2, y2 = rect
         max_w = x2 - x1 - BUBBLE_PAD * 2
 
+        if self._sprites is not None:
+            sprite = self._sprites.text(text, font, max_w)
+            if sprite.mask is not None:
+                tx = x1 + (x2 - x1 - sprite.width) // 2
+                ty = y1 + (y2 - y1 - sprite.height) // 2
+                page.paste(0, (tx, ty, tx + sprite.mask.width, ty + sprite.mask.height), sprite.mask)
+            return
+
         # テキストを最大幅に収まるよう切り詰め
         display = text
         try:
@@ -188,62 +285,4 @@ class PageComposer:
         self, n: int, layout_type: str
     ) -> list[tuple[int, int, int, int]]:
         """n コマのパネル矩形リストを返す。"""
-        m = PANEL_MARGIN
-        W, H = PAGE_WIDTH, PAGE_HEIGHT
-
-        if n == 1:
-            return [(m, m, W - m, H - m)]
-
-        if n == 2:
-            mid = H // 2
-            return [
-                (m, m, W - m, mid - m),
-                (m, mid + m, W - m, H - m),
-            ]
-
-        if n == 3:
-            if layout_type == "action":
-                top = int(H * 0.58)
-                mid = W // 2
-                return [
-                    (m, m, W - m, top),
-                    (m, top + m, mid - m, H - m),
-                    (mid + m, top + m, W - m, H - m),
-                ]
-            row = H // 3
-            return [
-                (m, m, W - m, row - m),
-                (m, row + m, W - m, row * 2 - m),
-                (m, row * 2 + m, W - m, H - m),
-            ]
-
-        if n == 4:
-            mw, mh = W // 2, H // 2
-            return [
-                (m, m, mw - m, mh - m),
-                (mw + m, m, W - m, mh - m),
-                (m, mh + m, mw - m, H - m),
-                (mw + m, mh + m, W - m, H - m),
-            ]
-
-        if n == 5:
-            row = H // 2
-            tw = W // 3
-            return [
-                (m, m, W // 2 - m, row - m),
-                (W // 2 + m, m, W - m, row - m),
-                (m, row + m, tw - m, H - m),
-                (tw + m, row + m, tw * 2 - m, H - m),
-                (tw * 2 + m, row + m, W - m, H - m),
-            ]
-
-        # 6 コマ（デフォルト）
-        mw, th = W // 2, H // 3
-        return [
-            (m, m, mw - m, th - m),
-            (mw + m, m, W - m, th - m),
-            (m, th + m, mw - m, th * 2 - m),
-            (mw + m, th + m, W - m, th * 2 - m),
-            (m, th * 2 + m, mw - m, H - m),
-            (mw + m, th * 2 + m, W - m, H - m),
-        ]
+        return layout_rects(n, layout_type)
@@ -0,0 +1,639 @@
+"""常駐変換サービス（novelmanga daemon）。
+
+1 回ごとに ``python -m novelmanga`` を起動すると、インタプリタの起動・SDK の
+インポート・クライアント生成・フォント読み込みが毎回かかり、1 章だけのような
+短い変換ではこれが大半を占める。デーモンは SceneAnalyzer・ImageGenerator・
+PageComposer を一度だけ作って温めたまま、ローカルの HTTP（TCP または
+Unix ソケット）でジョブを受け付ける。
+
+- 同時に実行するジョブ数（--max-jobs）と、全ジョブ合計の API 同時呼び出し数
+  （--api-concurrency）を共有の上限として持つ
+- 解析・画像のキャッシュ（--cache-dir）とフォントはジョブ間で共有する。
+  --cache-memory でメモリの LRU を、--cache-shared で他のホストと共有する
+  キャッシュを階層として重ねられる（cache.open_cache）
+- ジョブごとの進捗（チャンク・ページ数）と段階別の所要時間を返す
+
+API:
+    GET  /health        サービスの状態・統計
+    GET  /jobs          全ジョブ
+    POST /jobs          ジョブ投入（JSON）→ 202
+    GET  /jobs/{id}     ジョブの状態
+
+使い方:
+    python -m novelmanga daemon --port 8766 --cache-dir .cache
+    python -m novelmanga daemon --socket /tmp/novelmanga.sock --max-jobs 4
+    curl -X POST localhost:8766/jobs -d '{"input_file": "data/sample/ningen_shikkaku.txt", "pages": 3}'
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import re
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+from .cache import TieredCache, open_cache
+from .memory import size_arg
+from .models import Chunk
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)$")
+
+
+@dataclass
+class DaemonJob:
+    """デーモンが受け付けた 1 件の変換ジョブ。"""
+
+    id: str
+    novel_id: str
+    title: str
+    status: str = QUEUED
+    chunks_total: int = 0
+    chunks_done: int = 0
+    # 解析済みチャンクから分かったページ数（解析が終わるまで増えていく）
+    pages_total: int = 0
+    pages_done: int = 0
+    output_dir: str = ""
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    # 段階別の所要時間（秒）。queued / first_page / total は投入からの経過時間、
+    # parse / analysis / images / compose / write は処理時間（並行実行分は合計）
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def mark(self, stage: str) -> None:
+        """投入からの経過時間を stage として記録する。"""
+        with self._lock:
+            self.timings[stage] = time.perf_counter() - self._t0
+
+    def update(self, **fields: Any) -> None:
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def increment(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            data = asdict(self)
+        data["timings"] = {k: round(v, 4) for k, v in data["timings"].items()}
+        return data
+
+
+class _Stage:
+    """共有コンポーネントの呼び出しを計測し、ジョブの段階別時間に加算する。
+
+    limit を渡すと、その呼び出しは全ジョブ共有のセマフォの範囲で実行される。
+    待ち時間は段階の時間に含めない。
+    """
+
+    def __init__(
+        self,
+        target: Any,
+        job: DaemonJob,
+        stage: str,
+        limit: Optional[threading.Semaphore] = None,
+        on_result: Any = None,
+    ) -> None:
+        self._target = target
+        self._job = job
+        self._stage = stage
+        self._limit = limit
+        self._on_result = on_result
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args: Any, **kwargs: Any) -> Any:
+            with self._limit if self._limit is not None else contextlib.nullcontext():
+                t0 = time.perf_counter()
+                try:
+                    result = attr(*args, **kwargs)
+                finally:
+                    self._job.add_time(self._stage, time.perf_counter() - t0)
+            if self._on_result is not None:
+                self._on_result(result)
+            return result
+
+        return call
+
+
+class ConversionService:
+    """温めたコンポーネントを共有して変換ジョブを実行する。
+
+    client は transport.create_client() の戻り値。images=False なら画像生成を
+    行わない（ジョブごとに images=False も指定できる）。
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path = "output",
+        client: Any = None,
+        cache_dir: str | Path | None = None,
+        max_jobs: int = 2,
+        api_concurrency: int = 8,
+        workers: int = 4,
+        structured: bool = False,
+        images: bool = True,
+        similarity_threshold: Optional[float] = None,
+        write_threads: int = 2,
+        compress_level: int = 6,
+        cache_shared: Optional[str] = None,
+        cache_memory: int = 0,
+    ) -> None:
+        from .analyzer import SceneAnalyzer
+        from .composer import PageComposer
+        from .fonts import prewarm_fonts
+        from .generator import ImageGenerator
+
+        self.output_dir = Path(output_dir).resolve()
+        self.workers = max(1, workers)
+        self.write_threads = write_threads
+        self.compress_level = compress_level
+        self.started_at = time.time()
+        cache = Path(cache_dir) if cache_dir else None
+        # 常駐プロセスではメモリの階層（cache_memory）が同じ作品の再変換で効く
+        self.caches = {
+            name: open_cache(cache, name, shared=cache_shared, memory_bytes=cache_memory)
+            for name in (["scripts", "images"] if images else ["scripts"])
+        }
+
+        self.analyzer = SceneAnalyzer(
+            client=client,
+            structured=structured,
+            cache=self.caches["scripts"],
+        )
+        self.generator = None
+        if images:
+            self.generator = ImageGenerator(
+                client=client,
+                cache_dir=cache / "images" if cache else None,
+                similarity_threshold=similarity_threshold,
+                cache=self.caches["images"],
+            )
+        prewarm_fonts()
+        self.composer = PageComposer()
+
+        self._api_limit = threading.Semaphore(max(1, api_concurrency))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="daemon-job")
+        self._jobs: dict[str, DaemonJob] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # ジョブ管理
+    # ------------------------------------------------------------------
+
+    def submit(self, request: dict) -> DaemonJob:
+        """ジョブを受け付けて返す。request が不正なら ValueError。
+
+        request のキー:
+            input_file / text   入力（どちらか一方。input_file はデーモンから見えるパス）
+            novel_id            作品 ID（input_file なら省略時はファイル名）
+            title, author       マニフェストのタイトル・著者
+            pages               チャンク数の上限
+            chunk_size          チャンクの文字数（デフォルト: 2000）
+            content_defined     内容に基づくチャンク境界を使う
+            images              画像を生成する（デフォルト: true）
+            publish             manga-manifest.json に逐次公開する
+            pages_per_chapter   マニフェストの 1 章あたりのページ数
+        """
+        novel_id = self._validate(request)
+        job = DaemonJob(
+            id=uuid.uuid4().hex[:12],
+            novel_id=novel_id,
+            title=request.get("title") or novel_id,
+            output_dir=str(self.output_dir / novel_id),
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, request)
+        return job
+
+    def get(self, job_id: str) -> Optional[DaemonJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[DaemonJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll: float = 0.05) -> DaemonJob:
+        """ジョブが終わるまで待って返す。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        while job.status in (QUEUED, RUNNING):
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"job {job_id} did not finish in {timeout}s")
+            time.sleep(poll)
+        return job
+
+    def health(self) -> dict:
+        counts = {s: 0 for s in (QUEUED, RUNNING, DONE, FAILED)}
+        for job in self.jobs():
+            counts[job.status] += 1
+        data: dict[str, Any] = {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started_at, 1),
+            "jobs": counts,
+            "analysis": asdict(self.analyzer.stats),
+        }
+        if self.generator is not None:
+            data["images"] = asdict(self.generator.stats)
+        tiered = {name: c.to_dict() for name, c in self.caches.items() if isinstance(c, TieredCache)}
+        if tiered:
+            data["cache"] = tiered
+        return data
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        for cache in self.caches.values():
+            if isinstance(cache, TieredCache):
+                cache.close()
+
+    # ------------------------------------------------------------------
+    # 実行
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _validate(request: dict) -> str:
+        """request を検査して作品 ID を返す。"""
+        if not isinstance(request, dict):
+            raise ValueError("request body must be a JSON object")
+        input_file, text = request.get("input_file"), request.get("text")
+        if bool(input_file) == bool(text):
+            raise ValueError("exactly one of input_file or text is required")
+        if input_file and not Path(input_file).is_file():
+            raise ValueError(f"input_file not found: {input_file}")
+        novel_id = request.get("novel_id") or (Path(input_file).stem if input_file else None)
+        if not novel_id:
+            raise ValueError("novel_id is required with text")
+        if not isinstance(novel_id, str) or "/" in novel_id or "\\" in novel_id or novel_id.startswith("."):
+            raise ValueError(f"invalid novel_id: {novel_id}")
+        return novel_id
+
+    def _chunks(self, request: dict) -> list[Chunk]:
+        from .parser import AozoraBunkoParser
+
+        parser = AozoraBunkoParser()
+        if request.get("input_file"):
+            text = parser.parse_file(request["input_file"])
+        else:
+            text = parser.clean_text(request["text"])
+        chunk_size = int(request.get("chunk_size") or 2000)
+        if request.get("content_defined"):
+            chunks = parser.chunk_content_defined(text, chunk_size=chunk_size)
+        else:
+            chunks = parser.split_chunks(text, chunk_size=chunk_size)
+        if request.get("pages"):
+            chunks = chunks[: int(request["pages"])]
+        return chunks
+
+    def _run(self, job: DaemonJob, request: dict) -> None:
+        from .pipeline import ManifestPublisher, ReaderOrderPipeline
+        from .writer import PageWriter
+
+        job.mark("queued")
+        job.update(status=RUNNING)
+        t0 = time.perf_counter()
+        try:
+            chunks = self._chunks(request)
+            job.add_time("parse", time.perf_counter() - t0)
+            job.update(chunks_total=len(chunks))
+
+            def analyzed(scenes: list) -> None:
+                job.increment("chunks_done")
+                job.increment("pages_total", len(scenes))
+
+            def composed(page_number: int, _page: Any) -> None:
+                if page_number == 1:
+                    job.mark("first_page")
+                job.increment("pages_done")
+
+            generator = None
+            if self.generator is not None and request.get("images", True):
+                generator = _Stage(self.generator, job, "images", self._api_limit)
+            publisher = None
+            if request.get("publish"):
+                publisher = ManifestPublisher(
+                    self.output_dir,
+                    job.novel_id,
+                    job.title,
+                    author=request.get("author", ""),
+                    pages_per_chapter=int(request.get("pages_per_chapter") or 0),
+                )
+
+            with PageWriter(threads=self.write_threads, compress_level=self.compress_level) as writer:
+                pipeline = ReaderOrderPipeline(
+                    _Stage(self.analyzer, job, "analysis", self._api_limit, analyzed),
+                    _Stage(self.composer, job, "compose"),
+                    writer,
+                    job.output_dir,
+                    generator=generator,
+                    workers=self.workers,
+                    publisher=publisher,
+                    on_page=composed,
+                )
+                pipeline.run(chunks)
+                t_write = time.perf_counter()
+            job.add_time("write", time.perf_counter() - t_write)
+            if publisher is not None:
+                publisher.finish()
+            job.update(status=DONE)
+        except Exception as e:
+            job.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+        finally:
+            job.mark("total")
+
+
+# ----------------------------------------------------------------------
+# HTTP サーバー
+# ----------------------------------------------------------------------
+
+
+def _make_handler(service: ConversionService) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            path = self.path.split("?", 1)[0]
+            if path == "/health":
+                self._send(200, service.health())
+            elif path == "/jobs":
+                self._send(200, {"jobs": [j.to_dict() for j in service.jobs()]})
+            elif (m := _JOB_PATH.match(path)) and (job := service.get(m.group(1))):
+                self._send(200, job.to_dict())
+            else:
+                self._send(404, {"error": f"not found: {path}"})
+
+        def do_POST(self) -> None:  # noqa: N802
+            path = self.path.split("?", 1)[0]
+            if path != "/jobs":
+                self._send(404, {"error": f"not found: {path}"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                job = service.submit(json.loads(self.rfile.read(length) or b"{}"))
+            except (json.JSONDecodeError, ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(202, job.to_dict())
+
+        def _send(self, status: int, payload: dict) -> None:
+            raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+    return Handler
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self) -> tuple[socket.socket, Any]:
+        # BaseHTTPRequestHandler は client_address[0] を参照する
+        conn, _ = super().get_request()
+        return conn, ("local", 0)
+
+
+class DaemonServer:
+    """ConversionService を HTTP（TCP または Unix ソケット）で公開する。"""
+
+    def __init__(
+        self,
+        service: ConversionService,
+        host: str = "127.0.0.1",
+        port: int = 8766,
+        socket_path: str | Path | None = None,
+    ) -> None:
+        self.service = service
+        self.socket_path = Path(socket_path) if socket_path else None
+        handler = _make_handler(service)
+        if self.socket_path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                self.socket_path.unlink()
+            self._httpd: socketserver.BaseServer = _UnixHTTPServer(str(self.socket_path), handler)
+        else:
+            self._httpd = ThreadingHTTPServer((host, port), handler)
+            self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        """DaemonClient に渡すアドレス。"""
+        if self.socket_path is not None:
+            return f"unix://{self.socket_path}"
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> DaemonServer:
+        """バックグラウンドスレッドでサーバーを起動する。"""
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever(poll_interval=0.5)
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        if self.socket_path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                self.socket_path.unlink()
+
+    def __enter__(self) -> DaemonServer:
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+
+# ----------------------------------------------------------------------
+# クライアント
+# ----------------------------------------------------------------------
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class DaemonClient:
+    """デーモンの HTTP API クライアント。
+
+    address は ``http://127.0.0.1:8766`` または ``unix:///tmp/novelmanga.sock``。
+    エラー応答は RuntimeError になる。
+    """
+
+    def __init__(self, address: str, timeout: float = 30.0) -> None:
+        self.address = address
+        self.timeout = timeout
+        url = urlparse(address)
+        if url.scheme not in ("http", "unix"):
+            raise ValueError(f"Unsupported daemon address: {address}")
+        self._url = url
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._url.scheme == "unix":
+            return _UnixConnection(self._url.path, self.timeout)
+        return http.client.HTTPConnection(self._url.hostname, self._url.port or 80, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        conn = self._connect()
+        try:
+            headers = {}
+            raw = None
+            if body is not None:
+                raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                headers["Content-Type"] = "application/json; charset=utf-8"
+            conn.request(method, path, body=raw, headers=headers)
+            resp = conn.getresponse()
+            data = json.loads(resp.read() or b"{}")
+        finally:
+            conn.close()
+        if resp.status >= 400:
+            raise RuntimeError(f"{resp.status}: {data.get('error', data)}")
+        return data
+
+    def health(self) -> dict:
+        return self._request("GET", "/health")
+
+    def submit(self, **request: Any) -> dict:
+        return self._request("POST", "/jobs", request)
+
+    def job(self, job_id: str) -> dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def jobs(self) -> list[dict]:
+        return self._request("GET", "/jobs")["jobs"]
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll: float = 0.2) -> dict:
+        """ジョブが終わるまでポーリングして最終状態を返す。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.job(job_id)
+            if job["status"] not in (QUEUED, RUNNING):
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"job {job_id} did not finish in {timeout}s")
+            time.sleep(poll)
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+
+def daemon_main(argv: Optional[list[str]] = None) -> None:
+    p = argparse.ArgumentParser(prog="python -m novelmanga daemon", description="常駐変換サービスを起動する")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8766)
+    p.add_argument("--socket", default=None, metavar="PATH", help="TCP の代わりに Unix ソケットで待ち受ける")
+    p.add_argument("--output", "-o", default="output", help="出力ディレクトリ（{novel_id}/page_*.png）")
+    p.add_argument("--cache-dir", default=None, metavar="DIR", help="全ジョブで共有する解析結果・生成画像のキャッシュ")
+    p.add_argument(
+        "--cache-shared",
+        default=None,
+        metavar="PATH|URL",
+        help="--cache-dir の下に置く共有キャッシュ（NFS などのディレクトリ、または S3 互換の http(s)://HOST/BUCKET/PREFIX）",
+    )
+    p.add_argument(
+        "--cache-memory", type=size_arg, default=0, metavar="SIZE", help="--cache-dir の上に置くメモリキャッシュ（LRU）の上限"
+    )
+    p.add_argument("--max-jobs", type=int, default=2, help="同時に実行するジョブ数（デフォルト: 2）")
+    p.add_argument(
+        "--api-concurrency",
+        type=int,
+        default=8,
+        help="全ジョブ合計の API 同時呼び出し数の上限（デフォルト: 8）",
+    )
+    p.add_argument("--workers", type=int, default=4, help="ジョブごとの並行実行スレッド数（デフォルト: 4）")
+    p.add_argument("--structured-output", action="store_true")
+    p.add_argument("--no-images", action="store_true")
+    p.add_argument("--similarity-threshold", type=float, default=None, metavar="F")
+    p.add_argument("--write-threads", type=int, default=2, metavar="N")
+    p.add_argument("--png-compression", type=int, choices=range(10), default=6, metavar="0-9")
+    p.add_argument("--transport", choices=["live", "record", "replay"], default="live")
+    p.add_argument("--record-dir", default=None)
+    p.add_argument("--fake-server", default=None, metavar="URL")
+    args = p.parse_args(argv)
+
+    from .transport import create_client
+
+    t0 = time.perf_counter()
+    client = create_client(args.transport, record_dir=args.record_dir, base_url=args.fake_server)
+    service = ConversionService(
+        args.output,
+        client=client,
+        cache_dir=args.cache_dir,
+        cache_shared=args.cache_shared,
+        cache_memory=args.cache_memory,
+        max_jobs=args.max_jobs,
+        api_concurrency=args.api_concurrency,
+        workers=args.workers,
+        structured=args.structured_output,
+        images=not args.no_images,
+        similarity_threshold=args.similarity_threshold,
+        write_threads=args.write_threads,
+        compress_level=args.png_compression,
+    )
+    server = DaemonServer(service, host=args.host, port=args.port, socket_path=args.socket)
+    print(f"NovelManga daemon listening on {server.address}（起動 {time.perf_counter() - t0:.2f}s）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        service.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    daemon_main(sys.argv[1:])
@@ -0,0 +1,141 @@
+"""類似プロンプト検出のための MinHash/LSH インデックス。
+
+解析結果の visual_description は「dim room, young man sitting alone」の
+ような、ほぼ同一の記述を繰り返すことが多い。トークン集合の Jaccard
+類似度が閾値以上のプロンプトを高速に見つけ、既存画像を再利用する。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    {"a", "an", "the", "of", "in", "on", "at", "with", "and", "is", "to", "by", "for", "from"}
+)
+_PRIME = (1 << 61) - 1
+
+
+def shingles(text: str) -> frozenset[str]:
+    """プロンプトを正規化したトークン集合に変換する。"""
+    return frozenset(t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS)
+
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _choose_bands(num_perm: int, threshold: float) -> int:
+    """LSH の検出閾値 (1/b)^(1/r) が threshold 以下になる最小のバンド数を選ぶ。"""
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        if (1 / bands) ** (1 / rows) <= threshold:
+            return bands
+    return num_perm
+
+
+class PromptIndex:
+    """プロンプト → キャッシュキー の近傍検索インデックス。
+
+    LSH で候補を絞り込み、最終判定は実際の Jaccard 類似度で行う。
+    path を指定すると追記型の JSONL として永続化し、次回実行時に復元する。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        path: Optional[str | Path] = None,
+        seed: int = 1,
+    ) -> None:
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1]: {threshold}")
+        self.threshold = threshold
+        self._num_perm = num_perm
+        self._bands = _choose_bands(num_perm, threshold)
+        self._rows = num_perm // self._bands
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)
+        ]
+        self._entries: list[tuple[frozenset[str], str]] = []
+        self._buckets: dict[tuple[int, tuple[int, ...]], list[int]] = {}
+        self._path = Path(path) if path else None
+        # 画像生成を並列化したときに add / query が同時に呼ばれる
+        self._lock = threading.Lock()
+        if self._path and self._path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _signature(self, tokens: frozenset[str]) -> list[int]:
+        hashes = [_token_hash(t) for t in tokens]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, tokens: frozenset[str]) -> list[tuple[int, tuple[int, ...]]]:
+        sig = self._signature(tokens)
+        r = self._rows
+        return [(i, tuple(sig[i * r : (i + 1) * r])) for i in range(self._bands)]
+
+    def _insert(self, tokens: frozenset[str], key: str) -> None:
+        idx = len(self._entries)
+        self._entries.append((tokens, key))
+        for band_key in self._band_keys(tokens):
+            self._buckets.setdefault(band_key, []).append(idx)
+
+    def add(self, prompt: str, key: str) -> None:
+        """プロンプトとそのキャッシュキーを登録する。"""
+        tokens = shingles(prompt)
+        if not tokens:
+            return
+        with self._lock:
+            self._insert(tokens, key)
+            if self._path:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                with self._path.open("a", encoding="utf-8") as fh:
+                    fh.write(json.dumps({"prompt": prompt, "key": key}, ensure_ascii=False) + "\n")
+
+    def query(self, prompt: str) -> Optional[str]:
+        """閾値以上で最も類似した登録済みプロンプトのキーを返す。"""
+        tokens = shingles(prompt)
+        if not tokens or not self._entries:
+            return None
+        band_keys = self._band_keys(tokens)
+        with self._lock:
+            candidates: set[int] = set()
+            for band_key in band_keys:
+                candidates.update(self._buckets.get(band_key, ()))
+            entries = [self._entries[idx] for idx in candidates]
+        best_key, best_sim = None, self.threshold
+        for entry_tokens, key in entries:
+            sim = jaccard(tokens, entry_tokens)
+            if sim >= best_sim:
+                best_key, best_sim = key, sim
+        return best_key
+
+    def _load(self) -> None:
+        assert self._path is not None
+        with self._path.open(encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 書き込み途中で中断された行
+                tokens = shingles(rec.get("prompt", ""))
+                if tokens and rec.get("key"):
+                    self._insert(tokens, rec["key"])
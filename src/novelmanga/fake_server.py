@@ -0,0 +1,645 @@
+"""負荷試験用のローカル・モデルサーバー（Gemini REST API 互換のスタンドイン）。
+
+記録済みレスポンス（transport.RecordStore）または合成した脚本・画像を返す。
+レイテンシ・エラー率・レート制限を設定でき、API クォータを消費せずに
+小説 1 冊分の処理をオフラインで計測できる。
+
+バッチ API（ファイルのアップロード・batchGenerateContent・ジョブの取得・
+結果ファイルのダウンロード）も模擬する。ジョブは batch_delay 秒後に完了し、
+それまでは PENDING / RUNNING を返す。batch_end_state を指定すると、ジョブは
+結果を出さずにその状態（BATCH_STATE_EXPIRED など）で終わる。
+
+複数コマのシート画像のプロンプト（generator.sheet_prompt）には、指定された
+コマ割りどおりに白いガターで区切ったシートを返す。
+
+コンテキストキャッシュ（cachedContents）も模擬する。cachedContent を参照した
+リクエストはキャッシュのシステムプロンプトを使って応答し（記録の再生キーは
+キャッシュを使わない場合と同じ）、usageMetadata.cachedContentTokenCount を返す。
+トークン数（文字数で代用）が cache_min_tokens に満たないキャッシュの作成は
+400 で拒否し、TTL を過ぎたキャッシュの参照は 403 を返す。
+
+使い方:
+    python -m novelmanga.fake_server --port 8765
+    python -m novelmanga.fake_server --record-dir recordings --latency 0.8 --error-rate 0.05 --rate-limit 10
+    python -m novelmanga.fake_server --batch-delay 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from .generator import SHEET_GRID, sheet_boxes
+from .schema import COMPACT_FORMAT, LAYOUT_CODES, PANEL_TYPE_CODES
+from .transport import RecordStore, record_to_rest, request_key
+
+_GENERATE_PATH = re.compile(r"^/[^/]+/models/([^/:]+):generateContent$")
+_BATCH_CREATE_PATH = re.compile(r"^/[^/]+/models/([^/:]+):batchGenerateContent$")
+_BATCH_GET_PATH = re.compile(r"^/[^/]+/batches/([^/:]+)$")
+_UPLOAD_PATH = re.compile(r"^/upload/[^/]+/files$")
+_DOWNLOAD_PATH = re.compile(r"^(?:/download)?/[^/]+/files/([^/:]+):download$")
+_CACHES_PATH = re.compile(r"^/[^/]+/cachedContents$")
+_CACHE_PATH = re.compile(r"^/[^/]+/cachedContents/([^/:]+)$")
+_TTL = re.compile(r"^(\d+(?:\.\d+)?)s$")
+_QUOTE = re.compile(r"「([^「」]{1,60})」")
+
+_SETTINGS = [
+    "dim room", "narrow alley at night", "school classroom", "seaside at dusk",
+    "crowded train station", "old wooden house", "rainy street", "quiet hospital corridor",
+]
+_SUBJECTS = [
+    "young man sitting alone", "two friends talking", "woman looking out the window",
+    "boy laughing nervously", "father reading a newspaper", "silhouette of a man",
+]
+_PANEL_TYPES = ["establishing", "dialogue", "action", "narration"]
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    errors: int = 0
+    throttled: int = 0
+    replayed: int = 0
+    synthetic: int = 0
+    malformed: int = 0
+    batches: int = 0
+    batch_requests: int = 0
+    context_caches: int = 0
+    cached_requests: int = 0
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+def _texts(content: Optional[dict]) -> str:
+    if not content:
+        return ""
+    return "".join(p.get("text", "") for p in content.get("parts", []))
+
+
+def synthetic_script(text: str, seed: int, compact: bool = False) -> str:
+    """入力テキストから決定的に合成した脚本 JSON を返す。
+
+    compact=True ではコンパクト形式（schema.COMPACT_FORMAT）で返す。
+    """
+    rng = random.Random(seed)
+    # 改ページの有無は別の乱数列から決める（他のフィールドの値を変えないため）
+    breaks = random.Random(seed + 1)
+    quotes = _QUOTE.findall(text)
+    n_scenes = max(1, min(8, len(text) // 600))
+    scenes = []
+    for s in range(1, n_scenes + 1):
+        panels = []
+        for p in range(1, rng.randint(1, 4) + 1):
+            dialogue = [quotes.pop(0)] if quotes and rng.random() < 0.6 else []
+            panels.append(
+                {
+                    "panel_number": p,
+                    "panel_type": rng.choice(_PANEL_TYPES),
+                    "visual_description": f"{rng.choice(_SETTINGS)}, {rng.choice(_SUBJECTS)}",
+                    "dialogue": dialogue,
+                    "narration": None,
+                }
+            )
+        scene = {"scene_number": s, "page_layout": rng.choice(["standard", "action", "emotional"]), "panels": panels}
+        if s > 1 and breaks.random() < 0.15:
+            scene["page_break"] = True
+        scenes.append(scene)
+    if compact:
+        short = []
+        for scene in scenes:
+            panels = []
+            for p in scene["panels"]:
+                panel = {"t": PANEL_TYPE_CODES[p["panel_type"]], "v": p["visual_description"]}
+                if p["dialogue"]:
+                    panel["d"] = p["dialogue"]
+                panels.append(panel)
+            item = {"l": LAYOUT_CODES[scene["page_layout"]], "p": panels}
+            if scene.get("page_break"):
+                item["b"] = True
+            short.append(item)
+        return json.dumps({"s": short}, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps({"scenes": scenes}, ensure_ascii=False)
+
+
+def synthetic_image(seed: int, size: int = 512) -> bytes:
+    """シードから決定的に生成したグレースケール PNG を返す。"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    img = Image.new("L", (size, size), color=rng.randint(180, 240))
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        x1, y1 = rng.randrange(size), rng.randrange(size)
+        x2, y2 = x1 + rng.randint(20, size // 2), y1 + rng.randint(20, size // 2)
+        draw.rectangle((x1, y1, x2, y2), fill=rng.randint(0, 160))
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def synthetic_sheet(seed: int, boxes: list[tuple[int, int, int, int]], size: tuple[int, int] = (768, 1086)) -> bytes:
+    """boxes（generator.SHEET_GRID 座標）の各コマに合成画像を描き、白いガターで区切ったシートを返す。"""
+    from PIL import Image, ImageDraw
+
+    w, h = size
+    sheet = Image.new("L", size, color=255)
+    draw = ImageDraw.Draw(sheet)
+    for i, (x1, y1, x2, y2) in enumerate(boxes):
+        box = (x1 * w // SHEET_GRID, y1 * h // SHEET_GRID, x2 * w // SHEET_GRID, y2 * h // SHEET_GRID)
+        panel = Image.open(io.BytesIO(synthetic_image(seed + i))).resize((box[2] - box[0], box[3] - box[1]))
+        sheet.paste(panel, box[:2])
+        draw.rectangle((box[0], box[1], box[2] - 1, box[3] - 1), outline=0, width=3)
+    buf = io.BytesIO()
+    sheet.save(buf, "PNG")
+    return buf.getvalue()
+
+
+class FakeModelServer:
+    """Gemini REST API の generateContent を模擬する HTTP サーバー。"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        record_dir: str | Path | None = None,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: Optional[float] = None,
+        malformed_rate: float = 0.0,
+        seed: int = 0,
+        output_token_latency: float = 0.0,
+        batch_delay: float = 0.0,
+        cache_min_tokens: int = 0,
+        batch_end_state: Optional[str] = None,
+    ) -> None:
+        self.store = RecordStore(record_dir) if record_dir else None
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.output_token_latency = output_token_latency
+        self.batch_delay = batch_delay
+        # 指定すると、バッチジョブは結果を出さずにこの状態（BATCH_STATE_EXPIRED など）で終わる
+        self.batch_end_state = batch_end_state
+        self.cache_min_tokens = cache_min_tokens
+        self.stats = ServerStats()
+        self._bucket = _TokenBucket(rate_limit) if rate_limit else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # バッチ API: アップロード中のファイル・保存済みファイル・ジョブ
+        self._uploads: dict[str, dict] = {}
+        self._files: dict[str, bytes] = {}
+        self._batches: dict[str, dict] = {}
+        # コンテキストキャッシュ: ID → システムプロンプト・内容・期限
+        self._cached: dict[str, dict] = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # ------------------------------------------------------------------
+    # ライフサイクル
+    # ------------------------------------------------------------------
+
+    def start(self) -> FakeModelServer:
+        """バックグラウンドスレッドでサーバーを起動する。"""
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> FakeModelServer:
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # リクエスト処理
+    # ------------------------------------------------------------------
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _delay(self) -> float:
+        with self._lock:
+            jitter = self._rng.uniform(-self.latency_jitter, self.latency_jitter)
+        return max(0.0, self.latency + jitter)
+
+    def handle_generate(self, model: str, body: dict) -> tuple[int, dict]:
+        """generateContent リクエストを処理し、(ステータス, JSON) を返す。"""
+        self._count("requests")
+        if self._bucket is not None and not self._bucket.try_acquire():
+            self._count("throttled")
+            return 429, _error(429, "RESOURCE_EXHAUSTED", "Rate limit exceeded (fake server)")
+        if self.error_rate and self._roll(self.error_rate):
+            self._count("errors")
+            return 503, _error(503, "UNAVAILABLE", "Injected failure (fake server)")
+
+        cached = None
+        if body.get("cachedContent"):
+            cached = self._lookup_cached(body["cachedContent"])
+            if cached is None:
+                return 403, _error(403, "PERMISSION_DENIED", f"CachedContent not found: {body['cachedContent']}")
+            self._count("cached_requests")
+
+        payload = self._respond(model, body, cached)
+        # 出力トークン数に比例する生成時間を模擬する
+        delay = self._delay() + payload["usageMetadata"]["candidatesTokenCount"] * self.output_token_latency
+        if delay:
+            time.sleep(delay)
+        return 200, payload
+
+    def _respond(self, model: str, body: dict, cached: Optional[dict] = None) -> dict:
+        """記録があれば再生し、なければ合成したレスポンスを返す。"""
+        system = _texts(body.get("systemInstruction"))
+        contents = "".join(_texts(c) for c in body.get("contents", []))
+        if cached is not None:
+            system = cached["system"]
+            contents = cached["contents"] + contents
+        key = request_key(model, system, contents)
+
+        record = self.store.load(key) if self.store else None
+        if record is not None:
+            self._count("replayed")
+            if cached is not None:
+                record = {**record, "usage": {**record.get("usage", {}), "cached_content_token_count": cached["tokens"]}}
+            return record_to_rest(record)
+
+        self._count("synthetic")
+        seed = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")
+        modalities = body.get("generationConfig", {}).get("responseModalities") or []
+        if "IMAGE" in modalities:
+            # 複数コマのシート（generator.sheet_prompt）はコマ割りどおりに描く
+            boxes = sheet_boxes(contents)
+            image = synthetic_sheet(seed, boxes) if boxes else synthetic_image(seed)
+            data = base64.b64encode(image).decode("ascii")
+            part = {"inline_data": {"mime_type": "image/png", "data": data}}
+        else:
+            script = synthetic_script(contents, seed, compact=COMPACT_FORMAT in system)
+            if self.malformed_rate and self._roll(self.malformed_rate):
+                # max_output_tokens で途中終了したような壊れた JSON
+                self._count("malformed")
+                script = script[: len(script) * 2 // 3]
+            part = {"text": script}
+        usage = {"prompt_token_count": len(system) + len(contents), "candidates_token_count": 0}
+        if "text" in part:
+            usage["candidates_token_count"] = len(part["text"]) // 2
+        if cached is not None:
+            usage["cached_content_token_count"] = cached["tokens"]
+        return record_to_rest({"parts": [part], "usage": usage})
+
+    # ------------------------------------------------------------------
+    # コンテキストキャッシュ
+    # ------------------------------------------------------------------
+
+    def create_cached(self, body: dict) -> tuple[int, dict]:
+        system = _texts(body.get("systemInstruction"))
+        contents = "".join(_texts(c) for c in body.get("contents", []))
+        tokens = len(system) + len(contents)
+        if tokens < self.cache_min_tokens:
+            return 400, _error(
+                400,
+                "INVALID_ARGUMENT",
+                f"Cached content is too small. total_token_count={tokens}, min_total_token_count={self.cache_min_tokens}",
+            )
+        m = _TTL.match(body.get("ttl", "3600s"))
+        ttl = float(m.group(1)) if m else 3600.0
+        entry = {
+            "id": uuid.uuid4().hex[:16],
+            "model": body.get("model", ""),
+            "system": system,
+            "contents": contents,
+            "tokens": tokens,
+            "displayName": body.get("displayName", ""),
+            "expires": time.monotonic() + ttl,
+            "expireTime": datetime.fromtimestamp(time.time() + ttl, timezone.utc).isoformat(),
+        }
+        self._count("context_caches")
+        with self._lock:
+            self._cached[entry["id"]] = entry
+        return 200, self._cached_resource(entry)
+
+    def get_cached(self, cache_id: str) -> tuple[int, dict]:
+        entry = self._lookup_cached(f"cachedContents/{cache_id}")
+        if entry is None:
+            return 403, _error(403, "PERMISSION_DENIED", f"CachedContent not found: {cache_id}")
+        return 200, self._cached_resource(entry)
+
+    def delete_cached(self, cache_id: str) -> tuple[int, dict]:
+        with self._lock:
+            self._cached.pop(cache_id, None)
+        return 200, {}
+
+    def _lookup_cached(self, name: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._cached.get(name.removeprefix("cachedContents/"))
+            if entry is not None and time.monotonic() >= entry["expires"]:
+                del self._cached[entry["id"]]
+                entry = None
+        return entry
+
+    @staticmethod
+    def _cached_resource(entry: dict) -> dict:
+        return {
+            "name": f"cachedContents/{entry['id']}",
+            "model": entry["model"],
+            "displayName": entry["displayName"],
+            "expireTime": entry["expireTime"],
+            "usageMetadata": {"totalTokenCount": entry["tokens"]},
+        }
+
+    # ------------------------------------------------------------------
+    # バッチ API
+    # ------------------------------------------------------------------
+
+    def create_upload(self, body: dict) -> str:
+        """再開可能アップロードを開始し、アップロード ID を返す。"""
+        upload_id = uuid.uuid4().hex[:16]
+        meta = body.get("file") or {}
+        with self._lock:
+            self._uploads[upload_id] = {"mimeType": meta.get("mimeType", "application/octet-stream"), "data": b""}
+        return upload_id
+
+    def append_upload(self, upload_id: str, data: bytes, finalize: bool) -> Optional[dict]:
+        """アップロードにデータを追加する。finalize なら保存したファイルの情報を返す。"""
+        with self._lock:
+            upload = self._uploads[upload_id]
+            upload["data"] += data
+            if not finalize:
+                return None
+            del self._uploads[upload_id]
+            self._files[upload_id] = upload["data"]
+        return {
+            "name": f"files/{upload_id}",
+            "mimeType": upload["mimeType"],
+            "sizeBytes": str(len(upload["data"])),
+            "state": "ACTIVE",
+        }
+
+    def create_batch(self, model: str, body: dict) -> tuple[int, dict]:
+        """入力ファイルの JSONL（{"key", "request"} の行）を受け付けてジョブを作る。"""
+        batch = body.get("batch") or {}
+        file_name = (batch.get("inputConfig") or {}).get("fileName", "")
+        with self._lock:
+            data = self._files.get(file_name.removeprefix("files/"))
+        if data is None:
+            return 400, _error(400, "INVALID_ARGUMENT", f"Unknown input file: {file_name}")
+        try:
+            lines = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return 400, _error(400, "INVALID_ARGUMENT", "Input file is not JSONL")
+        self._count("batches")
+        job = {
+            "id": uuid.uuid4().hex[:16],
+            "model": model,
+            "displayName": batch.get("displayName", ""),
+            "lines": lines,
+            "created": time.monotonic(),
+            "createTime": datetime.now(timezone.utc).isoformat(),
+            "output": None,
+            "processing": False,
+        }
+        with self._lock:
+            self._batches[job["id"]] = job
+        return 200, self._batch_resource(job)
+
+    def get_batch(self, batch_id: str) -> tuple[int, dict]:
+        with self._lock:
+            job = self._batches.get(batch_id)
+            # 同時に来たポーリングのうち 1 つだけが処理を引き受ける（ほかは処理中として RUNNING を返す）
+            claimed = (
+                job is not None
+                and job["output"] is None
+                and not job["processing"]
+                and time.monotonic() - job["created"] >= self.batch_delay
+            )
+            if claimed:
+                job["processing"] = True
+        if job is None:
+            return 404, _error(404, "NOT_FOUND", f"Unknown batch: {batch_id}")
+        if claimed and self.batch_end_state is not None:
+            job["state"] = self.batch_end_state
+        elif claimed:
+            # 完了時にまとめて処理し、結果を JSONL ファイルとして保存する（レイテンシ・エラー注入はしない）
+            results = []
+            for line in job["lines"]:
+                self._count("batch_requests")
+                results.append({"key": line.get("key"), "response": self._respond(job["model"], line.get("request", {}))})
+            out_id = f"{job['id']}-out"
+            raw = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results).encode("utf-8")
+            with self._lock:
+                self._files[out_id] = raw
+                job["output"] = f"files/{out_id}"
+        return 200, self._batch_resource(job)
+
+    def download(self, file_id: str) -> Optional[bytes]:
+        with self._lock:
+            return self._files.get(file_id)
+
+    def _batch_resource(self, job: dict) -> dict:
+        done = job["output"] is not None or "state" in job
+        if "state" in job:
+            state = job["state"]
+        elif job["output"] is not None:
+            state = "BATCH_STATE_SUCCEEDED"
+        elif time.monotonic() - job["created"] >= self.batch_delay / 2:
+            state = "BATCH_STATE_RUNNING"
+        else:
+            state = "BATCH_STATE_PENDING"
+        metadata = {
+            "@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch",
+            "model": f"models/{job['model']}",
+            "displayName": job["displayName"],
+            "state": state,
+            "createTime": job["createTime"],
+        }
+        if job["output"] is not None:
+            metadata["output"] = {"responsesFile": job["output"]}
+        return {"name": f"batches/{job['id']}", "metadata": metadata, "done": done}
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:  # noqa: N802
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length)
+                path, _, query = self.path.partition("?")
+                command = self.headers.get("X-Goog-Upload-Command", "")
+                if "upload" in command.split(", "):
+                    # 再開可能アップロードのデータ転送（JSON ではない）
+                    upload_id = query.removeprefix("upload_id=")
+                    try:
+                        file = server.append_upload(upload_id, raw, "finalize" in command)
+                    except KeyError:
+                        self._send(404, _error(404, "NOT_FOUND", "Unknown upload"))
+                        return
+                    status = "final" if file is not None else "active"
+                    self._send(200, {"file": file} if file else {}, {"X-Goog-Upload-Status": status})
+                    return
+                try:
+                    body = json.loads(raw or b"{}")
+                except json.JSONDecodeError:
+                    self._send(400, _error(400, "INVALID_ARGUMENT", "Invalid JSON body"))
+                    return
+                if _UPLOAD_PATH.match(path):
+                    upload_id = server.create_upload(body)
+                    url = f"{server.url}{path}?upload_id={upload_id}"
+                    self._send(200, {}, {"X-Goog-Upload-URL": url, "X-Goog-Upload-Status": "active"})
+                    return
+                m = _BATCH_CREATE_PATH.match(path)
+                if m:
+                    self._send(*server.create_batch(m.group(1), body))
+                    return
+                if _CACHES_PATH.match(path):
+                    self._send(*server.create_cached(body))
+                    return
+                m = _GENERATE_PATH.match(path)
+                if not m:
+                    self._send(404, _error(404, "NOT_FOUND", f"Unknown path: {path}"))
+                    return
+                self._send(*server.handle_generate(m.group(1), body))
+
+            def do_GET(self) -> None:  # noqa: N802
+                path = self.path.split("?", 1)[0]
+                m = _BATCH_GET_PATH.match(path)
+                if m:
+                    self._send(*server.get_batch(m.group(1)))
+                    return
+                m = _CACHE_PATH.match(path)
+                if m:
+                    self._send(*server.get_cached(m.group(1)))
+                    return
+                m = _DOWNLOAD_PATH.match(path)
+                data = server.download(m.group(1)) if m else None
+                if data is None:
+                    self._send(404, _error(404, "NOT_FOUND", f"Unknown path: {path}"))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_DELETE(self) -> None:  # noqa: N802
+                m = _CACHE_PATH.match(self.path.split("?", 1)[0])
+                if not m:
+                    self._send(404, _error(404, "NOT_FOUND", f"Unknown path: {self.path}"))
+                    return
+                self._send(*server.delete_cached(m.group(1)))
+
+            def _send(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+                raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(raw)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        return Handler
+
+
+def _error(code: int, status: str, message: str) -> dict:
+    return {"error": {"code": code, "message": message, "status": status}}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(
+        prog="python -m novelmanga.fake_server",
+        description="負荷試験用のローカル・モデルサーバー",
+    )
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--record-dir", default=None, help="記録済みレスポンスのディレクトリ")
+    p.add_argument("--latency", type=float, default=0.0, help="応答遅延（秒）")
+    p.add_argument("--latency-jitter", type=float, default=0.0, help="応答遅延のゆらぎ（±秒）")
+    p.add_argument("--error-rate", type=float, default=0.0, help="503 を返す確率（0〜1）")
+    p.add_argument("--rate-limit", type=float, default=None, help="1 秒あたりの許容リクエスト数")
+    p.add_argument("--malformed-rate", type=float, default=0.0, help="途中で切れた脚本 JSON を返す確率（0〜1）")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--output-token-latency", type=float, default=0.0, help="出力 1 トークンあたりの生成時間（秒）")
+    p.add_argument("--batch-delay", type=float, default=0.0, help="バッチジョブが完了するまでの時間（秒）")
+    p.add_argument(
+        "--cache-min-tokens", type=int, default=0, help="コンテキストキャッシュを作成できる最小トークン数（文字数で代用）"
+    )
+    args = p.parse_args()
+
+    server = FakeModelServer(
+        host=args.host,
+        port=args.port,
+        record_dir=args.record_dir,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+        output_token_latency=args.output_token_latency,
+        batch_delay=args.batch_delay,
+        cache_min_tokens=args.cache_min_tokens,
+    )
+    print(f"Fake model server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""プロセス共通の日本語フォントレジストリ。
+
+フォント候補の探索はプロセスにつき 1 回だけ行い、読み込んだ FreeTypeFont は
+(パス, サイズ) ごとに共有する。PageComposer をジョブごとに生成する
+サーバーやワーカープールでも、探索と読み込みのコストは最初の 1 回で済む。
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from typing import Optional
+
+from PIL import ImageFont
+
+Font = ImageFont.FreeTypeFont | ImageFont.ImageFont
+
+# 日本語フォントの候補（優先順）
+_FONT_CANDIDATES = [
+    # Windows
+    "C:/Windows/Fonts/YuGothM.ttc",
+    "C:/Windows/Fonts/meiryo.ttc",
+    "C:/Windows/Fonts/msgothic.ttc",
+    # macOS
+    "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc",
+    "/Library/Fonts/NotoSansCJK-Regular.ttc",
+    # Linux
+    "/usr/share/fonts/truetype/noto/NotoSansCJKjp-Regular.otf",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+]
+
+# PageComposer が使うサイズ（セリフ・ナレーション）
+DEFAULT_SIZES = (20, 17)
+
+
+def _fontconfig_lookup() -> Optional[str]:
+    """Linux では fontconfig に日本語対応フォントを問い合わせる。"""
+    if not sys.platform.startswith("linux") or not shutil.which("fc-match"):
+        return None
+    try:
+        result = subprocess.run(
+            ["fc-match", "--format=%{file}", ":lang=ja"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+            check=False,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    path = result.stdout.strip()
+    return path if result.returncode == 0 and path and os.path.exists(path) else None
+
+
+class FontRegistry:
+    """フォント候補の解決結果と読み込み済みフォントを保持する。"""
+
+    def __init__(self, candidates: Optional[list[str]] = None, use_fontconfig: bool = True) -> None:
+        self._candidates = tuple(candidates if candidates is not None else _FONT_CANDIDATES)
+        self._use_fontconfig = use_fontconfig
+        self._resolved = False
+        self._path: Optional[str] = None
+        self._fonts: dict[tuple[Optional[str], int], Font] = {}
+        self._failed: set[str] = set()
+        self._lock = threading.RLock()
+
+    def resolve(self) -> Optional[str]:
+        """使用するフォントファイルのパスを返す（見つからなければ None）。"""
+        with self._lock:
+            if not self._resolved:
+                self._path = self._find()
+                self._resolved = True
+            return self._path
+
+    def _find(self) -> Optional[str]:
+        for path in self._candidates:
+            if os.path.exists(path) and self._try_load(path, DEFAULT_SIZES[0]) is not None:
+                return path
+        if self._use_fontconfig:
+            path = _fontconfig_lookup()
+            if path and self._try_load(path, DEFAULT_SIZES[0]) is not None:
+                return path
+        return None
+
+    def _try_load(self, path: str, size: int) -> Optional[Font]:
+        key = (path, size)
+        font = self._fonts.get(key)
+        if font is None and path not in self._failed:
+            try:
+                font = ImageFont.truetype(path, size)
+            except Exception:
+                self._failed.add(path)
+                return None
+            self._fonts[key] = font
+        return font
+
+    def get(self, size: int, path: Optional[str] = None) -> Font:
+        """size のフォントを返す。path を指定するとそのフォントを優先する。"""
+        with self._lock:
+            if path:
+                font = self._try_load(path, size)
+                if font is not None:
+                    return font
+            resolved = self.resolve()
+            if resolved:
+                font = self._try_load(resolved, size)
+                if font is not None:
+                    return font
+            # 日本語フォントがない環境では Pillow 既定フォント（サイズ共通）を使う
+            key = (None, 0)
+            if key not in self._fonts:
+                self._fonts[key] = ImageFont.load_default()
+            return self._fonts[key]
+
+    def prewarm(self, sizes: tuple[int, ...] = DEFAULT_SIZES, path: Optional[str] = None) -> None:
+        """候補の探索とフォント読み込みを前もって済ませる。"""
+        for size in sizes:
+            self.get(size, path)
+
+
+_registry: Optional[FontRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> FontRegistry:
+    """プロセス共通の FontRegistry を返す。"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = FontRegistry()
+        return _registry
+
+
+def prewarm_fonts(font_path: Optional[str] = None) -> None:
+    """ワーカープロセスの initializer 用。フォントを事前に読み込む。"""
+    get_registry().prewarm(path=font_path)
@@ -1,16 +1,28 @@
 """Gemini API を使ったパネル画像生成モジュール。
 
 新しい google-genai SDK (google.genai) を使用。
+
+sheet_min_panels を指定すると、コマ数の多いシーンはページのコマ割りどおりに
+並べた 1 枚のシート画像としてまとめて生成し、ガター（コマ間の白い余白）を
+手がかりにコマごとに切り出す。切り出せなかった場合はコマごとに生成し直す。
 """
 
 from __future__ import annotations
 
 import io
 import os
-from typing import Optional
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
 
 from PIL import Image
 
+from .cache import DiskCache, content_key
+from .dedup import PromptIndex
+
 _MANGA_STYLE = (
     "manga style, black and white ink drawing, Japanese comic art, "
     "clean line art, detailed, high quality, monochrome"
@@ -18,21 +30,202 @@ _MANGA_STYLE = (
 
 _DEFAULT_MODEL = "gemini-2.0-flash-exp-image-generation"
 
+# シートのプロンプトでコマの位置を表す座標系（ページ全体を 0〜SHEET_GRID とする）
+SHEET_GRID = 1000
+SHEET_MARKER = "manga panel sheet"
+_SHEET_BOX = re.compile(r"^Panel \d+ at \((\d+), (\d+), (\d+), (\d+)\):", re.MULTILINE)
+# ガターとみなす明るさの下限（線上のすべての画素がこれ以上）
+_GUTTER_LEVEL = 245
+# 期待位置からガターを探す範囲（シートの幅・高さに対する割合）
+_SNAP_TOLERANCE = 0.04
+# 切り出したコマが期待する大きさのこの割合に満たなければ失敗とする
+_MIN_CROP_RATIO = 0.7
+
+
+@dataclass
+class GenerationStats:
+    """画像生成の呼び出し統計。"""
+
+    api_calls: int = 0
+    failures: int = 0
+    cache_hits: int = 0
+    similar_hits: int = 0
+    sheets: int = 0
+    sheet_panels: int = 0
+    sheet_fallbacks: int = 0
+    # API 呼び出しにかかった時間の合計（秒、実行計画の見積もりに使う）
+    api_seconds: float = 0.0
+    # 取り込んだバッチジョブの結果（api_calls には数えない）と、そのうち使えなかったもの
+    batch_results: int = 0
+    batch_failures: int = 0
+
+    @property
+    def calls_saved(self) -> int:
+        return self.cache_hits + self.similar_hits
+
+    @property
+    def sheet_calls_saved(self) -> int:
+        """シートでまとめて生成したことで減った呼び出し数（切り出しに失敗したシートの分を差し引く）。"""
+        return self.sheet_panels - self.sheets - self.sheet_fallbacks
+
+
+@dataclass
+class SceneImages:
+    """generate_scene_images() の結果。"""
+
+    images: list[Optional[Image.Image]] = field(default_factory=list)
+    calls: int = 0
+    generated: int = 0
+    fallback: bool = False
+
+    @property
+    def saved(self) -> int:
+        """コマごとに生成した場合と比べて減った呼び出し数（フォールバック時は -1）。"""
+        return self.generated - self.calls
+
+
+def sheet_prompt(
+    descriptions: list[str],
+    rects: list[tuple[int, int, int, int]],
+    page_size: tuple[int, int],
+) -> str:
+    """コマの矩形（ページ座標）と描写から、シート画像を生成するプロンプトを作る。"""
+    pw, ph = page_size
+    lines = [
+        f"A single {SHEET_MARKER}: one portrait page ({pw}x{ph}) divided into {len(rects)} panels, "
+        "each with a thin black frame, separated by wide pure white gutters.",
+        f"Panel boxes are (left, top, right, bottom) on a {SHEET_GRID}x{SHEET_GRID} grid over the whole page.",
+    ]
+    for i, (description, rect) in enumerate(zip(descriptions, rects), 1):
+        box = _grid_box(rect, page_size)
+        lines.append(f"Panel {i} at ({box[0]}, {box[1]}, {box[2]}, {box[3]}): {description}")
+    lines.append(_MANGA_STYLE)
+    return "\n".join(lines)
+
+
+def sheet_boxes(prompt: str) -> list[tuple[int, int, int, int]]:
+    """sheet_prompt() のプロンプトからコマの矩形（SHEET_GRID 座標）を読み取る。シートでなければ空。"""
+    if SHEET_MARKER not in prompt:
+        return []
+    return [tuple(int(v) for v in m.groups()) for m in _SHEET_BOX.finditer(prompt)]  # type: ignore[misc]
+
+
+def crop_sheet(sheet: Image.Image, boxes: list[tuple[int, int, int, int]]) -> Optional[list[Image.Image]]:
+    """シート画像を boxes（SHEET_GRID 座標）のコマごとに切り出す。
+
+    各辺を期待位置の近くにあるガター（すべての画素が白い線）に合わせ、
+    コマの枠線の分だけ内側を切り出す。コマ間の辺でガターが見つからない、
+    切り出した領域が小さすぎる、または真っ白な場合は None を返す。
+    """
+    gray = sheet.convert("L")
+    w, h = gray.size
+    inset = max(2, round(min(w, h) * 0.006))
+    crops = []
+    for gx1, gy1, gx2, gy2 in boxes:
+        x1, y1 = round(gx1 * w / SHEET_GRID), round(gy1 * h / SHEET_GRID)
+        x2, y2 = round(gx2 * w / SHEET_GRID), round(gy2 * h / SHEET_GRID)
+        edges = (
+            _snap_edge(gray, "x", x1, (y1, y2), 1),
+            _snap_edge(gray, "y", y1, (x1, x2), 1),
+            _snap_edge(gray, "x", x2, (y1, y2), -1),
+            _snap_edge(gray, "y", y2, (x1, x2), -1),
+        )
+        if None in edges:
+            return None
+        left, top, right, bottom = edges
+        box = (left + inset, top + inset, right - inset, bottom - inset)
+        if (
+            box[2] - box[0] < (x2 - x1) * _MIN_CROP_RATIO
+            or box[3] - box[1] < (y2 - y1) * _MIN_CROP_RATIO
+        ):
+            return None
+        crop = gray.crop(box)
+        if crop.getextrema()[0] >= _GUTTER_LEVEL:
+            return None
+        crops.append(crop)
+    return crops
+
+
+def _snap_edge(gray: Image.Image, axis: str, pos: int, span: tuple[int, int], inward: int) -> Optional[int]:
+    """pos の近くのガターを探し、コマ側の境界の位置を返す。
+
+    inward はコマの内側の向き（左・上の辺は +1、右・下の辺は -1）。
+    ページの外周の辺でガター（余白）がなければ pos をそのまま使う。
+    """
+    limit = gray.width if axis == "x" else gray.height
+    tolerance = max(2, round(limit * _SNAP_TOLERANCE))
+    # 角の近くは隣のコマの枠線と重なるので、辺の中央部分だけを見る
+    lo, hi = span
+    margin = (hi - lo) * 15 // 100
+    lo, hi = lo + margin, max(lo + margin + 1, hi - margin)
+
+    def is_gutter(p: int) -> bool:
+        line = (p, lo, p + 1, hi) if axis == "x" else (lo, p, hi, p + 1)
+        return gray.crop(line).getextrema()[0] >= _GUTTER_LEVEL
+
+    candidates = [p for p in range(max(0, pos - tolerance), min(limit, pos + tolerance + 1)) if is_gutter(p)]
+    if not candidates:
+        return min(max(pos, 0), limit) if pos <= tolerance or pos >= limit - tolerance else None
+    p = min(candidates, key=lambda c: abs(c - pos))
+    while 0 <= p + inward < limit and is_gutter(p + inward):
+        p += inward
+    return p + 1 if inward > 0 else p
+
+
+def image_cache_key(visual_description: str, model: str = _DEFAULT_MODEL) -> str:
+    """コマ画像のキャッシュキー（SDK を読み込まずにキャッシュを引く実行計画からも使う）。"""
+    return content_key(model, f"{visual_description}, {_MANGA_STYLE}")
+
 
 class ImageGenerator:
-    """Gemini API を用いてコマの背景画像を生成する。"""
+    """Gemini API を用いてコマの背景画像を生成する。
+
+    cache_dir を指定すると生成画像をプロンプト単位でディスクに保存し
+    （cache に cache.open_cache() の TieredCache などを渡すとそちらを使う）、
+    similarity_threshold を指定すると visual_description が類似する
+    既存画像を再利用して API 呼び出しを省略する。sheet_min_panels 以上の
+    コマがあるシーンは generate_scene_images() で 1 枚のシートとして生成する
+    （0 で無効）。
+    batch_request() / ingest() はバッチジョブ（batch.py）でキャッシュを
+    先に埋めるために使う。
+    """
 
     def __init__(
         self,
         api_key: str | None = None,
         model: str = _DEFAULT_MODEL,
+        cache_dir: str | Path | None = None,
+        similarity_threshold: float | None = None,
+        client: Any = None,
+        sheet_min_panels: int = 0,
+        cache: Any = None,
     ) -> None:
         from google import genai
 
-        resolved_key = api_key or os.environ.get("GOOGLE_API_KEY")
-        self._client = genai.Client(api_key=resolved_key)
+        if client is None:
+            resolved_key = api_key or os.environ.get("GOOGLE_API_KEY")
+            client = genai.Client(api_key=resolved_key)
+        self._client = client
         self._model = model
         self._genai = genai
+        self.sheet_min_panels = sheet_min_panels
+
+        self._cache = cache if cache is not None else (DiskCache(cache_dir) if cache_dir else None)
+        # ディスクキャッシュがない場合、類似検索用に実行中だけメモリに保持する
+        self._memory: dict[str, bytes] | None = (
+            {} if self._cache is None and similarity_threshold else None
+        )
+        self._index: PromptIndex | None = None
+        if similarity_threshold:
+            index_path = Path(cache_dir) / "prompt_index.jsonl" if cache_dir else None
+            self._index = PromptIndex(similarity_threshold, path=index_path)
+        self.stats = GenerationStats()
+        self._lock = threading.Lock()
+
+    def _count(self, field: str, n: int = 1) -> None:
+        # 複数スレッドから generate_panel_image() を呼んでも統計が欠けないようにする
+        with self._lock:
+            setattr(self.stats, field, getattr(self.stats, field) + n)
 
     def generate_panel_image(
         self,
@@ -44,18 +237,160 @@ class ImageGenerator:
 
         生成失敗時は None を返す（呼び出し元は None チェックすること）。
         """
-        from google.genai import types
+        prompt = f"{visual_description}, {_MANGA_STYLE}"
+        key = content_key(self._model, prompt)
 
+        raw = self._lookup(visual_description, key)
+        if raw is not None:
+            return self._decode(raw, width, height)
+        raw = self._request_image(prompt)
+        if raw is None:
+            return None
+        # デコードできない応答をキャッシュすると、以後そのプロンプトは再生成されない
+        img = self._decode(raw, width, height)
+        if img is None:
+            self._count("failures")
+            return None
+        self._cache_put(key, raw)
+        if self._index is not None:
+            self._index.add(visual_description, key)
+        return img
+
+    def cached_panel_image(
+        self,
+        visual_description: str,
+        width: int = 512,
+        height: int = 512,
+    ) -> Optional[Image.Image]:
+        """キャッシュ済みの画像だけを返す（API は呼ばない）。なければ None。"""
         prompt = f"{visual_description}, {_MANGA_STYLE}"
+        raw = self._lookup(visual_description, content_key(self._model, prompt))
+        return self._decode(raw, width, height) if raw is not None else None
+
+    def uses_sheet(self, n_panels: int) -> bool:
+        """n_panels コマのシーンをシートでまとめて生成するか。"""
+        return self.sheet_min_panels > 0 and n_panels >= max(2, self.sheet_min_panels)
+
+    def generate_scene_images(
+        self,
+        descriptions: list[str],
+        rects: list[tuple[int, int, int, int]],
+        page_size: tuple[int, int],
+        width: int = 512,
+        height: int = 512,
+    ) -> SceneImages:
+        """1 シーンのコマ画像を、ページのコマ割り（rects）どおりの 1 枚のシートとして生成する。
+
+        キャッシュ済みのコマはそのまま使い、2 コマ以上足りなければシートを 1 回だけ
+        リクエストして切り出す。切り出したコマはコマ単位のキャッシュに保存する。
+        切り出しに失敗したら、足りないコマを generate_panel_image() で生成する。
+        """
+        result = SceneImages([self.cached_panel_image(d, width, height) for d in descriptions])
+        missing = [i for i, img in enumerate(result.images) if img is None]
+        result.generated = len(missing)
+        if not missing:
+            return result
+
+        crops = None
+        if len(missing) >= 2:
+            raw = self._request_image(sheet_prompt(descriptions, rects, page_size))
+            result.calls += 1
+            if raw is not None:
+                try:
+                    crops = crop_sheet(Image.open(io.BytesIO(raw)), [_grid_box(r, page_size) for r in rects])
+                except Exception as e:
+                    print(f"Warning: Sheet decode failed: {e}")
+            if crops is None:
+                self._count("sheet_fallbacks")
+                result.fallback = True
+
+        if crops is None:
+            for i in missing:
+                result.images[i] = self.generate_panel_image(descriptions[i], width, height)
+                result.calls += 1
+            return result
+
+        self._count("sheets")
+        self._count("sheet_panels", len(missing))
+        for i in missing:
+            buf = io.BytesIO()
+            crops[i].save(buf, "PNG")
+            key = self.cache_key(descriptions[i])
+            self._cache_put(key, buf.getvalue())
+            if self._index is not None:
+                self._index.add(descriptions[i], key)
+            result.images[i] = crops[i].resize((width, height), Image.LANCZOS)
+        return result
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    def cache_key(self, visual_description: str) -> str:
+        return image_cache_key(visual_description, self._model)
 
+    def is_cached(self, visual_description: str) -> bool:
+        """完全一致か類似プロンプトの画像がキャッシュにあるか（統計は数えない）。"""
+        return self._lookup(visual_description, self.cache_key(visual_description), count=False) is not None
+
+    def batch_request(self, visual_description: str) -> dict:
+        """_request_image と同じリクエストを、バッチ入力ファイル用の REST 形式で返す。"""
+        return {
+            "contents": [{"role": "user", "parts": [{"text": f"{visual_description}, {_MANGA_STYLE}"}]}],
+            "generationConfig": {"responseModalities": ["IMAGE", "TEXT"]},
+        }
+
+    def ingest(self, visual_description: str, raw: Optional[bytes]) -> bool:
+        """バッチジョブで生成した画像をキャッシュに保存する（デコードできなければ保存しない）。"""
+        self._count("batch_results")
+        if raw is None or not _decodable(raw):
+            self._count("batch_failures")
+            return False
+        key = self.cache_key(visual_description)
+        self._cache_put(key, raw)
+        if self._index is not None:
+            self._index.add(visual_description, key)
+        return True
+
+    def _lookup(self, visual_description: str, key: str, count: bool = True) -> Optional[bytes]:
+        """完全一致、次に類似プロンプトでキャッシュを引く。"""
+        raw = self._cache_get(key)
+        if raw is not None:
+            if count:
+                self._count("cache_hits")
+        elif self._index is not None:
+            similar = self._index.query(visual_description)
+            if similar is not None:
+                raw = self._cache_get(similar)
+                if raw is not None and count:
+                    self._count("similar_hits")
+        return raw
+
+    def _decode(self, raw: bytes, width: int, height: int) -> Optional[Image.Image]:
+        try:
+            img = Image.open(io.BytesIO(raw))
+            return img.resize((width, height), Image.LANCZOS)
+        except Exception as e:
+            print(f"Warning: Image decode failed: {e}")
+            return None
+
+    def _request_image(self, prompt: str) -> Optional[bytes]:
+        """API を呼び出して画像のバイト列を返す。"""
+        from google.genai import types
+
+        self._count("api_calls")
         try:
-            response = self._client.models.generate_content(
-                model=self._model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_modalities=["IMAGE", "TEXT"],
-                ),
-            )
+            t0 = time.perf_counter()
+            try:
+                response = self._client.models.generate_content(
+                    model=self._model,
+                    contents=prompt,
+                    config=types.GenerateContentConfig(
+                        response_modalities=["IMAGE", "TEXT"],
+                    ),
+                )
+            finally:
+                self._count("api_seconds", time.perf_counter() - t0)
 
             for part in response.candidates[0].content.parts:
                 inline = getattr(part, "inline_data", None)
@@ -63,14 +398,45 @@ class ImageGenerator:
                     raw = inline.data
                     # SDK が bytes を返す場合
                     if isinstance(raw, (bytes, bytearray)):
-                        img = Image.open(io.BytesIO(raw))
-                    else:
-                        # base64 文字列で返ってくる場合
-                        import base64
-                        img = Image.open(io.BytesIO(base64.b64decode(raw)))
-                    return img.resize((width, height), Image.LANCZOS)
+                        return bytes(raw)
+                    # base64 文字列で返ってくる場合
+                    import base64
+                    return base64.b64decode(raw)
 
         except Exception as e:
             print(f"Warning: Image generation failed: {e}")
 
+        self._count("failures")
+        return None
+
+    def _cache_get(self, key: str) -> Optional[bytes]:
+        if self._cache is not None:
+            return self._cache.get(key)
+        if self._memory is not None:
+            return self._memory.get(key)
         return None
+
+    def _cache_put(self, key: str, raw: bytes) -> None:
+        if self._cache is not None:
+            self._cache.put(key, raw)
+        elif self._memory is not None:
+            with self._lock:
+                self._memory[key] = raw
+
+
+def _decodable(raw: bytes) -> bool:
+    """raw が画像としてデコードできるか。"""
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            img.load()
+    except Exception as e:
+        print(f"Warning: Image decode failed: {e}")
+        return False
+    return True
+
+
+def _grid_box(rect: tuple[int, int, int, int], page_size: tuple[int, int]) -> tuple[int, int, int, int]:
+    """ページ座標の矩形を SHEET_GRID 座標に変換する（sheet_prompt と同じ丸め）。"""
+    pw, ph = page_size
+    x1, y1, x2, y2 = rect
+    return (x1 * SHEET_GRID // pw, y1 * SHEET_GRID // ph, x2 * SHEET_GRID // pw, y2 * SHEET_GRID // ph)
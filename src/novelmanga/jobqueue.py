@@ -0,0 +1,329 @@
+"""複数プロセス・複数ホストで処理を分担するための永続ジョブキュー。
+
+ジョブは種類（analysis / image / compose）・ペイロード・依存ジョブを持ち、
+ワーカーはリース（一定時間の占有権）を取って実行する。リースが切れた
+ジョブ（ワーカーの異常終了など）は別のワーカーが再取得する。失敗したジョブは
+max_attempts 回まで指数バックオフで再試行する。
+
+ジョブ ID は投入側が決める。同じ ID の再投入は無視され、結果は最初に
+完了したものだけが保存される（冪等）。
+
+バックエンドは ``JobQueue`` を実装すれば差し替えられる。標準は SQLite
+（``SQLiteJobQueue``）で、共有ファイルシステム上のファイルを複数ホストから
+開くこともできる（WAL モード）。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+# ジョブの状態
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+JOB_KINDS = ("analysis", "image", "compose")
+
+
+@dataclass
+class Job:
+    """キュー上のジョブ。"""
+
+    id: str
+    kind: str
+    payload: dict
+    status: str = PENDING
+    priority: int = 0
+    attempts: int = 0
+    max_attempts: int = 3
+    deps: list[str] = field(default_factory=list)
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+
+class JobQueue(ABC):
+    """ジョブキューのバックエンドの共通インターフェース。"""
+
+    @abstractmethod
+    def submit(
+        self,
+        job_id: str,
+        kind: str,
+        payload: dict,
+        deps: Iterable[str] = (),
+        priority: int = 0,
+        max_attempts: int = 3,
+    ) -> bool:
+        """ジョブを投入する。同じ ID が既にあれば何もせず False を返す。"""
+
+    @abstractmethod
+    def lease(
+        self, owner: str, kinds: Optional[Iterable[str]] = None, lease_seconds: float = 300.0
+    ) -> Optional[Job]:
+        """実行可能なジョブを 1 件リースする。なければ None。"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, owner: str, lease_seconds: float = 300.0) -> bool:
+        """リースを延長する。既にリースを失っていれば False。"""
+
+    @abstractmethod
+    def complete(self, job_id: str, owner: str, result: Any = None) -> bool:
+        """ジョブを完了にして結果を保存する。リースを失っていれば False。"""
+
+    @abstractmethod
+    def fail(self, job_id: str, owner: str, error: str, retry: bool = True) -> bool:
+        """ジョブの失敗を記録する。再試行回数が残っていれば待機状態に戻す。"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        """ジョブを取得する。"""
+
+    @abstractmethod
+    def counts(self) -> dict[str, int]:
+        """状態ごとのジョブ数を返す。"""
+
+    def results(self, job_ids: Iterable[str]) -> dict[str, Any]:
+        """完了したジョブの結果をまとめて返す。"""
+        out = {}
+        for job_id in job_ids:
+            job = self.get(job_id)
+            if job is not None and job.status == DONE:
+                out[job_id] = job.result
+        return out
+
+    def close(self) -> None:
+        pass
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,
+    kind          TEXT NOT NULL,
+    payload       TEXT NOT NULL,
+    status        TEXT NOT NULL,
+    priority      INTEGER NOT NULL DEFAULT 0,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL DEFAULT 3,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    not_before    REAL NOT NULL DEFAULT 0,
+    result        TEXT,
+    error         TEXT,
+    created       REAL NOT NULL,
+    updated       REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deps (
+    job_id TEXT NOT NULL,
+    dep_id TEXT NOT NULL,
+    PRIMARY KEY (job_id, dep_id)
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, created);
+CREATE INDEX IF NOT EXISTS deps_dep ON deps (dep_id);
+"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """SQLite ファイルに保存するジョブキュー。
+
+    リースの取得は BEGIN IMMEDIATE のトランザクションで行うため、
+    複数プロセスが同時に lease() しても同じジョブを二重に取ることはない。
+    """
+
+    def __init__(self, path: str | Path, retry_backoff: float = 2.0, timeout: float = 30.0) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.retry_backoff = retry_backoff
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def _tx(self) -> _Transaction:
+        return _Transaction(self._conn, self._lock)
+
+    def submit(
+        self,
+        job_id: str,
+        kind: str,
+        payload: dict,
+        deps: Iterable[str] = (),
+        priority: int = 0,
+        max_attempts: int = 3,
+    ) -> bool:
+        now = time.time()
+        with self._tx() as cur:
+            cur.execute(
+                "INSERT OR IGNORE INTO jobs (id, kind, payload, status, priority, max_attempts, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), PENDING, priority, max_attempts, now, now),
+            )
+            if cur.rowcount == 0:
+                return False
+            cur.executemany(
+                "INSERT OR IGNORE INTO deps (job_id, dep_id) VALUES (?, ?)",
+                [(job_id, dep) for dep in deps],
+            )
+        return True
+
+    def lease(
+        self, owner: str, kinds: Optional[Iterable[str]] = None, lease_seconds: float = 300.0
+    ) -> Optional[Job]:
+        now = time.time()
+        kind_list = list(kinds) if kinds else list(JOB_KINDS)
+        marks = ",".join("?" * len(kind_list))
+        with self._tx() as cur:
+            # リース切れのジョブのうち、再試行回数を使い切ったものは失敗にする
+            cur.execute(
+                "UPDATE jobs SET status = ?, error = 'lease expired', lease_owner = NULL, updated = ?"
+                " WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (FAILED, now, LEASED, now),
+            )
+            # 依存ジョブが失敗したジョブは実行できない
+            cur.execute(
+                "UPDATE jobs SET status = ?, error = 'dependency failed', updated = ?"
+                " WHERE status = ? AND EXISTS (SELECT 1 FROM deps d JOIN jobs j ON j.id = d.dep_id"
+                " WHERE d.job_id = jobs.id AND j.status = ?)",
+                (FAILED, now, PENDING, FAILED),
+            )
+            row = cur.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({marks})"
+                " AND ((status = ? AND not_before <= ?) OR (status = ? AND lease_expires < ?))"
+                # 未投入の依存ジョブも「未完了」として扱う
+                " AND NOT EXISTS (SELECT 1 FROM deps d LEFT JOIN jobs j ON j.id = d.dep_id"
+                " WHERE d.job_id = jobs.id AND (j.status IS NULL OR j.status != ?))"
+                " ORDER BY priority, created, id LIMIT 1",
+                (*kind_list, PENDING, now, LEASED, now, DONE),
+            ).fetchone()
+            if row is None:
+                return None
+            cur.execute(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                " updated = ? WHERE id = ?",
+                (LEASED, owner, now + lease_seconds, now, row["id"]),
+            )
+            job = self._to_job(cur, row)
+            job.status = LEASED
+            job.attempts += 1
+            return job
+
+    def heartbeat(self, job_id: str, owner: str, lease_seconds: float = 300.0) -> bool:
+        now = time.time()
+        with self._tx() as cur:
+            cur.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, LEASED, owner),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: str, owner: str, result: Any = None) -> bool:
+        now = time.time()
+        with self._tx() as cur:
+            cur.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL, updated = ?"
+                " WHERE id = ? AND status = ? AND lease_owner = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), now, job_id, LEASED, owner),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id: str, owner: str, error: str, retry: bool = True) -> bool:
+        now = time.time()
+        with self._tx() as cur:
+            row = cur.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                (job_id, LEASED, owner),
+            ).fetchone()
+            if row is None:
+                return False
+            if retry and row["attempts"] < row["max_attempts"]:
+                delay = self.retry_backoff * 2 ** (row["attempts"] - 1)
+                cur.execute(
+                    "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, not_before = ?, updated = ?"
+                    " WHERE id = ?",
+                    (PENDING, error, now + delay, now, job_id),
+                )
+            else:
+                cur.execute(
+                    "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, updated = ? WHERE id = ?",
+                    (FAILED, error, now, job_id),
+                )
+            return True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._tx() as cur:
+            row = cur.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._to_job(cur, row) if row is not None else None
+
+    def counts(self) -> dict[str, int]:
+        with self._tx() as cur:
+            rows = cur.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {s: 0 for s in (PENDING, LEASED, DONE, FAILED)}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _to_job(self, cur: sqlite3.Cursor, row: sqlite3.Row) -> Job:
+        deps = [r["dep_id"] for r in cur.execute("SELECT dep_id FROM deps WHERE job_id = ?", (row["id"],))]
+        return Job(
+            id=row["id"],
+            kind=row["kind"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            priority=row["priority"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            deps=deps,
+            result=json.loads(row["result"]) if row["result"] is not None else None,
+            error=row["error"],
+        )
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE 〜 COMMIT を囲むコンテキストマネージャ。"""
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.Lock) -> None:
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self) -> sqlite3.Cursor:
+        self._lock.acquire()
+        try:
+            self._cur = self._conn.cursor()
+            self._cur.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._cur
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        try:
+            self._cur.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+        finally:
+            self._lock.release()
+
+
+def open_queue(spec: str | Path) -> JobQueue:
+    """キューを開く。``sqlite:///path/to/jobs.db`` またはファイルパスを受け付ける。"""
+    text = str(spec)
+    if "://" in text:
+        scheme, _, rest = text.partition("://")
+        if scheme != "sqlite":
+            raise ValueError(f"Unsupported queue backend: {scheme}")
+        # sqlite:///jobs.db は相対パス、sqlite:////var/jobs.db は絶対パス
+        text = rest[1:] if rest.startswith("/") else rest
+    return SQLiteJobQueue(text)
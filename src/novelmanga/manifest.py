@@ -0,0 +1,157 @@
+"""マニフェスト（manga-manifest.json）の章構成と書き出し。
+
+scripts/generate_manifest.py・アーカイブ出力・逐次公開（pipeline）で
+同じ章分割と書き出し方を使うための共通定義。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+MANIFEST_NAME = "manga-manifest.json"
+# 作品の生成状況（novel["status"]）
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_COMPLETE = "complete"
+
+_upsert_lock = threading.Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class ChapterSpec:
+    """章の ID・タイトルと、含まれるページの範囲 [start, end)（0 始まり）。"""
+
+    id: str
+    title: str
+    start: int
+    end: int
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+
+def plan_chapters(total_pages: int, pages_per_chapter: int = 0) -> list[ChapterSpec]:
+    """total_pages ページを章に分割する。
+
+    pages_per_chapter=0 の場合、全ページを1章として扱う。
+    """
+    if total_pages <= 0:
+        return []
+    size = pages_per_chapter if pages_per_chapter > 0 else total_pages
+    starts = range(0, total_pages, size)
+    single = len(starts) == 1
+    return [
+        ChapterSpec(
+            id=f"chapter_{idx:02d}",
+            title="全編" if single else f"第{idx}章",
+            start=start,
+            end=min(start + size, total_pages),
+        )
+        for idx, start in enumerate(starts, 1)
+    ]
+
+
+def split_chapters(pages: list[str], pages_per_chapter: int = 0) -> list[dict]:
+    """ページ名のリストをマニフェストの chapters 形式に分割する。"""
+    return [
+        {"id": ch.id, "title": ch.title, "pages": pages[ch.start : ch.end]}
+        for ch in plan_chapters(len(pages), pages_per_chapter)
+    ]
+
+
+def novel_entry(
+    novel_id: str,
+    title: str,
+    author: str,
+    pages: list[str],
+    pages_per_chapter: int = 0,
+    status: Optional[str] = None,
+) -> dict:
+    """マニフェストの novels 要素を構築する。pages は相対URLのリスト。"""
+    novel = {
+        "id": novel_id,
+        "title": title,
+        "author": author,
+        "coverImage": pages[0] if pages else "",
+        "chapters": split_chapters(pages, pages_per_chapter),
+    }
+    if status is not None:
+        novel["status"] = status
+    return novel
+
+
+def write_manifest(path: str | Path, manifest: dict) -> None:
+    """マニフェストを一時ファイル経由で置き換える（読み手が途中の JSON を見ない）。"""
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=out.parent, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, ensure_ascii=False, indent=2)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, out)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _load_novels(path: str | Path) -> list[dict]:
+    try:
+        existing = json.loads(Path(path).read_text(encoding="utf-8"))
+        return list(existing.get("novels", []))
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+        return []
+
+
+def _write_novels(path: str | Path, novels: list[dict]) -> dict:
+    manifest = {
+        "version": 1,
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+        "novels": novels,
+    }
+    write_manifest(path, manifest)
+    return manifest
+
+
+def upsert_novel(path: str | Path, novel: dict) -> dict:
+    """既存のマニフェストの同じ ID の作品を novel で置き換えて書き出す。
+
+    他の作品はそのまま残す。マニフェストがなければ新規に作成する。
+    同じプロセス内で複数の作品を並行して公開しても更新が失われないよう、
+    読み込みから書き出しまでをロックで直列化する。
+    """
+    with _upsert_lock:
+        novels = [n for n in _load_novels(path) if n.get("id") != novel["id"]]
+        return _write_novels(path, [*novels, novel])
+
+
+def upsert_chapters(
+    path: str | Path,
+    novel_id: str,
+    title: str,
+    author: str,
+    chapters: list[dict],
+) -> dict:
+    """作品の章を ID ごとに置き換えて書き出す（--chapters で一部の章だけ生成した場合）。
+
+    作品の他の章・他の作品はそのまま残し、章は ID 順に並べる。
+    作品がなければ新規に作成する。
+    """
+    with _upsert_lock:
+        novels = _load_novels(path)
+        novel = next((n for n in novels if n.get("id") == novel_id), None)
+        if novel is None:
+            novel = {"id": novel_id, "title": title, "author": author, "chapters": []}
+            novels.append(novel)
+        replaced = {ch["id"] for ch in chapters}
+        merged = [ch for ch in novel.get("chapters", []) if ch.get("id") not in replaced] + chapters
+        novel["chapters"] = sorted(merged, key=lambda ch: ch["id"])
+        first = next((ch["pages"][0] for ch in novel["chapters"] if ch.get("pages")), "")
+        novel["coverImage"] = first
+        return _write_novels(path, novels)
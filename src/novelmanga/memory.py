@@ -0,0 +1,225 @@
+"""メモリ使用量の取得と、上限を超えたときのパネル画像の退避。
+
+長い小説では生成したパネル画像をすべてメモリに持つと OOM になる。
+``PanelImageStore`` はパネル画像をキーごとに預かり、``MemoryBudget`` の
+上限を超えたら古いものから一時ディレクトリの PNG に退避して、取り出すときに
+読み戻す。``MemoryBudget.throttle()`` は画像生成の前に呼び、上限を超えて
+いれば退避・GC を行い、それでも下がらなければ少し待つ。
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Hashable, Optional
+
+from PIL import Image
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(text: str) -> int:
+    """"512M" や "2G" のようなサイズ指定をバイト数にする。単位なしはバイト。"""
+    m = _SIZE.match(text)
+    if not m:
+        raise ValueError(f"Invalid size: {text!r}")
+    return int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+
+
+def size_arg(text: str) -> int:
+    """argparse の type= 用。parse_size のエラーを argparse のエラーにする。"""
+    try:
+        return parse_size(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def current_rss() -> int:
+    """現在の常駐メモリ（RSS）をバイト数で返す。取得できなければ 0。
+
+    Linux では /proc/self/statm、それ以外では resource のピーク値で代用する。
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux は KiB
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def image_nbytes(img: Image.Image) -> int:
+    """画像のピクセルデータの概算バイト数。"""
+    return img.width * img.height * len(img.getbands())
+
+
+@dataclass
+class BudgetStats:
+    spilled: int = 0
+    spilled_bytes: int = 0
+    reloaded: int = 0
+    throttled: int = 0
+    throttle_seconds: float = 0.0
+
+
+class PanelImageStore:
+    """パネル画像をキーごとに預かり、上限を超えたらディスクに退避する。
+
+    max_bytes は預かっている画像（メモリ上の分）の合計の上限。None なら
+    退避しない。退避先は spill_dir（省略時は一時ディレクトリ）で、close() で
+    削除する。
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, spill_dir: str | Path | None = None) -> None:
+        self.max_bytes = max_bytes
+        self.stats = BudgetStats()
+        self.bytes = 0
+        self.peak_bytes = 0
+        self._spill_root = Path(spill_dir) if spill_dir else None
+        self._spill_dir: Optional[Path] = None
+        self._memory: OrderedDict[Hashable, Image.Image] = OrderedDict()
+        self._disk: dict[Hashable, Path] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._memory) + len(self._disk)
+
+    def put(self, key: Hashable, img: Optional[Image.Image]) -> None:
+        """画像を預ける。None は預からない（pop で None が返る）。"""
+        if img is None:
+            return
+        with self._lock:
+            self._memory[key] = img
+            self.bytes += image_nbytes(img)
+            if self.max_bytes is not None:
+                self._spill_until(self.max_bytes)
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+
+    def pop(self, key: Hashable) -> Optional[Image.Image]:
+        """預けた画像を取り出す。退避済みなら読み戻す。"""
+        with self._lock:
+            img = self._memory.pop(key, None)
+            if img is not None:
+                self.bytes -= image_nbytes(img)
+                return img
+            path = self._disk.pop(key, None)
+        if path is None:
+            return None
+        with Image.open(path) as f:
+            img = f.copy()
+        path.unlink(missing_ok=True)
+        with self._lock:
+            self.stats.reloaded += 1
+        return img
+
+    def spill(self, target_bytes: int = 0) -> int:
+        """メモリ上の画像を古いものから退避し、target_bytes 以下にする。退避した件数を返す。"""
+        with self._lock:
+            return self._spill_until(target_bytes)
+
+    def _spill_until(self, target_bytes: int) -> int:
+        spilled = 0
+        while self.bytes > target_bytes and self._memory:
+            key, img = self._memory.popitem(last=False)
+            path = self._spill_path()
+            # 退避は速度優先。読み戻すだけなので圧縮は最小限にする
+            img.save(path, "PNG", compress_level=1)
+            self._disk[key] = path
+            n = image_nbytes(img)
+            self.bytes -= n
+            self.stats.spilled += 1
+            self.stats.spilled_bytes += n
+            spilled += 1
+        return spilled
+
+    def _spill_path(self) -> Path:
+        if self._spill_dir is None:
+            if self._spill_root is not None:
+                self._spill_root.mkdir(parents=True, exist_ok=True)
+            self._spill_dir = Path(tempfile.mkdtemp(prefix="novelmanga-spill-", dir=self._spill_root))
+        self._seq += 1
+        return self._spill_dir / f"{self._seq:08d}.png"
+
+    def close(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._disk.clear()
+            self.bytes = 0
+            if self._spill_dir is not None:
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+                self._spill_dir = None
+
+    def __enter__(self) -> PanelImageStore:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class MemoryBudget:
+    """プロセスの RSS の上限。超えたらパネル画像を退避し、生成を遅らせる。
+
+    store がメモリ上に持つ画像は上限の 1/4 までに制限する（RSS を取得
+    できない環境でも預かる画像の量は上限を守る）。待っても RSS が下がら
+    なかった後は、退避と GC だけ行い待たない。
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        store: Optional[PanelImageStore] = None,
+        max_wait: float = 5.0,
+        poll: float = 0.05,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.store = store if store is not None else PanelImageStore()
+        share = max_bytes // 4
+        if self.store.max_bytes is None or self.store.max_bytes > share:
+            self.store.max_bytes = share
+        self.max_wait = max_wait
+        self.poll = poll
+        self._futile = False
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> BudgetStats:
+        return self.store.stats
+
+    def over(self) -> bool:
+        return current_rss() > self.max_bytes
+
+    def throttle(self) -> None:
+        """上限を超えていれば退避・GC し、下回るまで（最大 max_wait 秒）待つ。"""
+        if not self.over():
+            self._futile = False
+            return
+        self.store.spill()
+        gc.collect()
+        if not self.over() or self._futile:
+            return
+        t0 = time.perf_counter()
+        deadline = t0 + self.max_wait
+        while self.over() and time.perf_counter() < deadline:
+            time.sleep(self.poll)
+        with self._lock:
+            self.stats.throttled += 1
+            self.stats.throttle_seconds += time.perf_counter() - t0
+            self._futile = self.over()
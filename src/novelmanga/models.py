@@ -21,25 +21,74 @@ class PageLayout(Enum):
     EMOTIONAL = "emotional"
 
 
-@dataclass
+@dataclass(slots=True)
 class Panel:
     panel_number: int
     panel_type: PanelType
     visual_description: str
     dialogue: list[str] = field(default_factory=list)
     narration: Optional[str] = None
+    # 実行時のみ保持する生画像。script_io ではシリアライズしない。
     image_data: Optional[bytes] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Scene:
     scene_number: int
     source_text: str
     panels: list[Panel] = field(default_factory=list)
     page_layout: str = "standard"
+    # 解析元チャンクの ID と、クリーンテキスト上の文字位置 [start, end)
+    chunk_id: str = ""
+    source_span: Optional[tuple[int, int]] = None
+    # True ならこのシーンは新しいページから始める（章の変わり目・大きな場面転換）
+    page_break: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
+class Chunk:
+    """解析 API に送るテキストの単位。"""
+
+    chunk_id: str
+    text: str
+    start: int
+    end: int
+
+
+@dataclass(slots=True)
+class Heading:
+    """青空文庫の見出し注記（［＃「…」は大見出し］など）。
+
+    level は 1=大見出し・2=中見出し・3=小見出し。byte_offset は元ファイル上の、
+    char_offset はデコードしたテキスト上の、見出し行の先頭位置。
+    """
+
+    title: str
+    level: int
+    line: int
+    byte_offset: int
+    char_offset: int
+
+
+@dataclass(slots=True)
+class SourceChapter:
+    """最上位の見出しで区切った章。範囲は元ファイル上の [start, end)。"""
+
+    number: int
+    title: str
+    byte_start: int
+    byte_end: int
+    char_start: int
+    char_end: int
+    sections: list[Heading] = field(default_factory=list)
+
+    @property
+    def id(self) -> str:
+        """マニフェスト・アーカイブの章 ID（manifest.plan_chapters と同じ形式）。"""
+        return f"chapter_{self.number:02d}"
+
+
+@dataclass(slots=True)
 class MangaPage:
     page_number: int
     scene: Scene
@@ -0,0 +1,268 @@
+"""S3 互換オブジェクトストアのキャッシュ・バックエンドとローカルのスタンドイン。
+
+ObjectStoreCache は http(s)://HOST/BUCKET/PREFIX の形の URL（パス形式）に
+対して GET / PUT / HEAD でエントリを読み書きし、cache.TieredCache の
+共有階層として使う。環境変数 AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY が
+あればリクエストに署名（AWS Signature Version 4、リージョンは AWS_REGION、
+省略時 us-east-1）する。エントリは DiskCache と同じく seal した形式で置き、
+読み出し時に内容のハッシュを照合する。
+
+LocalObjectStore はオブジェクトをディレクトリに置くだけの HTTP サーバーで、
+S3 の代わりに複数のワーカーからキャッシュを共有する試験に使う（署名は検証しない）。
+
+使い方:
+    python -m novelmanga.objectstore --port 9000 --root /srv/novelmanga-cache
+    python -m novelmanga input.txt --cache-dir .cache --cache-shared http://127.0.0.1:9000/novelmanga
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import os
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+from .cache import seal, unseal
+
+_EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+def sign_v4(
+    method: str,
+    url: str,
+    headers: dict[str, str],
+    payload_sha256: str,
+    access_key: str,
+    secret_key: str,
+    region: str = "us-east-1",
+    service: str = "s3",
+    now: Optional[datetime] = None,
+) -> dict[str, str]:
+    """AWS Signature Version 4 の署名ヘッダーを加えたヘッダーを返す（クエリなしの URL 用）。"""
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+    parts = urlsplit(url)
+    signed = {k.lower(): v.strip() for k, v in headers.items()}
+    signed.update({"host": parts.netloc, "x-amz-content-sha256": payload_sha256, "x-amz-date": amz_date})
+    names = sorted(signed)
+    canonical = "\n".join(
+        [
+            method,
+            parts.path or "/",
+            parts.query,
+            "".join(f"{name}:{signed[name]}\n" for name in names),
+            ";".join(names),
+            payload_sha256,
+        ]
+    )
+    scope = f"{date}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join(
+        ["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode()).hexdigest()]
+    )
+    key = ("AWS4" + secret_key).encode()
+    for part in (date, region, service, "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return {
+        **headers,
+        "x-amz-content-sha256": payload_sha256,
+        "x-amz-date": amz_date,
+        "Authorization": (
+            f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+            f"SignedHeaders={';'.join(names)}, Signature={signature}"
+        ),
+    }
+
+
+class ObjectStoreCache:
+    """S3 互換オブジェクトストアのキャッシュ（get / put / in は DiskCache と同じ）。
+
+    404 はミス、それ以外の HTTP エラー・通信エラーは例外になる
+    （TieredCache がその階層のエラーとして数える）。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 10.0,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        region: Optional[str] = None,
+    ) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.access_key = access_key or os.environ.get("AWS_ACCESS_KEY_ID")
+        self.secret_key = secret_key or os.environ.get("AWS_SECRET_ACCESS_KEY")
+        self.region = region or os.environ.get("AWS_REGION", "us-east-1")
+        self.corrupt = 0
+
+    def _request(self, method: str, key: str, data: Optional[bytes] = None) -> Optional[bytes]:
+        url = f"{self.url}/{key[:2]}/{key}"
+        headers: dict[str, str] = {}
+        if data is not None:
+            headers["Content-Type"] = "application/octet-stream"
+        if self.access_key and self.secret_key:
+            digest = hashlib.sha256(data).hexdigest() if data is not None else _EMPTY_SHA256
+            headers = sign_v4(method, url, headers, digest, self.access_key, self.secret_key, self.region)
+        req = urllib.request.Request(url, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def get(self, key: str) -> bytes | None:
+        blob = self._request("GET", key)
+        if blob is None:
+            return None
+        data = unseal(blob)
+        if data is None:
+            self.corrupt += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self._request("PUT", key, seal(data))
+
+    def __contains__(self, key: str) -> bool:
+        return self._request("HEAD", key) is not None
+
+
+class LocalObjectStore:
+    """オブジェクトを root 以下のファイルとして置く S3 互換（GET / PUT / HEAD / DELETE）のスタンドイン。"""
+
+    def __init__(self, root: str | Path, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> LocalObjectStore:
+        """バックグラウンドスレッドでサーバーを起動する。"""
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> LocalObjectStore:
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def _object_path(self, url_path: str) -> Optional[Path]:
+        path = (self.root / url_path.split("?", 1)[0].lstrip("/")).resolve()
+        # root の外（.. を含むパス）とディレクトリそのものは扱わない
+        if self.root not in path.parents:
+            return None
+        return path
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _target(self) -> Optional[Path]:
+                with store._lock:
+                    store.requests += 1
+                path = store._object_path(self.path)
+                if path is None:
+                    self._send(400)
+                return path
+
+            def do_GET(self) -> None:  # noqa: N802
+                self._read(body=True)
+
+            def do_HEAD(self) -> None:  # noqa: N802
+                self._read(body=False)
+
+            def _read(self, body: bool) -> None:
+                path = self._target()
+                if path is None:
+                    return
+                try:
+                    data = path.read_bytes()
+                except (FileNotFoundError, IsADirectoryError):
+                    self._send(404)
+                    return
+                self._send(200, data if body else b"", length=len(data))
+
+            def do_PUT(self) -> None:  # noqa: N802
+                path = self._target()
+                if path is None:
+                    return
+                data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(data)
+                os.replace(tmp, path)
+                self._send(200)
+
+            def do_DELETE(self) -> None:  # noqa: N802
+                path = self._target()
+                if path is None:
+                    return
+                path.unlink(missing_ok=True)
+                self._send(204)
+
+            def _send(self, status: int, data: bytes = b"", length: Optional[int] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data) if length is None else length))
+                self.end_headers()
+                if data:
+                    self.wfile.write(data)
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(
+        prog="python -m novelmanga.objectstore",
+        description="キャッシュ共有用の S3 互換オブジェクトストアのスタンドイン",
+    )
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9000)
+    p.add_argument("--root", required=True, help="オブジェクトを置くディレクトリ")
+    args = p.parse_args()
+
+    server = LocalObjectStore(args.root, host=args.host, port=args.port)
+    print(f"Object store listening on {server.url}（{server.root}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
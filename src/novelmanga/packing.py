@@ -0,0 +1,184 @@
+"""連続する短いシーンを 1 ページにまとめるページ割り（--pack-pages）。
+
+解析結果は 1 シーン = 1 ページで合成されるため、1〜2 コマの短いシーンが
+続くと余白の大きいページが増え、ページ数と出力バイト数が膨らむ。
+``pack_scenes`` は連続するシーンを、合計コマ数が上限以下になる範囲で
+同じページにまとめる。まとめ方は動的計画法で決め、
+
+1. ページ数が最小になること
+2. シーンの境目がページのコマ割り（layout_rects）の段の途中に来ないこと
+
+の順に優先する。page_break が付いたシーンと、呼び出し側が指定した位置
+（章の変わり目など）は必ず新しいページから始め、page_layout の異なる
+シーンは同じページにまとめない。まとめたページは ``PackedPage.as_scene``
+で 1 つの Scene（コマ番号を振り直したもの）として合成する。
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from .composer import layout_rects
+from .models import Scene
+
+# コマ割りのテンプレートがあるコマ数の上限（composer.layout_rects）
+MAX_TEMPLATE_PANELS = 6
+
+
+@dataclass
+class PackedPage:
+    """1 ページにまとめたシーン。start は元のシーン列での先頭の位置（0 始まり）。"""
+
+    start: int
+    scenes: list[Scene]
+
+    @property
+    def panel_count(self) -> int:
+        return sum(len(s.panels) for s in self.scenes)
+
+    def as_scene(self) -> Scene:
+        """ページ全体を 1 つの Scene にする。1 シーンだけのページは元のシーンを返す。"""
+        if len(self.scenes) == 1:
+            return self.scenes[0]
+        first = self.scenes[0]
+        panels = [
+            dataclasses.replace(panel, panel_number=k)
+            for k, panel in enumerate((p for s in self.scenes for p in s.panels), 1)
+        ]
+        spans = [s.source_span for s in self.scenes if s.source_span]
+        return Scene(
+            scene_number=first.scene_number,
+            source_text="\n".join(s.source_text for s in self.scenes if s.source_text),
+            panels=panels,
+            page_layout=first.page_layout,
+            chunk_id=first.chunk_id,
+            source_span=(spans[0][0], spans[-1][1]) if spans else None,
+            page_break=first.page_break,
+        )
+
+
+def row_ends(n: int, layout_type: str = "standard") -> frozenset[int]:
+    """n コマのコマ割りで、各段の最後のコマまでのコマ数の集合を返す。"""
+    ends: list[int] = []
+    last_top = None
+    for k, (_, y1, _, _) in enumerate(layout_rects(n, layout_type)[:n]):
+        if last_top is not None and y1 != last_top:
+            ends.append(k)
+        last_top = y1
+    ends.append(min(n, MAX_TEMPLATE_PANELS))
+    return frozenset(ends)
+
+
+def misaligned(scenes: list[Scene]) -> int:
+    """scenes を 1 ページにまとめたとき、段の途中で切り替わるシーンの境目の数。"""
+    if len(scenes) < 2:
+        return 0
+    total = sum(len(s.panels) for s in scenes)
+    ends = row_ends(total, scenes[0].page_layout)
+    count = 0
+    boundary = 0
+    for scene in scenes[:-1]:
+        boundary += len(scene.panels)
+        if boundary not in ends:
+            count += 1
+    return count
+
+
+def pack_scenes(
+    scenes: list[Scene], max_panels: int = MAX_TEMPLATE_PANELS, breaks: Iterable[int] = ()
+) -> list[PackedPage]:
+    """シーン列を順序を保ったままページにまとめる。
+
+    breaks はシーン列での位置（0 始まり）の集合で、その位置のシーンは
+    新しいページから始める。コマ数が max_panels を超えるシーンはそのまま
+    1 ページになる。
+    """
+    if not 1 <= max_panels <= MAX_TEMPLATE_PANELS:
+        raise ValueError(f"max_panels must be between 1 and {MAX_TEMPLATE_PANELS}, got {max_panels}")
+    n = len(scenes)
+    forced = set(breaks) | {i for i, s in enumerate(scenes) if s.page_break}
+    # best[i] = scenes[:i] をまとめたときの (ページ数, 段の途中の境目の数) と、最後のページの先頭
+    best: list[Optional[tuple[int, int]]] = [None] * (n + 1)
+    prev = [0] * (n + 1)
+    best[0] = (0, 0)
+    for i in range(1, n + 1):
+        panels = 0
+        for j in range(i - 1, -1, -1):
+            panels += len(scenes[j].panels)
+            if j < i - 1:
+                # 2 シーン以上をまとめる条件
+                if panels > max_panels or scenes[j].page_layout != scenes[i - 1].page_layout:
+                    break
+            if best[j] is not None:
+                pages, bad = best[j]
+                cost = (pages + 1, bad + misaligned(scenes[j:i]))
+                if best[i] is None or cost < best[i]:
+                    best[i] = cost
+                    prev[i] = j
+            if j in forced:
+                break
+    pages: list[PackedPage] = []
+    i = n
+    while i > 0:
+        j = prev[i]
+        pages.append(PackedPage(j, scenes[j:i]))
+        i = j
+    pages.reverse()
+    return pages
+
+
+@dataclass
+class PackingStats:
+    """ページ割りの統計。bytes_written は書き出したページの合計バイト数（呼び出し側が設定）。"""
+
+    scenes: int = 0
+    pages: int = 0
+    merged_pages: int = 0
+    misaligned: int = 0
+    bytes_written: Optional[int] = None
+
+    @property
+    def pages_saved(self) -> int:
+        return self.scenes - self.pages
+
+    @property
+    def bytes_saved_estimate(self) -> Optional[int]:
+        """減ったページ数 × 書き出したページの平均バイト数（まとめなかった場合の見積もり）。"""
+        if self.bytes_written is None or not self.pages:
+            return None
+        return round(self.pages_saved * self.bytes_written / self.pages)
+
+    def to_dict(self) -> dict:
+        return {
+            **dataclasses.asdict(self),
+            "pages_saved": self.pages_saved,
+            "bytes_saved_estimate": self.bytes_saved_estimate,
+        }
+
+
+@dataclass
+class ScenePacker:
+    """pack_scenes を呼び出しごとに適用し、統計を集計する（スレッドセーフ）。
+
+    ReaderOrderPipeline の pack にはインスタンスをそのまま渡す
+    （チャンクごとにまとめ、チャンクをまたいではまとめない）。
+    """
+
+    max_panels: int = MAX_TEMPLATE_PANELS
+    stats: PackingStats = field(default_factory=PackingStats)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def pack(self, scenes: list[Scene], breaks: Iterable[int] = ()) -> list[PackedPage]:
+        pages = pack_scenes(scenes, self.max_panels, breaks)
+        with self._lock:
+            self.stats.scenes += len(scenes)
+            self.stats.pages += len(pages)
+            self.stats.merged_pages += sum(1 for p in pages if len(p.scenes) > 1)
+            self.stats.misaligned += sum(misaligned(p.scenes) for p in pages)
+        return pages
+
+    def __call__(self, scenes: list[Scene]) -> list[Scene]:
+        return [page.as_scene() for page in self.pack(scenes)]
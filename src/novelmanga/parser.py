@@ -2,9 +2,86 @@
 
 from __future__ import annotations
 
+import codecs
+import hashlib
+import json
+import os
 import re
+import tempfile
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 
+from .models import Chunk, Heading, SourceChapter
+
+_ENCODINGS = ("utf-8", "utf-8-sig", "shift_jis", "cp932")
+# 見出しインデックスのサイドカーファイル（{入力ファイル}.index.json）
+INDEX_SUFFIX = ".index.json"
+_INDEX_VERSION = 1
+_HEADING_LEVELS = {"大": 1, "中": 2, "小": 3}
+
+
+@dataclass
+class TextIndex:
+    """青空文庫ファイルの見出しと章の索引。
+
+    byte_* は元ファイル上の、char_* は改行を変換せずにデコードした
+    テキスト上の位置。本文の範囲（body_*）はヘッダー・注記一覧・底本情報を除く。
+    size と mtime_ns が元ファイルと一致する間だけ有効。
+    """
+
+    source: str
+    size: int
+    mtime_ns: int
+    encoding: str
+    body_byte_start: int
+    body_byte_end: int
+    body_char_start: int
+    body_char_end: int
+    headings: list[Heading] = field(default_factory=list)
+    chapters: list[SourceChapter] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {"version": _INDEX_VERSION, **asdict(self)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> TextIndex:
+        data = dict(data)
+        if data.pop("version", None) != _INDEX_VERSION:
+            raise ValueError("unsupported index version")
+        headings = [Heading(**h) for h in data.pop("headings", [])]
+        chapters = [
+            SourceChapter(**{**c, "sections": [Heading(**h) for h in c.get("sections", [])]})
+            for c in data.pop("chapters", [])
+        ]
+        return cls(**data, headings=headings, chapters=chapters)
+
+    def matches(self, path: Path) -> bool:
+        st = path.stat()
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    def select(self, spec: str) -> list[SourceChapter]:
+        """"3-5" や "1,4" で指定した章を返す（番号は 1 始まり）。"""
+        return [self.chapters[n - 1] for n in parse_chapter_spec(spec, len(self.chapters))]
+
+
+def parse_chapter_spec(spec: str, total: int) -> list[int]:
+    """"3-5"・"2"・"1,4-" のような章指定を、昇順・重複なしの章番号にする。"""
+    numbers: set[int] = set()
+    for part in spec.split(","):
+        part = part.strip()
+        m = re.fullmatch(r"(\d*)\s*-\s*(\d*)|(\d+)", part)
+        if not part or not m or m.group(0) == "-":
+            raise ValueError(f"Invalid chapter range: {spec!r}")
+        if m.group(3):
+            lo = hi = int(m.group(3))
+        else:
+            lo = int(m.group(1)) if m.group(1) else 1
+            hi = int(m.group(2)) if m.group(2) else total
+        if not 1 <= lo <= hi <= total:
+            raise ValueError(f"Chapter range {part!r} is outside 1-{total}")
+        numbers.update(range(lo, hi + 1))
+    return sorted(numbers)
+
 
 class AozoraBunkoParser:
     """青空文庫形式テキストを解析し、クリーンなプレーンテキストに変換する。"""
@@ -19,6 +96,11 @@ class AozoraBunkoParser:
     _SEPARATOR = re.compile(r"-{20,}")
     # 3行以上の連続空行
     _MULTI_BLANK = re.compile(r"\n{3,}")
+    # ［＃「第一の手記」は大見出し］・［＃大見出し］第一の手記［＃大見出し終わり］
+    _HEADING = re.compile(r"［＃「([^」]+)」は(?:同行|窓)?([大中小])見出し］")
+    _HEADING_BLOCK = re.compile(r"［＃(?:同行|窓)?([大中小])見出し］(.+?)［＃(?:同行|窓)?[大中小]見出し終わり］")
+    _SEPARATOR_LINE = re.compile(r"^-{20,}\s*$")
+    _FOOTER = "底本："
 
     def parse_file(self, filepath: str | Path) -> str:
         """ファイルを読み込み、クリーンテキストを返す。"""
@@ -27,13 +109,135 @@ class AozoraBunkoParser:
         return self.clean_text(text)
 
     def _read_with_encoding(self, path: Path) -> str:
-        for encoding in ("utf-8", "utf-8-sig", "shift_jis", "cp932"):
+        for encoding in _ENCODINGS:
             try:
                 return path.read_text(encoding=encoding)
             except (UnicodeDecodeError, LookupError):
                 continue
         raise ValueError(f"Cannot decode file: {path}")
 
+    def _detect_encoding(self, raw: bytes, path: Path) -> str:
+        for encoding in _ENCODINGS:
+            try:
+                raw.decode(encoding)
+                return encoding
+            except (UnicodeDecodeError, LookupError):
+                continue
+        raise ValueError(f"Cannot decode file: {path}")
+
+    # ------------------------------------------------------------------
+    # 見出しインデックス
+    # ------------------------------------------------------------------
+
+    def build_index(self, filepath: str | Path) -> TextIndex:
+        """見出し注記（注記を除去する前）から章・節の索引を作る。
+
+        最上位の見出し（通常は大見出し）ごとに章とし、それより下の見出しは
+        章の sections に入れる。先頭の見出しより前の本文は第 1 章に含める。
+        見出しがなければ本文全体を 1 章とする。
+        """
+        path = Path(filepath)
+        raw = path.read_bytes()
+        encoding = self._detect_encoding(raw, path)
+        st = path.stat()
+
+        # 1 行ずつデコードして位置を記録する（Shift_JIS の 2 バイト目は改行にならない）
+        decoder = codecs.getincrementaldecoder(encoding)()
+        lines: list[tuple[int, int, str]] = []
+        byte_pos = char_pos = 0
+        for line in raw.splitlines(keepends=True):
+            text = decoder.decode(line)
+            lines.append((byte_pos, char_pos, text))
+            byte_pos += len(line)
+            char_pos += len(text)
+        lines.append((byte_pos, char_pos, ""))
+
+        # clean_text と同じく区切り線でヘッダー・注記一覧を除き、底本情報の手前までを本文とする
+        separators = [i for i, (_, _, t) in enumerate(lines) if self._SEPARATOR_LINE.match(t)]
+        first = separators[0] + 1 if len(separators) == 1 else separators[1] + 1 if separators else 0
+        last = separators[2] if len(separators) >= 3 else len(lines) - 1
+        for i in range(first, last):
+            if lines[i][2].startswith(self._FOOTER):
+                last = i
+                break
+
+        headings: list[Heading] = []
+        for i in range(first, last):
+            b, c, text = lines[i]
+            for m in self._HEADING.finditer(text):
+                headings.append(Heading(m.group(1), _HEADING_LEVELS[m.group(2)], i + 1, b, c))
+            for m in self._HEADING_BLOCK.finditer(text):
+                title = self._ANNOTATION.sub("", m.group(2)).strip()
+                headings.append(Heading(title, _HEADING_LEVELS[m.group(1)], i + 1, b, c))
+
+        body_start, body_end = lines[first], lines[last]
+        chapters: list[SourceChapter] = []
+        if headings:
+            top = min(h.level for h in headings)
+            tops = [h for h in headings if h.level == top]
+            for n, h in enumerate(tops, 1):
+                start = body_start if n == 1 else (h.byte_offset, h.char_offset)
+                end = (tops[n].byte_offset, tops[n].char_offset) if n < len(tops) else body_end
+                chapters.append(
+                    SourceChapter(
+                        number=n,
+                        title=h.title,
+                        byte_start=start[0],
+                        byte_end=end[0],
+                        char_start=start[1],
+                        char_end=end[1],
+                        sections=[s for s in headings if s.level > top and start[0] <= s.byte_offset < end[0]],
+                    )
+                )
+        else:
+            chapters.append(SourceChapter(1, "全編", body_start[0], body_end[0], body_start[1], body_end[1]))
+
+        return TextIndex(
+            source=path.name,
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            encoding=encoding,
+            body_byte_start=body_start[0],
+            body_byte_end=body_end[0],
+            body_char_start=body_start[1],
+            body_char_end=body_end[1],
+            headings=headings,
+            chapters=chapters,
+        )
+
+    @staticmethod
+    def index_path(filepath: str | Path) -> Path:
+        return Path(f"{filepath}{INDEX_SUFFIX}")
+
+    def load_index(self, filepath: str | Path, index_path: str | Path | None = None) -> TextIndex:
+        """保存済みの索引を読み込む。ないか元ファイルが変わっていれば作り直して保存する。
+
+        保存先は index_path（省略時は入力ファイルと同じ場所の {名前}.index.json）。
+        保存できない場合（読み取り専用など）も索引は返す。
+        """
+        path = Path(filepath)
+        sidecar = Path(index_path) if index_path else self.index_path(path)
+        try:
+            index = TextIndex.from_dict(json.loads(sidecar.read_text(encoding="utf-8")))
+            if index.matches(path):
+                return index
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+        index = self.build_index(path)
+        try:
+            _write_json(sidecar, index.to_dict())
+        except OSError:
+            pass
+        return index
+
+    def read_chapter(self, filepath: str | Path, chapter: SourceChapter, encoding: str) -> str:
+        """章の範囲だけを読み込んでデコードし、クリーンテキストを返す。"""
+        with open(filepath, "rb") as fh:
+            fh.seek(chapter.byte_start)
+            raw = fh.read(chapter.byte_end - chapter.byte_start)
+        text = raw.decode(encoding).replace("\r\n", "\n").replace("\r", "\n")
+        return self._strip_markup(text)
+
     def clean_text(self, text: str) -> str:
         """青空文庫特有のマークアップを除去する。"""
         # ヘッダーとフッターを除去（区切り線で囲まれた本文だけを取得）
@@ -48,6 +252,10 @@ class AozoraBunkoParser:
             body_end = len(parts) if len(parts) <= 3 else len(parts) - 1
             text = "\n\n".join(parts[2:body_end])
 
+        return self._strip_markup(text)
+
+    def _strip_markup(self, text: str) -> str:
+        """ルビ・注釈・字下げを除去し、空行を詰める。"""
         # ルビ除去（｜記号付き）
         text = self._PIPE_RUBY.sub(r"\1", text)
         # ルビ除去（記号なし）
@@ -63,29 +271,118 @@ class AozoraBunkoParser:
 
     def split_paragraphs(self, text: str) -> list[str]:
         """空行区切りで段落リストに分割する。"""
-        return [p.strip() for p in text.split("\n\n") if p.strip()]
+        return [text[a:b] for a, b in self._spans(text, "\n\n")]
+
+    def _spans(self, text: str, sep: str) -> list[tuple[int, int]]:
+        """sep で区切った空でない区間の [start, end) を、前後の空白を除いて返す。"""
+        spans: list[tuple[int, int]] = []
+        pos = 0
+        for piece in text.split(sep):
+            stripped = piece.strip()
+            if stripped:
+                start = pos + len(piece) - len(piece.lstrip())
+                spans.append((start, start + len(stripped)))
+            pos += len(piece) + len(sep)
+        return spans
 
     def chunk_for_analysis(self, text: str, chunk_size: int = 2000) -> list[str]:
         """Claude API に送る単位でテキストをチャンク分割する。
 
         段落の途中で切らないよう、段落単位でチャンクを作成する。
         """
-        paragraphs = self.split_paragraphs(text)
-        chunks: list[str] = []
-        current: list[str] = []
+        return [c.text for c in self.split_chunks(text, chunk_size)]
+
+    def split_chunks(self, text: str, chunk_size: int = 2000) -> list[Chunk]:
+        """chunk_for_analysis と同じ分割を、ID と文字位置付きの Chunk で返す。"""
+        spans = self._spans(text, "\n\n")
+        chunks: list[Chunk] = []
+        current: list[tuple[int, int]] = []
         current_len = 0
 
-        for para in paragraphs:
-            para_len = len(para)
+        for span in spans:
+            para_len = span[1] - span[0]
             if current and current_len + para_len > chunk_size:
-                chunks.append("\n\n".join(current))
-                current = [para]
+                chunks.append(self._make_chunk(text, current, "\n\n"))
+                current = [span]
                 current_len = para_len
             else:
-                current.append(para)
+                current.append(span)
                 current_len += para_len
 
         if current:
-            chunks.append("\n\n".join(current))
+            chunks.append(self._make_chunk(text, current, "\n\n"))
+
+        return chunks
+
+    def chunk_content_defined(
+        self,
+        text: str,
+        chunk_size: int = 2000,
+        min_size: int | None = None,
+    ) -> list[Chunk]:
+        """内容に基づいて境界を決めるチャンク分割。
+
+        青空文庫では 1 行が 1 段落なので、行単位で段落のハッシュを取り、
+        ハッシュ値が段落長に比例した確率で境界条件を満たした段落の直後で
+        区切る。ただし境界になるのは前の境界から min_size 以上たまった
+        段落だけで、chunk_size を超える前には強制的に区切る。
+
+        このため段落の挿入・削除・書き換えの影響は編集箇所の前後に限られる:
+        編集箇所より前のチャンクは変わらず（直前のチャンクが強制的に区切られて
+        いた場合はそのチャンクだけ変わりうる）、後ろのチャンクは両方の版で
+        境界条件を満たす段落に達したところから再び一致する（多くは 1〜2 チャンク先）。
+        貪欲な分割（split_chunks）と違い、後続のすべての chunk_id がずれることはない。
+
+        チャンク長は min_size 以上 chunk_size 以下（1 段落が chunk_size を
+        超える場合を除く）。平均はおよそ (min_size + chunk_size) / 2。
+        """
+        min_size = chunk_size // 4 if min_size is None else min_size
+        spread = max(1, (chunk_size - min_size) // 2)
+        spans = self._spans(text, "\n")
+        chunks: list[Chunk] = []
+        current: list[tuple[int, int]] = []
+        current_len = 0
+
+        for a, b in spans:
+            para_len = b - a
+            if current and current_len + para_len > chunk_size:
+                # 上限を超える場合は強制的に区切る
+                chunks.append(self._make_chunk(text, current))
+                current, current_len = [], 0
+            current.append((a, b))
+            current_len += para_len
+            if current_len >= min_size and _boundary_score(text[a:b]) < para_len / spread:
+                chunks.append(self._make_chunk(text, current))
+                current, current_len = [], 0
+
+        if current:
+            chunks.append(self._make_chunk(text, current))
 
         return chunks
+
+    def _make_chunk(
+        self, text: str, spans: list[tuple[int, int]], joiner: str | None = None
+    ) -> Chunk:
+        start, end = spans[0][0], spans[-1][1]
+        body = joiner.join(text[a:b] for a, b in spans) if joiner else text[start:end]
+        chunk_id = hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+        return Chunk(chunk_id=chunk_id, text=body, start=start, end=end)
+
+
+def _write_json(path: Path, data: dict) -> None:
+    """一時ファイル経由で JSON を書き出す。"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False, indent=2)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _boundary_score(paragraph: str) -> float:
+    """段落内容から決まる [0, 1) の一様な値。"""
+    digest = hashlib.blake2b(paragraph.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2**64
@@ -0,0 +1,317 @@
+"""読む順に処理するストリーミング・パイプラインと、マニフェストの逐次公開。
+
+通常の実行（__main__ の 4 ステップ）は全チャンクの解析が終わってから画像生成、
+全画像がそろってからページ合成を行うため、最初のページができるのは最後になる。
+``ReaderOrderPipeline`` は解析・画像生成・合成をタスクに分け、ページ番号の
+小さいものから優先して複数スレッドで実行する。``ManifestPublisher`` は
+先頭から連続して書き出し終わったページまでを manga-manifest.json に
+「生成中」として公開し直すので、長時間の実行中でも先頭から読み始められる。
+"""
+
+from __future__ import annotations
+
+import itertools
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from PIL import Image
+
+from .composer import PAGE_HEIGHT, PAGE_WIDTH
+from .manifest import (
+    MANIFEST_NAME,
+    STATUS_COMPLETE,
+    STATUS_IN_PROGRESS,
+    novel_entry,
+    upsert_novel,
+)
+from .memory import MemoryBudget, PanelImageStore
+from .models import Chunk, Scene
+from .placeholders import annotate_chapters
+from .writer import PageWriter
+
+
+def page_filename(page_number: int) -> str:
+    """1 始まりのページ番号からページ画像のファイル名を返す。"""
+    return f"page_{page_number:03d}.png"
+
+
+def sheet_page_entry(page_number: int, result: Any) -> dict:
+    """シートで生成したページの呼び出し数を実行レポート用の辞書にする。"""
+    return {
+        "page": page_number,
+        "panels": len(result.images),
+        "generated": result.generated,
+        "calls": result.calls,
+        "saved": result.saved,
+        "fallback": result.fallback,
+    }
+
+
+class ManifestPublisher:
+    """書き出し済みページの連続範囲をマニフェストに公開する。
+
+    page_written() は任意の順・任意のスレッドから呼んでよい。1 ページ目から
+    途切れずにそろった範囲が伸びたときだけ、マニフェストを書き直す。
+    章にはページの大きさ・プレースホルダー（placeholder の種類）・先読みの順序を
+    付ける（placeholders.annotate_chapters）。計算済みのページは読み直さない。
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        novel_id: str,
+        title: str,
+        author: str = "",
+        pages_per_chapter: int = 0,
+        placeholder: str = "auto",
+    ) -> None:
+        self.path = Path(output_dir) / MANIFEST_NAME
+        self.output_dir = Path(output_dir)
+        self.novel_id = novel_id
+        self.title = title
+        self.author = author
+        self.pages_per_chapter = pages_per_chapter
+        self.placeholder = placeholder
+        self.published = 0
+        self.publish_count = 0
+        self._done: set[int] = set()
+        self._page_info: dict = {}
+        self._lock = threading.Lock()
+
+    def page_written(self, page_number: int) -> None:
+        with self._lock:
+            self._done.add(page_number)
+            advanced = False
+            while self.published + 1 in self._done:
+                self._done.remove(self.published + 1)
+                self.published += 1
+                advanced = True
+            if advanced:
+                self._publish(STATUS_IN_PROGRESS)
+
+    def finish(self) -> None:
+        """生成完了として公開する。"""
+        with self._lock:
+            if self.published:
+                self._publish(STATUS_COMPLETE)
+
+    def _publish(self, status: str) -> None:
+        pages = [f"{self.novel_id}/{page_filename(i)}" for i in range(1, self.published + 1)]
+        novel = novel_entry(self.novel_id, self.title, self.author, pages, self.pages_per_chapter, status)
+        annotate_chapters(novel["chapters"], self.output_dir, self.placeholder, self._page_info)
+        upsert_novel(self.path, novel)
+        self.publish_count += 1
+
+
+class ReaderOrderPipeline:
+    """チャンクを解析・画像生成・合成し、ページを読む順に優先して書き出す。
+
+    タスクの優先度は (チャンク番号, シーン番号, 段階) で、前のページに必要な
+    処理ほど先に実行される。ページ番号は前のチャンクの解析がすべて終わった
+    時点で確定するため、それまで合成を保留する。
+
+    generator が None なら画像なしで合成する。on_page はページ番号順に
+    （合成したスレッドから）呼ばれる。アーカイブ出力などに使う。
+    budget を渡すと、合成待ちのパネル画像を budget.store に預け、上限を
+    超えたら退避して画像生成を遅らせる。generator.uses_sheet() が真になる
+    シーンは、コマごとのタスクに分けずに 1 枚のシートとして生成し、
+    ページごとの呼び出し数を sheet_pages に記録する。pack（packing.ScenePacker など）を
+    渡すと、チャンクごとの解析結果のシーン列をページ単位にまとめてから処理する。
+
+    run() が戻った時点ではページの書き出しが終わっていないことがある。
+    呼び出し側で writer.close() の後に publisher.finish() を呼ぶこと。
+    """
+
+    def __init__(
+        self,
+        analyzer: Any,
+        composer: Any,
+        writer: PageWriter,
+        page_dir: str | Path,
+        generator: Any = None,
+        workers: int = 4,
+        publisher: Optional[ManifestPublisher] = None,
+        on_page: Optional[Callable[[int, Image.Image], None]] = None,
+        budget: Optional[MemoryBudget] = None,
+        pack: Optional[Callable[[list[Scene]], list[Scene]]] = None,
+    ) -> None:
+        self.analyzer = analyzer
+        self.composer = composer
+        self.writer = writer
+        self.page_dir = Path(page_dir)
+        self.generator = generator
+        self.workers = max(1, workers)
+        self.publisher = publisher
+        self.on_page = on_page
+        self.budget = budget
+        self.pack = pack
+
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._error: Optional[BaseException] = None
+
+        self._chunks: list[Chunk] = []
+        self._scenes: dict[int, list[Scene]] = {}
+        self._offsets: dict[int, int] = {}
+        self._images = budget.store if budget is not None else PanelImageStore()
+        self._remaining: dict[tuple[int, int], int] = {}
+        self._parked: dict[int, list[int]] = {}
+        self._ordered: dict[int, Image.Image] = {}
+        self._next_ordered = 1
+        self._order_lock = threading.Lock()
+        self._sheet_results: dict[tuple[int, int], Any] = {}
+        self.sheet_pages: list[dict] = []
+
+    # ------------------------------------------------------------------
+    # 実行
+    # ------------------------------------------------------------------
+
+    def run(self, chunks: list[Chunk]) -> list[Scene]:
+        """全チャンクを処理し、読む順のシーンリストを返す。"""
+        self._chunks = list(chunks)
+        for ci in range(len(self._chunks)):
+            self._schedule((ci, -1, 0), self._analyze, ci)
+
+        threads = [
+            threading.Thread(target=self._work, name=f"pipeline-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+        with self._idle:
+            while self._pending and self._error is None:
+                self._idle.wait()
+        for _ in threads:
+            self._queue.put(((-1,), next(self._seq), None, ()))
+        for t in threads:
+            t.join()
+        if self._error is not None:
+            raise self._error
+        return [s for ci in range(len(self._chunks)) for s in self._scenes.get(ci, [])]
+
+    def _schedule(self, priority: tuple, fn: Callable, *args: Any) -> None:
+        with self._lock:
+            self._pending += 1
+        self._queue.put((priority, next(self._seq), fn, args))
+
+    def _work(self) -> None:
+        while True:
+            _, _, fn, args = self._queue.get()
+            if fn is None:
+                return
+            try:
+                if self._error is None:
+                    fn(*args)
+            except BaseException as e:
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    self._idle.notify_all()
+
+    # ------------------------------------------------------------------
+    # タスク
+    # ------------------------------------------------------------------
+
+    def _analyze(self, ci: int) -> None:
+        scenes = self.analyzer.analyze(self._chunks[ci])
+        if self.pack is not None:
+            scenes = self.pack(scenes)
+        ready: list[tuple[int, int]] = []
+        with self._lock:
+            self._scenes[ci] = scenes
+            # 先頭から連続して解析済みのチャンクのページ番号を確定する
+            while len(self._offsets) in self._scenes:
+                k = len(self._offsets)
+                prev = k - 1
+                self._offsets[k] = (
+                    self._offsets[prev] + len(self._scenes[prev]) if k else 0
+                )
+                ready.extend((k, si) for si in self._parked.pop(k, []))
+
+        for si, scene in enumerate(scenes):
+            key = (ci, si)
+            with self._lock:
+                self._remaining[key] = len(scene.panels)
+            if self.generator is None or not scene.panels:
+                self._compose_when_numbered(ci, si)
+                continue
+            uses_sheet = getattr(self.generator, "uses_sheet", None)
+            if uses_sheet is not None and uses_sheet(len(scene.panels)):
+                self._schedule((ci, si, 0), self._generate_sheet, ci, si)
+                continue
+            for pi in range(len(scene.panels)):
+                self._schedule((ci, si, pi), self._generate, ci, si, pi)
+
+        for k, si in ready:
+            self._schedule((k, si, -1), self._compose, k, si)
+
+    def _generate(self, ci: int, si: int, pi: int) -> None:
+        panel = self._scenes[ci][si].panels[pi]
+        if self.budget is not None:
+            self.budget.throttle()
+        img = self.generator.generate_panel_image(panel.visual_description)
+        self._images.put((ci, si, pi), img)
+        key = (ci, si)
+        with self._lock:
+            self._remaining[key] -= 1
+            done = self._remaining[key] == 0
+        if done:
+            self._compose_when_numbered(ci, si)
+
+    def _generate_sheet(self, ci: int, si: int) -> None:
+        scene = self._scenes[ci][si]
+        if self.budget is not None:
+            self.budget.throttle()
+        result = self.generator.generate_scene_images(
+            [p.visual_description for p in scene.panels],
+            self.composer.panel_rects(scene),
+            (PAGE_WIDTH, PAGE_HEIGHT),
+        )
+        for pi, img in enumerate(result.images):
+            self._images.put((ci, si, pi), img)
+        with self._lock:
+            self._remaining[(ci, si)] = 0
+            self._sheet_results[(ci, si)] = result
+        self._compose_when_numbered(ci, si)
+
+    def _compose_when_numbered(self, ci: int, si: int) -> None:
+        with self._lock:
+            if ci not in self._offsets:
+                self._parked.setdefault(ci, []).append(si)
+                return
+        self._schedule((ci, si, -1), self._compose, ci, si)
+
+    def _compose(self, ci: int, si: int) -> None:
+        scene = self._scenes[ci][si]
+        with self._lock:
+            self._remaining.pop((ci, si), None)
+            page_number = self._offsets[ci] + si + 1
+            sheet = self._sheet_results.pop((ci, si), None)
+            if sheet is not None:
+                self.sheet_pages.append(sheet_page_entry(page_number, sheet))
+        images = [self._images.pop((ci, si, pi)) for pi in range(len(scene.panels))]
+        page = self.composer.compose_page(scene, images)
+
+        on_done = None
+        if self.publisher is not None:
+            publisher = self.publisher
+            on_done = lambda: publisher.page_written(page_number)  # noqa: E731
+        self.writer.submit(page, self.page_dir / page_filename(page_number), on_done)
+
+        if self.on_page is not None:
+            self._emit_in_order(page_number, page)
+
+    def _emit_in_order(self, page_number: int, page: Image.Image) -> None:
+        with self._order_lock:
+            self._ordered[page_number] = page
+            while self._next_ordered in self._ordered:
+                self.on_page(self._next_ordered, self._ordered.pop(self._next_ordered))
+                self._next_ordered += 1
@@ -0,0 +1,207 @@
+"""マニフェストに載せるページのプレースホルダーと先読みの順序。
+
+リーダーはページの PNG を読み終わるまで何も表示できないので、マニフェストの
+章ごとに pageInfo（ページと同じ順の幅・高さ・バイト数・プレースホルダー）と
+prefetch（今のページから先読みするページの相対位置を優先順に並べたもの）を
+載せ、ダウンロード中はプレースホルダーを表示して次のページから先に読ませる。
+
+プレースホルダーは 2 種類:
+
+- blurhash: BlurHash（https://blurha.sh）の文字列。全ページを小さな格子に
+  縮小して積み重ね、基底関数との積和を 1 回の einsum でまとめて求める
+  （NumPy が必要: pip install 'novelmanga[numpy]'）
+- thumbnail: 幅 16px のグレースケール PNG の data URI（Pillow だけで作れる）
+
+"auto" は NumPy があれば blurhash、なければ thumbnail を使う。ページの情報は
+(パス, サイズ, 更新時刻) ごとに known に覚えておけるので、逐次公開で
+マニフェストを何度も書き直しても、新しく書き出したページだけを読む。
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import math
+import os
+import statistics
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 任意依存
+    np = None  # type: ignore[assignment]
+
+PLACEHOLDER_KINDS = ("auto", "blurhash", "thumbnail", "none")
+
+# BlurHash の成分数（横, 縦）。縦長のページなので縦を多めにする
+BLURHASH_COMPONENTS = (4, 5)
+# BlurHash を求める前にページを縮小する格子の大きさ（横, 縦）
+_GRID = (32, 45)
+THUMBNAIL_WIDTH = 16
+# 先読みするページの合計バイト数の目安と、先に読むページ数の上限
+PREFETCH_BUDGET = 3 * 2**20
+MAX_PREFETCH_AHEAD = 4
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ImportError("BlurHash placeholders require numpy: pip install 'novelmanga[numpy]'")
+
+
+def resolve_kind(kind: str) -> str:
+    """kind を実際に使う種類にする（"auto" は NumPy の有無で決める）。
+
+    未知の種類は ValueError、blurhash で NumPy がなければ ImportError。
+    """
+    if kind not in PLACEHOLDER_KINDS:
+        raise ValueError(f"Unknown placeholder kind: {kind!r} (choose from {', '.join(PLACEHOLDER_KINDS)})")
+    if kind == "auto":
+        return "blurhash" if np is not None else "thumbnail"
+    if kind == "blurhash":
+        require_numpy()
+    return kind
+
+
+# ----------------------------------------------------------------------
+# BlurHash
+# ----------------------------------------------------------------------
+
+
+def _encode83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _to_srgb(value: float) -> int:
+    v = min(max(value, 0.0), 1.0)
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _hash_from_factors(factors, components: tuple[int, int]) -> str:
+    """(縦の成分, 横の成分) の係数（グレースケール）から BlurHash の文字列を組み立てる。"""
+    cx, cy = components
+    flat = [float(f) for f in factors.reshape(-1)]
+    dc, ac = flat[0], flat[1:]
+    parts = [_encode83((cx - 1) + (cy - 1) * 9, 1)]
+    if ac:
+        quantised_max = int(max(0, min(82, math.floor(max(abs(a) for a in ac) * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+        parts.append(_encode83(quantised_max, 1))
+    else:
+        maximum = 1.0
+        parts.append(_encode83(0, 1))
+    gray = _to_srgb(dc)
+    parts.append(_encode83((gray << 16) + (gray << 8) + gray, 4))
+    for a in ac:
+        q = int(max(0, min(18, math.floor(math.copysign(abs(a / maximum) ** 0.5, a) * 9 + 9.5))))
+        parts.append(_encode83(q * 19 * 19 + q * 19 + q, 2))
+    return "".join(parts)
+
+
+def blurhash_batch(images: list[Image.Image], components: tuple[int, int] = BLURHASH_COMPONENTS) -> list[str]:
+    """画像をまとめて BlurHash にする（グレースケールとして扱う）。
+
+    各画像を _GRID に縮小して (枚数, 縦, 横) の配列に積み、sRGB から線形への
+    変換と基底関数との積和を全画像について一度に計算する。
+    """
+    require_numpy()
+    if not images:
+        return []
+    cx, cy = components
+    w, h = _GRID
+    pixels = np.stack(
+        [np.asarray(img.convert("L").resize((w, h), Image.Resampling.BOX), dtype=np.float64) for img in images]
+    ) / 255.0
+    linear = np.where(pixels <= 0.04045, pixels / 12.92, ((pixels + 0.055) / 1.055) ** 2.4)
+    basis_x = np.cos(np.pi * np.outer(np.arange(cx), np.arange(w)) / w)
+    basis_y = np.cos(np.pi * np.outer(np.arange(cy), np.arange(h)) / h)
+    factors = np.einsum("jy,nyx,ix->nji", basis_y, linear, basis_x) / (w * h)
+    # 直流成分以外は 2 倍（BlurHash の正規化）
+    factors *= 2
+    factors[:, 0, 0] /= 2
+    return [_hash_from_factors(f, components) for f in factors]
+
+
+# ----------------------------------------------------------------------
+# サムネイル
+# ----------------------------------------------------------------------
+
+
+def thumbnail_data_uri(image: Image.Image, width: int = THUMBNAIL_WIDTH) -> str:
+    """幅 width px のグレースケール PNG の data URI。"""
+    height = max(1, round(image.height * width / image.width))
+    small = image.convert("L").resize((width, height), Image.Resampling.BOX)
+    buf = io.BytesIO()
+    small.save(buf, format="PNG", optimize=True)
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+# ----------------------------------------------------------------------
+# ページ情報と先読み
+# ----------------------------------------------------------------------
+
+
+def page_info(paths: list[Path], kind: str = "auto", known: Optional[dict] = None) -> list[dict]:
+    """ページ画像ごとの {"width", "height", "bytes", blurhash / thumbnail} を返す。
+
+    kind="none" ではプレースホルダーを付けない（画像のヘッダーだけを読む）。
+    known を渡すと計算結果を (パス, サイズ, 更新時刻) ごとに覚え、次の呼び出しで使い回す。
+    """
+    kind = resolve_kind(kind)
+    known = {} if known is None else known
+    stats = [os.stat(p) for p in paths]
+    keys = [(str(p), st.st_size, st.st_mtime_ns, kind) for p, st in zip(paths, stats)]
+    missing = [i for i, key in enumerate(keys) if key not in known]
+    if missing:
+        # 全ページを保持しないよう、開いたらすぐ縮小する
+        sizes, small, placeholders = [], [], []
+        for i in missing:
+            with Image.open(paths[i]) as img:
+                sizes.append(img.size)
+                if kind == "blurhash":
+                    small.append(img.convert("L").resize(_GRID, Image.Resampling.BOX))
+                elif kind == "thumbnail":
+                    placeholders.append({"thumbnail": thumbnail_data_uri(img)})
+                else:
+                    placeholders.append({})
+        if kind == "blurhash":
+            placeholders = [{"blurhash": h} for h in blurhash_batch(small)]
+        for i, (width, height), extra in zip(missing, sizes, placeholders):
+            known[keys[i]] = {"width": width, "height": height, "bytes": stats[i].st_size, **extra}
+    return [known[key] for key in keys]
+
+
+def prefetch_order(
+    sizes: list[int], budget: int = PREFETCH_BUDGET, max_ahead: int = MAX_PREFETCH_AHEAD
+) -> list[int]:
+    """先読みするページの相対位置を優先順に返す（次のページから順に、最後に 1 つ前）。
+
+    先に読むページ数は、ページの中央値のバイト数で budget に収まる数（1〜max_ahead）。
+    """
+    if not sizes:
+        return [1, -1]
+    typical = max(1, statistics.median(sizes))
+    ahead = int(min(max_ahead, max(1, budget // typical)))
+    return [*range(1, ahead + 1), -1]
+
+
+def annotate_chapters(
+    chapters: list[dict], root: str | Path, kind: str = "auto", known: Optional[dict] = None
+) -> None:
+    """マニフェストの章に pageInfo と prefetch を付ける。ページの URL は root からの相対パス。
+
+    ページのファイルがそろっていない章（別の場所に置いたページなど）には何も付けない。
+    """
+    root = Path(root)
+    chapters = [ch for ch in chapters if all((root / url).is_file() for url in ch.get("pages", []))]
+    urls = [url for ch in chapters for url in ch.get("pages", [])]
+    infos = iter(page_info([root / url for url in urls], kind, known))
+    for chapter in chapters:
+        chapter["pageInfo"] = [next(infos) for _ in chapter.get("pages", [])]
+        chapter["prefetch"] = prefetch_order([info["bytes"] for info in chapter["pageInfo"]])
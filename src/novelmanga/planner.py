@@ -0,0 +1,319 @@
+"""実行計画（--plan）: API を呼ばずに呼び出し数・トークン数・費用・所要時間を見積もる。
+
+パースとチャンク分割だけを行い、チャンクごとに
+
+- 解析の入力トークン数（プロンプトと本文から文字種で見積もる）
+- シーン数・コマ数・解析の出力トークン数（過去の run_report.json の "usage" から
+  求めた文字数あたりの比率。レポートがなければ既定値）
+- 解析キャッシュ・画像キャッシュで済む呼び出し（--cache-dir を SDK なしで引く）
+
+を求め、API 呼び出し 1 回あたりの所要時間（同じく過去のレポートから）と
+並列数（--publish の --workers）・レート制限（--plan-rpm）から全体の所要時間を出す。
+
+このモジュールと依存先はモデル SDK（google.genai）を import しない。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .cache import DiskCache
+from .generator import image_cache_key
+from .models import Chunk
+from .prompts import USER_PROMPT, analysis_cache_key, system_instruction
+from .report import REPORT_NAME
+from .script_io import decode_scenes
+
+PLAN_NAME = "run_plan.json"
+
+# 英字 4 文字・数字 3 桁・日本語 1 文字・記号 1 文字をそれぞれ 1 トークンとみなす
+_TOKEN = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[^\x00-\x7f]|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """文字種からトークン数を見積もる（SDK の count_tokens を使わない概算）。"""
+    return len(_TOKEN.findall(text))
+
+
+@dataclass(frozen=True)
+class Rates:
+    """見積もりに使う比率。source は値の出どころ（既定値か、何件のレポートか）。"""
+
+    scenes_per_kchar: float = 1.5
+    panels_per_scene: float = 3.0
+    # 解析の出力トークン数（本文 1000 文字あたり）と、チャンクあたりの呼び出し回数（再試行を含む）
+    output_tokens_per_kchar: float = 450.0
+    calls_per_chunk: float = 1.0
+    # API 呼び出し 1 回あたりの所要時間（秒）
+    analysis_seconds: float = 15.0
+    image_seconds: float = 8.0
+    source: str = "default"
+
+
+# コンパクト形式は出力トークンが約 4 割少ない（scripts/bench_schema.py）
+DEFAULT_RATES = {
+    "verbose": Rates(),
+    "compact": Rates(output_tokens_per_kchar=270.0),
+}
+
+
+@dataclass(frozen=True)
+class Prices:
+    """USD 単価: 入力・出力 100 万トークンあたりと、画像 1 枚あたり。"""
+
+    input_per_mtok: float = 0.10
+    output_per_mtok: float = 0.40
+    per_image: float = 0.039
+
+
+def parse_prices(text: str) -> Prices:
+    """"入力,出力,画像" の形式（例: 0.1,0.4,0.039）を Prices にする。"""
+    parts = text.split(",")
+    if len(parts) != 3:
+        raise ValueError(f"expected IN,OUT,IMAGE prices, got {text!r}")
+    try:
+        values = [float(p) for p in parts]
+    except ValueError:
+        raise ValueError(f"invalid price in {text!r}") from None
+    if any(v < 0 for v in values):
+        raise ValueError(f"prices must not be negative: {text!r}")
+    return Prices(*values)
+
+
+def find_reports(paths: Iterable[str | Path]) -> list[Path]:
+    """ファイルはそのまま、ディレクトリは配下の run_report.json を探して返す。"""
+    found: list[Path] = []
+    for path in map(Path, paths):
+        if path.is_file():
+            found.append(path)
+        elif path.is_dir():
+            found.extend(sorted(path.rglob(REPORT_NAME)))
+    return list(dict.fromkeys(found))
+
+
+def load_rates(paths: Iterable[str | Path], script_format: str = "verbose") -> Rates:
+    """過去の run_report.json の "usage" を合算して比率を求める。
+
+    同じ解析出力形式のレポートがあればそれだけを使う。分母が 0 の比率は既定値のまま。
+    """
+    usages = []
+    for path in find_reports(paths):
+        try:
+            usage = json.loads(path.read_text(encoding="utf-8")).get("usage")
+        except (OSError, ValueError, AttributeError):
+            continue
+        if isinstance(usage, dict):
+            usages.append(usage)
+    same = [u for u in usages if u.get("script_format", "verbose") == script_format]
+    usages = same or usages
+    default = DEFAULT_RATES.get(script_format, Rates())
+    if not usages:
+        return default
+
+    def total(*keys: str) -> float:
+        out = 0.0
+        for u in usages:
+            value = u
+            for key in keys:
+                value = value.get(key, 0) if isinstance(value, dict) else 0
+            out += value if isinstance(value, (int, float)) else 0
+        return out
+
+    def ratio(num: float, den: float, fallback: float, scale: float = 1.0) -> float:
+        return num / den * scale if den > 0 and num > 0 else fallback
+
+    chars, analyzed = total("chars"), total("analyzed_chars")
+    analyzed_chunks = total("analyzed_chunks")
+    calls = total("analysis", "calls")
+    image_calls = total("images", "calls")
+    return Rates(
+        scenes_per_kchar=ratio(total("scenes"), chars, default.scenes_per_kchar, 1000),
+        panels_per_scene=ratio(total("panels"), total("scenes"), default.panels_per_scene),
+        output_tokens_per_kchar=ratio(
+            total("analysis", "output_tokens"), analyzed, default.output_tokens_per_kchar, 1000
+        ),
+        calls_per_chunk=ratio(calls, analyzed_chunks, default.calls_per_chunk),
+        analysis_seconds=ratio(total("analysis", "api_seconds"), calls, default.analysis_seconds),
+        image_seconds=ratio(total("images", "api_seconds"), image_calls, default.image_seconds),
+        source=f"{len(usages)} reports",
+    )
+
+
+@dataclass
+class ChunkEstimate:
+    """1 チャンクの見積もり。analysis_cached なら scenes / panels は実際の値。"""
+
+    chunk_id: str
+    chars: int
+    input_tokens: int
+    output_tokens: int
+    scenes: float
+    panels: float
+    analysis_cached: bool = False
+    # 画像キャッシュにあるコマ数（解析がキャッシュ済みのチャンクだけ分かる）
+    images_cached: int = 0
+
+
+@dataclass
+class RunPlan:
+    """実行全体の見積もり。"""
+
+    chunks: list[ChunkEstimate]
+    rates: Rates
+    prices: Prices = field(default_factory=Prices)
+    images: bool = True
+    workers: int = 1
+    rpm: Optional[float] = None
+
+    @property
+    def analysis_calls(self) -> int:
+        return math.ceil(self.rates.calls_per_chunk * sum(not c.analysis_cached for c in self.chunks))
+
+    @property
+    def panels(self) -> int:
+        return round(sum(c.panels for c in self.chunks))
+
+    @property
+    def image_calls(self) -> int:
+        if not self.images:
+            return 0
+        return max(0, self.panels - sum(c.images_cached for c in self.chunks))
+
+    @property
+    def input_tokens(self) -> int:
+        return round(sum(c.input_tokens for c in self.chunks if not c.analysis_cached) * self.rates.calls_per_chunk)
+
+    @property
+    def output_tokens(self) -> int:
+        return round(sum(c.output_tokens for c in self.chunks if not c.analysis_cached) * self.rates.calls_per_chunk)
+
+    @property
+    def cost(self) -> float:
+        p = self.prices
+        return (
+            self.input_tokens / 1e6 * p.input_per_mtok
+            + self.output_tokens / 1e6 * p.output_per_mtok
+            + self.image_calls * p.per_image
+        )
+
+    @property
+    def api_seconds(self) -> float:
+        return self.analysis_calls * self.rates.analysis_seconds + self.image_calls * self.rates.image_seconds
+
+    @property
+    def wall_seconds(self) -> float:
+        """並列数で割った呼び出し時間と、レート制限から決まる最短時間の大きい方。"""
+        seconds = self.api_seconds / max(1, self.workers)
+        if self.rpm:
+            seconds = max(seconds, (self.analysis_calls + self.image_calls) / self.rpm * 60)
+        return seconds
+
+    @property
+    def cache_share(self) -> dict[str, float]:
+        """キャッシュで済む割合（解析はチャンク数、画像はコマ数に対して）。"""
+        n = len(self.chunks)
+        panels = self.panels
+        return {
+            "analysis": sum(c.analysis_cached for c in self.chunks) / n if n else 0.0,
+            "images": sum(c.images_cached for c in self.chunks) / panels if panels and self.images else 0.0,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "rates": asdict(self.rates),
+            "prices": asdict(self.prices),
+            "workers": self.workers,
+            "rpm": self.rpm,
+            "totals": {
+                "chunks": len(self.chunks),
+                "chars": sum(c.chars for c in self.chunks),
+                "scenes": round(sum(c.scenes for c in self.chunks)),
+                "panels": self.panels,
+                "analysis_calls": self.analysis_calls,
+                "image_calls": self.image_calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cost_usd": round(self.cost, 4),
+                "api_seconds": round(self.api_seconds, 1),
+                "wall_seconds": round(self.wall_seconds, 1),
+                "cache_share": self.cache_share,
+            },
+            "chunks": [asdict(c) for c in self.chunks],
+        }
+
+
+def plan_run(
+    chunks: list[Chunk],
+    rates: Rates,
+    *,
+    cache_dir: str | Path | None = None,
+    script_format: str = "verbose",
+    structured: bool = False,
+    context: Optional[str] = None,
+    images: bool = True,
+    workers: int = 1,
+    rpm: Optional[float] = None,
+    prices: Prices = Prices(),
+) -> RunPlan:
+    """チャンク列の実行計画を作る。cache_dir は実行時の --cache-dir と同じディレクトリ。"""
+    system = system_instruction(script_format, context)
+    system_tokens = estimate_tokens(system) + estimate_tokens(USER_PROMPT)
+    scripts = images_cache = None
+    if cache_dir is not None:
+        # 見積もりではディレクトリを作らない（DiskCache は root を作成する）
+        if (Path(cache_dir) / "scripts").is_dir():
+            scripts = DiskCache(Path(cache_dir) / "scripts")
+        if images and (Path(cache_dir) / "images").is_dir():
+            images_cache = DiskCache(Path(cache_dir) / "images")
+
+    estimates = []
+    for chunk in chunks:
+        chars = len(chunk.text)
+        cached = scripts.get(analysis_cache_key(structured, system, chunk.text)) if scripts is not None else None
+        estimate = ChunkEstimate(
+            chunk_id=chunk.chunk_id,
+            chars=chars,
+            input_tokens=system_tokens + estimate_tokens(chunk.text),
+            output_tokens=round(chars / 1000 * rates.output_tokens_per_kchar),
+            scenes=round(chars / 1000 * rates.scenes_per_kchar, 2),
+            panels=round(chars / 1000 * rates.scenes_per_kchar * rates.panels_per_scene, 2),
+        )
+        if cached is not None:
+            scenes = decode_scenes(cached)
+            descriptions = [p.visual_description for s in scenes for p in s.panels]
+            estimate.analysis_cached = True
+            estimate.scenes = len(scenes)
+            estimate.panels = len(descriptions)
+            if images_cache is not None:
+                estimate.images_cached = sum(image_cache_key(d) in images_cache for d in descriptions)
+        estimates.append(estimate)
+    return RunPlan(estimates, rates, prices=prices, images=images, workers=workers, rpm=rpm)
+
+
+def _duration(seconds: float) -> str:
+    minutes, s = divmod(round(seconds), 60)
+    h, m = divmod(minutes, 60)
+    return f"{h} 時間 {m:02d} 分" if h else f"{m} 分 {s:02d} 秒"
+
+
+def format_plan(plan: RunPlan) -> str:
+    """実行計画の要約（標準出力用）。"""
+    d = plan.to_dict()["totals"]
+    share = d["cache_share"]
+    mode = f"{plan.workers} 並列" if plan.workers > 1 else "逐次"
+    rate = f"・上限 {plan.rpm:g} 回/分" if plan.rpm else ""
+    lines = [
+        f"  -> {d['chunks']} チャンク・{d['chars']:,} 文字 → 約 {d['scenes']} シーン・{d['panels']} コマ"
+        f"（比率: {plan.rates.source}）",
+        f"  -> 解析 {d['analysis_calls']} 回（入力 {d['input_tokens']:,} / 出力 {d['output_tokens']:,} トークン）"
+        f"・画像 {d['image_calls']} 回",
+        f"  -> キャッシュで済む割合: 解析 {share['analysis']:.0%}・画像 {share['images']:.0%}",
+        f"  -> 費用 約 ${d['cost_usd']:.2f}・API 所要時間 {_duration(plan.api_seconds)}"
+        f" → 実時間 約 {_duration(plan.wall_seconds)}（{mode}{rate}）",
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,334 @@
+"""実行時のプロファイリング（--profile-memory / --profile-cpu）。
+
+``MemoryProfiler`` は段階（解析・画像生成・合成など）ごとに tracemalloc の
+スナップショットと RSS を記録し、ページごとにも RSS と追跡中のメモリ量を
+記録する。結果は run_report.json の "memory" に入る。
+
+tracemalloc は割り当てごとに記録するので、有効にすると処理が数割遅くなる。
+
+``CpuProfiler`` は段階ごとに cProfile（段階の中で起動したスレッドを含む）と
+全スレッドのスタックのサンプリングを行い、段階ごとの pstats と、flamegraph.pl・
+speedscope などに渡せる collapsed stack（"フレーム;フレーム 回数"）を書き出す。
+文字の描画・コマ割り・正規表現・JSON のパース・画像のデコードにかかった時間を
+分類して集計し、run_report.json の "cpu" に入る。
+"""
+
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from .memory import current_rss
+
+
+class MemoryProfiler:
+    """段階ごと・ページごとのメモリ使用量を記録する。
+
+    top は段階ごとに記録する、段階中に増えた割り当ての多い行の件数。
+    """
+
+    def __init__(self, top: int = 10, frames: int = 1) -> None:
+        self.top = top
+        self.frames = frames
+        self.stages: list[dict] = []
+        self.pages: list[dict] = []
+        self.peak_rss = 0
+        self._started_tracing = False
+        self._lock = threading.Lock()
+
+    def start(self) -> MemoryProfiler:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._sample_rss()
+        return self
+
+    def stop(self) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _sample_rss(self) -> int:
+        rss = current_rss()
+        with self._lock:
+            self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """with ブロックを 1 段階として計測する。"""
+        rss_before = self._sample_rss()
+        before = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        if before is not None:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            record: dict = {
+                "stage": name,
+                "seconds": round(time.perf_counter() - t0, 4),
+                "rss_before": rss_before,
+                "rss_after": self._sample_rss(),
+            }
+            if before is not None:
+                current, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                record["traced_after"] = current
+                record["traced_peak"] = peak
+                record["top_growth"] = [
+                    {"where": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                    for stat in after.compare_to(before, "lineno")[: self.top]
+                    if stat.size_diff > 0
+                ]
+            with self._lock:
+                self.stages.append(record)
+
+    def page(self, page_number: int, stage: str = "compose") -> None:
+        """ページ 1 枚ごとの軽い計測（スナップショットは取らない）。"""
+        record = {"page": page_number, "stage": stage, "rss": self._sample_rss()}
+        if tracemalloc.is_tracing():
+            record["traced"] = tracemalloc.get_traced_memory()[0]
+        with self._lock:
+            self.pages.append(record)
+
+    def to_dict(self, extra: Optional[dict] = None) -> dict:
+        with self._lock:
+            data = {"peak_rss": self.peak_rss, "stages": list(self.stages), "pages": list(self.pages)}
+        if extra:
+            data.update(extra)
+        return data
+
+
+# 時間を集計する分類。inclusive=True はその関数から呼んだ処理も含む時間（cumtime）、
+# False は一致する関数の自己時間（tottime）の合計（C で実装された正規表現の処理などを拾う）
+_CATEGORIES: list[tuple[str, bool, Callable[[str, str], bool]]] = [
+    ("draw_text", True, lambda path, func: func == "_draw_centered_text"),
+    ("layout", True, lambda path, func: func in ("_calculate_layout", "layout_rects")),
+    (
+        "regex",
+        False,
+        lambda path, func: "'re.Pattern'" in func or "'re.Match'" in func or f"{os.sep}re{os.sep}" in path,
+    ),
+    ("json", True, lambda path, func: func == "raw_decode" and path.endswith(f"json{os.sep}decoder.py")),
+    ("image_decode", True, lambda path, func: func == "load" and path.endswith(f"PIL{os.sep}ImageFile.py")),
+]
+
+# サンプリングで待機中とみなす末端のフレーム（ファイル名, 関数名）
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+
+def _frame_label(path: str, line: int, func: str) -> str:
+    return f"{func} ({Path(path).name}:{line})" if path != "~" else func
+
+
+class _Snapshot:
+    """動いているスレッドのプロファイラを止めずに、ここまでの統計を pstats に渡す。"""
+
+    def __init__(self, prof: cProfile.Profile) -> None:
+        prof.snapshot_stats()
+        self.stats = prof.stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class _StackSampler:
+    """一定間隔で全スレッドのスタックを記録する（待機中のスレッドは除く）。"""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cpu-sampler", daemon=True)
+
+    def start(self) -> _StackSampler:
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (Path(code.co_filename).name, code.co_name) in _IDLE_FRAMES:
+                    continue
+                labels = []
+                while frame is not None:
+                    code = frame.f_code
+                    labels.append(_frame_label(code.co_filename, code.co_firstlineno, code.co_name).replace(";", ","))
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(labels))] += 1
+
+
+class CpuProfiler:
+    """段階ごとの CPU プロファイルを記録し、out_dir に書き出す。
+
+    stage() の中で起動したスレッドも別の cProfile で計測して段階の pstats に
+    合算する（同時に 1 つしかプロファイラを有効にできない Python では、
+    段階を実行したスレッドだけになる）。同じ名前の段階（ワーカーの同じ種類の
+    ジョブなど）は 1 つにまとめる。top は要約に載せる関数の数。
+    """
+
+    def __init__(self, out_dir: str | Path, top: int = 20, interval: float = 0.005) -> None:
+        self.out_dir = Path(out_dir)
+        self.top = top
+        self.interval = interval
+        self.stages: dict[str, dict] = {}
+        self._stats: dict[str, pstats.Stats] = {}
+        self._stacks: dict[str, Counter[str]] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """with ブロックを 1 段階として計測する。"""
+        threads: list[cProfile.Profile] = []
+
+        def bootstrap(frame, event, arg):
+            # 新しいスレッドの最初の呼び出しで、そのスレッド用のプロファイラに切り替える
+            prof = cProfile.Profile(time.thread_time)
+            try:
+                prof.enable()
+            except ValueError:
+                sys.setprofile(None)
+                return
+            with self._lock:
+                threads.append(prof)
+
+        main = cProfile.Profile(time.thread_time)
+        sampler = _StackSampler(self.interval).start()
+        threading.setprofile(bootstrap)
+        t0 = time.perf_counter()
+        main.enable()
+        try:
+            yield
+        finally:
+            main.disable()
+            seconds = time.perf_counter() - t0
+            threading.setprofile(None)
+            stacks = sampler.stop()
+            stats = pstats.Stats(main)
+            with self._lock:
+                for prof in threads:
+                    # 段階の後も動き続けるスレッドは、ここまでの分を取り込む
+                    stats.add(pstats.Stats(_Snapshot(prof)))
+                record = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+                record["calls"] += 1
+                record["seconds"] += seconds
+                if name in self._stats:
+                    self._stats[name].add(stats)
+                else:
+                    self._stats[name] = stats
+                self._stacks.setdefault(name, Counter()).update(stacks)
+
+    @staticmethod
+    def categories(stats: pstats.Stats) -> dict[str, float]:
+        """分類ごとの秒数。"""
+        out = {}
+        for name, inclusive, match in _CATEGORIES:
+            matched = {key for key in stats.stats if match(key[0], key[2])}
+            total = 0.0
+            for key in matched:
+                _cc, _nc, tt, ct, callers = stats.stats[key]
+                if inclusive:
+                    # 同じ分類の関数から呼ばれた分は呼び出し元の時間に含まれている
+                    total += ct - sum(edge[3] for caller, edge in callers.items() if caller in matched)
+                else:
+                    total += tt
+            out[name] = round(total, 4)
+        return out
+
+    def _top(self, stats: pstats.Stats) -> list[dict]:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[: self.top]
+        return [
+            {
+                "function": _frame_label(path, line, func),
+                "calls": nc,
+                "tottime": round(tt, 4),
+                "cumtime": round(ct, 4),
+            }
+            for (path, line, func), (_cc, nc, tt, ct, _callers) in rows
+        ]
+
+    def _total(self) -> Optional[pstats.Stats]:
+        if not self._stats:
+            return None
+        total = pstats.Stats()
+        for stats in self._stats.values():
+            total.add(stats)
+        return total
+
+    def write(self) -> dict:
+        """段階ごとの {stage}.pstats・{stage}.collapsed と summary.txt を書き出し、要約を返す。"""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            stages = {}
+            for name, stats in self._stats.items():
+                stats.dump_stats(self.out_dir / f"{name}.pstats")
+                stacks = self._stacks.get(name, Counter())
+                (self.out_dir / f"{name}.collapsed").write_text(
+                    "".join(f"{stack} {n}\n" for stack, n in sorted(stacks.items())), encoding="utf-8"
+                )
+                stages[name] = {
+                    **self.stages[name],
+                    "seconds": round(self.stages[name]["seconds"], 4),
+                    "cpu_seconds": round(stats.total_tt, 4),
+                    "samples": sum(stacks.values()),
+                    "categories": self.categories(stats),
+                    "pstats": f"{name}.pstats",
+                    "collapsed": f"{name}.collapsed",
+                }
+            total = self._total()
+        summary = {
+            "dir": str(self.out_dir),
+            "stages": stages,
+            "categories": self.categories(total) if total is not None else {},
+            "top": self._top(total) if total is not None else [],
+        }
+        buf = io.StringIO()
+        if total is not None:
+            total.stream = buf
+            total.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        (self.out_dir / "summary.txt").write_text(format_cpu_summary(summary) + "\n\n" + buf.getvalue(), encoding="utf-8")
+        return summary
+
+
+def format_cpu_summary(summary: dict) -> str:
+    """CpuProfiler.write() の要約を表示用の文字列にする。"""
+    lines = [f"CPU プロファイル: {summary['dir']}"]
+    for name, st in summary["stages"].items():
+        lines.append(
+            f"  {name:<10} {st['seconds']:>8.2f}s（CPU {st['cpu_seconds']:.2f}s・サンプル {st['samples']}）"
+        )
+    if summary["categories"]:
+        lines.append("  分類: " + "・".join(f"{k} {v:.3f}s" for k, v in summary["categories"].items()))
+    if summary["top"]:
+        lines.append(f"  自己時間の上位 {len(summary['top'])} 関数:")
+        lines.extend(
+            f"    {row['tottime']:>8.3f}s {row['calls']:>9} 回  {row['function']}" for row in summary["top"]
+        )
+    return "\n".join(lines)
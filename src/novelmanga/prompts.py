@@ -0,0 +1,85 @@
+"""シーン解析のプロンプトと解析キャッシュのキー。
+
+モデル SDK に依存しないので、SDK を読み込まずに解析キャッシュを引く
+実行計画（planner.py）からも使える。
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from .cache import content_key
+from .schema import COMPACT_FORMAT
+
+MODEL = "gemini-2.0-flash"
+USER_PROMPT = "以下の小説テキストを漫画の脚本に変換してください：\n\n"
+CONTEXT_HEADER = "\n\n作品の設定・登場人物（すべてのチャンクで共通）：\n"
+
+SYSTEM_PROMPT = """あなたは小説を漫画の脚本に変換する専門家です。
+与えられた小説テキストを漫画ページに変換するための脚本を生成してください。
+
+以下の JSON 形式のみで出力してください（前後に余計なテキストを入れないこと）：
+
+{
+  "scenes": [
+    {
+      "scene_number": 1,
+      "page_layout": "standard",
+      "panels": [
+        {
+          "panel_number": 1,
+          "panel_type": "establishing",
+          "visual_description": "Detailed English description for image generation AI",
+          "dialogue": ["セリフ1", "セリフ2"],
+          "narration": "ナレーションテキスト（なければ null）"
+        }
+      ]
+    }
+  ]
+}
+
+ガイドライン：
+- 各シーンは 1〜6 コマで構成（通常は 2〜4 コマ）
+- visual_description は画像生成 AI 向けの英語プロンプト（詳細に）
+- panel_type: "action" / "dialogue" / "narration" / "establishing"
+- page_layout: "standard" / "action" / "emotional"
+- 章の変わり目や大きな場面転換で新しいページから始めるべきシーンには "page_break": true を付ける
+- 日本漫画スタイルを意識すること
+- テキストの分量に応じて適切な数のシーンを生成すること"""
+
+# 出力トークンを減らすための短いキーの形式（schema.expand_compact で通常の形式に戻す）
+COMPACT_SYSTEM_PROMPT = f"""あなたは小説を漫画の脚本に変換する専門家です。
+与えられた小説テキストを漫画ページに変換するための脚本を生成してください。
+
+以下の JSON 形式（{COMPACT_FORMAT}）のみで、改行や空白を入れずに出力してください（前後に余計なテキストを入れないこと）：
+
+{{"s":[{{"l":"s","p":[{{"t":"e","v":"Detailed English description for image generation AI","d":["セリフ1","セリフ2"],"n":"ナレーション"}}]}}]}}
+
+キー：
+- s: シーンの配列（出現順に番号を振るので番号は不要）
+- l: ページレイアウト s=standard / a=action / e=emotional
+- b: 新しいページから始めるべきシーン（章の変わり目・大きな場面転換）なら true（それ以外は省略）
+- p: コマの配列（出現順に番号を振るので番号は不要）
+- t: コマの種類 e=establishing / d=dialogue / a=action / n=narration
+- v: 画像生成 AI 向けの英語プロンプト（詳細に）
+- d: セリフの配列（なければ省略）
+- n: ナレーション（なければ省略）
+
+ガイドライン：
+- 各シーンは 1〜6 コマで構成（通常は 2〜4 コマ）
+- 日本漫画スタイルを意識すること
+- テキストの分量に応じて適切な数のシーンを生成すること"""
+SCRIPT_FORMATS = ("verbose", "compact")
+
+
+def system_instruction(script_format: str = "verbose", context: Optional[str] = None) -> str:
+    """出力形式と作品の設定から、解析に使うシステムプロンプトを組み立てる。"""
+    if script_format not in SCRIPT_FORMATS:
+        raise ValueError(f"Unknown script format: {script_format}")
+    prompt = COMPACT_SYSTEM_PROMPT if script_format == "compact" else SYSTEM_PROMPT
+    return prompt + (CONTEXT_HEADER + context.strip() if context else "")
+
+
+def analysis_cache_key(structured: bool, system_instruction: str, text: str) -> str:
+    """チャンク本文の解析結果のキャッシュキー（SceneAnalyzer.cache_key と同じ）。"""
+    return content_key("analysis", MODEL, str(structured), system_instruction, text)
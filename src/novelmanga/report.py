@@ -0,0 +1,39 @@
+"""実行レポート（run_report.json）。
+
+毎回の実行で出力ディレクトリ（--shard ではシャードのディレクトリ）に
+run_report.json を書き出す。usage セクション（チャンク・シーン・コマ数、
+呼び出し数、トークン数、API 時間）は常に記録し、--plan が過去の実行から
+見積もりの比率を求めるのに使う。プロファイリング・メモリ上限・キャッシュなどの
+セクションは、その機能を使った実行でだけ加わる。セクションごとに記録し、
+マニフェストと同じく一時ファイル経由で置き換える。
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from .manifest import write_manifest
+
+REPORT_NAME = "run_report.json"
+
+
+class RunReport:
+    """1 回の実行のレポート。section() で記録し、write() で書き出す。"""
+
+    def __init__(self, output_dir: str | Path, **meta: Any) -> None:
+        self.path = Path(output_dir) / REPORT_NAME
+        self.data: dict[str, Any] = {
+            "version": 1,
+            "startedAt": datetime.now(timezone.utc).isoformat(),
+            **meta,
+        }
+
+    def section(self, name: str, value: Any) -> None:
+        self.data[name] = value
+
+    def write(self) -> Path:
+        self.data["finishedAt"] = datetime.now(timezone.utc).isoformat()
+        write_manifest(self.path, self.data)
+        return self.path
@@ -0,0 +1,409 @@
+"""解析レスポンスのスキーマ生成・検証・修復。
+
+- ``RESPONSE_SCHEMA``: Scene/Panel のデータクラス定義から導出した
+  レスポンススキーマ（Gemini API の response_schema 形式）
+- ``compile_validator``: スキーマを一度だけクロージャに変換した高速バリデータ
+- ``repair_json``: コードブロック・前置き・末尾カンマ・途中で切れた出力を
+  ローカルで修復して JSON として読み込む
+- ``COMPACT_RESPONSE_SCHEMA`` / ``expand_compact`` / ``compact_scenes``:
+  出力トークンを減らすための短いキーの形式と、通常の形式との相互変換
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import re
+import types
+import typing
+from enum import Enum
+from typing import Any, Callable, Optional
+
+from .models import PageLayout, Panel, PanelType, Scene
+
+# 実行時にのみ使うフィールドはスキーマに含めない
+_EXCLUDED_FIELDS = {"image_data", "source_text", "chunk_id", "source_span"}
+# 型注釈は str だが値域が列挙型で決まっているフィールド
+_ENUM_OVERRIDES: dict[str, type[Enum]] = {"page_layout": PageLayout}
+
+
+def _type_schema(tp: Any, name: str) -> dict:
+    if name in _ENUM_OVERRIDES:
+        return {"type": "STRING", "enum": [e.value for e in _ENUM_OVERRIDES[name]]}
+
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if origin in (typing.Union, types.UnionType) and type(None) in args:
+        inner = next(a for a in args if a is not type(None))
+        return {**_type_schema(inner, name), "nullable": True}
+    if origin is list:
+        return {"type": "ARRAY", "items": _type_schema(args[0], name)}
+    if isinstance(tp, type) and issubclass(tp, Enum):
+        return {"type": "STRING", "enum": [e.value for e in tp]}
+    if dataclasses.is_dataclass(tp):
+        return dataclass_schema(tp)
+    if tp is bool:
+        return {"type": "BOOLEAN"}
+    if tp is int:
+        return {"type": "INTEGER"}
+    if tp is str:
+        return {"type": "STRING"}
+    raise TypeError(f"Unsupported field type for schema: {tp!r}")
+
+
+def dataclass_schema(cls: type) -> dict:
+    """データクラスのフィールド定義からオブジェクトスキーマを導出する。"""
+    hints = typing.get_type_hints(cls)
+    properties: dict[str, dict] = {}
+    required: list[str] = []
+    for f in dataclasses.fields(cls):
+        if f.name in _EXCLUDED_FIELDS:
+            continue
+        properties[f.name] = _type_schema(hints[f.name], f.name)
+        if f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING:
+            required.append(f.name)
+    return {"type": "OBJECT", "properties": properties, "required": required}
+
+
+PANEL_SCHEMA = dataclass_schema(Panel)
+SCENE_SCHEMA = dataclass_schema(Scene)
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"scenes": {"type": "ARRAY", "items": SCENE_SCHEMA}},
+    "required": ["scenes"],
+}
+
+
+# ----------------------------------------------------------------------
+# コンパクト形式
+# ----------------------------------------------------------------------
+#
+# {"s": [{"l": "s", "b": true, "p": [{"t": "d", "v": "...", "d": ["..."], "n": "..."}]}]}
+#
+# キーと列挙値を 1 文字にし、scene_number / panel_number は出力させない
+# （_build_scenes と同じく出現順から決める）。空の d、null の n、false の b は省略できる。
+
+COMPACT_FORMAT = "compact-script-v1"
+LAYOUT_CODES = {"standard": "s", "action": "a", "emotional": "e"}
+PANEL_TYPE_CODES = {
+    PanelType.ESTABLISHING.value: "e",
+    PanelType.DIALOGUE.value: "d",
+    PanelType.ACTION.value: "a",
+    PanelType.NARRATION.value: "n",
+}
+_LAYOUTS = {v: k for k, v in LAYOUT_CODES.items()}
+_PANEL_TYPES = {v: k for k, v in PANEL_TYPE_CODES.items()}
+
+COMPACT_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "s": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "l": {"type": "STRING", "enum": list(LAYOUT_CODES.values())},
+                    "b": {"type": "BOOLEAN"},
+                    "p": {
+                        "type": "ARRAY",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "t": {"type": "STRING", "enum": list(PANEL_TYPE_CODES.values())},
+                                "v": {"type": "STRING"},
+                                "d": {"type": "ARRAY", "items": {"type": "STRING"}},
+                                "n": {"type": "STRING", "nullable": True},
+                            },
+                            "required": ["t", "v"],
+                        },
+                    },
+                },
+                "required": ["p"],
+            },
+        }
+    },
+    "required": ["s"],
+}
+
+
+def expand_compact(data: Any) -> Any:
+    """コンパクト形式を通常の形式（{"scenes": [...]}）に展開する。
+
+    通常の形式や想定外の値はそのまま返し、検証は salvage に任せる。
+    未知のコードは元の値のまま残す（_build_panel で既定値になる）。
+    """
+    if not isinstance(data, dict) or "scenes" in data or not isinstance(data.get("s"), list):
+        return data
+    scenes = []
+    for si, scene in enumerate(data["s"], 1):
+        if not isinstance(scene, dict) or not isinstance(scene.get("p"), list):
+            scenes.append(scene)
+            continue
+        panels = []
+        for pi, panel in enumerate(scene["p"], 1):
+            if not isinstance(panel, dict):
+                panels.append(panel)
+                continue
+            code = panel.get("t", "a")
+            panels.append(
+                {
+                    "panel_number": pi,
+                    "panel_type": _PANEL_TYPES.get(code, code),
+                    "visual_description": panel.get("v"),
+                    "dialogue": panel.get("d") or [],
+                    "narration": panel.get("n"),
+                }
+            )
+        layout = scene.get("l", "s")
+        expanded = {"scene_number": si, "page_layout": _LAYOUTS.get(layout, layout), "panels": panels}
+        if "b" in scene:
+            expanded["page_break"] = scene["b"]
+        scenes.append(expanded)
+    return {"scenes": scenes}
+
+
+def compact_scenes(scenes: list[Scene]) -> dict:
+    """Scene のリストをコンパクト形式の辞書にする（ベンチマーク・テスト用の逆変換）。"""
+    out = []
+    for scene in scenes:
+        panels = []
+        for panel in scene.panels:
+            item: dict[str, Any] = {
+                "t": PANEL_TYPE_CODES[panel.panel_type.value],
+                "v": panel.visual_description,
+            }
+            if panel.dialogue:
+                item["d"] = list(panel.dialogue)
+            if panel.narration:
+                item["n"] = panel.narration
+            panels.append(item)
+        item = {"l": LAYOUT_CODES.get(scene.page_layout, scene.page_layout), "p": panels}
+        if scene.page_break:
+            item["b"] = True
+        out.append(item)
+    return {"s": out}
+
+
+# ----------------------------------------------------------------------
+# バリデータ
+# ----------------------------------------------------------------------
+
+Validator = Callable[[Any, str, list], None]
+
+
+def _compile(schema: dict) -> Validator:
+    kind = schema.get("type")
+    nullable = schema.get("nullable", False)
+
+    if kind == "OBJECT":
+        props = {k: _compile(v) for k, v in schema.get("properties", {}).items()}
+        required = tuple(schema.get("required", ()))
+
+        def check(value: Any, path: str, errors: list) -> None:
+            if not isinstance(value, dict):
+                if not (nullable and value is None):
+                    errors.append(f"{path}: expected object")
+                return
+            for key in required:
+                if key not in value:
+                    errors.append(f"{path}.{key}: required")
+            for key, sub in props.items():
+                if key in value:
+                    sub(value[key], f"{path}.{key}", errors)
+
+    elif kind == "ARRAY":
+        item = _compile(schema["items"])
+
+        def check(value: Any, path: str, errors: list) -> None:
+            if not isinstance(value, list):
+                if not (nullable and value is None):
+                    errors.append(f"{path}: expected array")
+                return
+            for i, v in enumerate(value):
+                item(v, f"{path}[{i}]", errors)
+
+    elif kind == "STRING":
+        enum = frozenset(schema["enum"]) if "enum" in schema else None
+
+        def check(value: Any, path: str, errors: list) -> None:
+            if value is None:
+                if not nullable:
+                    errors.append(f"{path}: expected string")
+            elif not isinstance(value, str):
+                errors.append(f"{path}: expected string")
+            elif enum is not None and value not in enum:
+                errors.append(f"{path}: {value!r} not in enum")
+
+    elif kind == "INTEGER":
+
+        def check(value: Any, path: str, errors: list) -> None:
+            if value is None:
+                if not nullable:
+                    errors.append(f"{path}: expected integer")
+            elif not isinstance(value, int) or isinstance(value, bool):
+                errors.append(f"{path}: expected integer")
+
+    elif kind == "BOOLEAN":
+
+        def check(value: Any, path: str, errors: list) -> None:
+            if value is None:
+                if not nullable:
+                    errors.append(f"{path}: expected boolean")
+            elif not isinstance(value, bool):
+                errors.append(f"{path}: expected boolean")
+
+    else:
+        raise ValueError(f"Unsupported schema type: {kind}")
+
+    return check
+
+
+def compile_validator(schema: dict) -> Callable[[Any], list[str]]:
+    """スキーマをバリデータ関数にコンパイルする。戻り値はエラーメッセージのリスト。"""
+    check = _compile(schema)
+
+    def validate(value: Any) -> list[str]:
+        errors: list[str] = []
+        check(value, "$", errors)
+        return errors
+
+    return validate
+
+
+def _shallow(schema: dict, key: str) -> dict:
+    """key の配列要素を中身を問わないオブジェクトとして扱うスキーマを返す。"""
+    return {
+        **schema,
+        "properties": {**schema["properties"], key: {"type": "ARRAY", "items": {"type": "OBJECT"}}},
+    }
+
+
+def _without_enums(schema: dict) -> dict:
+    """列挙値の制約を外したスキーマを返す（未知の値は _build_panel で既定値になる）。"""
+    out = {k: v for k, v in schema.items() if k != "enum"}
+    if "properties" in out:
+        out["properties"] = {k: _without_enums(v) for k, v in out["properties"].items()}
+    if "items" in out:
+        out["items"] = _without_enums(out["items"])
+    return out
+
+
+def _optional(schema: dict, keys: tuple[str, ...]) -> dict:
+    """keys を必須でなくしたスキーマを返す。"""
+    return {**schema, "required": [k for k in schema.get("required", ()) if k not in keys]}
+
+
+def _drop_nulls(item: Any, keys: tuple[str, ...]) -> Any:
+    """keys のうち値が null のものを取り除く（_build_scenes では欠けているのと同じく既定値になる）。"""
+    if not isinstance(item, dict):
+        return item
+    return {k: v for k, v in item.items() if not (v is None and k in keys)}
+
+
+# _build_scenes / _build_panel が既定値で補うフィールド。欠けていても null でもよい
+# （番号は出現順から決める）
+SCENE_DEFAULTED = ("scene_number", "page_layout", "page_break")
+PANEL_DEFAULTED = ("panel_number", "panel_type", "visual_description", "dialogue", "narration")
+
+validate_document = compile_validator(RESPONSE_SCHEMA)
+# salvage 用: シーン・コマを個別に検証して、壊れた要素だけを取り除く
+_validate_top = compile_validator(_shallow(RESPONSE_SCHEMA, "scenes"))
+_validate_scene = compile_validator(_optional(_without_enums(_shallow(SCENE_SCHEMA, "panels")), SCENE_DEFAULTED))
+_validate_panel = compile_validator(_optional(_without_enums(PANEL_SCHEMA), PANEL_DEFAULTED))
+
+
+# ----------------------------------------------------------------------
+# 修復
+# ----------------------------------------------------------------------
+
+_FENCE = re.compile(r"```(?:json)?\s*")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """途中で切れた JSON を、最後に完結した要素の直後で閉じる。"""
+    stack: list[str] = []
+    in_string = escaped = False
+    cut: Optional[tuple[int, str]] = None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack or _CLOSERS[stack.pop()] != ch:
+                return None
+            cut = (i + 1, "".join(_CLOSERS[c] for c in reversed(stack)))
+            if not stack:
+                return text[: i + 1]
+    if cut is None:
+        return None
+    end, closers = cut
+    return text[:end] + closers
+
+
+def repair_json(text: str) -> tuple[Optional[Any], bool]:
+    """レスポンステキストを JSON として読み込む。
+
+    戻り値は (データ, 修復したかどうか)。修復できなければデータは None。
+    """
+    cleaned = _FENCE.sub("", text).strip()
+    start = cleaned.find("{")
+    if start == -1:
+        return None, False
+    body = cleaned[start:]
+    end = body.rfind("}") + 1
+    try:
+        return json.loads(body[:end]), False
+    except json.JSONDecodeError:
+        pass
+
+    for candidate in (body[:end], body):
+        fixed = _TRAILING_COMMA.sub(r"\1", candidate)
+        try:
+            return json.loads(fixed), True
+        except json.JSONDecodeError:
+            pass
+        closed = _close_truncated(fixed)
+        if closed is not None:
+            try:
+                return json.loads(_TRAILING_COMMA.sub(r"\1", closed)), True
+            except json.JSONDecodeError:
+                pass
+    return None, False
+
+
+def salvage(data: Any) -> tuple[Optional[dict], bool]:
+    """スキーマに合わないシーン・コマを取り除いたレスポンスを返す。
+
+    既定値で補えるフィールド（SCENE_DEFAULTED・PANEL_DEFAULTED）は欠けていても
+    null でもよい（null は欠けているものとして検証し、値はそのまま返す）。
+    戻り値は (データ, 取り除いた要素があるか)。全体が使えなければ None。
+    """
+    if _validate_top(data):
+        return None, False
+    dropped = False
+    scenes = []
+    for scene in data["scenes"]:
+        if _validate_scene(_drop_nulls(scene, SCENE_DEFAULTED)):
+            dropped = True
+            continue
+        raw_panels = scene.get("panels", [])
+        panels = [p for p in raw_panels if not _validate_panel(_drop_nulls(p, PANEL_DEFAULTED))]
+        if len(panels) != len(raw_panels):
+            dropped = True
+        if not panels:
+            continue
+        scenes.append({**scene, "panels": panels})
+    if not scenes:
+        return None, dropped
+    return {**data, "scenes": scenes}, dropped
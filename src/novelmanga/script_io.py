@@ -0,0 +1,306 @@
+"""Scene/Panel 脚本のコンパクトなバイナリ形式と JSON エクスポート。
+
+バイナリ形式（リトルエンディアン）::
+
+    ヘッダー (24 bytes)
+        magic b"NMSC" | version u16 | flags u16 | count u32 | reserved u32
+        | index_offset u64
+    レコード × count
+        length u32 | UTF-8 の JSON 配列（位置ベース、キー名なし）
+        v2 以降は末尾に chunk_id と source_span、v3 以降はさらに page_break を持つ
+    インデックス
+        レコード先頭のファイルオフセット u64 × count
+
+末尾のインデックスにより、巨大な脚本ファイルでも任意のシーンを
+1 回の seek で読み出せる（``ScriptReader[i]``）。
+``Panel.image_data`` は実行時専用のためシリアライズしない。
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+from .models import Panel, PanelType, Scene
+
+MAGIC = b"NMSC"
+FORMAT_VERSION = 3
+
+_HEADER = struct.Struct("<4sHHIIQ")
+_LENGTH = struct.Struct("<I")
+
+
+def _encode_scene(scene: Scene) -> bytes:
+    record = [
+        scene.scene_number,
+        scene.source_text,
+        scene.page_layout,
+        [
+            [
+                p.panel_number,
+                p.panel_type.value,
+                p.visual_description,
+                p.dialogue,
+                p.narration,
+            ]
+            for p in scene.panels
+        ],
+        scene.chunk_id,
+        list(scene.source_span) if scene.source_span else None,
+        scene.page_break,
+    ]
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_scene(payload: bytes) -> Scene:
+    record = json.loads(payload)
+    scene_number, source_text, page_layout, panels = record[:4]
+    # v1 のレコードには chunk_id / source_span がない
+    chunk_id = record[4] if len(record) > 4 else ""
+    span = record[5] if len(record) > 5 else None
+    page_break = bool(record[6]) if len(record) > 6 else False
+    return Scene(
+        scene_number=scene_number,
+        source_text=source_text,
+        panels=[
+            Panel(
+                panel_number=p[0],
+                panel_type=PanelType(p[1]),
+                visual_description=p[2],
+                dialogue=p[3],
+                narration=p[4],
+            )
+            for p in panels
+        ],
+        page_layout=page_layout,
+        chunk_id=chunk_id,
+        source_span=tuple(span) if span else None,
+        page_break=page_break,
+    )
+
+
+class ScriptWriter:
+    """シーンを逐次追記するライター。``close()`` でインデックスを書き込む。
+
+    path の代わりにシーク可能なバイナリファイルオブジェクトも渡せる
+    （その場合 ``close()`` はファイルを閉じない）。
+    """
+
+    def __init__(self, path: str | Path | BinaryIO) -> None:
+        if hasattr(path, "write"):
+            self._fh: BinaryIO = path  # type: ignore[assignment]
+            self._owns = False
+        else:
+            out = Path(path)
+            out.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(out, "wb")
+            self._owns = True
+        self._base = self._fh.tell()
+        self._offsets = array("Q")
+        self._closed = False
+        self._fh.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0, 0))
+
+    def append(self, scene: Scene) -> None:
+        payload = _encode_scene(scene)
+        self._offsets.append(self._fh.tell() - self._base)
+        self._fh.write(_LENGTH.pack(len(payload)))
+        self._fh.write(payload)
+
+    def extend(self, scenes: Iterable[Scene]) -> None:
+        for scene in scenes:
+            self.append(scene)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        index_offset = self._fh.tell() - self._base
+        offsets = self._offsets
+        if sys.byteorder == "big":
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+        self._fh.write(offsets.tobytes())
+        end = self._fh.tell()
+        self._fh.seek(self._base)
+        self._fh.write(
+            _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(self._offsets), 0, index_offset)
+        )
+        if self._owns:
+            self._fh.close()
+        else:
+            self._fh.seek(end)
+
+    def __enter__(self) -> ScriptWriter:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class ScriptReader:
+    """脚本ファイルの遅延リーダー。シーンはアクセスされた時点でデコードする。"""
+
+    def __init__(self, path: str | Path | BinaryIO) -> None:
+        if hasattr(path, "read"):
+            self._fh: BinaryIO = path  # type: ignore[assignment]
+            self.path = Path(getattr(path, "name", "<stream>"))
+        else:
+            self.path = Path(path)
+            self._fh = open(self.path, "rb")
+        self._base = self._fh.tell()
+        header = self._fh.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            self._fh.close()
+            raise ValueError(f"Not a script file (truncated header): {self.path}")
+        magic, version, _flags, count, _reserved, index_offset = _HEADER.unpack(header)
+        if magic != MAGIC:
+            self._fh.close()
+            raise ValueError(f"Not a script file (bad magic): {self.path}")
+        if version > FORMAT_VERSION:
+            self._fh.close()
+            raise ValueError(f"Unsupported script format version {version}: {self.path}")
+        self.version = version
+        self._count = count
+        self._index_offset = index_offset
+        self._offsets: array | None = None
+
+    def _load_index(self) -> array:
+        if self._offsets is None:
+            self._fh.seek(self._base + self._index_offset)
+            offsets = array("Q")
+            offsets.frombytes(self._fh.read(self._count * offsets.itemsize))
+            if sys.byteorder == "big":
+                offsets.byteswap()
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Scene:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(f"scene index out of range: {index}")
+        self._fh.seek(self._base + self._load_index()[index])
+        (length,) = _LENGTH.unpack(self._fh.read(_LENGTH.size))
+        return _decode_scene(self._fh.read(length))
+
+    def __iter__(self) -> Iterator[Scene]:
+        # 先頭から順に読むだけなのでインデックスは不要
+        self._fh.seek(self._base + _HEADER.size)
+        for _ in range(self._count):
+            (length,) = _LENGTH.unpack(self._fh.read(_LENGTH.size))
+            yield _decode_scene(self._fh.read(length))
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self) -> ScriptReader:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+# ----------------------------------------------------------------------
+# 便利関数
+# ----------------------------------------------------------------------
+
+
+def dump_scenes(scenes: Iterable[Scene], path: str | Path) -> None:
+    """シーン列をバイナリ脚本ファイルに書き出す。"""
+    with ScriptWriter(path) as writer:
+        writer.extend(scenes)
+
+
+def load_scenes(path: str | Path) -> list[Scene]:
+    """バイナリ脚本ファイルの全シーンを読み込む。"""
+    with ScriptReader(path) as reader:
+        return list(reader)
+
+
+def load_scene(path: str | Path, index: int) -> Scene:
+    """バイナリ脚本ファイルから index 番目のシーンだけを読み込む。"""
+    with ScriptReader(path) as reader:
+        return reader[index]
+
+
+def encode_scenes(scenes: Iterable[Scene]) -> bytes:
+    """シーン列をバイナリ脚本形式のバイト列に変換する。"""
+    buf = io.BytesIO()
+    with ScriptWriter(buf) as writer:
+        writer.extend(scenes)
+    return buf.getvalue()
+
+
+def decode_scenes(data: bytes) -> list[Scene]:
+    """``encode_scenes`` のバイト列からシーン列を復元する。"""
+    return list(ScriptReader(io.BytesIO(data)))
+
+
+def scene_to_dict(scene: Scene) -> dict:
+    """Scene を解析 API と同じキー名の辞書に変換する。"""
+    return {
+        "scene_number": scene.scene_number,
+        "source_text": scene.source_text,
+        "page_layout": scene.page_layout,
+        "panels": [
+            {
+                "panel_number": p.panel_number,
+                "panel_type": p.panel_type.value,
+                "visual_description": p.visual_description,
+                "dialogue": list(p.dialogue),
+                "narration": p.narration,
+            }
+            for p in scene.panels
+        ],
+        "chunk_id": scene.chunk_id,
+        "source_span": list(scene.source_span) if scene.source_span else None,
+        "page_break": scene.page_break,
+    }
+
+
+def scene_from_dict(data: dict) -> Scene:
+    """``scene_to_dict`` の出力から Scene を復元する。"""
+    return Scene(
+        scene_number=data["scene_number"],
+        source_text=data.get("source_text", ""),
+        panels=[
+            Panel(
+                panel_number=p["panel_number"],
+                panel_type=PanelType(p["panel_type"]),
+                visual_description=p["visual_description"],
+                dialogue=p.get("dialogue") or [],
+                narration=p.get("narration"),
+            )
+            for p in data.get("panels", [])
+        ],
+        page_layout=data.get("page_layout", "standard"),
+        chunk_id=data.get("chunk_id", ""),
+        source_span=tuple(data["source_span"]) if data.get("source_span") else None,
+        page_break=bool(data.get("page_break", False)),
+    )
+
+
+def export_json(scenes: Iterable[Scene], path: str | Path) -> None:
+    """人が読める JSON 形式で脚本を書き出す。"""
+    doc = {
+        "format": "novelmanga-script",
+        "version": FORMAT_VERSION,
+        "scenes": [scene_to_dict(s) for s in scenes],
+    }
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def import_json(path: str | Path) -> list[Scene]:
+    """``export_json`` で書き出した JSON を読み込む。"""
+    doc = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [scene_from_dict(d) for d in doc.get("scenes", [])]
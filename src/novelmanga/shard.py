@@ -0,0 +1,213 @@
+"""1 作品を複数ホストで分担する（--shard i/N）と、その結果の結合（merge）。
+
+チャンク列を N 個の連続した区間に決定的に分け、シャード i は i 番目の区間だけを
+解析・画像生成・合成する。ページは実行順の通し番号ではなく、原文上の位置から
+決まる ID（チャンク番号とチャンク内のシーン番号）で保存するので、どのホストで
+何回実行しても同じページは同じ ID になる。
+
+各シャードは次のように出力する::
+
+    {output}/shards/{novel_id}/shard-{i}-of-{N}/
+        page_c00012-s001.png ...
+        shard.json       # シャード番号・全チャンク数・チャンク列の指紋・ページ一覧
+        run_report.json  # このシャードの実行レポート（merge は読まない）
+
+``merge`` はシャードの shard.json を検証し、ページを ID 順に並べて
+{output}/{novel_id}/page_NNN.png に（再描画せずに）リンクまたはコピーし、
+マニフェストを書き出す。シャードごとの run_report.json はそのまま残るので、
+``--plan --plan-history {output}`` はすべてのシャードの実行を履歴として合算する。
+
+使い方:
+    python -m novelmanga novel.txt --shard 1/3 -o shared/
+    python -m novelmanga novel.txt --shard 2/3 -o shared/
+    python -m novelmanga novel.txt --shard 3/3 -o shared/
+    python -m novelmanga merge shared/shards/novel -o shared/
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Optional
+
+from .manifest import MANIFEST_NAME, STATUS_COMPLETE, novel_entry, upsert_novel, write_manifest
+from .placeholders import PLACEHOLDER_KINDS, annotate_chapters
+
+SHARD_META = "shard.json"
+_SHARD_VERSION = 1
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """"2/4" を (2, 4) にする（番号は 1 始まり）。"""
+    m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec)
+    if not m:
+        raise ValueError(f"Invalid shard: {spec!r} (expected i/N)")
+    index, count = int(m.group(1)), int(m.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard index must be in 1-{count}: {spec!r}")
+    return index, count
+
+
+def shard_range(total: int, index: int, count: int) -> range:
+    """total 個のチャンクのうちシャード index/count が担当する区間。
+
+    区間は連続していて、すべてのシャードを合わせると重複なく全体を覆う。
+    """
+    return range((index - 1) * total // count, index * total // count)
+
+
+def fingerprint(chunk_ids: list[str]) -> str:
+    """チャンク列の指紋。入力テキストかチャンク分割の設定が違えば変わる。"""
+    return hashlib.sha256("\n".join(chunk_ids).encode("utf-8")).hexdigest()[:16]
+
+
+def page_id(chunk_index: int, scene_index: int) -> str:
+    """チャンク番号（0 始まり）とチャンク内のシーン番号（1 始まり）から決まるページ ID。"""
+    return f"c{chunk_index:05d}-s{scene_index:03d}"
+
+
+def shard_dir(output_dir: str | Path, novel_id: str, index: int, count: int) -> Path:
+    return Path(output_dir) / "shards" / novel_id / f"shard-{index}-of-{count}"
+
+
+def write_shard_meta(
+    directory: str | Path,
+    novel_id: str,
+    index: int,
+    count: int,
+    chunk_ids: list[str],
+    pages: list[dict],
+) -> Path:
+    """シャードの shard.json を書き出す。pages は {"id", "chunk", "chunk_id", "file"} のリスト。"""
+    chunks = shard_range(len(chunk_ids), index, count)
+    meta = {
+        "version": _SHARD_VERSION,
+        "novel_id": novel_id,
+        "shard": index,
+        "shards": count,
+        "chunks_total": len(chunk_ids),
+        "chunks": [chunks.start, chunks.stop],
+        "fingerprint": fingerprint(chunk_ids),
+        "pages": pages,
+    }
+    path = Path(directory) / SHARD_META
+    write_manifest(path, meta)
+    return path
+
+
+def load_shards(paths: list[str | Path]) -> list[tuple[Path, dict]]:
+    """シャードのディレクトリ（またはその親）から shard.json を集める。"""
+    found: dict[Path, dict] = {}
+    for p in map(Path, paths):
+        metas = [p / SHARD_META] if (p / SHARD_META).exists() else sorted(p.glob(f"*/{SHARD_META}"))
+        if not metas:
+            raise ValueError(f"{SHARD_META} not found under {p}")
+        for meta_path in metas:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("version") != _SHARD_VERSION:
+                raise ValueError(f"Unsupported shard version: {meta_path}")
+            found[meta_path.parent.resolve()] = meta
+    return sorted(found.items(), key=lambda item: item[1]["shard"])
+
+
+def merge_shards(
+    shards: list[tuple[Path, dict]],
+    output_dir: str | Path,
+    novel_id: Optional[str] = None,
+    title: Optional[str] = None,
+    author: str = "",
+    pages_per_chapter: int = 0,
+    placeholder: str = "auto",
+) -> dict:
+    """シャードのページを ID 順に {output_dir}/{novel_id}/page_NNN.png に並べ、マニフェストを更新する。
+
+    すべてのシャードが同じ作品・同じシャード数・同じチャンク列から作られ、
+    欠けがないことを確認してから書き出す。章にはページの大きさ・プレースホルダー・
+    先読みの順序を付ける（placeholders.annotate_chapters）。作品のエントリを返す。
+    """
+    if not shards:
+        raise ValueError("No shards to merge")
+    first = shards[0][1]
+    for directory, meta in shards:
+        for key in ("novel_id", "shards", "chunks_total", "fingerprint"):
+            if meta[key] != first[key]:
+                raise ValueError(f"Shard {directory} has a different {key}: {meta[key]!r} != {first[key]!r}")
+    present = [meta["shard"] for _, meta in shards]
+    missing = sorted(set(range(1, first["shards"] + 1)) - set(present))
+    if missing:
+        raise ValueError(f"Missing shards: {', '.join(map(str, missing))} of {first['shards']}")
+    if len(present) != len(set(present)):
+        raise ValueError("Duplicate shards")
+
+    pages = sorted(
+        ((page["id"], directory / page["file"]) for directory, meta in shards for page in meta["pages"]),
+        key=lambda item: item[0],
+    )
+    ids = [pid for pid, _ in pages]
+    if len(ids) != len(set(ids)):
+        raise ValueError("Duplicate page ids across shards")
+
+    novel_id = novel_id or first["novel_id"]
+    out = Path(output_dir)
+    novel_dir = out / novel_id
+    novel_dir.mkdir(parents=True, exist_ok=True)
+    urls = []
+    for n, (_, src) in enumerate(pages, 1):
+        name = f"page_{n:03d}.png"
+        _place(src, novel_dir / name)
+        urls.append(f"{novel_id}/{name}")
+    novel = novel_entry(novel_id, title or novel_id, author, urls, pages_per_chapter, status=STATUS_COMPLETE)
+    annotate_chapters(novel["chapters"], out, placeholder)
+    upsert_novel(out / MANIFEST_NAME, novel)
+    return novel
+
+
+def _place(src: Path, dst: Path) -> None:
+    """src を dst に置く。同じファイルシステムならハードリンク、だめならコピー。"""
+    tmp = dst.with_name(f".tmp-{dst.name}")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def merge_main(argv: Optional[list[str]] = None) -> None:
+    p = argparse.ArgumentParser(
+        prog="python -m novelmanga merge",
+        description="--shard で分担して生成したページを 1 つの作品に結合する",
+    )
+    p.add_argument("shards", nargs="+", help="シャードのディレクトリ（または shards/{novel_id}）")
+    p.add_argument("--output", "-o", default="output", help="出力ディレクトリ（デフォルト: output）")
+    p.add_argument("--novel-id", default=None, help="作品ID（省略時: シャードに記録された ID）")
+    p.add_argument("--title", default=None, help="作品タイトル（省略時: 作品ID）")
+    p.add_argument("--author", default="", help="著者名")
+    p.add_argument("--pages-per-chapter", type=int, default=0, metavar="N", help="1 章あたりのページ数（0=全ページ1章）")
+    p.add_argument(
+        "--placeholder", choices=PLACEHOLDER_KINDS, default="auto", help="マニフェストに載せるページのプレースホルダー"
+    )
+    args = p.parse_args(argv)
+
+    try:
+        shards = load_shards(args.shards)
+        novel = merge_shards(
+            shards,
+            args.output,
+            novel_id=args.novel_id,
+            title=args.title,
+            author=args.author,
+            pages_per_chapter=args.pages_per_chapter,
+            placeholder=args.placeholder,
+        )
+    except (OSError, ValueError, KeyError, ImportError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    pages = sum(len(ch["pages"]) for ch in novel["chapters"])
+    print(f"{len(shards)} シャード・{pages} ページを {Path(args.output) / novel['id']}/ に結合しました")
@@ -0,0 +1,117 @@
+"""吹き出し・ナレーション枠・テキストのスプライトキャッシュ。
+
+吹き出しの大きさはコマ幅から決まる少数のパターンしかなく、セリフも
+「……」「えっ！」のような同じ行が繰り返し現れる。一度描画した図形と
+テキストを画像（+ マスク）として保持し、ページ合成では貼り付けるだけにする。
+貼り付け結果は ImageDraw で直接描画した場合とピクセル単位で一致する。
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+Font = ImageFont.FreeTypeFont | ImageFont.ImageFont
+
+
+@dataclass(frozen=True, slots=True)
+class TextSprite:
+    """切り詰め済みテキストのマスクと、中央寄せに使う寸法。"""
+
+    mask: Optional[Image.Image]
+    width: int
+    height: int
+
+
+def _font_key(font: Font) -> tuple:
+    path = getattr(font, "path", None)
+    if isinstance(path, str):
+        return (path, getattr(font, "size", None), getattr(font, "index", 0))
+    # ファイルパスを持たないフォントはオブジェクト自体をキーにする
+    # （キーが参照を保持するので id の再利用で取り違えることはない）
+    return ("font", font)
+
+
+def fit_text(draw: ImageDraw.ImageDraw, text: str, font: Font, max_w: int) -> tuple[str, int, int]:
+    """max_w に収まるよう末尾を切り詰めたテキストと、その幅・高さを返す。"""
+    display = text
+    while len(display) > 1:
+        bbox = draw.textbbox((0, 0), display, font=font)
+        if bbox[2] - bbox[0] <= max_w:
+            break
+        display = display[:-1]
+    bbox = draw.textbbox((0, 0), display, font=font)
+    return display, bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+class SpriteCache:
+    """形状・テキストのスプライトを保持する LRU キャッシュ（スレッドセーフ）。"""
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        # textbbox 計測用の作業領域
+        self._scratch = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: tuple, render: Callable[[], Any]) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def bubble(self, width: int, height: int, outline: int) -> tuple[Image.Image, Image.Image]:
+        """白塗り・黒枠の楕円吹き出し (画像, マスク) を返す。"""
+
+        def render() -> tuple[Image.Image, Image.Image]:
+            box = (0, 0, width, height)
+            img = Image.new("L", (width + 1, height + 1), color=255)
+            ImageDraw.Draw(img).ellipse(box, fill=255, outline=0, width=outline)
+            mask = Image.new("L", img.size, color=0)
+            ImageDraw.Draw(mask).ellipse(box, fill=255, outline=255, width=outline)
+            return img, mask
+
+        return self._get(("bubble", width, height, outline), render)
+
+    def box(self, width: int, height: int, fill: int, outline: int) -> Image.Image:
+        """塗りつぶし矩形（ナレーション枠）の画像を返す。"""
+
+        def render() -> Image.Image:
+            img = Image.new("L", (width + 1, height + 1), color=fill)
+            ImageDraw.Draw(img).rectangle((0, 0, width, height), fill=fill, outline=0, width=outline)
+            return img
+
+        return self._get(("box", width, height, fill, outline), render)
+
+    def text(self, text: str, font: Font, max_w: int) -> TextSprite:
+        """max_w に収めたテキストのマスクを返す。"""
+
+        def render() -> TextSprite:
+            with self._lock:
+                display, tw, th = fit_text(self._scratch, text, font, max_w)
+                bbox = self._scratch.textbbox((0, 0), display, font=font)
+            if bbox[2] <= 0 or bbox[3] <= 0:
+                return TextSprite(None, tw, th)
+            mask = Image.new("L", (bbox[2], bbox[3]), color=0)
+            ImageDraw.Draw(mask).text((0, 0), display, fill=255, font=font)
+            return TextSprite(mask, tw, th)
+
+        return self._get(("text", text, _font_key(font), max_w), render)
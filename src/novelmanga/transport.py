@@ -0,0 +1,228 @@
+"""モデル API へのトランスポート層。
+
+SceneAnalyzer / ImageGenerator に渡す genai クライアントを、実行モードに
+応じて差し替える。
+
+- ``live``   : 実 API に接続する（従来どおり）
+- ``record`` : 実 API に接続しつつ、レスポンスを record_dir に保存する
+- ``replay`` : ローカルの FakeModelServer に接続する。record_dir の記録が
+  あればそれを返し、なければ合成した脚本・画像を返す
+
+記録キーは (モデル名, システムプロンプト, 入力テキスト) から決まるため、
+record で保存したレスポンスは replay 時にそのまま再生される。
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+from .cache import content_key
+
+TRANSPORT_MODES = ("live", "record", "replay")
+
+
+def request_key(model: str, system_instruction: str, contents: str) -> str:
+    """記録・再生で共通のリクエストキーを返す。"""
+    return content_key(model, system_instruction, contents)
+
+
+# ----------------------------------------------------------------------
+# 記録形式
+# ----------------------------------------------------------------------
+
+
+def response_to_record(response: Any) -> dict:
+    """SDK のレスポンスを保存用の辞書に変換する。"""
+    parts: list[dict] = []
+    candidates = getattr(response, "candidates", None) or []
+    if candidates:
+        content = getattr(candidates[0], "content", None)
+        for part in getattr(content, "parts", None) or []:
+            text = getattr(part, "text", None)
+            if isinstance(text, str):
+                parts.append({"text": text})
+            inline = getattr(part, "inline_data", None)
+            data = getattr(inline, "data", None) if inline else None
+            if data:
+                if isinstance(data, (bytes, bytearray)):
+                    data = base64.b64encode(data).decode("ascii")
+                parts.append(
+                    {"inline_data": {"mime_type": inline.mime_type, "data": data}}
+                )
+
+    usage: dict[str, int] = {}
+    meta = getattr(response, "usage_metadata", None)
+    for name in ("prompt_token_count", "candidates_token_count", "cached_content_token_count"):
+        value = getattr(meta, name, None) if meta is not None else None
+        if isinstance(value, int):
+            usage[name] = value
+    return {"parts": parts, "usage": usage}
+
+
+def record_to_rest(record: dict) -> dict:
+    """保存した記録を generateContent の REST レスポンス形式に変換する。"""
+    parts = []
+    for part in record.get("parts", []):
+        if "text" in part:
+            parts.append({"text": part["text"]})
+        elif "inline_data" in part:
+            inline = part["inline_data"]
+            parts.append({"inlineData": {"mimeType": inline["mime_type"], "data": inline["data"]}})
+    usage = record.get("usage", {})
+    return {
+        "candidates": [
+            {"content": {"role": "model", "parts": parts}, "finishReason": "STOP"}
+        ],
+        "usageMetadata": {
+            "promptTokenCount": usage.get("prompt_token_count", 0),
+            "candidatesTokenCount": usage.get("candidates_token_count", 0),
+            "cachedContentTokenCount": usage.get("cached_content_token_count", 0),
+        },
+    }
+
+
+class RecordStore:
+    """record_dir 配下にリクエストキー単位で記録を保存する。"""
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def save(self, key: str, record: dict, **meta: str) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self._path(key).with_suffix(".tmp")
+        tmp.write_text(json.dumps({**meta, **record}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self._path(key))
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            return json.loads(self._path(key).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+
+    def __len__(self) -> int:
+        return len(list(self.root.glob("*.json"))) if self.root.exists() else 0
+
+
+# ----------------------------------------------------------------------
+# 記録クライアント
+# ----------------------------------------------------------------------
+
+
+def _system_text(config: Any) -> str:
+    if config is None:
+        return ""
+    system = (
+        config.get("system_instruction")
+        if isinstance(config, dict)
+        else getattr(config, "system_instruction", None)
+    )
+    return system if isinstance(system, str) else ""
+
+
+def _config_value(config: Any, name: str) -> Any:
+    if config is None:
+        return None
+    return config.get(name) if isinstance(config, dict) else getattr(config, name, None)
+
+
+class _RecordingCaches:
+    """caches.create を中継し、キャッシュ名 → システムプロンプトを覚えておく。"""
+
+    def __init__(self, caches: Any, systems: dict[str, str]) -> None:
+        self._caches = caches
+        self._systems = systems
+
+    def create(self, *, model: str, config: Any = None, **kwargs: Any) -> Any:
+        cached = self._caches.create(model=model, config=config, **kwargs)
+        self._systems[cached.name] = _system_text(config)
+        return cached
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._caches, name)
+
+
+class _RecordingModels:
+    def __init__(self, models: Any, store: RecordStore, systems: dict[str, str]) -> None:
+        self._models = models
+        self._store = store
+        self._systems = systems
+
+    def generate_content(self, *, model: str, contents: Any, config: Any = None, **kwargs: Any) -> Any:
+        response = self._models.generate_content(
+            model=model, contents=contents, config=config, **kwargs
+        )
+        text = contents if isinstance(contents, str) else json.dumps(contents, ensure_ascii=False, default=str)
+        # コンテキストキャッシュを参照した呼び出しも、キャッシュなしと同じキーで記録する
+        cached = _config_value(config, "cached_content")
+        system = self._systems.get(cached, "") if cached else _system_text(config)
+        key = request_key(model, system, text)
+        self._store.save(key, response_to_record(response), model=model)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._models, name)
+
+
+class RecordingClient:
+    """genai クライアントをラップし、generate_content のレスポンスを記録する。"""
+
+    def __init__(self, client: Any, record_dir: str | Path) -> None:
+        self._client = client
+        systems: dict[str, str] = {}
+        self.models = _RecordingModels(client.models, RecordStore(record_dir), systems)
+        self.caches = _RecordingCaches(client.caches, systems)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+# ----------------------------------------------------------------------
+# ファクトリ
+# ----------------------------------------------------------------------
+
+
+def create_client(
+    mode: str = "live",
+    api_key: str | None = None,
+    record_dir: str | Path | None = None,
+    base_url: str | None = None,
+    retry_attempts: int = 3,
+) -> Any:
+    """モードに応じた genai クライアントを生成する。
+
+    replay で base_url を省略した場合は、record_dir を参照する
+    FakeModelServer をプロセス内で起動して接続する。
+    """
+    if mode not in TRANSPORT_MODES:
+        raise ValueError(f"Unknown transport mode: {mode}")
+
+    from google import genai
+    from google.genai import types
+
+    retry = types.HttpRetryOptions(attempts=retry_attempts) if retry_attempts > 1 else None
+
+    if mode == "replay":
+        if base_url is None:
+            from .fake_server import FakeModelServer
+
+            base_url = FakeModelServer(record_dir=record_dir).start().url
+        return genai.Client(
+            api_key=api_key or "replay",
+            http_options=types.HttpOptions(base_url=base_url, retry_options=retry),
+        )
+
+    client = genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(base_url=base_url, retry_options=retry),
+    )
+    if mode == "record":
+        if record_dir is None:
+            raise ValueError("record mode requires record_dir")
+        return RecordingClient(client, record_dir)
+    return client
@@ -0,0 +1,434 @@
+"""ジョブキューのワーカーと、変換ジョブの投入。
+
+``submit_run`` は小説をチャンクに分け、チャンクごとの analysis ジョブを投入する。
+analysis ジョブを実行したワーカーは、解析結果のシーンごとに image ジョブ
+（コマ画像の生成）と compose ジョブ（ページ合成）を追加する。
+
+- image ジョブは生成した画像を共有キャッシュ（cache_dir/images）に保存する
+- compose ジョブは画像をキャッシュから読み、ページ番号を前のチャンクの解析結果
+  から決めて output_dir/page_NNN.png に書き出す
+
+どのジョブも結果はキャッシュ・キュー・出力ファイルに冪等に保存されるので、
+リース切れで二重に実行されても結果は変わらない。
+
+使い方:
+    python -m novelmanga submit data/sample/ningen_shikkaku.txt --queue jobs.db --cache-dir .cache
+    python -m novelmanga worker --queue jobs.db
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .jobqueue import DONE, FAILED, JOB_KINDS, LEASED, PENDING, Job, JobQueue, open_queue
+from .memory import size_arg
+from .models import Chunk
+from .script_io import scene_from_dict, scene_to_dict
+
+
+def _analysis_id(run_id: str, ci: int) -> str:
+    return f"{run_id}/analysis/{ci:05d}"
+
+
+def _image_id(run_id: str, ci: int, si: int, pi: int) -> str:
+    return f"{run_id}/image/{ci:05d}/{si:03d}/{pi:02d}"
+
+
+def _compose_id(run_id: str, ci: int, si: int) -> str:
+    return f"{run_id}/compose/{ci:05d}/{si:03d}"
+
+
+def submit_run(
+    queue: JobQueue,
+    chunks: list[Chunk],
+    run_id: str,
+    output_dir: str | Path,
+    cache_dir: str | Path,
+    structured: bool = False,
+    images: bool = True,
+    max_attempts: int = 3,
+) -> int:
+    """チャンクごとの analysis ジョブを投入し、新たに投入した件数を返す。
+
+    cache_dir と output_dir はすべてのワーカーから同じパスで見える必要がある。
+    """
+    run = {
+        "id": run_id,
+        "output_dir": str(output_dir),
+        "cache_dir": str(cache_dir),
+        "structured": structured,
+        "images": images,
+        "chunks": len(chunks),
+        "max_attempts": max_attempts,
+    }
+    submitted = 0
+    for ci, chunk in enumerate(chunks):
+        payload = {
+            "run": run,
+            "index": ci,
+            "chunk": {"chunk_id": chunk.chunk_id, "text": chunk.text, "start": chunk.start, "end": chunk.end},
+        }
+        if queue.submit(_analysis_id(run_id, ci), "analysis", payload, priority=ci, max_attempts=max_attempts):
+            submitted += 1
+    return submitted
+
+
+@dataclass
+class WorkerStats:
+    """ワーカーの処理統計。"""
+
+    completed: int = 0
+    failed: int = 0
+    lost_leases: int = 0
+
+
+class Worker:
+    """キューからジョブをリースして実行する。
+
+    client は解析・画像生成に使う API クライアント（transport.create_client）。
+    SceneAnalyzer・ImageGenerator は (cache_dir, structured) ごとに一度だけ
+    作って使い回す。cache_shared を指定すると、ジョブの cache_dir をこの
+    ワーカーのローカルの階層とし、その下に共有キャッシュ（cache.open_cache）を
+    置く。共有キャッシュへの書き込みは、別のワーカーが続くジョブで読めるよう
+    ジョブの完了前に同期で行う。profiler（profiling.CpuProfiler）を渡すと、
+    ジョブの実行をジョブの種類ごとのステージとしてプロファイルする。
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        client: Any = None,
+        owner: Optional[str] = None,
+        kinds: Optional[list[str]] = None,
+        lease_seconds: float = 300.0,
+        poll_interval: float = 1.0,
+        cache_shared: Optional[str] = None,
+        cache_memory: int = 0,
+        profiler: Any = None,
+    ) -> None:
+        self.queue = queue
+        self.client = client
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.kinds = kinds or list(JOB_KINDS)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.cache_shared = cache_shared
+        self.cache_memory = cache_memory
+        self.profiler = profiler
+        self.stats = WorkerStats()
+        self._analyzers: dict[tuple[str, bool], Any] = {}
+        self._generators: dict[str, Any] = {}
+        self._composer: Any = None
+        self._handlers: dict[str, Callable[[Job], Any]] = {
+            "analysis": self._run_analysis,
+            "image": self._run_image,
+            "compose": self._run_compose,
+        }
+
+    # ------------------------------------------------------------------
+    # ループ
+    # ------------------------------------------------------------------
+
+    def run(self, max_jobs: Optional[int] = None, exit_when_idle: bool = False) -> WorkerStats:
+        """ジョブを実行し続ける。exit_when_idle なら実行できるジョブが尽きたら戻る。"""
+        done = 0
+        while max_jobs is None or done < max_jobs:
+            if self.run_one():
+                done += 1
+                continue
+            if exit_when_idle and self._idle():
+                break
+            time.sleep(self.poll_interval)
+        return self.stats
+
+    def run_one(self) -> bool:
+        """ジョブを 1 件実行する。実行できるジョブがなければ False。"""
+        job = self.queue.lease(self.owner, self.kinds, self.lease_seconds)
+        if job is None:
+            return False
+        stop = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True)
+        beat.start()
+        try:
+            if self.profiler is None:
+                result = self._handlers[job.kind](job)
+            else:
+                with self.profiler.stage(job.kind):
+                    result = self._handlers[job.kind](job)
+        except Exception as e:
+            stop.set()
+            beat.join()
+            self.stats.failed += 1
+            if not self.queue.fail(job.id, self.owner, f"{type(e).__name__}: {e}"):
+                self.stats.lost_leases += 1
+            return True
+        stop.set()
+        beat.join()
+        if self.queue.complete(job.id, self.owner, result):
+            self.stats.completed += 1
+        else:
+            # リースが切れて別のワーカーが実行中。結果は冪等なので破棄してよい
+            self.stats.lost_leases += 1
+        return True
+
+    def _idle(self) -> bool:
+        counts = self.queue.counts()
+        # 他のワーカーが実行中のジョブから新しいジョブが追加されることがある
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def _heartbeat(self, job: Job, stop: threading.Event) -> None:
+        while not stop.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(job.id, self.owner, self.lease_seconds):
+                return
+
+    # ------------------------------------------------------------------
+    # コンポーネント
+    # ------------------------------------------------------------------
+
+    def _analyzer(self, run: dict) -> Any:
+        key = (run["cache_dir"], bool(run["structured"]))
+        if key not in self._analyzers:
+            from .analyzer import SceneAnalyzer
+
+            self._analyzers[key] = SceneAnalyzer(
+                client=self.client,
+                structured=run["structured"],
+                cache=self._cache(run, "scripts"),
+            )
+        return self._analyzers[key]
+
+    def _generator(self, run: dict) -> Any:
+        key = run["cache_dir"]
+        if key not in self._generators:
+            from .generator import ImageGenerator
+
+            self._generators[key] = ImageGenerator(
+                client=self.client,
+                cache_dir=Path(run["cache_dir"]) / "images",
+                cache=self._cache(run, "images"),
+            )
+        return self._generators[key]
+
+    def _cache(self, run: dict, namespace: str) -> Any:
+        from .cache import open_cache
+
+        return open_cache(
+            run["cache_dir"],
+            namespace,
+            shared=self.cache_shared,
+            memory_bytes=self.cache_memory,
+            write_back=False,
+        )
+
+    def _page_composer(self) -> Any:
+        if self._composer is None:
+            from .composer import PageComposer
+
+            self._composer = PageComposer()
+        return self._composer
+
+    # ------------------------------------------------------------------
+    # ジョブ
+    # ------------------------------------------------------------------
+
+    def _run_analysis(self, job: Job) -> dict:
+        run, ci = job.payload["run"], job.payload["index"]
+        scenes = self._analyzer(run).analyze(Chunk(**job.payload["chunk"]))
+        if not scenes and job.attempts < job.max_attempts:
+            raise RuntimeError("analysis returned no scenes")
+
+        run_id = run["id"]
+        # ページ番号はこのチャンクまでの解析結果で決まる
+        analysis_ids = [_analysis_id(run_id, k) for k in range(ci + 1)]
+        for si, scene in enumerate(scenes):
+            image_ids = []
+            if run["images"]:
+                for pi, panel in enumerate(scene.panels):
+                    image_ids.append(_image_id(run_id, ci, si, pi))
+                    self.queue.submit(
+                        image_ids[-1],
+                        "image",
+                        {"run": run, "description": panel.visual_description},
+                        priority=ci,
+                        max_attempts=run["max_attempts"],
+                    )
+            self.queue.submit(
+                _compose_id(run_id, ci, si),
+                "compose",
+                {"run": run, "index": ci, "scene": si},
+                deps=[*analysis_ids, *image_ids],
+                priority=ci,
+                max_attempts=run["max_attempts"],
+            )
+        return {"scenes": [scene_to_dict(s) for s in scenes]}
+
+    def _run_image(self, job: Job) -> dict:
+        generator = self._generator(job.payload["run"])
+        img = generator.generate_panel_image(job.payload["description"])
+        if img is None:
+            if job.attempts < job.max_attempts:
+                raise RuntimeError("image generation failed")
+            # 再試行を使い切ったら画像なしのコマとして合成させる
+            return {"ok": False}
+        return {"ok": True}
+
+    def _run_compose(self, job: Job) -> dict:
+        from .writer import save_png_atomic
+
+        run, ci, si = job.payload["run"], job.payload["index"], job.payload["scene"]
+        ids = [_analysis_id(run["id"], k) for k in range(ci + 1)]
+        results = self.queue.results(ids)
+        if len(results) != len(ids):
+            raise RuntimeError("analysis results missing")
+        offset = sum(len(results[i]["scenes"]) for i in ids[:-1])
+        scene = scene_from_dict(results[ids[-1]]["scenes"][si])
+
+        images: list = [None] * len(scene.panels)
+        if run["images"]:
+            generator = self._generator(run)
+            images = [generator.cached_panel_image(p.visual_description) for p in scene.panels]
+
+        page_number = offset + si + 1
+        path = Path(run["output_dir"]) / f"page_{page_number:03d}.png"
+        size = save_png_atomic(self._page_composer().compose_page(scene, images), path)
+        return {"page": page_number, "path": str(path), "bytes": size}
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+
+def _print_counts(queue: JobQueue) -> dict[str, int]:
+    counts = queue.counts()
+    print(
+        f"  -> 待機 {counts[PENDING]} / 実行中 {counts[LEASED]}"
+        f" / 完了 {counts[DONE]} / 失敗 {counts[FAILED]}"
+    )
+    return counts
+
+
+def submit_main(argv: Optional[list[str]] = None) -> None:
+    p = argparse.ArgumentParser(prog="python -m novelmanga submit", description="変換ジョブをキューに投入する")
+    p.add_argument("input_file", help="青空文庫テキストファイルのパス")
+    p.add_argument("--queue", "-q", required=True, help="キュー（jobs.db または sqlite:///jobs.db）")
+    p.add_argument("--output", "-o", default="output", help="出力ディレクトリ（全ワーカーから見えるパス）")
+    p.add_argument(
+        "--cache-dir",
+        required=True,
+        help="共有キャッシュディレクトリ（全ワーカーから見えるパス。ワーカーの --cache-shared を使う場合は各ワーカーのローカルのパス）",
+    )
+    p.add_argument("--run-id", default=None, help="ジョブ ID の接頭辞（省略時: 入力ファイル名）")
+    p.add_argument("--pages", "-p", type=int, default=None, metavar="N", help="投入するチャンク数の上限")
+    p.add_argument("--chunk-size", type=int, default=2000, metavar="CHARS")
+    p.add_argument("--content-defined-chunks", action="store_true")
+    p.add_argument("--structured-output", action="store_true")
+    p.add_argument("--no-images", action="store_true")
+    p.add_argument("--max-attempts", type=int, default=3, help="ジョブごとの最大試行回数")
+    p.add_argument("--wait", action="store_true", help="すべてのジョブが終わるまで進捗を表示して待つ")
+    args = p.parse_args(argv)
+
+    from .parser import AozoraBunkoParser
+
+    input_path = Path(args.input_file)
+    parser = AozoraBunkoParser()
+    text = parser.parse_file(input_path)
+    if args.content_defined_chunks:
+        chunks = parser.chunk_content_defined(text, chunk_size=args.chunk_size)
+    else:
+        chunks = parser.split_chunks(text, chunk_size=args.chunk_size)
+    if args.pages:
+        chunks = chunks[: args.pages]
+
+    queue = open_queue(args.queue)
+    n = submit_run(
+        queue,
+        chunks,
+        args.run_id or input_path.stem,
+        Path(args.output).resolve(),
+        Path(args.cache_dir).resolve(),
+        structured=args.structured_output,
+        images=not args.no_images,
+        max_attempts=args.max_attempts,
+    )
+    print(f"{len(chunks)} チャンク中 {n} 件の analysis ジョブを投入しました")
+    counts = _print_counts(queue)
+    while args.wait and (counts[PENDING] or counts[LEASED]):
+        time.sleep(2.0)
+        counts = _print_counts(queue)
+
+
+def worker_main(argv: Optional[list[str]] = None) -> None:
+    p = argparse.ArgumentParser(prog="python -m novelmanga worker", description="キューのジョブを実行する")
+    p.add_argument("--queue", "-q", required=True, help="キュー（jobs.db または sqlite:///jobs.db）")
+    p.add_argument(
+        "--kinds",
+        default=",".join(JOB_KINDS),
+        help="実行するジョブの種類（カンマ区切り、デフォルト: すべて）",
+    )
+    p.add_argument("--lease-seconds", type=float, default=300.0, help="リース期間（秒）")
+    p.add_argument("--poll-interval", type=float, default=1.0, help="ジョブがないときの待機間隔（秒）")
+    p.add_argument("--max-jobs", type=int, default=None, help="この件数を実行したら終了する")
+    p.add_argument("--exit-when-idle", action="store_true", help="実行できるジョブがなくなったら終了する")
+    p.add_argument("--transport", choices=["live", "record", "replay"], default="live")
+    p.add_argument("--record-dir", default=None)
+    p.add_argument("--fake-server", default=None, metavar="URL")
+    p.add_argument(
+        "--cache-shared",
+        default=None,
+        metavar="PATH|URL",
+        help="ワーカー間で共有するキャッシュ（NFS などのディレクトリ、または S3 互換の http(s)://HOST/BUCKET/PREFIX）",
+    )
+    p.add_argument("--cache-memory", type=size_arg, default=0, metavar="SIZE", help="メモリキャッシュ（LRU）の上限（例: 256M）")
+    p.add_argument(
+        "--profile-cpu",
+        default=None,
+        metavar="DIR",
+        help="ジョブの種類ごとの CPU プロファイル（pstats・collapsed stack）を DIR/HOST-PID/ に書き出す",
+    )
+    p.add_argument("--profile-top", type=int, default=20, metavar="N", help="CPU プロファイルの要約に出す関数の数")
+    args = p.parse_args(argv)
+
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    unknown = set(kinds) - set(JOB_KINDS)
+    if unknown:
+        print(f"Error: 不明なジョブの種類: {', '.join(sorted(unknown))}", file=sys.stderr)
+        sys.exit(1)
+
+    from .transport import create_client
+
+    client = create_client(args.transport, record_dir=args.record_dir, base_url=args.fake_server)
+    cpu = None
+    if args.profile_cpu:
+        from .profiling import CpuProfiler
+
+        cpu = CpuProfiler(Path(args.profile_cpu) / f"{socket.gethostname()}-{os.getpid()}", top=args.profile_top)
+    worker = Worker(
+        open_queue(args.queue),
+        client=client,
+        kinds=kinds,
+        lease_seconds=args.lease_seconds,
+        poll_interval=args.poll_interval,
+        cache_shared=args.cache_shared,
+        cache_memory=args.cache_memory,
+        profiler=cpu,
+    )
+    print(f"Worker {worker.owner} started ({', '.join(kinds)})")
+    try:
+        stats = worker.run(max_jobs=args.max_jobs, exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        stats = worker.stats
+    print(f"完了 {stats.completed} 件・失敗 {stats.failed} 件・リース喪失 {stats.lost_leases} 件")
+    if cpu is not None:
+        from .profiling import format_cpu_summary
+
+        print(format_cpu_summary(cpu.write()))
@@ -0,0 +1,155 @@
+"""ページ画像の書き出し（バックグラウンド PNG エンコード）。
+
+PNG の zlib 圧縮とファイル書き込みは GIL を解放するため、別スレッドで
+行えばページ合成と並行して進められる。``PageWriter`` は合成済みページを
+上限付きキューで受け取り、バックグラウンドスレッドで書き出す。
+
+どのファイルも一時ファイルに書いてから rename するので、書き込み途中の
+ページが出力ディレクトリに現れることはない。
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from PIL import Image
+
+# zlib の圧縮レベル（0=無圧縮・最速 〜 9=最小サイズ・最遅）。Pillow の既定値と同じ
+DEFAULT_COMPRESS_LEVEL = 6
+
+
+def save_png_atomic(
+    page: Image.Image, path: str | Path, compress_level: int = DEFAULT_COMPRESS_LEVEL
+) -> int:
+    """ページを PNG として path に保存し、書き込んだバイト数を返す。"""
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=out.parent, prefix=".tmp-", suffix=".png")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            page.save(fh, "PNG", compress_level=compress_level)
+            size = fh.tell()
+        # mkstemp は 0600 で作成するので、通常のファイルと同じ権限に戻す
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, out)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return size
+
+
+@dataclass
+class WriterStats:
+    """書き出しの統計。"""
+
+    pages: int = 0
+    bytes: int = 0
+    errors: int = 0
+
+
+_STOP = object()
+
+
+class PageWriter:
+    """合成済みページを書き出す write-behind ライター。
+
+    submit() はキューに空きがあればすぐに戻る（満杯ならブロックする）。
+    threads=0 なら submit() の中で同期的に書き出す。書き込みエラーは
+    close() で最初のものを送出する。
+    """
+
+    def __init__(
+        self,
+        threads: int = 2,
+        max_pending: int = 8,
+        compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    ) -> None:
+        if not 0 <= compress_level <= 9:
+            raise ValueError(f"compress_level must be 0-9: {compress_level}")
+        self.compress_level = compress_level
+        self.stats = WriterStats()
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        self._threads = [
+            threading.Thread(target=self._run, name=f"page-writer-{i}", daemon=True)
+            for i in range(threads)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(
+        self,
+        page: Image.Image,
+        path: str | Path,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """ページの書き出しを予約する。
+
+        on_done は書き出しが完了した（ファイルが path に現れた）後に、
+        書き出したスレッドから呼ばれる。失敗したページでは呼ばれない。
+        """
+        if self._closed:
+            raise RuntimeError("PageWriter is closed")
+        if not self._threads:
+            self._write(page, path, on_done)
+            return
+        self._queue.put((page, path, on_done))
+
+    def close(self) -> None:
+        """予約済みのページをすべて書き出して終了する。"""
+        if not self._closed:
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(_STOP)
+            for t in self._threads:
+                t.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> PageWriter:
+        return self
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # 呼び出し側の例外を優先し、書き出しエラーでは上書きしない
+            try:
+                self.close()
+            except Exception:
+                pass
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            self._write(*item)
+
+    def _write(
+        self, page: Image.Image, path: str | Path, on_done: Optional[Callable[[], None]] = None
+    ) -> None:
+        try:
+            size = save_png_atomic(page, path, self.compress_level)
+            with self._lock:
+                self.stats.pages += 1
+                self.stats.bytes += size
+            if on_done is not None:
+                on_done()
+        except Exception as e:
+            with self._lock:
+                self.stats.errors += 1
+            if not self._threads:
+                raise
+            # ワーカースレッドは止めずに、最初のエラーを close() で送出する
+            with self._lock:
+                if self._error is None:
+                    self._error = e
@@ -61,6 +61,34 @@ class TestSceneAnalyzerParsing:
         scenes = a._parse_response(text)
         assert len(scenes) == 1
 
+    def test_missing_numbers_and_null_dialogue(self):
+        a = self._analyzer()
+        text = json.dumps(
+            {
+                "scenes": [
+                    {"panels": [{"panel_type": "action", "visual_description": "A", "dialogue": None}]},
+                    {
+                        "panels": [
+                            {"panel_type": "dialogue", "visual_description": "B", "dialogue": None},
+                            {"visual_description": "C", "narration": None},
+                        ]
+                    },
+                ]
+            }
+        )
+        scenes = a._parse_response(text)
+        assert [s.scene_number for s in scenes] == [1, 2]
+        assert [p.panel_number for p in scenes[1].panels] == [1, 2]
+        assert scenes[1].panels[0].dialogue == []
+        assert scenes[1].panels[1].panel_type == PanelType.ACTION
+
+    def test_null_page_break(self):
+        a = self._analyzer()
+        data = json.loads(_VALID_JSON)
+        data["scenes"][0]["page_break"] = None
+        scenes = a._parse_response(json.dumps(data))
+        assert len(scenes) == 1 and scenes[0].page_break is False
+
     def test_parse_empty_string_returns_empty(self):
         a = self._analyzer()
         assert a._parse_response("") == []
@@ -192,3 +220,225 @@ class TestSceneAnalyzerWithMock:
         scenes = analyzer.analyze_chunk("テストテキスト")
 
         assert scenes == []
+
+
+def _genai_response(text: str) -> MagicMock:
+    response = MagicMock()
+    response.text = text
+    return response
+
+
+class TestSceneAnalyzerRetryAndStructured:
+    """修復・再試行・JSON 出力モードのテスト（クライアントを注入）。"""
+
+    def test_structured_mode_requests_json_schema(self):
+        client = MagicMock()
+        client.models.generate_content.return_value = _genai_response(_VALID_JSON)
+        analyzer = SceneAnalyzer(client=client, structured=True)
+
+        scenes = analyzer.analyze_chunk("テキスト")
+
+        assert len(scenes) == 1
+        config = client.models.generate_content.call_args.kwargs["config"]
+        assert config.response_mime_type == "application/json"
+        assert config.response_schema["properties"]["scenes"]["type"] == "ARRAY"
+
+    def test_default_mode_has_no_schema(self):
+        client = MagicMock()
+        client.models.generate_content.return_value = _genai_response(_VALID_JSON)
+        SceneAnalyzer(client=client).analyze_chunk("テキスト")
+        config = client.models.generate_content.call_args.kwargs["config"]
+        assert config.response_schema is None
+
+    def test_compact_format_decodes_to_same_scenes(self):
+        from novelmanga.schema import compact_scenes
+
+        verbose = MagicMock()
+        verbose.models.generate_content.return_value = _genai_response(_VALID_JSON)
+        expected = SceneAnalyzer(client=verbose).analyze_chunk("テキスト")
+
+        client = MagicMock()
+        compact_json = json.dumps(compact_scenes(expected), ensure_ascii=False, separators=(",", ":"))
+        client.models.generate_content.return_value = _genai_response(compact_json)
+        analyzer = SceneAnalyzer(client=client, script_format="compact", structured=True)
+
+        assert analyzer.analyze_chunk("テキスト") == expected
+        assert len(compact_json) < len(_VALID_JSON)
+        config = client.models.generate_content.call_args.kwargs["config"]
+        assert set(config.response_schema["properties"]) == {"s"}
+        assert "compact-script-v1" in config.system_instruction
+
+    def test_page_break_parsed(self):
+        data = json.loads(_VALID_JSON)
+        data["scenes"][0]["page_break"] = True
+        client = MagicMock()
+        client.models.generate_content.return_value = _genai_response(json.dumps(data, ensure_ascii=False))
+        scenes = SceneAnalyzer(client=client).analyze_chunk("テキスト")
+        assert scenes[0].page_break is True
+        assert all(not s.page_break for s in scenes[1:])
+
+    def test_unknown_script_format_rejected(self):
+        with pytest.raises(ValueError):
+            SceneAnalyzer(client=MagicMock(), script_format="tiny")
+
+    def test_truncated_response_repaired_without_retry(self):
+        client = MagicMock()
+        truncated = _VALID_JSON[: _VALID_JSON.index('{"panel_number": 2')] + '{"panel_number": 2, "pan'
+        client.models.generate_content.return_value = _genai_response(truncated)
+        analyzer = SceneAnalyzer(client=client)
+
+        scenes = analyzer.analyze_chunk("テキスト")
+
+        assert len(scenes[0].panels) == 1
+        assert client.models.generate_content.call_count == 1
+        assert analyzer.stats.repaired == 1
+        assert analyzer.stats.parse_failure_rate == 0.0
+
+    def test_unusable_response_retried(self):
+        client = MagicMock()
+        client.models.generate_content.side_effect = [
+            _genai_response("申し訳ありませんが、処理できません。"),
+            _genai_response(_VALID_JSON),
+        ]
+        analyzer = SceneAnalyzer(client=client, max_retries=1)
+
+        scenes = analyzer.analyze_chunk("テキスト")
+
+        assert len(scenes) == 1
+        assert analyzer.stats.retries == 1
+        assert analyzer.stats.parse_failures == 1
+        assert analyzer.stats.parse_failure_rate == 0.5
+
+    def test_gives_up_after_max_retries(self):
+        client = MagicMock()
+        client.models.generate_content.return_value = _genai_response("not json")
+        analyzer = SceneAnalyzer(client=client, max_retries=2)
+
+        assert analyzer.analyze_chunk("テキスト") == []
+        assert client.models.generate_content.call_count == 3
+        assert analyzer.stats.failed_chunks == 1
+
+
+class TestSceneAnalyzerChunks:
+    def _chunk(self, text: str = "本文テキスト", start: int = 10):
+        from novelmanga.models import Chunk
+
+        return Chunk(chunk_id="abc123", text=text, start=start, end=start + len(text))
+
+    def test_analyze_records_chunk_id_and_span(self):
+        client = MagicMock()
+        client.models.generate_content.return_value = _genai_response(_VALID_JSON)
+        scenes = SceneAnalyzer(client=client).analyze(self._chunk())
+        assert scenes[0].chunk_id == "abc123"
+        assert scenes[0].source_span == (10, 16)
+
+    def test_cache_skips_unchanged_chunks(self, tmp_path):
+        client = MagicMock()
+        client.models.generate_content.return_value = _genai_response(_VALID_JSON)
+        SceneAnalyzer(client=client, cache_dir=tmp_path).analyze(self._chunk())
+
+        analyzer = SceneAnalyzer(client=client, cache_dir=tmp_path)
+        scenes = analyzer.analyze(self._chunk(start=500))
+
+        assert client.models.generate_content.call_count == 1
+        assert analyzer.stats.cache_hits == 1
+        assert scenes[0].source_span == (500, 506)
+        assert scenes[0].panels[1].dialogue == ["恥の多い生涯を送って来ました。"]
+
+    def test_failed_analysis_not_cached(self, tmp_path):
+        client = MagicMock()
+        client.models.generate_content.return_value = _genai_response("not json")
+        SceneAnalyzer(client=client, cache_dir=tmp_path, max_retries=0).analyze(self._chunk())
+        client.models.generate_content.return_value = _genai_response(_VALID_JSON)
+        scenes = SceneAnalyzer(client=client, cache_dir=tmp_path).analyze(self._chunk())
+        assert len(scenes) == 1
+
+
+class TestContextCache:
+    """システムプロンプトのコンテキストキャッシュ（ローカルのスタンドインで検証）。"""
+
+    def _chunk(self, i: int = 0):
+        from novelmanga.models import Chunk
+
+        text = f"第{i}段。" + "「おはよう」と彼は言った。" * 60
+        return Chunk(chunk_id=str(i), text=text, start=0, end=len(text))
+
+    def _client(self, srv):
+        from novelmanga.transport import create_client
+
+        return create_client("replay", base_url=srv.url, retry_attempts=1)
+
+    def test_reuses_one_cache_and_reports_savings(self):
+        from novelmanga.fake_server import FakeModelServer
+
+        with FakeModelServer() as srv:
+            analyzer = SceneAnalyzer(client=self._client(srv), context_cache=True, context="登場人物: 大庭葉蔵")
+            for i in range(3):
+                assert analyzer.analyze(self._chunk(i))
+            assert srv.stats.context_caches == 1
+            assert srv.stats.cached_requests == 3
+
+        assert "大庭葉蔵" in analyzer.system_instruction
+        assert analyzer.stats.context_cache_calls == 3
+        assert analyzer.stats.cached_tokens_per_call == len(analyzer.system_instruction)
+        assert analyzer.stats.prompt_tokens > analyzer.stats.cached_tokens
+        assert analyzer.stats.output_tokens > 0
+        assert analyzer.stats.api_seconds > 0
+
+    def test_falls_back_when_caching_unavailable(self):
+        from novelmanga.fake_server import FakeModelServer
+
+        with FakeModelServer(cache_min_tokens=10**6) as srv:
+            analyzer = SceneAnalyzer(client=self._client(srv), context_cache=True)
+            assert analyzer.analyze(self._chunk(0))
+            assert analyzer.analyze(self._chunk(1))
+            assert srv.stats.cached_requests == 0
+
+        assert not analyzer.context_cache.available
+        assert analyzer.stats.context_cache_calls == 0
+        assert analyzer.stats.cached_tokens == 0
+
+    def test_refreshes_after_ttl(self):
+        import time
+
+        from novelmanga.fake_server import FakeModelServer
+
+        with FakeModelServer() as srv:
+            analyzer = SceneAnalyzer(client=self._client(srv), context_cache=True, context_cache_ttl=1)
+            analyzer.analyze(self._chunk(0))
+            time.sleep(1.0)
+            analyzer.analyze(self._chunk(1))
+            assert srv.stats.context_caches == 2
+            assert analyzer.stats.context_cache_fallbacks == 0
+
+    def test_rate_limit_keeps_cache(self):
+        from google.genai import errors
+
+        from novelmanga.fake_server import FakeModelServer
+
+        with FakeModelServer(rate_limit=0.001) as srv:
+            analyzer = SceneAnalyzer(client=self._client(srv), context_cache=True)
+            assert analyzer.analyze(self._chunk(0))
+            name = analyzer.context_cache.name()
+            with pytest.raises(errors.ClientError) as exc:
+                analyzer.analyze(self._chunk(1))
+            assert exc.value.code == 429
+            # キャッシュは作り直さず、キャッシュなしの送り直しもしない
+            assert analyzer.context_cache.name() == name
+            assert srv.stats.context_caches == 1
+            assert srv.stats.requests == 2
+            assert analyzer.stats.context_cache_fallbacks == 0
+
+    def test_recreates_cache_deleted_on_server(self):
+        from novelmanga.fake_server import FakeModelServer
+
+        with FakeModelServer() as srv:
+            analyzer = SceneAnalyzer(client=self._client(srv), context_cache=True)
+            analyzer.analyze(self._chunk(0))
+            srv.delete_cached(analyzer.context_cache.name().removeprefix("cachedContents/"))
+
+            assert analyzer.analyze(self._chunk(1))  # 拒否されたらキャッシュなしで送り直す
+            assert analyzer.stats.context_cache_fallbacks == 1
+            assert analyzer.analyze(self._chunk(2))
+            assert srv.stats.context_caches == 2
+            assert analyzer.stats.context_cache_calls == 2
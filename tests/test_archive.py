@@ -0,0 +1,118 @@
+"""アーカイブ出力のテスト。"""
+
+import io
+import zipfile
+
+import pytest
+from PIL import Image
+
+from novelmanga.archive import ArchiveExporter, CbzWriter, EpubWriter, encode_png
+from novelmanga.manifest import plan_chapters
+
+
+def _page(color: int) -> Image.Image:
+    return Image.new("L", (60, 85), color=color)
+
+
+def _export(tmp_path, n: int, per_chapter: bool = False, formats=("cbz",)) -> list:
+    with ArchiveExporter(
+        tmp_path, "novel", "作品", plan_chapters(n, 2), author="著者", formats=formats, per_chapter=per_chapter
+    ) as exporter:
+        for i in range(n):
+            exporter.add(_page(i * 10))
+    return exporter.close()
+
+
+class TestCbz:
+    def test_pages_stored_in_order(self, tmp_path):
+        (path,) = _export(tmp_path, 5)
+        assert path == tmp_path / "novel.cbz"
+        with zipfile.ZipFile(path) as zf:
+            pngs = [i for i in zf.infolist() if i.filename.endswith(".png")]
+            assert [i.filename for i in pngs] == [f"page_{n:04d}.png" for n in range(1, 6)]
+            assert all(i.compress_type == zipfile.ZIP_STORED for i in pngs)
+            with Image.open(io.BytesIO(zf.read("page_0003.png"))) as img:
+                assert img.getpixel((0, 0)) == 20
+
+    def test_comicinfo_bookmarks_chapters(self, tmp_path):
+        (path,) = _export(tmp_path, 5)
+        with zipfile.ZipFile(path) as zf:
+            info = zf.read("ComicInfo.xml").decode("utf-8")
+        assert "<PageCount>5</PageCount>" in info
+        assert 'Image="0"' in info and 'Bookmark="第1章"' in info
+        assert 'Bookmark="第2章"' in info and 'Bookmark="第3章"' in info
+        assert "<Writer>著者</Writer>" in info
+
+    def test_per_chapter_archives(self, tmp_path):
+        paths = _export(tmp_path, 5, per_chapter=True)
+        assert [p.relative_to(tmp_path).as_posix() for p in paths] == [
+            "novel/chapter_01.cbz",
+            "novel/chapter_02.cbz",
+            "novel/chapter_03.cbz",
+        ]
+        with zipfile.ZipFile(paths[-1]) as zf:
+            assert [n for n in zf.namelist() if n.endswith(".png")] == ["page_0001.png"]
+
+    def test_abort_leaves_no_files(self, tmp_path):
+        with pytest.raises(RuntimeError):
+            with ArchiveExporter(tmp_path, "novel", "作品", plan_chapters(3)) as exporter:
+                exporter.add(_page(0))
+                raise RuntimeError("stop")
+        assert list(tmp_path.iterdir()) == []
+
+    def test_unknown_format_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            ArchiveExporter(tmp_path, "novel", "作品", [], formats=("pdf",))
+
+
+class TestEpub:
+    def test_structure(self, tmp_path):
+        (path,) = _export(tmp_path, 3, formats=("epub",))
+        with zipfile.ZipFile(path) as zf:
+            first = zf.infolist()[0]
+            assert first.filename == "mimetype"
+            assert first.compress_type == zipfile.ZIP_STORED
+            assert zf.read("mimetype") == b"application/epub+zip"
+            assert zf.getinfo("OEBPS/images/page_0001.png").compress_type == zipfile.ZIP_STORED
+            opf = zf.read("OEBPS/content.opf").decode("utf-8")
+            nav = zf.read("OEBPS/nav.xhtml").decode("utf-8")
+            page = zf.read("OEBPS/page_0001.xhtml").decode("utf-8")
+        assert "pre-paginated" in opf
+        assert opf.count("<itemref") == 3
+        assert 'href="page_0001.xhtml">第1章' in nav
+        assert 'href="page_0003.xhtml">第2章' in nav
+        assert 'content="width=60, height=85"' in page
+
+    def test_both_formats_share_encoding(self, tmp_path):
+        paths = _export(tmp_path, 2, formats=("cbz", "epub"))
+        with zipfile.ZipFile(paths[0]) as cbz, zipfile.ZipFile(paths[1]) as epub:
+            assert cbz.read("page_0002.png") == epub.read("OEBPS/images/page_0002.png")
+
+
+class TestWriters:
+    def test_title_without_chapters_in_nav(self, tmp_path):
+        writer = EpubWriter(tmp_path / "book.epub", "題名")
+        writer.add_png(encode_png(_page(0)), 60, 85)
+        writer.close()
+        with zipfile.ZipFile(tmp_path / "book.epub") as zf:
+            assert "題名</a>" in zf.read("OEBPS/nav.xhtml").decode("utf-8")
+
+    def test_no_temp_file_after_close(self, tmp_path):
+        writer = CbzWriter(tmp_path / "book.cbz", "題名")
+        writer.add_png(encode_png(_page(0)), 60, 85)
+        writer.close()
+        assert [p.name for p in tmp_path.iterdir()] == ["book.cbz"]
+
+    def test_missing_hook_fails_before_opening(self, tmp_path):
+        from novelmanga.archive import _ZipArchive
+
+        class NoFinish(_ZipArchive):
+            def _page_name(self, index):
+                return f"{index}.png"
+
+            def _write_page(self, index, entry, data):
+                self._write(entry.name, data)
+
+        with pytest.raises(TypeError):
+            NoFinish(tmp_path / "book.zip")
+        assert list(tmp_path.iterdir()) == []
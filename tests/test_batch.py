@@ -0,0 +1,159 @@
+"""バッチジョブ（--batch-submit）のテスト。"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from novelmanga.analyzer import SceneAnalyzer
+from novelmanga.batch import BatchJobRunner, prefill_analysis, prefill_images
+from novelmanga.fake_server import FakeModelServer
+from novelmanga.generator import ImageGenerator
+from novelmanga.models import Chunk
+from novelmanga.transport import create_client
+
+_TEXT = "「おはよう」と彼は言った。" * 80
+
+
+def _chunks(n: int) -> list[Chunk]:
+    return [Chunk(chunk_id=str(i), text=f"第{i}段。" + _TEXT, start=i, end=i + 1) for i in range(n)]
+
+
+def _quiet(_message: str) -> None:
+    pass
+
+
+@pytest.fixture
+def server():
+    with FakeModelServer(batch_delay=0.3) as srv:
+        yield srv
+
+
+@pytest.fixture
+def client(server):
+    return create_client("replay", base_url=server.url, retry_attempts=1)
+
+
+class TestBatchJobRunner:
+    def test_resumes_submitted_job(self, server, client, tmp_path):
+        analyzer = SceneAnalyzer(client=client, cache_dir=tmp_path / "scripts")
+        requests = {analyzer.cache_key(c): analyzer.batch_request(c) for c in _chunks(3)}
+        state = tmp_path / "state.json"
+
+        # 完了前にタイムアウトしても、状態ファイルにジョブが残る
+        runner = BatchJobRunner(client, state, poll_interval=0.01, timeout=0.0, log=_quiet)
+        with pytest.raises(TimeoutError):
+            runner.run("analysis", analyzer.model, requests)
+        entry = json.loads(state.read_text(encoding="utf-8"))["phases"]["analysis"]
+        assert entry["job"].startswith("batches/")
+        assert entry["state"] == "JOB_STATE_PENDING"
+        assert len(entry["keys"]) == 3
+
+        # 再実行では投入し直さずに同じジョブを待つ
+        runner = BatchJobRunner(client, state, poll_interval=0.05, log=_quiet)
+        results = runner.run("analysis", analyzer.model, requests)
+        assert runner.stats.resumed == 1 and runner.stats.submitted == 0
+        assert server.stats.batches == 1
+        assert all(r is not None for r in results.values())
+        assert json.loads(state.read_text(encoding="utf-8"))["phases"]["analysis"]["state"] == "ingested"
+
+    def test_input_file_is_jsonl(self, client, tmp_path):
+        analyzer = SceneAnalyzer(client=client, structured=True)
+        chunk = _chunks(1)[0]
+        runner = BatchJobRunner(client, tmp_path / "state.json", poll_interval=0.05, log=_quiet)
+        runner.run("analysis", analyzer.model, {"k": analyzer.batch_request(chunk)})
+        (input_file,) = tmp_path.glob("state-analysis-*.jsonl")
+        (line,) = input_file.read_text(encoding="utf-8").splitlines()
+        request = json.loads(line)
+        assert request["key"] == "k"
+        assert request["request"]["generationConfig"]["responseMimeType"] == "application/json"
+        assert chunk.text in request["request"]["contents"][0]["parts"][0]["text"]
+
+
+def test_concurrent_polls_process_batch_once(tmp_path):
+    import threading
+    import time
+
+    lines = [{"key": f"k{i}", "request": {"contents": [{"parts": [{"text": f"第{i}段"}]}]}} for i in range(5)]
+    path = tmp_path / "input.jsonl"
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+    with FakeModelServer() as srv:
+        client = create_client("replay", base_url=srv.url, retry_attempts=1)
+        uploaded = client.files.upload(file=str(path), config={"mime_type": "jsonl"})
+        job = client.batches.create(model="gemini-2.5-flash", src=uploaded.name)
+        batch_id = job.name.removeprefix("batches/")
+        respond = srv._respond
+
+        def slow_respond(*args):
+            # 処理中に他のポーリングが来るよう、1 リクエストの処理を遅くする
+            time.sleep(0.01)
+            return respond(*args)
+
+        srv._respond = slow_respond
+        barrier = threading.Barrier(8)
+
+        def poll():
+            barrier.wait()
+            srv.get_batch(batch_id)
+
+        threads = [threading.Thread(target=poll) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert srv.stats.batch_requests == len(lines)
+
+
+class TestPrefill:
+    def test_results_feed_normal_paths_without_sync_calls(self, server, client, tmp_path):
+        analyzer = SceneAnalyzer(client=client, cache_dir=tmp_path / "scripts")
+        generator = ImageGenerator(client=client, cache_dir=tmp_path / "images")
+        runner = BatchJobRunner(client, tmp_path / "state.json", poll_interval=0.05, log=_quiet)
+        chunks = _chunks(3)
+
+        assert prefill_analysis(runner, analyzer, chunks) == 3
+        assert analyzer.stats.calls == 0 and analyzer.stats.batch_results == 3
+        scenes = [s for c in chunks for s in analyzer.analyze(c)]
+        descriptions = [p.visual_description for s in scenes for p in s.panels]
+        assert prefill_images(runner, generator, descriptions) == len(set(descriptions))
+
+        assert all(generator.generate_panel_image(d) is not None for d in descriptions)
+        assert server.stats.requests == 0  # 同期の generateContent は呼ばれない
+        assert server.stats.batches == 2
+        assert analyzer.stats.cache_hits == 3
+        assert generator.stats.cache_hits == len(descriptions)
+        # バッチの結果は API 呼び出しに数えない（--plan の見積もりが膨らまないように）
+        assert generator.stats.api_calls == 0
+        assert generator.stats.batch_results == len(set(descriptions))
+
+        # すべてキャッシュ済みなら投入しない
+        assert prefill_analysis(runner, analyzer, chunks) == 0
+        assert server.stats.batches == 2
+
+    def test_unusable_response_falls_back_to_sync_call(self, server, client, tmp_path):
+        analyzer = SceneAnalyzer(client=client, cache_dir=tmp_path / "scripts")
+        chunk = _chunks(1)[0]
+        assert not analyzer.ingest(chunk, "not json")
+        assert not analyzer.is_cached(chunk) and analyzer.cached_scenes(chunk) is None
+        assert analyzer.stats.batch_failures == 1
+        assert analyzer.analyze(chunk)
+        assert server.stats.requests == 1
+
+
+def test_expired_job_falls_back_to_sync_calls(tmp_path):
+    novel = tmp_path / "novel.txt"
+    novel.write_text("題名\n\n" + "「こんにちは」と彼は言った。\n" * 200, encoding="utf-8")
+    with FakeModelServer(batch_end_state="BATCH_STATE_EXPIRED") as srv:
+        cmd = [
+            sys.executable, "-m", "novelmanga", str(novel),
+            "-o", str(tmp_path / "out"), "--cache-dir", str(tmp_path / "cache"),
+            "--transport", "replay", "--fake-server", srv.url,
+            "--batch-submit", "--batch-poll", "0.05", "--no-images",
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr
+        assert "JOB_STATE_EXPIRED" in result.stderr
+        assert srv.stats.batches == 1 and srv.stats.batch_requests == 0
+        assert srv.stats.requests >= 1  # 解析は同期的に呼び出した
+    assert list((tmp_path / "out").glob("page_*.png"))
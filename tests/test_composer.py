@@ -6,6 +6,7 @@ import pytest
 from PIL import Image
 
 from novelmanga.composer import PAGE_HEIGHT, PAGE_WIDTH, PageComposer
+from novelmanga.sprites import SpriteCache
 from novelmanga.models import Panel, PanelType, Scene
 
 
@@ -144,3 +145,44 @@ class TestPageComposer:
         self.composer.save_page(page, out)
         loaded = Image.open(out)
         assert loaded.size == (PAGE_WIDTH, PAGE_HEIGHT)
+
+
+class TestSpriteCache:
+    def _dialogue_scene(self) -> Scene:
+        panels = [
+            _panel(i + 1, PanelType.DIALOGUE, dialogue=["えっ！", "恥の多い生涯を送って来ました。" * 3], narration="その夜のこと。")
+            for i in range(4)
+        ]
+        return Scene(scene_number=1, source_text="", panels=panels, page_layout="standard")
+
+    def test_sprites_match_direct_drawing(self):
+        scene = self._dialogue_scene()
+        img = Image.new("RGB", (64, 64), color="gray")
+        direct = PageComposer(use_sprites=False).compose_page(scene, [img, None, img, None])
+        cached = PageComposer().compose_page(scene, [img, None, img, None])
+        assert direct.tobytes() == cached.tobytes()
+
+    def test_repeated_shapes_and_lines_hit_cache(self):
+        cache = SpriteCache()
+        composer = PageComposer(sprite_cache=cache)
+        scene = self._dialogue_scene()
+        composer.compose_page(scene, [None] * 4)
+        misses = cache.misses
+        composer.compose_page(scene, [None] * 4)
+        assert cache.misses == misses
+        assert cache.hits > 0
+
+    def test_cache_shared_between_composers(self):
+        cache = SpriteCache()
+        scene = self._dialogue_scene()
+        PageComposer(sprite_cache=cache).compose_page(scene, [None] * 4)
+        entries = len(cache)
+        PageComposer(sprite_cache=cache).compose_page(scene, [None] * 4)
+        # フォントも共有されるので、2 つ目の PageComposer では新規描画が発生しない
+        assert len(cache) == entries
+
+    def test_lru_bound(self):
+        cache = SpriteCache(max_entries=2)
+        for w in (10, 20, 30):
+            cache.bubble(w, 10, 2)
+        assert len(cache) == 2
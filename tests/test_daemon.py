@@ -0,0 +1,101 @@
+"""常駐変換サービスのテスト。"""
+
+import json
+import sys
+
+import pytest
+
+from novelmanga.daemon import DONE, FAILED, ConversionService, DaemonClient, DaemonServer
+from novelmanga.fake_server import FakeModelServer
+from novelmanga.manifest import MANIFEST_NAME
+from novelmanga.transport import create_client
+
+_TEXT = "\n\n".join(["「おはよう」と彼は言った。自分は、道化を演じていた。" * 10] * 4)
+
+
+@pytest.fixture
+def server():
+    with FakeModelServer() as srv:
+        yield srv
+
+
+@pytest.fixture
+def service(tmp_path, server):
+    client = create_client("replay", base_url=server.url, retry_attempts=1)
+    svc = ConversionService(tmp_path / "out", client=client, cache_dir=tmp_path / "cache", max_jobs=2)
+    yield svc
+    svc.shutdown()
+
+
+class TestConversionService:
+    def test_job_writes_pages_and_reports_progress(self, tmp_path, service):
+        job = service.submit({"text": _TEXT, "novel_id": "a", "chunk_size": 400})
+        job = service.wait(job.id, timeout=60)
+        assert job.status == DONE, job.error
+        assert job.chunks_done == job.chunks_total > 1
+        assert job.pages_done == job.pages_total > 0
+        pages = sorted(p.name for p in (tmp_path / "out" / "a").iterdir())
+        assert pages == [f"page_{i:03d}.png" for i in range(1, job.pages_total + 1)]
+        for stage in ("queued", "parse", "analysis", "images", "compose", "first_page", "total"):
+            assert stage in job.timings
+
+    def test_components_are_shared_between_jobs(self, service, server):
+        first = service.wait(service.submit({"text": _TEXT, "novel_id": "a"}).id, timeout=60)
+        requests = server.stats.requests
+        second = service.wait(service.submit({"text": _TEXT, "novel_id": "b"}).id, timeout=60)
+        assert first.status == second.status == DONE
+        # 同じテキストの解析・画像は温まったキャッシュから返る
+        assert server.stats.requests == requests
+        assert service.analyzer.stats.cache_hits > 0
+
+    def test_concurrent_jobs_publish_to_one_manifest(self, tmp_path, service):
+        ids = [
+            service.submit({"text": f"{i}{_TEXT}", "novel_id": f"n{i}", "publish": True, "images": False}).id
+            for i in range(4)
+        ]
+        assert all(service.wait(i, timeout=60).status == DONE for i in ids)
+        manifest = json.loads((tmp_path / "out" / MANIFEST_NAME).read_text(encoding="utf-8"))
+        assert sorted(n["id"] for n in manifest["novels"]) == ["n0", "n1", "n2", "n3"]
+        assert all(n["status"] == "complete" for n in manifest["novels"])
+
+    @pytest.mark.parametrize(
+        "request_body",
+        [{}, {"text": "x"}, {"text": "x", "input_file": "y", "novel_id": "a"}, {"input_file": "missing.txt"},
+         {"text": "x", "novel_id": "../etc"}],
+    )
+    def test_invalid_requests(self, service, request_body):
+        with pytest.raises(ValueError):
+            service.submit(request_body)
+
+    def test_failure_is_reported(self, service, monkeypatch):
+        def broken(*args, **kwargs):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(service.composer, "compose_page", broken)
+        job = service.wait(service.submit({"text": _TEXT, "novel_id": "a", "images": False}).id, timeout=60)
+        assert job.status == FAILED
+        assert "boom" in job.error
+
+
+class TestDaemonServer:
+    def test_http_api(self, service):
+        with DaemonServer(service, port=0) as daemon:
+            client = DaemonClient(daemon.address)
+            assert client.health()["status"] == "ok"
+            job = client.submit(text=_TEXT, novel_id="a", images=False)
+            assert job["status"] in ("queued", "running")
+            assert client.wait(job["id"], timeout=60, poll=0.02)["status"] == DONE
+            assert [j["id"] for j in client.jobs()] == [job["id"]]
+            with pytest.raises(RuntimeError, match="400"):
+                client.submit(text=_TEXT)
+            with pytest.raises(RuntimeError, match="404"):
+                client.job("0123456789ab")
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="Unix ソケットが必要")
+    def test_unix_socket(self, tmp_path, service):
+        with DaemonServer(service, socket_path=tmp_path / "d.sock") as daemon:
+            assert daemon.address.startswith("unix://")
+            client = DaemonClient(daemon.address)
+            job = client.submit(text=_TEXT, novel_id="a", images=False)
+            assert client.wait(job["id"], timeout=60, poll=0.02)["pages_done"] > 0
+        assert not (tmp_path / "d.sock").exists()
@@ -0,0 +1,54 @@
+"""PromptIndex（類似プロンプト検出）のテスト。"""
+
+import pytest
+
+from novelmanga.dedup import PromptIndex, jaccard, shingles
+
+
+class TestShingles:
+    def test_normalizes_case_and_punctuation(self):
+        assert shingles("Dim room, young man!") == shingles("dim ROOM young man")
+
+    def test_drops_stopwords(self):
+        assert "the" not in shingles("the dim room")
+
+    def test_jaccard_empty_is_zero(self):
+        assert jaccard(frozenset(), frozenset({"a"})) == 0.0
+
+
+class TestPromptIndex:
+    def test_finds_near_duplicate(self):
+        index = PromptIndex(threshold=0.8)
+        index.add("dim room, young man sitting alone", "key-1")
+        assert index.query("a dim room, young man sitting alone") == "key-1"
+
+    def test_rejects_dissimilar_prompt(self):
+        index = PromptIndex(threshold=0.8)
+        index.add("dim room, young man sitting alone", "key-1")
+        assert index.query("bright beach with children playing volleyball") is None
+
+    def test_below_threshold_not_reused(self):
+        index = PromptIndex(threshold=0.9)
+        index.add("dim room, young man sitting alone", "key-1")
+        # 6 トークン中 5 トークン一致 → Jaccard 5/7
+        assert index.query("dim room, old woman sitting alone") is None
+
+    def test_returns_best_match(self):
+        index = PromptIndex(threshold=0.5)
+        index.add("dim room young man sitting alone by window", "partial")
+        index.add("dim room young man sitting alone", "exact")
+        assert index.query("dim room young man sitting alone") == "exact"
+
+    def test_empty_index_returns_none(self):
+        assert PromptIndex().query("anything") is None
+
+    def test_invalid_threshold(self):
+        with pytest.raises(ValueError):
+            PromptIndex(threshold=0.0)
+
+    def test_persists_across_instances(self, tmp_path):
+        path = tmp_path / "prompt_index.jsonl"
+        PromptIndex(threshold=0.8, path=path).add("dim room, young man sitting alone", "key-1")
+        reloaded = PromptIndex(threshold=0.8, path=path)
+        assert len(reloaded) == 1
+        assert reloaded.query("dim room, young man sitting alone.") == "key-1"
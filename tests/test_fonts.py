@@ -0,0 +1,72 @@
+"""フォントレジストリのテスト。"""
+
+from unittest.mock import patch
+
+from PIL import ImageFont
+
+from novelmanga import fonts
+from novelmanga.composer import PageComposer
+from novelmanga.fonts import FontRegistry, get_registry
+
+
+def _default_font_path() -> str | None:
+    path = getattr(ImageFont.load_default(), "path", None)
+    return path if isinstance(path, str) else None
+
+
+class TestFontRegistry:
+    def test_candidates_probed_once(self, tmp_path):
+        registry = FontRegistry([str(tmp_path / "missing.ttf")], use_fontconfig=False)
+        with patch("novelmanga.fonts.os.path.exists", return_value=False) as exists:
+            registry.get(20)
+            registry.get(17)
+            registry.get(20)
+        assert exists.call_count == 1
+
+    def test_fonts_shared_per_size(self):
+        registry = FontRegistry([], use_fontconfig=False)
+        assert registry.get(20) is registry.get(20)
+
+    def test_fontconfig_fallback(self):
+        registry = FontRegistry([], use_fontconfig=True)
+        with patch("novelmanga.fonts._fontconfig_lookup", return_value="/fonts/ja.ttf") as lookup, patch(
+            "novelmanga.fonts.ImageFont.truetype", return_value=object()
+        ) as truetype:
+            assert registry.resolve() == "/fonts/ja.ttf"
+            registry.get(20)
+            registry.get(17)
+        lookup.assert_called_once()
+        # 解決時の 20pt 読み込みを再利用するので、読み込みは 20pt・17pt の 2 回だけ
+        assert truetype.call_count == 2
+
+    def test_unloadable_font_path_falls_back(self, tmp_path):
+        broken = tmp_path / "broken.ttf"
+        broken.write_bytes(b"not a font")
+        registry = FontRegistry([], use_fontconfig=False)
+        assert registry.get(20, str(broken)) is registry.get(20)
+
+    def test_prewarm_loads_sizes(self):
+        registry = FontRegistry([], use_fontconfig=False)
+        with patch.object(registry, "get", wraps=registry.get) as get:
+            registry.prewarm((20, 17))
+        assert [c.args[0] for c in get.call_args_list] == [20, 17]
+
+
+class TestComposerFonts:
+    def test_font_path_does_not_leak_between_composers(self, tmp_path):
+        before = list(fonts._FONT_CANDIDATES)
+        PageComposer(font_path=str(tmp_path / "custom.ttf"))
+        assert fonts._FONT_CANDIDATES == before
+
+    def test_composers_share_fonts(self):
+        a, b = PageComposer(), PageComposer()
+        assert a._font_dialogue is b._font_dialogue
+        assert a._font_dialogue is get_registry().get(20)
+
+    def test_custom_font_path_used(self):
+        path = _default_font_path()
+        if path is None:
+            return
+        composer = PageComposer(font_path=path)
+        assert composer._font_dialogue.path == path
+        assert composer._font_dialogue.size == 20
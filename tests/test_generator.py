@@ -114,6 +114,21 @@ class TestImageGenerator:
 
         assert result is None
 
+    @patch("google.genai.Client")
+    def test_blocked_response_timed_once(self, mock_client_cls):
+        from novelmanga.generator import ImageGenerator
+
+        # セーフティでブロックされると candidates が空で返る
+        mock_client = MagicMock()
+        mock_client.models.generate_content.return_value = MagicMock(candidates=None)
+        mock_client_cls.return_value = mock_client
+
+        gen = ImageGenerator(api_key="test")
+        with patch("novelmanga.generator.time.perf_counter", side_effect=[10.0, 12.5, 20.0, 30.0]):
+            assert gen.generate_panel_image("Description") is None
+        assert gen.stats.api_seconds == 2.5
+        assert gen.stats.failures == 1
+
     @patch("google.genai.Client")
     def test_custom_size(self, mock_client_cls):
         from novelmanga.generator import ImageGenerator
@@ -142,3 +157,191 @@ class TestImageGenerator:
         contents = call_kwargs.kwargs.get("contents") or call_kwargs.args[1] if len(call_kwargs.args) > 1 else call_kwargs.kwargs["contents"]
         assert "A samurai scene" in contents
         assert _MANGA_STYLE in contents
+
+
+class TestImageGeneratorCaching:
+    @patch("google.genai.Client")
+    def test_disk_cache_skips_second_call(self, mock_client_cls, tmp_path):
+        from novelmanga.generator import ImageGenerator
+
+        mock_client = _make_mock_client(_make_png_bytes())
+        mock_client_cls.return_value = mock_client
+
+        gen = ImageGenerator(api_key="test", cache_dir=tmp_path)
+        gen.generate_panel_image("A dark room")
+        gen2 = ImageGenerator(api_key="test", cache_dir=tmp_path)
+        result = gen2.generate_panel_image("A dark room")
+
+        assert result is not None
+        assert mock_client.models.generate_content.call_count == 1
+        assert gen2.stats.cache_hits == 1
+
+    @patch("google.genai.Client")
+    def test_undecodable_response_is_not_cached(self, mock_client_cls, tmp_path):
+        from novelmanga.generator import ImageGenerator
+
+        mock_client = _make_mock_client(b"not an image")
+        mock_client_cls.return_value = mock_client
+
+        gen = ImageGenerator(api_key="test", cache_dir=tmp_path, similarity_threshold=0.8)
+        assert gen.generate_panel_image("A dark room") is None
+        assert not gen.is_cached("A dark room")
+        assert gen.stats.failures == 1
+        # 次の呼び出しでは改めて生成する
+        mock_client.models.generate_content.return_value = _make_mock_client(
+            _make_png_bytes()
+        ).models.generate_content.return_value
+        assert gen.generate_panel_image("A dark room") is not None
+        assert mock_client.models.generate_content.call_count == 2
+
+    @patch("google.genai.Client")
+    def test_ingest_skips_undecodable_image(self, mock_client_cls, tmp_path):
+        from novelmanga.generator import ImageGenerator
+
+        mock_client_cls.return_value = _make_mock_client(_make_png_bytes())
+        gen = ImageGenerator(api_key="test", cache_dir=tmp_path)
+        assert not gen.ingest("A dark room", b"not an image")
+        assert not gen.is_cached("A dark room")
+        assert gen.ingest("A dark room", _make_png_bytes())
+        assert gen.is_cached("A dark room")
+
+    @patch("google.genai.Client")
+    def test_similar_prompt_reuses_image(self, mock_client_cls):
+        from novelmanga.generator import ImageGenerator
+
+        mock_client = _make_mock_client(_make_png_bytes())
+        mock_client_cls.return_value = mock_client
+
+        gen = ImageGenerator(api_key="test", similarity_threshold=0.8)
+        gen.generate_panel_image("dim room, young man sitting alone")
+        result = gen.generate_panel_image("A dim room, young man sitting alone.")
+
+        assert result is not None
+        assert mock_client.models.generate_content.call_count == 1
+        assert gen.stats.similar_hits == 1
+        assert gen.stats.calls_saved == 1
+
+    @patch("google.genai.Client")
+    def test_dissimilar_prompt_generates(self, mock_client_cls):
+        from novelmanga.generator import ImageGenerator
+
+        mock_client = _make_mock_client(_make_png_bytes())
+        mock_client_cls.return_value = mock_client
+
+        gen = ImageGenerator(api_key="test", similarity_threshold=0.8)
+        gen.generate_panel_image("dim room, young man sitting alone")
+        gen.generate_panel_image("crowded train station at rush hour")
+
+        assert mock_client.models.generate_content.call_count == 2
+        assert gen.stats.api_calls == 2
+        assert gen.stats.calls_saved == 0
+
+    @patch("google.genai.Client")
+    def test_similarity_index_persists_with_cache(self, mock_client_cls, tmp_path):
+        from novelmanga.generator import ImageGenerator
+
+        mock_client = _make_mock_client(_make_png_bytes())
+        mock_client_cls.return_value = mock_client
+
+        ImageGenerator(api_key="test", cache_dir=tmp_path, similarity_threshold=0.8) \
+            .generate_panel_image("dim room, young man sitting alone")
+        gen = ImageGenerator(api_key="test", cache_dir=tmp_path, similarity_threshold=0.8)
+        gen.generate_panel_image("dim room, the young man sitting alone")
+
+        assert mock_client.models.generate_content.call_count == 1
+        assert gen.stats.similar_hits == 1
+
+
+def _sheet_scene(n: int):
+    from novelmanga.models import Panel, PanelType, Scene
+
+    return Scene(
+        scene_number=1,
+        source_text="",
+        panels=[Panel(i + 1, PanelType.ACTION, f"panel {i} of {n}") for i in range(n)],
+    )
+
+
+class TestPanelSheets:
+    """複数コマをまとめたシート画像の生成と切り出し。"""
+
+    @pytest.mark.parametrize("n", [3, 4, 5, 6])
+    def test_crop_matches_layout(self, n):
+        from novelmanga.composer import PAGE_HEIGHT, PAGE_WIDTH, PageComposer
+        from novelmanga.fake_server import synthetic_sheet
+        from novelmanga.generator import _grid_box, crop_sheet
+
+        rects = PageComposer(use_sprites=False).panel_rects(_sheet_scene(n))
+        boxes = [_grid_box(r, (PAGE_WIDTH, PAGE_HEIGHT)) for r in rects]
+        sheet = Image.open(io.BytesIO(synthetic_sheet(7, boxes)))
+        crops = crop_sheet(sheet, boxes)
+
+        assert crops is not None and len(crops) == n
+        for crop, (x1, y1, x2, y2) in zip(crops, boxes):
+            expected = ((x2 - x1) * sheet.width / 1000, (y2 - y1) * sheet.height / 1000)
+            assert expected[0] * 0.95 <= crop.width <= expected[0]
+            assert expected[1] * 0.95 <= crop.height <= expected[1]
+            # ガターも枠線も含まない
+            assert 0 < crop.getpixel((0, crop.height // 2)) < 245
+
+    def test_sheet_without_gutters_is_rejected(self):
+        from novelmanga.generator import crop_sheet
+
+        assert crop_sheet(Image.new("L", (768, 1086), 200), [(11, 7, 488, 492), (511, 7, 988, 492)]) is None
+
+    def test_one_call_per_scene_and_crops_cached(self, tmp_path):
+        from novelmanga.composer import PAGE_HEIGHT, PAGE_WIDTH, PageComposer
+        from novelmanga.fake_server import FakeModelServer
+        from novelmanga.generator import ImageGenerator
+        from novelmanga.transport import create_client
+
+        scene = _sheet_scene(6)
+        descriptions = [p.visual_description for p in scene.panels]
+        rects = PageComposer(use_sprites=False).panel_rects(scene)
+        with FakeModelServer() as srv:
+            client = create_client("replay", base_url=srv.url, retry_attempts=1)
+            gen = ImageGenerator(client=client, cache_dir=tmp_path, sheet_min_panels=4)
+            result = gen.generate_scene_images(descriptions, rects, (PAGE_WIDTH, PAGE_HEIGHT))
+
+            assert all(img is not None and img.size == (512, 512) for img in result.images)
+            assert (result.calls, result.saved, result.fallback) == (1, 5, False)
+            assert srv.stats.requests == 1
+            assert gen.stats.sheet_calls_saved == 5
+
+            # 切り出したコマはコマ単位のキャッシュから読める
+            again = ImageGenerator(client=client, cache_dir=tmp_path).generate_scene_images(
+                descriptions, rects, (PAGE_WIDTH, PAGE_HEIGHT)
+            )
+            assert again.calls == 0
+            assert srv.stats.requests == 1
+
+    @patch("google.genai.Client")
+    def test_falls_back_to_per_panel_calls(self, mock_client_cls):
+        from novelmanga.composer import PAGE_HEIGHT, PAGE_WIDTH, PageComposer
+        from novelmanga.generator import ImageGenerator
+
+        # ガターのない画像しか返らないので切り出せない
+        mock_client = _make_mock_client(_make_png_bytes((512, 512)))
+        mock_client_cls.return_value = mock_client
+        scene = _sheet_scene(4)
+
+        gen = ImageGenerator(api_key="test", sheet_min_panels=4)
+        result = gen.generate_scene_images(
+            [p.visual_description for p in scene.panels],
+            PageComposer(use_sprites=False).panel_rects(scene),
+            (PAGE_WIDTH, PAGE_HEIGHT),
+        )
+
+        assert result.fallback
+        assert all(img is not None for img in result.images)
+        assert result.calls == mock_client.models.generate_content.call_count == 5
+        assert result.saved == -1
+        assert gen.stats.sheet_fallbacks == 1
+        assert gen.stats.sheet_calls_saved == -1
+
+    def test_uses_sheet_threshold(self):
+        from novelmanga.generator import ImageGenerator
+
+        assert not ImageGenerator(client=MagicMock()).uses_sheet(6)
+        gen = ImageGenerator(client=MagicMock(), sheet_min_panels=4)
+        assert [gen.uses_sheet(n) for n in (1, 3, 4, 6)] == [False, False, True, True]
@@ -0,0 +1,182 @@
+"""ジョブキューとワーカーのテスト。"""
+
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from novelmanga.fake_server import FakeModelServer
+from novelmanga.jobqueue import DONE, FAILED, LEASED, PENDING, SQLiteJobQueue, open_queue
+from novelmanga.models import Chunk
+from novelmanga.transport import create_client
+from novelmanga.worker import Worker, submit_run
+
+_TEXT = "「おはよう」と彼は言った。" * 80
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = SQLiteJobQueue(tmp_path / "jobs.db", retry_backoff=0.0)
+    yield q
+    q.close()
+
+
+class TestSQLiteJobQueue:
+    def test_submit_is_idempotent(self, queue):
+        assert queue.submit("a", "analysis", {"x": 1})
+        assert not queue.submit("a", "analysis", {"x": 2})
+        assert queue.get("a").payload == {"x": 1}
+
+    def test_lease_is_exclusive(self, queue):
+        queue.submit("a", "analysis", {})
+        job = queue.lease("w1")
+        assert job.id == "a" and job.status == LEASED and job.attempts == 1
+        assert queue.lease("w2") is None
+
+    def test_priority_order(self, queue):
+        queue.submit("late", "image", {}, priority=5)
+        queue.submit("early", "image", {}, priority=1)
+        assert queue.lease("w").id == "early"
+
+    def test_kinds_filter(self, queue):
+        queue.submit("a", "analysis", {})
+        assert queue.lease("w", kinds=["image"]) is None
+        assert queue.lease("w", kinds=["analysis"]).id == "a"
+
+    def test_dependencies(self, queue):
+        queue.submit("compose", "compose", {}, deps=["img"])
+        assert queue.lease("w") is None  # 依存ジョブが未投入
+        queue.submit("img", "image", {})
+        assert queue.lease("w").id == "img"
+        assert queue.lease("w") is None
+        queue.complete("img", "w", {"ok": True})
+        assert queue.lease("w").id == "compose"
+
+    def test_complete_stores_result_once(self, queue):
+        queue.submit("a", "analysis", {})
+        queue.lease("w")
+        assert queue.complete("a", "w", {"scenes": []})
+        assert not queue.complete("a", "w", {"scenes": [1]})
+        assert queue.results(["a", "missing"]) == {"a": {"scenes": []}}
+
+    def test_retry_then_fail(self, queue):
+        queue.submit("a", "image", {}, max_attempts=2)
+        queue.submit("b", "compose", {}, deps=["a"])
+        queue.lease("w")
+        assert queue.fail("a", "w", "boom")
+        assert queue.get("a").status == PENDING
+        assert queue.lease("w").attempts == 2
+        queue.fail("a", "w", "boom again")
+        assert queue.get("a").status == FAILED
+        assert queue.get("a").error == "boom again"
+        # 依存ジョブの失敗は次の lease で伝播する
+        assert queue.lease("w") is None
+        assert queue.get("b").status == FAILED
+
+    def test_expired_lease_is_reclaimed(self, queue):
+        queue.submit("a", "analysis", {})
+        queue.lease("w1", lease_seconds=0.01)
+        time.sleep(0.05)
+        job = queue.lease("w2")
+        assert job.id == "a" and job.attempts == 2
+        # 古いリースの持ち主は完了できない
+        assert not queue.complete("a", "w1", {})
+        assert queue.complete("a", "w2", {})
+
+    def test_heartbeat_extends_lease(self, queue):
+        queue.submit("a", "analysis", {})
+        queue.lease("w1", lease_seconds=0.05)
+        assert queue.heartbeat("a", "w1", lease_seconds=60)
+        time.sleep(0.1)
+        assert queue.lease("w2") is None
+
+    def test_counts(self, queue):
+        queue.submit("a", "analysis", {})
+        queue.submit("b", "analysis", {})
+        queue.lease("w")
+        assert queue.counts() == {PENDING: 1, LEASED: 1, DONE: 0, FAILED: 0}
+
+    def test_open_queue_url(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        q = open_queue("sqlite:///rel.db")
+        assert q.path == Path("rel.db")
+        q.close()
+        with pytest.raises(ValueError):
+            open_queue("redis://localhost/0")
+
+
+@pytest.fixture
+def server():
+    with FakeModelServer() as srv:
+        yield srv
+
+
+def _chunks(n: int) -> list[Chunk]:
+    return [Chunk(chunk_id=f"c{i}", text=f"{i}:{_TEXT}", start=i, end=i + 1) for i in range(n)]
+
+
+class TestWorker:
+    def test_run_produces_numbered_pages(self, tmp_path, queue, server):
+        out = tmp_path / "out"
+        submit_run(queue, _chunks(2), "run", out, tmp_path / "cache")
+        client = create_client("replay", base_url=server.url, retry_attempts=1)
+        worker = Worker(queue, client=client, poll_interval=0.01)
+        stats = worker.run(exit_when_idle=True)
+
+        counts = queue.counts()
+        assert counts[FAILED] == 0 and counts[PENDING] == 0
+        pages = sorted(p.name for p in out.iterdir())
+        assert pages == [f"page_{i:03d}.png" for i in range(1, len(pages) + 1)]
+        assert stats.completed == counts[DONE]
+
+    def test_resubmit_does_not_duplicate_work(self, tmp_path, queue, server):
+        chunks = _chunks(1)
+        assert submit_run(queue, chunks, "run", tmp_path / "out", tmp_path / "cache") == 1
+        client = create_client("replay", base_url=server.url, retry_attempts=1)
+        Worker(queue, client=client, poll_interval=0.01).run(exit_when_idle=True)
+        requests = server.stats.requests
+        assert submit_run(queue, chunks, "run", tmp_path / "out", tmp_path / "cache") == 0
+        Worker(queue, client=client, poll_interval=0.01).run(exit_when_idle=True)
+        assert server.stats.requests == requests
+
+    def test_failed_jobs_are_retried(self, tmp_path, queue, server):
+        out = tmp_path / "out"
+        submit_run(queue, _chunks(2), "run", out, tmp_path / "cache")
+        client = create_client("replay", base_url=server.url, retry_attempts=1)
+        worker = Worker(queue, client=client, poll_interval=0.01)
+        # 各ジョブの 1 回目だけ失敗させる
+        handlers = dict(worker._handlers)
+
+        def flaky(job):
+            if job.attempts == 1:
+                raise RuntimeError("transient")
+            return handlers[job.kind](job)
+
+        worker._handlers = {kind: flaky for kind in handlers}
+        stats = worker.run(exit_when_idle=True)
+        counts = queue.counts()
+        assert counts[FAILED] == 0
+        assert stats.failed == stats.completed == counts[DONE]
+        assert list(out.glob("page_*.png"))
+
+    def test_multiple_worker_processes(self, tmp_path, queue, server):
+        out = tmp_path / "out"
+        submit_run(queue, _chunks(3), "run", out, tmp_path / "cache")
+        cmd = [
+            sys.executable, "-m", "novelmanga", "worker",
+            "--queue", str(queue.path),
+            "--transport", "replay", "--fake-server", server.url,
+            "--exit-when-idle", "--poll-interval", "0.05",
+        ]
+        procs = [subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) for _ in range(3)]
+        outputs = [p.communicate(timeout=120)[0] for p in procs]
+        assert all(p.returncode == 0 for p in procs)
+        counts = queue.counts()
+        assert counts[FAILED] == 0 and counts[DONE] > 0
+        # 3 プロセスで分担し、同じジョブを二重に完了していない
+        completed = sum(int(o.rsplit("完了 ", 1)[1].split(" ")[0]) for o in outputs)
+        assert completed == counts[DONE]
+        results = queue.results([f"run/analysis/{i:05d}" for i in range(3)])
+        assert len(list(out.glob("page_*.png"))) == sum(len(r["scenes"]) for r in results.values())
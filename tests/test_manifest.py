@@ -0,0 +1,47 @@
+"""章分割のテスト。"""
+
+import json
+
+from novelmanga.manifest import novel_entry, plan_chapters, split_chapters, upsert_chapters, upsert_novel
+
+
+class TestPlanChapters:
+    def test_single_chapter(self):
+        (ch,) = plan_chapters(7)
+        assert (ch.id, ch.title, ch.start, ch.end) == ("chapter_01", "全編", 0, 7)
+
+    def test_fixed_size_chapters(self):
+        chapters = plan_chapters(7, 3)
+        assert [(c.start, c.end) for c in chapters] == [(0, 3), (3, 6), (6, 7)]
+        assert [c.title for c in chapters] == ["第1章", "第2章", "第3章"]
+        assert len(chapters[-1]) == 1
+
+    def test_empty(self):
+        assert plan_chapters(0, 3) == []
+
+
+class TestSplitChapters:
+    def test_matches_plan(self):
+        pages = [f"n/page_{i:03d}.png" for i in range(1, 6)]
+        chapters = split_chapters(pages, 2)
+        assert [c["pages"] for c in chapters] == [pages[0:2], pages[2:4], pages[4:5]]
+        assert chapters[0]["id"] == "chapter_01"
+
+
+class TestUpsertChapters:
+    def test_replaces_only_given_chapters(self, tmp_path):
+        path = tmp_path / "manga-manifest.json"
+        upsert_novel(path, novel_entry("other", "Other", "", ["other/page_001.png"]))
+        upsert_chapters(path, "n", "N", "A", [
+            {"id": "chapter_03", "title": "第三の手記", "pages": ["n/chapter_03/page_001.png"]},
+        ])
+        upsert_chapters(path, "n", "N", "A", [
+            {"id": "chapter_01", "title": "はしがき", "pages": ["n/chapter_01/page_001.png"]},
+            {"id": "chapter_03", "title": "第三の手記", "pages": ["n/chapter_03/page_001.png", "n/chapter_03/page_002.png"]},
+        ])
+        novels = {n["id"]: n for n in json.loads(path.read_text(encoding="utf-8"))["novels"]}
+        assert set(novels) == {"other", "n"}
+        novel = novels["n"]
+        assert [c["id"] for c in novel["chapters"]] == ["chapter_01", "chapter_03"]
+        assert len(novel["chapters"][1]["pages"]) == 2
+        assert novel["coverImage"] == "n/chapter_01/page_001.png"
@@ -0,0 +1,149 @@
+"""メモリ上限とパネル画像の退避のテスト。"""
+
+import argparse
+
+import pytest
+from PIL import Image
+
+from novelmanga import memory
+from novelmanga.memory import MemoryBudget, PanelImageStore, image_nbytes, parse_size, size_arg
+from novelmanga.models import Chunk, Panel, PanelType, Scene
+from novelmanga.pipeline import ReaderOrderPipeline
+from novelmanga.writer import PageWriter
+
+
+def _script(n_scenes: int) -> list[Scene]:
+    """1 シーン 3 コマの合成脚本。"""
+    return [
+        Scene(
+            scene_number=s,
+            source_text="",
+            panels=[
+                Panel(panel_number=p, panel_type=PanelType.ACTION, visual_description=f"{s}-{p}")
+                for p in range(1, 4)
+            ],
+        )
+        for s in range(1, n_scenes + 1)
+    ]
+
+
+def _panel(s: int, p: int) -> Image.Image:
+    return Image.new("L", (64, 64), color=(s * 3 + p) % 256)
+
+
+class TestParseSize:
+    @pytest.mark.parametrize(
+        "text,expected",
+        [("1024", 1024), ("512M", 512 << 20), ("2G", 2 << 30), ("1.5GiB", 3 << 29), ("64kb", 64 << 10)],
+    )
+    def test_units(self, text, expected):
+        assert parse_size(text) == expected
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_size("lots")
+
+    def test_size_arg_reports_argparse_error(self):
+        assert size_arg("256M") == 256 << 20
+        with pytest.raises(argparse.ArgumentTypeError, match="lots"):
+            size_arg("lots")
+
+
+class TestPanelImageStore:
+    def test_1000_scene_script_stays_within_budget(self, tmp_path):
+        scenes = _script(1000)
+        limit = 40 * image_nbytes(_panel(0, 0))
+        with PanelImageStore(max_bytes=limit, spill_dir=tmp_path) as store:
+            # __main__ と同じく全シーンの画像を生成してから合成する
+            for scene in scenes:
+                for panel in scene.panels:
+                    store.put((scene.scene_number, panel.panel_number), _panel(scene.scene_number, panel.panel_number))
+                    assert store.bytes <= limit
+            assert store.peak_bytes <= limit
+            assert len(store) == 3000
+            assert store.stats.spilled == 3000 - 40
+
+            for scene in scenes:
+                for panel in scene.panels:
+                    img = store.pop((scene.scene_number, panel.panel_number))
+                    assert img.getpixel((0, 0)) == _panel(scene.scene_number, panel.panel_number).getpixel((0, 0))
+            assert store.stats.reloaded == store.stats.spilled
+            assert len(store) == 0
+        assert not any(tmp_path.rglob("*.png"))
+
+    def test_unbounded_store_keeps_images_in_memory(self):
+        store = PanelImageStore()
+        store.put("a", _panel(1, 1))
+        store.put("b", None)
+        assert store.stats.spilled == 0
+        assert store.pop("b") is None
+        assert store.pop("a").size == (64, 64)
+
+    def test_close_removes_spill_files(self, tmp_path):
+        store = PanelImageStore(max_bytes=0, spill_dir=tmp_path)
+        store.put("a", _panel(1, 1))
+        assert any(tmp_path.rglob("*.png"))
+        store.close()
+        assert not any(tmp_path.rglob("*.png"))
+
+
+class TestMemoryBudget:
+    def test_throttle_spills_when_over(self, monkeypatch):
+        rss = {"value": 10}
+        monkeypatch.setattr(memory, "current_rss", lambda: rss["value"])
+        store = PanelImageStore()
+        budget = MemoryBudget(1 << 30, store, max_wait=0.01, poll=0.001)
+        store.put("a", _panel(1, 1))
+        budget.throttle()
+        assert store.stats.spilled == 0
+
+        rss["value"] = 2 << 30
+        budget.throttle()
+        assert store.stats.spilled == 1
+        assert budget.stats.throttled == 1
+        # 待っても下がらなかった後は待たない
+        budget.throttle()
+        assert budget.stats.throttled == 1
+
+        rss["value"] = 10
+        budget.throttle()
+        rss["value"] = 2 << 30
+        budget.throttle()
+        assert budget.stats.throttled == 2
+        store.close()
+
+    def test_store_share_of_budget(self):
+        budget = MemoryBudget(4000)
+        assert budget.store.max_bytes == 1000
+
+    def test_pipeline_with_budget(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(memory, "current_rss", lambda: 1 << 40)
+        scenes = _script(40)
+
+        class Analyzer:
+            def analyze(self, chunk):
+                i = int(chunk.chunk_id)
+                return scenes[i * 10 : (i + 1) * 10]
+
+        class Generator:
+            def generate_panel_image(self, description):
+                s, p = map(int, description.split("-"))
+                return _panel(s, p)
+
+        class Composer:
+            def compose_page(self, scene, images):
+                assert all(img is not None for img in images)
+                return Image.new("L", (4, 4))
+
+        budget = MemoryBudget(8 * image_nbytes(_panel(0, 0)), PanelImageStore(spill_dir=tmp_path / "spill"),
+                              max_wait=0.01, poll=0.001)
+        chunks = [Chunk(chunk_id=str(i), text="", start=i, end=i + 1) for i in range(4)]
+        with PageWriter(threads=0) as writer:
+            result = ReaderOrderPipeline(
+                Analyzer(), Composer(), writer, tmp_path / "out", generator=Generator(), workers=4, budget=budget
+            ).run(chunks)
+        assert len(result) == 40
+        assert len(list((tmp_path / "out").iterdir())) == 40
+        assert budget.stats.spilled > 0
+        assert budget.store.peak_bytes <= budget.store.max_bytes
+        budget.store.close()
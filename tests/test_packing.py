@@ -0,0 +1,100 @@
+"""ページ割り（packing）のテスト。"""
+
+import pytest
+
+from novelmanga.models import Panel, PanelType, Scene
+from novelmanga.packing import ScenePacker, misaligned, pack_scenes, row_ends
+
+
+def _scene(n: int, panels: int, layout: str = "standard", page_break: bool = False) -> Scene:
+    return Scene(
+        scene_number=n,
+        source_text=f"本文{n}",
+        panels=[Panel(i + 1, PanelType.ACTION, f"scene {n} panel {i + 1}") for i in range(panels)],
+        page_layout=layout,
+        chunk_id=f"c{n}",
+        source_span=(n * 10, n * 10 + 10),
+        page_break=page_break,
+    )
+
+
+def _shape(pages) -> list[list[int]]:
+    return [[s.scene_number for s in page.scenes] for page in pages]
+
+
+class TestRowEnds:
+    def test_rows_follow_layout_templates(self):
+        assert row_ends(4) == {2, 4}
+        assert row_ends(5) == {2, 5}
+        assert row_ends(6) == {2, 4, 6}
+        assert row_ends(3, "action") == {1, 3}
+        assert row_ends(3) == {1, 2, 3}
+
+    def test_misaligned_counts_boundaries_inside_rows(self):
+        assert misaligned([_scene(1, 2), _scene(2, 2)]) == 0
+        assert misaligned([_scene(1, 1), _scene(2, 3)]) == 1
+        assert misaligned([_scene(1, 3)]) == 0
+
+
+class TestPackScenes:
+    def test_minimizes_pages(self):
+        scenes = [_scene(i, n) for i, n in enumerate([2, 2, 2, 1, 3, 6, 1], 1)]
+        pages = pack_scenes(scenes)
+        assert _shape(pages) == [[1, 2, 3], [4, 5], [6], [7]]
+        assert [p.start for p in pages] == [0, 3, 5, 6]
+
+    def test_prefers_row_aligned_boundaries(self):
+        # 1+1+2 | 2 も 1+1 | 2+2 も 2 ページだが、後者は境目がすべて段の区切りに来る
+        scenes = [_scene(i, n) for i, n in enumerate([1, 1, 2, 2], 1)]
+        pages = pack_scenes(scenes, max_panels=4)
+        assert _shape(pages) == [[1, 2], [3, 4]]
+        assert sum(misaligned(p.scenes) for p in pages) == 0
+
+    def test_page_break_and_explicit_breaks(self):
+        scenes = [_scene(1, 1), _scene(2, 1, page_break=True), _scene(3, 1), _scene(4, 1)]
+        assert _shape(pack_scenes(scenes)) == [[1], [2, 3, 4]]
+        assert _shape(pack_scenes(scenes, breaks=[3])) == [[1], [2, 3], [4]]
+
+    def test_different_layouts_not_merged(self):
+        scenes = [_scene(1, 1), _scene(2, 2, "action"), _scene(3, 1, "action"), _scene(4, 1)]
+        assert _shape(pack_scenes(scenes)) == [[1], [2, 3], [4]]
+
+    def test_large_scene_kept_alone(self):
+        scenes = [_scene(1, 1), _scene(2, 8), _scene(3, 1)]
+        assert _shape(pack_scenes(scenes)) == [[1], [2], [3]]
+
+    def test_max_panels_validated(self):
+        with pytest.raises(ValueError):
+            pack_scenes([], max_panels=7)
+        assert pack_scenes([]) == []
+
+
+class TestPackedPage:
+    def test_as_scene_merges_and_renumbers(self):
+        a, b = _scene(1, 2, page_break=True), _scene(2, 3)
+        merged = pack_scenes([a, b])[0].as_scene()
+        assert merged.scene_number == 1
+        assert [p.panel_number for p in merged.panels] == [1, 2, 3, 4, 5]
+        assert [p.visual_description for p in merged.panels][2] == "scene 2 panel 1"
+        assert merged.source_text == "本文1\n本文2"
+        assert merged.source_span == (10, 30)
+        assert merged.chunk_id == "c1" and merged.page_break
+        # 元のシーンのコマ番号は変えない
+        assert [p.panel_number for p in b.panels] == [1, 2, 3]
+
+    def test_single_scene_page_returns_original(self):
+        scene = _scene(1, 6)
+        assert pack_scenes([scene])[0].as_scene() is scene
+
+
+class TestScenePacker:
+    def test_stats(self):
+        packer = ScenePacker(max_panels=4)
+        scenes = packer([_scene(1, 2), _scene(2, 2), _scene(3, 4)])
+        assert [len(s.panels) for s in scenes] == [4, 4]
+        packer([_scene(4, 1)])
+        st = packer.stats
+        assert (st.scenes, st.pages, st.pages_saved, st.merged_pages) == (4, 3, 1, 1)
+        assert st.bytes_saved_estimate is None
+        st.bytes_written = 3000
+        assert st.to_dict()["bytes_saved_estimate"] == 1000
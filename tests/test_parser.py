@@ -1,7 +1,7 @@
 """AozoraBunkoParser のテスト。"""
 
 import pytest
-from novelmanga.parser import AozoraBunkoParser
+from novelmanga.parser import AozoraBunkoParser, parse_chapter_spec
 
 
 SAMPLE_WITH_SEPARATOR = """\
@@ -110,3 +110,189 @@ class TestAozoraBunkoParser:
     def test_parse_file_not_found(self):
         with pytest.raises(Exception):
             self.parser.parse_file("/nonexistent/path/file.txt")
+
+    # --- split_chunks / chunk_content_defined ---
+
+    def test_split_chunks_matches_chunk_for_analysis(self):
+        text = "\n\n".join(f"段落{i}テキスト" * 3 for i in range(20))
+        chunks = self.parser.split_chunks(text, chunk_size=60)
+        assert [c.text for c in chunks] == self.parser.chunk_for_analysis(text, chunk_size=60)
+
+    def test_split_chunks_spans_point_into_text(self):
+        text = "  段落A\n\n段落B  \n\n\n段落C"
+        chunks = self.parser.split_chunks(text, chunk_size=3)
+        assert [text[c.start:c.end] for c in chunks] == ["段落A", "段落B", "段落C"]
+
+    def _novel(self, n: int = 300) -> list[str]:
+        return [f"{i}番目の段落です。" + "文章" * (i % 17 + 5) for i in range(n)]
+
+    def test_content_defined_covers_all_lines_in_order(self):
+        text = "\n".join(self._novel())
+        chunks = self.parser.chunk_content_defined(text, chunk_size=400)
+        assert "\n".join(c.text for c in chunks) == text
+        for c in chunks:
+            assert text[c.start:c.end] == c.text
+
+    def test_content_defined_respects_size_bounds(self):
+        text = "\n".join(self._novel())
+        chunks = self.parser.chunk_content_defined(text, chunk_size=400, min_size=100)
+        for c in chunks[:-1]:
+            body = c.text.replace("\n", "")
+            assert 100 <= len(body) <= 400
+
+    def test_content_defined_insertion_only_changes_local_chunk(self):
+        lines = self._novel()
+        before = self.parser.chunk_content_defined("\n".join(lines), chunk_size=400)
+        edited = lines[:3] + ["挿入された段落。"] + lines[3:]
+        after = self.parser.chunk_content_defined("\n".join(edited), chunk_size=400)
+
+        before_ids = [c.chunk_id for c in before]
+        after_ids = [c.chunk_id for c in after]
+        changed = set(after_ids) - set(before_ids)
+        assert len(changed) == 1
+        assert after_ids[-10:] == before_ids[-10:]
+
+    def test_content_defined_edits_stay_local(self):
+        """どの位置で段落を挿入・削除・書き換えても、変わるのは編集箇所の近くのチャンクだけ。"""
+        lines = self._novel()
+        before = self.parser.chunk_content_defined("\n".join(lines), chunk_size=400)
+        before_ids = [c.chunk_id for c in before]
+        changed_counts = []
+        for i in range(0, len(lines), 5):
+            for edited in (
+                lines[:i] + ["挿入された段落。"] + lines[i:],
+                lines[:i] + lines[i + 1 :],
+                lines[:i] + [lines[i] + "追記"] + lines[i + 1 :],
+            ):
+                after_ids = [c.chunk_id for c in self.parser.chunk_content_defined("\n".join(edited), chunk_size=400)]
+                offset = sum(len(line) + 1 for line in lines[:i])
+                # 編集箇所の直前のチャンクを除き、前のチャンクは変わらない
+                kept = max(0, sum(1 for c in before if c.end < offset) - 1)
+                assert after_ids[:kept] == before_ids[:kept]
+                common = 0
+                while common < min(len(after_ids), len(before_ids)) - kept and (
+                    after_ids[-1 - common] == before_ids[-1 - common]
+                ):
+                    common += 1
+                changed_counts.append(len(after_ids) - kept - common)
+        assert max(changed_counts) <= len(before_ids) // 5
+        assert sum(changed_counts) / len(changed_counts) < 3
+
+    def test_greedy_insertion_shifts_every_chunk(self):
+        """比較用: 貪欲分割では先頭付近の挿入で後続の境界がずれる。"""
+        paragraphs = [f"段落{i:02d}" + "文" * 30 for i in range(50)]
+        before = self.parser.split_chunks("\n\n".join(paragraphs), chunk_size=100)
+        inserted = "挿入段落" + "文" * 30  # 他の段落と同じ長さ
+        after = self.parser.split_chunks("\n\n".join([inserted] + paragraphs), chunk_size=100)
+        assert not {c.chunk_id for c in after} & {c.chunk_id for c in before}
+
+
+SAMPLE_WITH_HEADINGS = """\
+太宰　治
+人間失格
+-------------------------------------------------------
+【テキスト中に現れる記号について】
+
+［＃］：入力者注　主に外字の説明や、傍点の位置の指定
+（例）［＃「はしがき」は大見出し］
+-------------------------------------------------------
+
+［＃３字下げ］はしがき［＃「はしがき」は大見出し］
+
+　私はその男の写真を三葉《さんよう》、見たことがある。
+
+［＃３字下げ］第一の手記［＃「第一の手記」は大見出し］
+
+　恥の多い生涯を送って来ました。
+
+［＃５字下げ］一［＃「一」は中見出し］
+
+　自分には、人間の生活というものが、見当つかないのです。
+
+［＃５字下げ］二［＃「二」は中見出し］
+
+　つまり自分には、人間の営みというものが未だに何もわかっていない。
+
+［＃大見出し］あとがき［＃大見出し終わり］
+
+　この手記を書き綴った狂人を、私は、直接には知らない。
+
+
+底本：「人間失格」新潮文庫
+"""
+
+
+class TestChapterIndex:
+    def setup_method(self):
+        self.parser = AozoraBunkoParser()
+
+    def _write(self, tmp_path, text=SAMPLE_WITH_HEADINGS):
+        path = tmp_path / "novel.txt"
+        path.write_bytes(text.replace("\n", "\r\n").encode("cp932"))
+        return path
+
+    def test_headings_and_chapters(self, tmp_path):
+        index = self.parser.build_index(self._write(tmp_path))
+        assert index.encoding == "shift_jis"
+        # 注記一覧の（例）と底本情報は見出しにしない
+        assert [(h.title, h.level) for h in index.headings] == [
+            ("はしがき", 1), ("第一の手記", 1), ("一", 2), ("二", 2), ("あとがき", 1),
+        ]
+        assert [c.title for c in index.chapters] == ["はしがき", "第一の手記", "あとがき"]
+        assert [s.title for s in index.chapters[1].sections] == ["一", "二"]
+        assert [c.id for c in index.chapters] == ["chapter_01", "chapter_02", "chapter_03"]
+
+    def test_read_chapter_is_slice_of_full_text(self, tmp_path):
+        path = self._write(tmp_path)
+        index = self.parser.build_index(path)
+        full = self.parser.parse_file(path)
+        texts = [self.parser.read_chapter(path, c, index.encoding) for c in index.chapters]
+        assert texts[1].startswith("第一の手記")
+        assert "見当つかない" in texts[1] and "狂人" not in texts[1]
+        assert "底本" not in texts[2]
+        for text in texts:
+            assert text in full
+
+    def test_offsets_point_into_source(self, tmp_path):
+        path = self._write(tmp_path)
+        index = self.parser.build_index(path)
+        raw = path.read_bytes()
+        decoded = raw.decode(index.encoding)
+        for h in index.headings:
+            assert raw[h.byte_offset :].decode(index.encoding).startswith(decoded[h.char_offset :][:10])
+            assert h.title in decoded[h.char_offset :].split("\r\n", 1)[0]
+
+    def test_no_headings_is_single_chapter(self, tmp_path):
+        index = self.parser.build_index(self._write(tmp_path, SAMPLE_WITH_SEPARATOR))
+        (chapter,) = index.chapters
+        assert chapter.title == "全編"
+        assert "写真" in self.parser.read_chapter(tmp_path / "novel.txt", chapter, index.encoding)
+
+    def test_sample_novel_chapters(self):
+        from pathlib import Path
+
+        sample = Path(__file__).parent.parent / "data" / "sample" / "ningen_shikkaku.txt"
+        index = self.parser.build_index(sample)
+        assert [c.title for c in index.chapters] == ["はしがき", "第一の手記", "第二の手記", "第三の手記", "あとがき"]
+
+    def test_load_index_persists_and_rebuilds_when_stale(self, tmp_path):
+        path = self._write(tmp_path)
+        index = self.parser.load_index(path)
+        sidecar = self.parser.index_path(path)
+        assert sidecar.exists()
+        assert self.parser.load_index(path) == index
+
+        path.write_bytes(SAMPLE_WITH_SEPARATOR.encode("utf-8"))
+        rebuilt = self.parser.load_index(path)
+        assert rebuilt.encoding == "utf-8"
+        assert [c.title for c in rebuilt.chapters] == ["全編"]
+
+    def test_select_chapters(self, tmp_path):
+        index = self.parser.build_index(self._write(tmp_path))
+        assert [c.number for c in index.select("2-3")] == [2, 3]
+        assert [c.number for c in index.select("1,3-")] == [1, 3]
+
+    @pytest.mark.parametrize("spec", ["", "0", "2-1", "4", "a-b", "-"])
+    def test_invalid_chapter_spec(self, spec):
+        with pytest.raises(ValueError):
+            parse_chapter_spec(spec, 3)
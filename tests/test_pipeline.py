@@ -0,0 +1,245 @@
+"""読む順パイプラインとマニフェスト逐次公開のテスト。"""
+
+import json
+import random
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from novelmanga.manifest import MANIFEST_NAME, upsert_novel
+from novelmanga.models import Chunk, Panel, PanelType, Scene
+from novelmanga.pipeline import ManifestPublisher, ReaderOrderPipeline
+from novelmanga.writer import PageWriter
+
+
+def _scene(n: int, panels: int = 2) -> Scene:
+    return Scene(
+        scene_number=n,
+        source_text="",
+        panels=[
+            Panel(panel_number=i + 1, panel_type=PanelType.ACTION, visual_description=f"scene {n} panel {i}")
+            for i in range(panels)
+        ],
+    )
+
+
+class FakeAnalyzer:
+    def __init__(self, scenes_per_chunk: list[int], log: list, jitter: float = 0.0) -> None:
+        self.scenes_per_chunk = scenes_per_chunk
+        self.log = log
+        self.jitter = jitter
+
+    def analyze(self, chunk: Chunk) -> list[Scene]:
+        ci = int(chunk.chunk_id)
+        if self.jitter:
+            time.sleep(random.uniform(0, self.jitter))
+        self.log.append(("analyze", ci))
+        return [_scene(ci * 100 + s) for s in range(self.scenes_per_chunk[ci])]
+
+
+class FakeGenerator:
+    def __init__(self, log: list, jitter: float = 0.0) -> None:
+        self.log = log
+        self.jitter = jitter
+
+    def generate_panel_image(self, description: str) -> Image.Image:
+        if self.jitter:
+            time.sleep(random.uniform(0, self.jitter))
+        self.log.append(("image", description))
+        return Image.new("L", (8, 8))
+
+
+class FakeComposer:
+    def __init__(self, log: list) -> None:
+        self.log = log
+
+    def compose_page(self, scene: Scene, images: list) -> Image.Image:
+        assert len(images) == len(scene.panels)
+        self.log.append(("compose", scene.scene_number))
+        # ページ内容からシーンを識別できるようにする
+        return Image.new("L", (4, 4), color=scene.scene_number % 256)
+
+
+def _chunks(n: int) -> list[Chunk]:
+    return [Chunk(chunk_id=str(i), text=f"chunk {i}", start=i, end=i + 1) for i in range(n)]
+
+
+def _run(tmp_path, scenes_per_chunk, workers=4, jitter=0.0, publisher=None, on_page=None):
+    log: list = []
+    with PageWriter(threads=2) as writer:
+        pipeline = ReaderOrderPipeline(
+            FakeAnalyzer(scenes_per_chunk, log, jitter),
+            FakeComposer(log),
+            writer,
+            tmp_path / "novel",
+            generator=FakeGenerator(log, jitter),
+            workers=workers,
+            publisher=publisher,
+            on_page=on_page,
+        )
+        scenes = pipeline.run(_chunks(len(scenes_per_chunk)))
+    if publisher is not None:
+        publisher.finish()
+    return scenes, log
+
+
+class TestReaderOrderPipeline:
+    def test_pages_numbered_in_reader_order(self, tmp_path):
+        scenes, _ = _run(tmp_path, [2, 0, 3, 1], jitter=0.005)
+        assert [s.scene_number for s in scenes] == [0, 1, 200, 201, 202, 300]
+        pages = sorted((tmp_path / "novel").iterdir())
+        assert [p.name for p in pages] == [f"page_{i:03d}.png" for i in range(1, 7)]
+        with Image.open(tmp_path / "novel" / "page_004.png") as img:
+            assert img.getpixel((0, 0)) == 201
+
+    def test_first_page_composed_before_later_chunks_analyzed(self, tmp_path):
+        _, log = _run(tmp_path, [2, 2, 2], workers=1)
+        first_compose = log.index(("compose", 0))
+        assert first_compose < log.index(("analyze", 1))
+
+    def test_on_page_called_in_order(self, tmp_path):
+        seen: list[int] = []
+        _run(tmp_path, [3, 2, 3], jitter=0.005, on_page=lambda n, page: seen.append(n))
+        assert seen == list(range(1, 9))
+
+    def test_error_propagates(self, tmp_path):
+        class Broken(FakeAnalyzer):
+            def analyze(self, chunk):
+                raise RuntimeError("boom")
+
+        with PageWriter(threads=1) as writer:
+            pipeline = ReaderOrderPipeline(Broken([1], []), FakeComposer([]), writer, tmp_path)
+            with pytest.raises(RuntimeError, match="boom"):
+                pipeline.run(_chunks(2))
+
+
+class FakeSheetGenerator(FakeGenerator):
+    """4 コマ以上のシーンをシートでまとめて生成するジェネレーター。"""
+
+    def uses_sheet(self, n_panels: int) -> bool:
+        return n_panels >= 4
+
+    def generate_scene_images(self, descriptions, rects, page_size):
+        from novelmanga.generator import SceneImages
+
+        assert len(rects) == len(descriptions)
+        self.log.append(("sheet", len(descriptions)))
+        return SceneImages([Image.new("L", (8, 8)) for _ in descriptions], calls=1, generated=len(descriptions))
+
+
+class SheetComposer(FakeComposer):
+    def panel_rects(self, scene: Scene) -> list:
+        return [(0, 0, 1, 1)] * len(scene.panels)
+
+
+class TestSheetScenes:
+    def test_sheet_scenes_generated_in_one_task(self, tmp_path):
+        class Analyzer(FakeAnalyzer):
+            def analyze(self, chunk):
+                ci = int(chunk.chunk_id)
+                return [_scene(ci * 100, panels=2), _scene(ci * 100 + 1, panels=4)]
+
+        log: list = []
+        with PageWriter(threads=1) as writer:
+            pipeline = ReaderOrderPipeline(
+                Analyzer([], log),
+                SheetComposer(log),
+                writer,
+                tmp_path / "novel",
+                generator=FakeSheetGenerator(log),
+            )
+            pipeline.run(_chunks(2))
+
+        assert log.count(("sheet", 4)) == 2
+        assert sum(1 for entry in log if entry[0] == "image") == 4
+        pages = sorted(pipeline.sheet_pages, key=lambda e: e["page"])
+        assert [(e["page"], e["calls"], e["saved"]) for e in pages] == [(2, 1, 3), (4, 1, 3)]
+
+
+class TestPackedScenes:
+    def test_scenes_packed_per_chunk(self, tmp_path):
+        from novelmanga.packing import ScenePacker
+
+        log: list = []
+        packer = ScenePacker(max_panels=4)
+        with PageWriter(threads=1) as writer:
+            pipeline = ReaderOrderPipeline(
+                FakeAnalyzer([3, 1], log),
+                FakeComposer(log),
+                writer,
+                tmp_path / "novel",
+                generator=FakeGenerator(log),
+                pack=packer,
+            )
+            scenes = pipeline.run(_chunks(2))
+
+        # チャンク 0 の 2+2 コマと 2 コマ、チャンク 1 の 2 コマ（チャンクをまたいではまとめない）
+        assert [len(s.panels) for s in scenes] == [4, 2, 2]
+        assert sorted(p.name for p in (tmp_path / "novel").iterdir()) == [f"page_{i:03d}.png" for i in (1, 2, 3)]
+        assert sum(1 for entry in log if entry[0] == "image") == 8
+        assert (packer.stats.scenes, packer.stats.pages) == (4, 3)
+
+
+class TestManifestPublisher:
+    def test_publishes_contiguous_prefix(self, tmp_path):
+        publisher = ManifestPublisher(tmp_path, "novel", "題名")
+        publisher.page_written(2)
+        assert not (tmp_path / MANIFEST_NAME).exists()
+        publisher.page_written(1)
+        novel = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))["novels"][0]
+        assert novel["status"] == "in_progress"
+        assert novel["chapters"][0]["pages"] == ["novel/page_001.png", "novel/page_002.png"]
+        assert novel["coverImage"] == "novel/page_001.png"
+
+    def test_pipeline_publishes_progressively(self, tmp_path):
+        snapshots: list[int] = []
+        publisher = ManifestPublisher(tmp_path, "novel", "題名", pages_per_chapter=2)
+        original = publisher._publish
+
+        def spy(status):
+            original(status)
+            data = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+            pages = [p for ch in data["novels"][0]["chapters"] for p in ch["pages"]]
+            # 公開されたページはすべて書き出し済み
+            assert all((tmp_path / p).exists() for p in pages)
+            snapshots.append(len(pages))
+
+        publisher._publish = spy
+        _run(tmp_path, [2, 3], jitter=0.005, publisher=publisher)
+        assert snapshots == sorted(snapshots)
+        assert snapshots[-1] == 5
+        novel = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))["novels"][0]
+        assert novel["status"] == "complete"
+        assert [len(ch["pages"]) for ch in novel["chapters"]] == [2, 2, 1]
+
+    def test_pages_annotated(self, tmp_path):
+        publisher = ManifestPublisher(tmp_path, "novel", "題名", pages_per_chapter=2, placeholder="thumbnail")
+        _run(tmp_path, [2, 1], publisher=publisher)
+        chapters = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))["novels"][0]["chapters"]
+        for chapter in chapters:
+            assert len(chapter["pageInfo"]) == len(chapter["pages"])
+            assert chapter["prefetch"][0] == 1
+        info = chapters[0]["pageInfo"][0]
+        assert info["bytes"] == (tmp_path / chapters[0]["pages"][0]).stat().st_size
+        assert info["thumbnail"].startswith("data:image/png")
+
+    def test_other_novels_preserved(self, tmp_path):
+        upsert_novel(tmp_path / MANIFEST_NAME, {"id": "other", "title": "別", "chapters": []})
+        publisher = ManifestPublisher(tmp_path, "novel", "題名")
+        publisher.page_written(1)
+        ids = [n["id"] for n in json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))["novels"]]
+        assert ids == ["other", "novel"]
+
+    def test_concurrent_page_written(self, tmp_path):
+        publisher = ManifestPublisher(tmp_path, "novel", "題名")
+        order = list(range(1, 41))
+        random.Random(0).shuffle(order)
+        threads = [threading.Thread(target=publisher.page_written, args=(n,)) for n in order]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert publisher.published == 40
+        assert not list(tmp_path.glob(".tmp-*"))
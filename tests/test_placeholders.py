@@ -0,0 +1,106 @@
+"""マニフェストのプレースホルダー・先読み（placeholders）のテスト。"""
+
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("numpy")
+
+from novelmanga.placeholders import (  # noqa: E402
+    annotate_chapters,
+    blurhash_batch,
+    page_info,
+    prefetch_order,
+    resolve_kind,
+    thumbnail_data_uri,
+)
+
+
+def _page(path, color=128, size=(160, 226)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    img = Image.linear_gradient("L").resize(size) if color is None else Image.new("L", size, color)
+    img.save(path)
+    return path
+
+
+class TestBlurhash:
+    def test_black_image(self):
+        # 黒一色は直流成分 0・交流成分がすべて 0（"fQ" の繰り返し）になる
+        black = blurhash_batch([Image.new("L", (100, 140), 0)], (4, 3))[0]
+        assert black == "L00000" + "fQ" * 11
+
+    def test_header_and_dc(self):
+        white = blurhash_batch([Image.new("RGB", (100, 140), "white")])[0]
+        # 4x5 成分 → "d"、直流成分は sRGB の #FFFFFF
+        assert white[0] == "d" and white[2:6] == "TSUA"
+        assert len(white) == 6 + 2 * 19
+
+    def test_batch_matches_single(self):
+        images = [Image.new("L", (90, 120), 30), Image.linear_gradient("L").resize((90, 120))]
+        assert blurhash_batch(images) == [blurhash_batch([img])[0] for img in images]
+        assert blurhash_batch(images)[0] != blurhash_batch(images)[1]
+        assert blurhash_batch([]) == []
+
+    def test_missing_numpy_names_numpy_extra(self, monkeypatch):
+        from novelmanga import placeholders
+
+        monkeypatch.setattr(placeholders, "np", None)
+        with pytest.raises(ImportError, match=r"novelmanga\[numpy\]"):
+            resolve_kind("blurhash")
+
+
+class TestThumbnail:
+    def test_grayscale_16px(self):
+        uri = thumbnail_data_uri(Image.new("RGB", (1600, 2262), "gray"))
+        assert uri.startswith("data:image/png;base64,")
+        img = Image.open(io.BytesIO(base64.b64decode(uri.split(",", 1)[1])))
+        assert img.size == (16, 23) and img.mode == "L"
+
+
+class TestPageInfo:
+    def test_sizes_and_placeholders(self, tmp_path):
+        path = _page(tmp_path / "p1.png", color=None)
+        (info,) = page_info([path], "blurhash")
+        assert (info["width"], info["height"]) == (160, 226)
+        assert info["bytes"] == path.stat().st_size
+        assert len(info["blurhash"]) == 44
+        (thumb,) = page_info([path], "thumbnail")
+        assert "blurhash" not in thumb and thumb["thumbnail"].startswith("data:")
+        (bare,) = page_info([path], "none")
+        assert set(bare) == {"width", "height", "bytes"}
+
+    def test_known_pages_not_reread(self, tmp_path):
+        a, b = _page(tmp_path / "a.png"), _page(tmp_path / "b.png", color=0)
+        known: dict = {}
+        first = page_info([a], known=known)
+        assert len(known) == 1
+        both = page_info([a, b], known=known)
+        assert both[0] is first[0] and len(known) == 2
+
+    def test_unknown_kind(self):
+        with pytest.raises(ValueError):
+            resolve_kind("webp")
+        assert resolve_kind("auto") == "blurhash"
+
+
+class TestPrefetch:
+    def test_ahead_follows_page_size(self):
+        assert prefetch_order([500_000] * 3) == [1, 2, 3, 4, -1]
+        assert prefetch_order([1_200_000, 1_000_000, 1_100_000]) == [1, 2, -1]
+        assert prefetch_order([10_000_000]) == [1, -1]
+        assert prefetch_order([]) == [1, -1]
+
+    def test_annotate_chapters(self, tmp_path):
+        _page(tmp_path / "novel" / "page_001.png")
+        _page(tmp_path / "novel" / "page_002.png", color=0)
+        chapters = [
+            {"id": "chapter_01", "pages": ["novel/page_001.png", "novel/page_002.png"]},
+            {"id": "chapter_02", "pages": ["novel/page_003.png"]},
+        ]
+        annotate_chapters(chapters, tmp_path)
+        assert [i["height"] for i in chapters[0]["pageInfo"]] == [226, 226]
+        assert chapters[0]["prefetch"][0] == 1
+        # ファイルがそろっていない章には付けない
+        assert "pageInfo" not in chapters[1] and "prefetch" not in chapters[1]
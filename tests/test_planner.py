@@ -0,0 +1,127 @@
+"""実行計画（planner）のテスト。"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from novelmanga.cache import DiskCache
+from novelmanga.generator import image_cache_key
+from novelmanga.models import Chunk, Panel, PanelType, Scene
+from novelmanga.planner import (
+    DEFAULT_RATES,
+    Prices,
+    Rates,
+    estimate_tokens,
+    load_rates,
+    parse_prices,
+    plan_run,
+)
+from novelmanga.prompts import analysis_cache_key, system_instruction
+from novelmanga.report import REPORT_NAME
+from novelmanga.script_io import encode_scenes
+
+
+def _chunks(*sizes: int) -> list[Chunk]:
+    return [Chunk(chunk_id=f"c{i}", text="あ" * n + str(i), start=0, end=n) for i, n in enumerate(sizes)]
+
+
+def _report(path, **usage) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    (path / REPORT_NAME).write_text(json.dumps({"version": 1, "usage": usage}), encoding="utf-8")
+
+
+class TestRates:
+    def test_estimate_tokens(self):
+        assert estimate_tokens("漢字かな") == 4
+        assert estimate_tokens("abcdefgh 12345!") == 2 + 2 + 1
+
+    def test_defaults_without_reports(self, tmp_path):
+        assert load_rates([tmp_path]) == DEFAULT_RATES["verbose"]
+        assert load_rates([tmp_path], "compact").output_tokens_per_kchar < Rates().output_tokens_per_kchar
+
+    def test_aggregates_reports_of_same_format(self, tmp_path):
+        usage = {
+            "chars": 4000, "analyzed_chars": 2000, "analyzed_chunks": 2, "scenes": 8, "panels": 24,
+            "analysis": {"calls": 3, "output_tokens": 600, "api_seconds": 30.0},
+            "images": {"calls": 10, "api_seconds": 50.0},
+        }
+        _report(tmp_path / "a", **usage)
+        _report(tmp_path / "b", **{**usage, "chars": 12000})
+        _report(tmp_path / "c", script_format="compact", chars=1, scenes=100)
+        (tmp_path / "d").mkdir()
+        (tmp_path / "d" / REPORT_NAME).write_text("{broken", encoding="utf-8")
+
+        rates = load_rates([tmp_path])
+        assert rates.source == "2 reports"
+        assert rates.scenes_per_kchar == pytest.approx(1.0)
+        assert rates.panels_per_scene == pytest.approx(3.0)
+        assert rates.output_tokens_per_kchar == pytest.approx(300.0)
+        assert rates.calls_per_chunk == pytest.approx(1.5)
+        assert rates.analysis_seconds == pytest.approx(10.0)
+        assert rates.image_seconds == pytest.approx(5.0)
+        assert load_rates([tmp_path], "compact").scenes_per_kchar == pytest.approx(100_000)
+
+    def test_parse_prices(self):
+        assert parse_prices("0.1,0.4,0.04") == Prices(0.1, 0.4, 0.04)
+        for bad in ("1,2", "a,b,c", "1,-2,3"):
+            with pytest.raises(ValueError):
+                parse_prices(bad)
+
+
+class TestPlanRun:
+    RATES = Rates(scenes_per_kchar=1.0, panels_per_scene=2.0, output_tokens_per_kchar=100.0,
+                  analysis_seconds=10.0, image_seconds=5.0)
+
+    def test_estimates_uncached_run(self):
+        plan = plan_run(_chunks(1000, 2000), self.RATES)
+        d = plan.to_dict()["totals"]
+        assert (d["scenes"], d["panels"], d["analysis_calls"], d["image_calls"]) == (3, 6, 2, 6)
+        assert d["output_tokens"] == 300
+        assert plan.chunks[0].input_tokens > 1001
+        assert plan.api_seconds == 2 * 10 + 6 * 5
+        assert plan.cost == pytest.approx(d["input_tokens"] * 0.1e-6 + 300 * 0.4e-6 + 6 * 0.039)
+
+    def test_concurrency_and_rate_limit(self):
+        chunks = _chunks(1000, 2000)
+        assert plan_run(chunks, self.RATES, workers=5).wall_seconds == pytest.approx(10.0)
+        # 8 回を 1 分あたり 4 回に制限すると 120 秒
+        assert plan_run(chunks, self.RATES, workers=5, rpm=4).wall_seconds == pytest.approx(120.0)
+        assert plan_run(chunks, self.RATES, images=False).image_calls == 0
+
+    def test_cache_projection(self, tmp_path):
+        chunks = _chunks(1000, 2000)
+        scenes = [Scene(1, "", [Panel(i, PanelType.ACTION, f"desc {i}") for i in (1, 2, 3)])]
+        key = analysis_cache_key(False, system_instruction("verbose"), chunks[0].text)
+        DiskCache(tmp_path / "scripts").put(key, encode_scenes(scenes))
+        DiskCache(tmp_path / "images").put(image_cache_key("desc 2"), b"png")
+
+        plan = plan_run(chunks, self.RATES, cache_dir=tmp_path)
+        first = plan.chunks[0]
+        assert first.analysis_cached and (first.scenes, first.panels, first.images_cached) == (1, 3, 1)
+        assert (plan.analysis_calls, plan.panels, plan.image_calls) == (1, 7, 6)
+        assert plan.output_tokens == 200
+        assert plan.cache_share == {"analysis": 0.5, "images": pytest.approx(1 / 7)}
+        # 別の出力形式のキャッシュは使えない
+        assert plan_run(chunks, self.RATES, cache_dir=tmp_path, script_format="compact").analysis_calls == 2
+
+    def test_missing_cache_dir_not_created(self, tmp_path):
+        plan_run(_chunks(10), self.RATES, cache_dir=tmp_path / "cache")
+        assert not (tmp_path / "cache").exists()
+
+
+def test_plan_cli_does_not_import_sdk(tmp_path):
+    novel = tmp_path / "novel.txt"
+    novel.write_text("題名\n\n" + "「こんにちは」と彼は言った。\n" * 400, encoding="utf-8")
+    code = (
+        "import sys\n"
+        "from novelmanga.__main__ import main\n"
+        f"sys.argv = ['novelmanga', {str(novel)!r}, '-o', {str(tmp_path / 'out')!r}, '--plan']\n"
+        "main()\n"
+        "assert not [m for m in sys.modules if m.startswith('google')], 'SDK imported'\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    plan = json.loads((tmp_path / "out" / "run_plan.json").read_text(encoding="utf-8"))
+    assert plan["totals"]["chunks"] >= 1 and plan["totals"]["analysis_calls"] == plan["totals"]["chunks"]
@@ -0,0 +1,97 @@
+"""メモリ・CPU プロファイラと実行レポートのテスト。"""
+
+import json
+import pstats
+import re
+import threading
+import tracemalloc
+
+from novelmanga.profiling import CpuProfiler, MemoryProfiler, format_cpu_summary
+from novelmanga.report import REPORT_NAME, RunReport
+
+
+class TestMemoryProfiler:
+    def test_stage_and_page_records(self):
+        profiler = MemoryProfiler(top=5).start()
+        try:
+            with profiler.stage("alloc"):
+                blob = [bytearray(1024) for _ in range(2000)]
+            profiler.page(1)
+        finally:
+            profiler.stop()
+        del blob
+        assert not tracemalloc.is_tracing()
+
+        data = profiler.to_dict()
+        stage = data["stages"][0]
+        assert stage["stage"] == "alloc"
+        assert stage["traced_peak"] >= 2000 * 1024
+        assert stage["rss_after"] > 0
+        assert 0 < len(stage["top_growth"]) <= 5
+        assert stage["top_growth"][0]["size_diff"] >= 2000 * 1024
+        assert data["pages"][0]["page"] == 1 and "traced" in data["pages"][0]
+        assert data["peak_rss"] >= stage["rss_after"]
+
+    def test_without_tracing(self):
+        profiler = MemoryProfiler()
+        with profiler.stage("plain"):
+            pass
+        assert "traced_peak" not in profiler.stages[0]
+
+
+def _busy(n: int = 3000) -> None:
+    pattern = re.compile(r"(\w+)-(\d+)")
+    for i in range(n):
+        json.loads(json.dumps({"i": i, "s": "x" * 50}))
+        pattern.findall(f"page-{i} panel-{i}")
+
+
+class TestCpuProfiler:
+    def test_stage_files_and_summary(self, tmp_path):
+        cpu = CpuProfiler(tmp_path / "cpu", top=5, interval=0.001)
+        for _ in range(2):
+            with cpu.stage("parse"):
+                _busy()
+        summary = cpu.write()
+
+        stage = summary["stages"]["parse"]
+        assert stage["calls"] == 2 and stage["cpu_seconds"] > 0
+        assert stage["categories"]["json"] > 0 and stage["categories"]["regex"] > 0
+        stats = pstats.Stats(str(tmp_path / "cpu" / "parse.pstats"))
+        assert any(func == "_busy" for _path, _line, func in stats.stats)
+        # collapsed stack は "フレーム;フレーム 回数" の行
+        lines = (tmp_path / "cpu" / "parse.collapsed").read_text(encoding="utf-8").splitlines()
+        assert lines and stage["samples"] == sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+        assert any(line.startswith("MainThread;") and "_busy" in line for line in lines)
+
+        top = [row["tottime"] for row in summary["top"]]
+        assert 0 < len(top) <= 5 and top == sorted(top, reverse=True)
+        text = (tmp_path / "cpu" / "summary.txt").read_text(encoding="utf-8")
+        assert text.startswith(format_cpu_summary(summary))
+
+    def test_threads_started_in_stage(self, tmp_path):
+        cpu = CpuProfiler(tmp_path, interval=0.001)
+        with cpu.stage("compose"):
+            worker = threading.Thread(target=_busy, name="page-writer-0")
+            worker.start()
+            worker.join()
+        cpu.write()
+        lines = (tmp_path / "compose.collapsed").read_text(encoding="utf-8").splitlines()
+        assert any(line.startswith("page-writer-0;") for line in lines)
+
+    def test_empty(self, tmp_path):
+        summary = CpuProfiler(tmp_path).write()
+        assert summary["stages"] == {} and summary["top"] == []
+        assert (tmp_path / "summary.txt").exists()
+
+
+class TestRunReport:
+    def test_write(self, tmp_path):
+        report = RunReport(tmp_path, input="novel.txt")
+        report.section("memory", {"peak_rss": 1})
+        path = report.write()
+        assert path == tmp_path / REPORT_NAME
+        data = json.loads(path.read_text(encoding="utf-8"))
+        assert data["input"] == "novel.txt"
+        assert data["memory"] == {"peak_rss": 1}
+        assert "startedAt" in data and "finishedAt" in data
@@ -0,0 +1,171 @@
+"""schema（レスポンススキーマ・検証・修復）のテスト。"""
+
+import json
+
+from novelmanga.models import Panel, PanelType, Scene
+from novelmanga.schema import (
+    COMPACT_RESPONSE_SCHEMA,
+    PANEL_SCHEMA,
+    RESPONSE_SCHEMA,
+    compact_scenes,
+    compile_validator,
+    expand_compact,
+    repair_json,
+    salvage,
+    validate_document,
+)
+
+_DOC = {
+    "scenes": [
+        {
+            "scene_number": 1,
+            "page_layout": "standard",
+            "panels": [
+                {
+                    "panel_number": 1,
+                    "panel_type": "establishing",
+                    "visual_description": "A dim room",
+                    "dialogue": ["セリフ"],
+                    "narration": None,
+                }
+            ],
+        }
+    ]
+}
+
+
+class TestSchemaDerivation:
+    def test_panel_schema_from_dataclass(self):
+        props = PANEL_SCHEMA["properties"]
+        assert props["panel_number"] == {"type": "INTEGER"}
+        assert props["panel_type"]["enum"] == ["action", "dialogue", "narration", "establishing"]
+        assert props["dialogue"] == {"type": "ARRAY", "items": {"type": "STRING"}}
+        assert props["narration"]["nullable"] is True
+        assert "image_data" not in props
+        assert set(PANEL_SCHEMA["required"]) == {"panel_number", "panel_type", "visual_description"}
+
+    def test_scene_schema_has_layout_enum_and_panels(self):
+        scene = RESPONSE_SCHEMA["properties"]["scenes"]["items"]
+        assert scene["properties"]["page_layout"]["enum"] == ["standard", "action", "emotional"]
+        assert scene["properties"]["panels"]["items"] == PANEL_SCHEMA
+        assert "source_text" not in scene["properties"]
+
+
+class TestValidator:
+    def test_valid_document(self):
+        assert validate_document(_DOC) == []
+
+    def test_reports_path_of_error(self):
+        bad = json.loads(json.dumps(_DOC))
+        bad["scenes"][0]["panels"][0]["panel_number"] = "one"
+        assert validate_document(bad) == ["$.scenes[0].panels[0].panel_number: expected integer"]
+
+    def test_missing_required(self):
+        errors = compile_validator(PANEL_SCHEMA)({"panel_number": 1})
+        assert "$.panel_type: required" in errors
+        assert "$.visual_description: required" in errors
+
+    def test_bool_is_not_integer(self):
+        assert compile_validator({"type": "INTEGER"})(True)
+
+
+class TestRepair:
+    def test_plain_json_not_marked_repaired(self):
+        data, repaired = repair_json(json.dumps(_DOC))
+        assert data == _DOC
+        assert repaired is False
+
+    def test_code_fence_and_preamble(self):
+        data, _ = repair_json(f"以下が脚本です\n```json\n{json.dumps(_DOC)}\n```")
+        assert data == _DOC
+
+    def test_trailing_commas(self):
+        data, repaired = repair_json('{"scenes": [{"scene_number": 1, "panels": [],},],}')
+        assert data == {"scenes": [{"scene_number": 1, "panels": []}]}
+        assert repaired
+
+    def test_truncated_output_keeps_complete_panels(self):
+        text = json.dumps(_DOC, ensure_ascii=False)
+        truncated = text[: text.rindex("}", 0, len(text) - 3)] + '}, {"panel_number": 2, "panel_ty'
+        data, repaired = repair_json(truncated)
+        assert repaired
+        assert data["scenes"][0]["panels"] == _DOC["scenes"][0]["panels"]
+
+    def test_unrepairable(self):
+        assert repair_json("JSON ではない") == (None, False)
+
+
+class TestSalvage:
+    def test_drops_invalid_panels_only(self):
+        doc = json.loads(json.dumps(_DOC))
+        doc["scenes"][0]["panels"].append({"panel_number": 2, "visual_description": ["not", "a", "string"]})
+        data, dropped = salvage(doc)
+        assert dropped
+        assert len(data["scenes"][0]["panels"]) == 1
+
+    def test_defaulted_fields_may_be_missing_or_null(self):
+        # 番号がなく dialogue が null のレスポンスも、既定値で補えるので取り除かない
+        doc = {"scenes": [{"panels": [{"panel_type": "action", "visual_description": "走る", "dialogue": None}]}]}
+        data, dropped = salvage(doc)
+        assert not dropped
+        assert data == doc
+
+    def test_unknown_enum_value_is_kept(self):
+        doc = json.loads(json.dumps(_DOC))
+        doc["scenes"][0]["panels"][0]["panel_type"] = "splash"
+        data, dropped = salvage(doc)
+        assert not dropped
+        assert data == doc
+
+    def test_null_page_break_keeps_scene(self):
+        doc = json.loads(json.dumps(_DOC))
+        doc["scenes"][0]["page_break"] = None
+        data, dropped = salvage(doc)
+        assert not dropped and len(data["scenes"]) == 1
+
+    def test_no_scenes_is_unusable(self):
+        assert salvage({"scenes": []})[0] is None
+        assert salvage({"other": 1})[0] is None
+
+
+class TestCompact:
+    def test_round_trip_restores_verbose_document(self):
+        panel = Panel(
+            panel_number=1,
+            panel_type=PanelType.ESTABLISHING,
+            visual_description="A dim room",
+            dialogue=["セリフ"],
+        )
+        scenes = [Scene(scene_number=1, source_text="", panels=[panel])]
+        compact = compact_scenes(scenes)
+        assert compact == {"s": [{"l": "s", "p": [{"t": "e", "v": "A dim room", "d": ["セリフ"]}]}]}
+        assert compile_validator(COMPACT_RESPONSE_SCHEMA)(compact) == []
+        assert expand_compact(compact) == _DOC
+
+    def test_numbers_by_position(self):
+        scenes = [
+            Scene(scene_number=1, source_text="", panels=[Panel(panel_number=1, panel_type=PanelType.DIALOGUE, visual_description="a")]),
+            Scene(scene_number=2, source_text="", panels=[Panel(panel_number=1, panel_type=PanelType.ACTION, visual_description="b")] * 2),
+        ]
+        expanded = expand_compact(compact_scenes(scenes))
+        assert [s["scene_number"] for s in expanded["scenes"]] == [1, 2]
+        assert [p["panel_number"] for p in expanded["scenes"][1]["panels"]] == [1, 2]
+
+    def test_page_break_round_trip(self):
+        panel = Panel(panel_number=1, panel_type=PanelType.ACTION, visual_description="a")
+        scenes = [
+            Scene(scene_number=1, source_text="", panels=[panel]),
+            Scene(scene_number=2, source_text="", panels=[panel], page_break=True),
+        ]
+        compact = compact_scenes(scenes)
+        assert "b" not in compact["s"][0] and compact["s"][1]["b"] is True
+        assert compile_validator(COMPACT_RESPONSE_SCHEMA)(compact) == []
+        expanded = expand_compact(compact)["scenes"]
+        assert "page_break" not in expanded[0] and expanded[1]["page_break"] is True
+        assert compile_validator(RESPONSE_SCHEMA)({"scenes": [{**expanded[1], "page_break": "yes"}]}) == [
+            "$.scenes[0].page_break: expected boolean"
+        ]
+
+    def test_verbose_document_passes_through(self):
+        assert expand_compact(_DOC) is _DOC
+        assert expand_compact([1, 2]) == [1, 2]
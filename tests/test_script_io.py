@@ -0,0 +1,134 @@
+"""script_io（脚本のシリアライズ）のテスト。"""
+
+import json
+
+import pytest
+
+from novelmanga.models import Panel, PanelType, Scene
+from novelmanga.script_io import (
+    FORMAT_VERSION,
+    ScriptReader,
+    ScriptWriter,
+    decode_scenes,
+    dump_scenes,
+    encode_scenes,
+    export_json,
+    import_json,
+    load_scene,
+    load_scenes,
+)
+
+
+def _scene(n: int) -> Scene:
+    return Scene(
+        scene_number=n,
+        source_text=f"本文{n}",
+        panels=[
+            Panel(
+                panel_number=1,
+                panel_type=PanelType.ESTABLISHING,
+                visual_description=f"Dim room {n}",
+                narration="ナレーション",
+            ),
+            Panel(
+                panel_number=2,
+                panel_type=PanelType.DIALOGUE,
+                visual_description="Close-up of a young man",
+                dialogue=["セリフ1", "セリフ2"],
+            ),
+        ],
+        page_layout="emotional",
+        chunk_id=f"chunk{n}",
+        source_span=(n * 100, n * 100 + 50),
+    )
+
+
+class TestScriptIO:
+    def test_models_use_slots(self):
+        scene = _scene(1)
+        assert not hasattr(scene, "__dict__")
+        assert not hasattr(scene.panels[0], "__dict__")
+
+    def test_round_trip(self, tmp_path):
+        scenes = [_scene(i) for i in range(1, 6)]
+        path = tmp_path / "script.nms"
+        dump_scenes(scenes, path)
+        assert load_scenes(path) == scenes
+
+    def test_page_break_round_trip(self, tmp_path):
+        scenes = [_scene(1), _scene(2)]
+        scenes[1].page_break = True
+        path = tmp_path / "script.nms"
+        dump_scenes(scenes, path)
+        assert [s.page_break for s in load_scenes(path)] == [False, True]
+        assert [s.page_break for s in decode_scenes(encode_scenes(scenes))] == [False, True]
+
+    def test_lazy_load_by_index(self, tmp_path):
+        scenes = [_scene(i) for i in range(1, 101)]
+        path = tmp_path / "script.nms"
+        dump_scenes(scenes, path)
+        assert load_scene(path, 42) == scenes[42]
+        with ScriptReader(path) as reader:
+            assert len(reader) == 100
+            assert reader[-1] == scenes[-1]
+            with pytest.raises(IndexError):
+                reader[100]
+
+    def test_image_data_not_serialized(self, tmp_path):
+        scene = _scene(1)
+        scene.panels[0].image_data = b"\x89PNG raw bytes"
+        path = tmp_path / "script.nms"
+        dump_scenes([scene], path)
+        assert load_scenes(path)[0].panels[0].image_data is None
+
+    def test_empty_script(self, tmp_path):
+        path = tmp_path / "empty.nms"
+        with ScriptWriter(path):
+            pass
+        assert load_scenes(path) == []
+
+    def test_bad_magic_raises(self, tmp_path):
+        path = tmp_path / "bogus.nms"
+        path.write_bytes(b"X" * 64)
+        with pytest.raises(ValueError):
+            ScriptReader(path)
+
+    def test_future_version_rejected(self, tmp_path):
+        path = tmp_path / "script.nms"
+        dump_scenes([_scene(1)], path)
+        raw = bytearray(path.read_bytes())
+        raw[4:6] = (FORMAT_VERSION + 1).to_bytes(2, "little")
+        path.write_bytes(bytes(raw))
+        with pytest.raises(ValueError):
+            ScriptReader(path)
+
+    def test_binary_smaller_than_json(self, tmp_path):
+        scenes = [_scene(i) for i in range(1, 51)]
+        dump_scenes(scenes, tmp_path / "script.nms")
+        export_json(scenes, tmp_path / "script.json")
+        assert (tmp_path / "script.nms").stat().st_size < (tmp_path / "script.json").stat().st_size
+
+    def test_json_export_round_trip(self, tmp_path):
+        scenes = [_scene(i) for i in range(1, 4)]
+        path = tmp_path / "script.json"
+        export_json(scenes, path)
+        doc = json.loads(path.read_text(encoding="utf-8"))
+        assert doc["version"] == FORMAT_VERSION
+        assert doc["scenes"][0]["panels"][1]["dialogue"] == ["セリフ1", "セリフ2"]
+        assert import_json(path) == scenes
+
+    def test_bytes_round_trip(self):
+        scenes = [_scene(i) for i in range(1, 4)]
+        assert decode_scenes(encode_scenes(scenes)) == scenes
+
+    def test_reads_v1_records(self, tmp_path):
+        import struct
+
+        payload = json.dumps([1, "", "standard", [[1, "action", "desc", [], None]]]).encode()
+        header = struct.pack("<4sHHIIQ", b"NMSC", 1, 0, 1, 0, 24 + 4 + len(payload))
+        path = tmp_path / "v1.nms"
+        path.write_bytes(header + struct.pack("<I", len(payload)) + payload + struct.pack("<Q", 24))
+        scene = load_scenes(path)[0]
+        assert scene.panels[0].visual_description == "desc"
+        assert scene.chunk_id == ""
+        assert scene.source_span is None
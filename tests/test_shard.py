@@ -0,0 +1,110 @@
+"""シャード分割と結合（merge）のテスト。"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+from novelmanga.manifest import MANIFEST_NAME
+from novelmanga.planner import find_reports
+from novelmanga.report import REPORT_NAME
+from novelmanga.shard import (
+    load_shards,
+    merge_shards,
+    page_id,
+    parse_shard,
+    shard_dir,
+    shard_range,
+    write_shard_meta,
+)
+
+_CHUNK_IDS = [f"chunk{i}" for i in range(7)]
+
+
+def _write_shard(output_dir, index, count, scenes_per_chunk=2, chunk_ids=_CHUNK_IDS):
+    """各チャンクから scenes_per_chunk ページを作ったシャードを書き出す。"""
+    directory = shard_dir(output_dir, "novel", index, count)
+    directory.mkdir(parents=True, exist_ok=True)
+    pages = []
+    for ci in shard_range(len(chunk_ids), index, count):
+        for k in range(1, scenes_per_chunk + 1):
+            pid = page_id(ci, k)
+            Image.new("L", (4, 4), color=ci * 10 + k).save(directory / f"page_{pid}.png")
+            pages.append({"id": pid, "chunk": ci, "chunk_id": chunk_ids[ci], "file": f"page_{pid}.png"})
+    write_shard_meta(directory, "novel", index, count, chunk_ids, pages)
+    return directory
+
+
+class TestPartition:
+    def test_parse_shard(self):
+        assert parse_shard("2/4") == (2, 4)
+        for spec in ["0/2", "3/2", "1", "a/b"]:
+            with pytest.raises(ValueError):
+                parse_shard(spec)
+
+    @pytest.mark.parametrize("total,count", [(7, 3), (2, 4), (10, 1), (0, 2)])
+    def test_ranges_cover_all_chunks_once(self, total, count):
+        covered = [i for n in range(1, count + 1) for i in shard_range(total, n, count)]
+        assert covered == list(range(total))
+
+    def test_page_ids_sort_in_reader_order(self):
+        ids = [page_id(c, s) for c in (0, 1, 12) for s in (1, 2, 10)]
+        assert ids == sorted(ids)
+
+
+class TestMerge:
+    def test_merge_orders_pages_by_id(self, tmp_path):
+        # シャードは逆順・別々のタイミングで終わってもよい
+        for index in (3, 1, 2):
+            _write_shard(tmp_path, index, 3)
+        shards = load_shards([tmp_path / "shards" / "novel"])
+        novel = merge_shards(shards, tmp_path, title="Novel", pages_per_chapter=5)
+
+        pages = [p for ch in novel["chapters"] for p in ch["pages"]]
+        assert pages == [f"novel/page_{n:03d}.png" for n in range(1, 15)]
+        colors = [Image.open(tmp_path / p).getpixel((0, 0)) for p in pages]
+        assert colors == [ci * 10 + k for ci in range(7) for k in (1, 2)]
+        manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+        assert manifest["novels"][0]["status"] == "complete"
+        assert len(novel["chapters"]) == 3
+
+    def test_missing_shard(self, tmp_path):
+        _write_shard(tmp_path, 1, 3)
+        _write_shard(tmp_path, 3, 3)
+        with pytest.raises(ValueError, match="Missing shards: 2"):
+            merge_shards(load_shards([tmp_path / "shards" / "novel"]), tmp_path)
+
+    def test_mismatched_chunking(self, tmp_path):
+        _write_shard(tmp_path, 1, 2)
+        _write_shard(tmp_path, 2, 2, chunk_ids=[f"other{i}" for i in range(7)])
+        with pytest.raises(ValueError, match="fingerprint"):
+            merge_shards(load_shards([tmp_path / "shards" / "novel"]), tmp_path)
+
+    def test_merge_is_repeatable(self, tmp_path):
+        for index in (1, 2):
+            _write_shard(tmp_path, index, 2)
+        shards = load_shards([shard_dir(tmp_path, "novel", 1, 2), shard_dir(tmp_path, "novel", 2, 2)])
+        first = merge_shards(shards, tmp_path)
+        assert merge_shards(shards, tmp_path) == first
+        assert len(list((tmp_path / "novel").glob("page_*.png"))) == 14
+
+
+def test_each_shard_writes_its_own_report(tmp_path):
+    novel = tmp_path / "novel.txt"
+    novel.write_text("題名\n\n" + "「こんにちは」と彼は言った。\n" * 400, encoding="utf-8")
+    out = tmp_path / "out"
+    for spec in ("1/2", "2/2"):
+        code = (
+            "import sys\n"
+            "from novelmanga.__main__ import main\n"
+            f"sys.argv = ['novelmanga', {str(novel)!r}, '-o', {str(out)!r}, '--transport', 'replay',"
+            f" '--no-images', '--shard', {spec!r}]\n"
+            "main()\n"
+        )
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr
+    assert not (out / REPORT_NAME).exists()
+    reports = find_reports([out])
+    assert reports == [shard_dir(out, "novel", i, 2) / REPORT_NAME for i in (1, 2)]
@@ -0,0 +1,72 @@
+"""スクリーントーン後処理（tones）のテスト。"""
+
+import pytest
+from PIL import Image, ImageDraw
+
+np = pytest.importorskip("numpy")
+
+from novelmanga.composer import PageComposer  # noqa: E402
+from novelmanga.models import Panel, PanelType, Scene  # noqa: E402
+from novelmanga.tones import PRESETS, apply_tone, get_preset  # noqa: E402
+
+
+def _black_ratio(img: Image.Image) -> float:
+    return float((np.asarray(img) == 0).mean())
+
+
+def _step(dark: int = 100, light: int = 200) -> Image.Image:
+    """左半分が暗く右半分が明るい 200x200 の画像。"""
+    img = Image.new("L", (200, 200), light)
+    ImageDraw.Draw(img).rectangle((0, 0, 99, 199), fill=dark)
+    return img
+
+
+class TestApplyTone:
+    @pytest.mark.parametrize("name", list(PRESETS))
+    def test_output_is_binary_and_same_size(self, name):
+        img = Image.linear_gradient("L").resize((300, 170))
+        out = apply_tone(img, name)
+        assert out.mode == "L" and out.size == (300, 170)
+        assert set(np.unique(np.asarray(out))) <= {0, 255}
+
+    @pytest.mark.parametrize("name", ["dither", "halftone"])
+    @pytest.mark.parametrize("level", [64, 128, 192])
+    def test_screens_preserve_mean_tone(self, name, level):
+        out = apply_tone(Image.new("L", (240, 240), level), name)
+        assert _black_ratio(out) == pytest.approx(1 - level / 255, abs=0.08)
+
+    def test_ink_keeps_edges_and_drops_flat_midtones(self):
+        out = np.asarray(apply_tone(_step(), "ink"))
+        assert (out[:, 97:100] == 0).mean() > 0.9  # 輪郭の暗い側は線になる
+        assert (out[:, :80] == 255).all()  # 平坦な中間調は白
+        assert (out[:, 100:] == 255).all()
+
+    def test_screentone_combines_lines_and_dots(self):
+        out = np.asarray(apply_tone(_step(), "screentone"))
+        assert (out[:, 97:100] == 0).mean() > 0.9
+        assert 0.3 < (out[:, :80] == 0).mean() < 0.8
+        # 紙の白に近い画素には網点を置かない
+        assert _black_ratio(apply_tone(Image.new("L", (100, 100), 240), "screentone")) == 0.0
+
+    def test_small_images(self):
+        for size in [(1, 1), (7, 5), (33, 40)]:
+            assert apply_tone(Image.new("L", size, 30), "screentone").size == size
+
+    def test_unknown_preset(self):
+        with pytest.raises(ValueError):
+            get_preset("sepia")
+
+
+class TestComposerTone:
+    def test_panel_images_are_toned(self):
+        scene = Scene(1, "", [Panel(1, PanelType.ACTION, "")])
+        img = Image.linear_gradient("L").resize((400, 400))
+        page = PageComposer(use_sprites=False, tone="halftone").compose_page(scene, [img])
+        x1, y1, x2, y2 = PageComposer(use_sprites=False).panel_rects(scene)[0]
+        inner = np.asarray(page.crop((x1 + 3, y1 + 3, x2 - 3, y2 - 3)))
+        assert set(np.unique(inner)) <= {0, 255}
+
+    def test_default_keeps_grayscale(self):
+        scene = Scene(1, "", [Panel(1, PanelType.ACTION, "")])
+        page = PageComposer(use_sprites=False).compose_page(scene, [Image.new("L", (64, 64), 128)])
+        assert page.getpixel((540, 764)) == 128
@@ -0,0 +1,162 @@
+"""トランスポート層と FakeModelServer のテスト。"""
+
+import json
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from PIL import Image
+
+from novelmanga.analyzer import SceneAnalyzer
+from novelmanga.fake_server import FakeModelServer
+from novelmanga.generator import ImageGenerator
+from novelmanga.transport import RecordStore, RecordingClient, create_client
+
+_SCRIPT = json.dumps(
+    {
+        "scenes": [
+            {
+                "scene_number": 1,
+                "page_layout": "standard",
+                "panels": [
+                    {
+                        "panel_number": 1,
+                        "panel_type": "dialogue",
+                        "visual_description": "Recorded panel",
+                        "dialogue": ["記録されたセリフ"],
+                        "narration": None,
+                    }
+                ],
+            }
+        ]
+    },
+    ensure_ascii=False,
+)
+
+
+def _text_response(text: str) -> MagicMock:
+    part = MagicMock()
+    part.text = text
+    part.inline_data = None
+    candidate = MagicMock()
+    candidate.content.parts = [part]
+    response = MagicMock()
+    response.candidates = [candidate]
+    response.usage_metadata.prompt_token_count = 100
+    response.usage_metadata.candidates_token_count = 20
+    response.usage_metadata.cached_content_token_count = None
+    response.text = text
+    return response
+
+
+@pytest.fixture
+def server():
+    with FakeModelServer() as srv:
+        yield srv
+
+
+class TestFakeModelServer:
+    def test_synthetic_script(self, server):
+        client = create_client("replay", base_url=server.url, retry_attempts=1)
+        scenes = SceneAnalyzer(client=client).analyze_chunk("「こんにちは」と彼は言った。" * 50)
+        assert scenes
+        assert all(s.panels for s in scenes)
+        assert server.stats.synthetic == 1
+
+    def test_synthetic_script_is_deterministic(self, server):
+        client = create_client("replay", base_url=server.url, retry_attempts=1)
+        analyzer = SceneAnalyzer(client=client)
+        assert analyzer.analyze_chunk("同じテキスト") == analyzer.analyze_chunk("同じテキスト")
+
+    def test_synthetic_compact_script_and_output_latency(self):
+        text = "「こんにちは」と彼は言った。" * 50
+        with FakeModelServer(output_token_latency=0.001) as srv:
+            client = create_client("replay", base_url=srv.url, retry_attempts=1)
+            analyzer = SceneAnalyzer(client=client, script_format="compact")
+            scenes = analyzer.analyze_chunk(text)
+            assert scenes and all(s.panels for s in scenes)
+            assert analyzer.stats.parse_failures == 0
+            assert srv.stats.synthetic == 1
+
+    def test_synthetic_image(self, server):
+        client = create_client("replay", base_url=server.url, retry_attempts=1)
+        img = ImageGenerator(client=client).generate_panel_image("dim room", 128, 128)
+        assert isinstance(img, Image.Image)
+        assert img.size == (128, 128)
+
+    def test_injected_errors(self):
+        with FakeModelServer(error_rate=1.0) as srv:
+            client = create_client("replay", base_url=srv.url, retry_attempts=1)
+            assert ImageGenerator(client=client).generate_panel_image("dim room") is None
+            assert srv.stats.errors == 1
+
+    def test_rate_limit(self):
+        with FakeModelServer(rate_limit=1.0) as srv:
+            client = create_client("replay", base_url=srv.url, retry_attempts=1)
+            gen = ImageGenerator(client=client)
+            gen.generate_panel_image("first")
+            assert gen.generate_panel_image("second") is None
+            assert srv.stats.throttled == 1
+
+    def test_latency(self):
+        with FakeModelServer(latency=0.2) as srv:
+            client = create_client("replay", base_url=srv.url, retry_attempts=1)
+            t0 = time.perf_counter()
+            SceneAnalyzer(client=client).analyze_chunk("テキスト")
+            assert time.perf_counter() - t0 >= 0.2
+
+
+class TestRecordReplay:
+    def test_record_then_replay(self, tmp_path):
+        inner = MagicMock()
+        inner.models.generate_content.return_value = _text_response(_SCRIPT)
+        recorder = RecordingClient(inner, tmp_path)
+
+        recorded = SceneAnalyzer(client=recorder).analyze_chunk("元のテキスト")
+        assert len(RecordStore(tmp_path)) == 1
+
+        with FakeModelServer(record_dir=tmp_path) as srv:
+            client = create_client("replay", base_url=srv.url, retry_attempts=1)
+            replayed = SceneAnalyzer(client=client).analyze_chunk("元のテキスト")
+            assert srv.stats.replayed == 1
+
+        assert replayed == recorded
+        assert replayed[0].panels[0].dialogue == ["記録されたセリフ"]
+
+    def test_recording_client_passes_through_attributes(self, tmp_path):
+        inner = MagicMock()
+        recorder = RecordingClient(inner, tmp_path)
+        assert recorder.files is inner.files
+        # caches は create だけを中継して記録し、他はそのまま渡す
+        assert recorder.caches.get is inner.caches.get
+
+    def test_context_cached_call_recorded_under_plain_key(self, tmp_path):
+        inner = MagicMock()
+        inner.models.generate_content.return_value = _text_response(_SCRIPT)
+        inner.caches.create.return_value.name = "cachedContents/abc"
+        inner.caches.create.return_value.expire_time = None
+        recorder = RecordingClient(inner, tmp_path)
+
+        analyzer = SceneAnalyzer(client=recorder, context_cache=True)
+        recorded = analyzer.analyze_chunk("元のテキスト")
+        assert analyzer.stats.context_cache_calls == 1
+        config = inner.models.generate_content.call_args.kwargs["config"]
+        assert config.cached_content == "cachedContents/abc" and config.system_instruction is None
+
+        # キャッシュを使わない再生でも同じ記録が返る
+        with FakeModelServer(record_dir=tmp_path) as srv:
+            client = create_client("replay", base_url=srv.url, retry_attempts=1)
+            assert SceneAnalyzer(client=client).analyze_chunk("元のテキスト") == recorded
+            assert srv.stats.replayed == 1
+
+    def test_replay_without_url_starts_inprocess_server(self, tmp_path):
+        client = create_client("replay", record_dir=tmp_path, retry_attempts=1)
+        assert SceneAnalyzer(client=client).analyze_chunk("テキスト")
+
+    def test_record_requires_dir(self):
+        with pytest.raises(ValueError):
+            create_client("record", api_key="test")
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            create_client("bogus")
@@ -0,0 +1,66 @@
+"""ページ書き出しのテスト。"""
+
+import pytest
+from PIL import Image
+
+from novelmanga.writer import PageWriter, save_png_atomic
+
+
+def _page(color: int = 128) -> Image.Image:
+    return Image.new("L", (64, 96), color=color)
+
+
+class TestSavePngAtomic:
+    def test_writes_png(self, tmp_path):
+        out = tmp_path / "sub" / "page_001.png"
+        size = save_png_atomic(_page(), out)
+        assert out.stat().st_size == size
+        with Image.open(out) as img:
+            assert img.size == (64, 96)
+
+    def test_no_temp_files_left(self, tmp_path):
+        save_png_atomic(_page(), tmp_path / "page_001.png")
+        assert [p.name for p in tmp_path.iterdir()] == ["page_001.png"]
+
+    def test_failed_write_leaves_nothing(self, tmp_path):
+        # CMYK は PNG で保存できないのでエンコード中に失敗する
+        with pytest.raises(OSError):
+            save_png_atomic(Image.new("CMYK", (4, 4)), tmp_path / "page_001.png")
+        assert list(tmp_path.iterdir()) == []
+
+    def test_compression_level_tradeoff(self, tmp_path):
+        page = Image.radial_gradient("L").resize((512, 512))
+        fast = save_png_atomic(page, tmp_path / "fast.png", compress_level=0)
+        small = save_png_atomic(page, tmp_path / "small.png", compress_level=9)
+        assert small < fast
+
+
+class TestPageWriter:
+    @pytest.mark.parametrize("threads", [0, 1, 3])
+    def test_writes_all_pages(self, tmp_path, threads):
+        with PageWriter(threads=threads, max_pending=2) as writer:
+            for i in range(10):
+                writer.submit(_page(i * 20), tmp_path / f"page_{i:03d}.png")
+        assert writer.stats.pages == 10
+        assert sorted(p.name for p in tmp_path.iterdir()) == [f"page_{i:03d}.png" for i in range(10)]
+        with Image.open(tmp_path / "page_005.png") as img:
+            assert img.getpixel((0, 0)) == 100
+
+    def test_error_raised_on_close(self, tmp_path):
+        writer = PageWriter(threads=2)
+        writer.submit(Image.new("CMYK", (4, 4)), tmp_path / "bad.png")
+        writer.submit(_page(), tmp_path / "good.png")
+        with pytest.raises(OSError):
+            writer.close()
+        assert writer.stats.errors == 1
+        assert (tmp_path / "good.png").exists()
+
+    def test_submit_after_close_rejected(self, tmp_path):
+        writer = PageWriter(threads=1)
+        writer.close()
+        with pytest.raises(RuntimeError):
+            writer.submit(_page(), tmp_path / "page.png")
+
+    def test_invalid_compress_level(self):
+        with pytest.raises(ValueError):
+            PageWriter(compress_level=10)